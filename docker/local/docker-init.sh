@@ -13,22 +13,8 @@ if [[ "${DATABASE_URL}" == postgresql* ]]; then
     echo "PostgreSQL is up!"
 fi
 
-# Create admin user
-echo "Creating admin user..."
-superset fab create-admin \
-    --username "${SUPERSET_ADMIN_USERNAME}" \
-    --firstname Admin \
-    --lastname User \
-    --email "${SUPERSET_ADMIN_EMAIL}" \
-    --password "${SUPERSET_ADMIN_PASSWORD}" || true
-
-# Initialize database
-echo "Initializing database..."
-superset db upgrade
-
-# Create default roles and permissions
-echo "Setting up roles..."
-superset init
+# Migrate, create the admin and sync roles only when needed
+python -m superset_ext.bootstrap
 
 # Load examples if requested
 if [[ "${SUPERSET_LOAD_EXAMPLES}" == "yes" ]]; then
@@ -0,0 +1,56 @@
+"""
+gunicorn configuration for the compose stacks
+Workers, threads and timeout follow the container's cgroup limits
+(superset_ext.runtime); `make config STACK=<name>` generates a per-stack file.
+"""
+
+from superset_ext.gunicorn_hooks import (
+    child_exit,
+    install_pid_guard,
+    post_fork,
+    post_request,
+    post_worker_init,
+    pre_fork,
+    pre_request,
+    when_ready,
+    worker_abort,
+)
+from superset_ext.runtime import tune
+
+# Server hooks gunicorn looks up by name in this module
+__all__ = [
+    'child_exit',
+    'post_fork',
+    'post_request',
+    'post_worker_init',
+    'pre_fork',
+    'pre_request',
+    'when_ready',
+    'worker_abort',
+]
+
+RUNTIME = tune()
+
+wsgi_app = 'superset.app:create_app()'
+bind = '0.0.0.0:8088'
+workers = RUNTIME.workers
+worker_class = 'gthread'
+threads = RUNTIME.threads
+timeout = RUNTIME.timeout
+graceful_timeout = 30
+keepalive = 5
+
+# Load Superset once in the master and fork workers from it: copy-on-write
+# memory sharing and workers that start in milliseconds
+preload_app = True
+
+# Replace workers after a while so slow leaks (pandas, SQLAlchemy caches)
+# never reach the container's memory limit; jitter avoids restarting all at once
+max_requests = RUNTIME.max_requests
+max_requests_jitter = max_requests // 10
+
+# Heartbeat files on tmpfs, not on the container's overlay filesystem
+worker_tmp_dir = '/dev/shm'
+
+# Workers must not reuse database connections the master opened
+install_pid_guard()
@@ -1,6 +1,8 @@
 import os
 from celery.schedules import crontab
 
+from superset_ext.metrics import PrometheusStatsLogger
+
 # Superset specific config
 ROW_LIMIT = 5000
 SECRET_KEY = os.environ.get('SUPERSET_SECRET_KEY', 'your-secret-key-here')
@@ -33,10 +35,12 @@ MAPBOX_API_KEY = os.environ.get('MAPBOX_API_KEY', '')
 REDIS_URL = os.environ.get('REDIS_URL', 'redis://redis:6379/0')
 
 CACHE_CONFIG = {
-    'CACHE_TYPE': 'RedisCache',
+    'CACHE_TYPE': 'superset_ext.cache.LayeredRedisCache',
     'CACHE_DEFAULT_TIMEOUT': 300,
     'CACHE_KEY_PREFIX': 'superset_',
     'CACHE_REDIS_URL': REDIS_URL,
+    'CACHE_L1_MAX_BYTES': 16 * 1024 * 1024,  # In-process L1 per worker
+    'CACHE_L1_TIMEOUT': 30,
 }
 
 # Celery configuration
@@ -45,10 +49,31 @@ class CeleryConfig:
     imports = (
         'superset.sql_lab',
         'superset.tasks',
+        'superset.tasks.thumbnails',
+        'superset_ext.tasks',
     )
     result_backend = REDIS_URL
-    worker_prefetch_multiplier = 10
+    # Long tasks are acked late: reserve one at a time so the backlog stays
+    # in Redis, where idle workers and make worker-autoscale see it
+    worker_prefetch_multiplier = 1
     task_acks_late = True
+    # Batch work gets its own queues and the superset-worker-batch service,
+    # so reports, thumbnails and warm-up never hold the processes interactive
+    # SQL Lab and async chart queries wait for (pulumi.config.workers)
+    task_routes = {
+        'sql_lab.get_sql_results': {'queue': 'sql_lab'},
+        'load_chart_data_into_cache': {'queue': 'sql_lab'},
+        'load_explore_json_into_cache': {'queue': 'sql_lab'},
+        'reports.scheduler': {'queue': 'reports'},
+        'reports.execute': {'queue': 'reports'},
+        'reports.prune_log': {'queue': 'reports'},
+        'cache_chart_thumbnail': {'queue': 'thumbnails'},
+        'cache_dashboard_thumbnail': {'queue': 'thumbnails'},
+        'cache_dashboard_screenshot': {'queue': 'thumbnails'},
+        'superset_ext.warm_up_dashboards': {'queue': 'warmup'},
+        'cache-warmup': {'queue': 'warmup'},
+        'fetch_url': {'queue': 'warmup'},
+    }
     task_annotations = {
         'sql_lab.get_sql_results': {
             'rate_limit': '100/s',
@@ -108,6 +133,9 @@ WEBDRIVER_OPTION_ARGS = [
     "--disable-dev-shm-usage",
     "--disable-gpu",
 ]
+# Warm browsers reused by the screenshots of each worker process
+# (superset_ext.browser_pool); superset-worker-batch runs one thread per browser
+BROWSER_POOL = {'size': 2, 'max_renders': 50, 'acquire_timeout': 120, 'warm': True}
 
 # Async queries
 GLOBAL_ASYNC_QUERIES_REDIS_CONFIG = {
@@ -148,6 +176,9 @@ if os.environ.get('OAUTH_ENABLED', 'false').lower() == 'true':
             }
         })
 
+# Superset's query, cache and API timings as Prometheus metrics
+STATS_LOGGER = PrometheusStatsLogger()
+
 # Load examples
 LOAD_EXAMPLES = os.environ.get('SUPERSET_LOAD_EXAMPLES', 'yes').lower() == 'yes'
 
@@ -4,12 +4,19 @@ This configuration minimizes resource usage while maintaining functionality
 """
 
 import os
+from functools import partial
 from celery.schedules import crontab
+from superset_ext.admission import AdmissionMiddleware, load_admission_config
+from superset_ext.metrics import InstrumentedNullPool, MetricsMiddleware, PrometheusStatsLogger, instrument_app
+from superset_ext.results import DiskResultsBackend
+from superset_ext.runtime import tune
+from superset_ext.slowlog import SlowQueryLog
 
 # Flask App Configuration
 ROW_LIMIT = 5000
-SUPERSET_WEBSERVER_THREADS = 2
-SUPERSET_WEBSERVER_TIMEOUT = 300
+RUNTIME = tune()  # from the container's cgroup limits
+SUPERSET_WEBSERVER_THREADS = RUNTIME.threads
+SUPERSET_WEBSERVER_TIMEOUT = RUNTIME.timeout
 WTF_CSRF_ENABLED = True
 WTF_CSRF_TIME_LIMIT = None
 
@@ -33,6 +40,7 @@ if SQLALCHEMY_DATABASE_URI.startswith('sqlite'):
         'connect_args': {
             'check_same_thread': False,
         },
+        'poolclass': InstrumentedNullPool,  # SQLite file default, timing connects
         'pool_pre_ping': True,
         'pool_recycle': 3600,
     }
@@ -49,16 +57,15 @@ if SQLALCHEMY_DATABASE_URI.startswith('sqlite'):
         cursor.execute("PRAGMA temp_store=MEMORY")
         cursor.close()
 
-# Disable Redis cache for free tier
+# No Redis in free tier: cache in SQLite files shared by all gunicorn workers
 CACHE_CONFIG = {
-    'CACHE_TYPE': 'SimpleCache',
+    'CACHE_TYPE': 'superset_ext.cache.SQLiteCache',
     'CACHE_DEFAULT_TIMEOUT': 300,
     'CACHE_KEY_PREFIX': 'superset_',
+    'CACHE_SQLITE_PATH': '/app/superset_home/cache/metadata.db',
+    'CACHE_MAX_BYTES': 64 * 1024 * 1024,  # 64MB
 }
 
-# Results backend - use database instead of Redis
-RESULTS_BACKEND = None  # Will use database
-
 # Disable Celery for free tier
 class CeleryConfig:
     broker_url = None
@@ -158,24 +165,96 @@ ENABLE_ALERTS = False
 THUMBNAIL_SELENIUM_USER = None  # No selenium/thumbnails
 
 # Default cache timeout
+# Chart data misses are single-flight: one worker re-runs an expired query
+# while the others wait for its result instead of hitting the database too
 DATA_CACHE_CONFIG = {
-    'CACHE_TYPE': 'SimpleCache',
+    'CACHE_TYPE': 'superset_ext.singleflight.SingleFlightCache',
+    'CACHE_BACKEND': 'superset_ext.cache.SQLiteCache',
+    'CACHE_LOCK_TIMEOUT': SUPERSET_WEBSERVER_TIMEOUT,
+    'CACHE_LOCK_WAIT': 5,  # then run the query: never wait out a failed leader
     'CACHE_DEFAULT_TIMEOUT': 86400,  # 24 hours
     'CACHE_KEY_PREFIX': 'superset_data_',
+    'CACHE_SQLITE_PATH': '/app/superset_home/cache/data.db',
+    'CACHE_MAX_BYTES': 512 * 1024 * 1024,  # 512MB of the 5GB disk budget
 }
 
 # Filter state cache
 FILTER_STATE_CACHE_CONFIG = {
-    'CACHE_TYPE': 'SimpleCache',
+    'CACHE_TYPE': 'superset_ext.cache.SQLiteCache',
     'CACHE_DEFAULT_TIMEOUT': 86400,  # 24 hours
     'CACHE_KEY_PREFIX': 'superset_filter_',
+    'CACHE_SQLITE_PATH': '/app/superset_home/cache/filter_state.db',
+    'CACHE_MAX_BYTES': 32 * 1024 * 1024,  # 32MB
 }
 
 # Explore form data cache
 EXPLORE_FORM_DATA_CACHE_CONFIG = {
-    'CACHE_TYPE': 'SimpleCache',
+    'CACHE_TYPE': 'superset_ext.cache.SQLiteCache',
     'CACHE_DEFAULT_TIMEOUT': 86400,  # 24 hours
     'CACHE_KEY_PREFIX': 'superset_explore_',
+    'CACHE_SQLITE_PATH': '/app/superset_home/cache/explore_form_data.db',
+    'CACHE_MAX_BYTES': 32 * 1024 * 1024,  # 32MB
 }
 
-print("Superset configured for GCP Free Tier - Optimized for minimal resource usage")
\ No newline at end of file
+# Storage budget for everything under superset_home (Cloud Storage free tier)
+MAX_STORAGE_BYTES = 5 * 1024 * 1024 * 1024  # 5GB, as the superset_home_free volume
+
+# Results backend - compressed files under superset_home instead of Redis.
+# Whatever the SQLite caches do not use of the 5GB storage budget is theirs.
+RESULTS_BACKEND = DiskResultsBackend(
+    path='/app/superset_home/results',
+    max_bytes=MAX_STORAGE_BYTES - sum(
+        config['CACHE_MAX_BYTES']
+        for config in (
+            CACHE_CONFIG,
+            DATA_CACHE_CONFIG,
+            FILTER_STATE_CACHE_CONFIG,
+            EXPLORE_FORM_DATA_CACHE_CONFIG,
+        )
+    ),
+)
+
+# =============================================================================
+# ADMISSION CONTROL (reject bursts early instead of timing out)
+# =============================================================================
+
+# Token buckets per route class (chart data, SQL Lab, static) from the
+# stack's superset.admission section in system.yaml, shared by all workers
+ADMISSION_ROUTES = load_admission_config(
+    os.environ.get('SUPERSET_SYSTEM_CONFIG_PATH', '/app/system.yaml'),
+    os.environ.get('SUPERSET_STACK', 'gcp-free-tier'),
+)
+ADDITIONAL_MIDDLEWARE = [
+    partial(AdmissionMiddleware, routes=ADMISSION_ROUTES, path='/app/superset_home/admission.db',
+            threads=RUNTIME.threads),
+]
+
+# =============================================================================
+# SLOW METADATA QUERY LOG
+# =============================================================================
+
+# Metadata statements slower than SLOW_QUERY_THRESHOLD_MS are logged (a
+# SLOW_QUERY_SAMPLE_RATE share of them); latency per statement fingerprint is
+# ranked across workers by `python -m superset_ext.slowlog --top 20`
+SLOW_QUERY_LOG = SlowQueryLog(
+    path='/app/superset_home/slowlog',
+    threshold_seconds=float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 250)) / 1000,
+    sample_rate=float(os.environ.get('SLOW_QUERY_SAMPLE_RATE', 1.0)),
+)
+SLOW_QUERY_LOG.install(url=SQLALCHEMY_DATABASE_URI)
+
+# =============================================================================
+# PROMETHEUS METRICS (scraped on /metrics by the prometheus service)
+# =============================================================================
+
+# Per-endpoint latency histograms, in-flight requests, metadata pool checkout
+# wait (pool class above) and cache hits/misses, summed over all workers,
+# next to Superset's own query, cache and API timings (STATS_LOGGER).
+# Listed last so it wraps the other middlewares and sees shed requests.
+PROMETHEUS_EXPORTER_PATH = '/metrics'
+STATS_LOGGER = PrometheusStatsLogger()
+FLASK_APP_MUTATOR = instrument_app
+ADDITIONAL_MIDDLEWARE.append(partial(MetricsMiddleware, path=PROMETHEUS_EXPORTER_PATH))
+
+print("Superset configured for GCP Free Tier - Optimized for minimal resource usage")
+print(f"Runtime tuning: {RUNTIME!r}")
\ No newline at end of file
@@ -4,9 +4,15 @@ This configuration includes all free tier services and limits
 """
 
 import os
-import logging
 from datetime import timedelta
+from functools import partial
 from celery.schedules import crontab
+from superset_ext.results import DiskResultsBackend
+from superset_ext.runtime import tune
+from superset_ext.slowlog import SlowQueryLog
+from superset_ext.admission import AdmissionMiddleware, load_admission_config
+from superset_ext.metrics import InstrumentedNullPool, MetricsMiddleware, PrometheusStatsLogger, instrument_app
+from superset_ext.usage import UsageMiddleware, UsageTracker
 
 # =============================================================================
 # CORE CONFIGURATION
@@ -14,8 +20,9 @@ from celery.schedules import crontab
 
 # Flask App Configuration
 ROW_LIMIT = 5000  # Firestore-like limits
-SUPERSET_WEBSERVER_THREADS = 2
-SUPERSET_WEBSERVER_TIMEOUT = 300
+RUNTIME = tune()  # from the container's cgroup limits
+SUPERSET_WEBSERVER_THREADS = RUNTIME.threads
+SUPERSET_WEBSERVER_TIMEOUT = RUNTIME.timeout
 WTF_CSRF_ENABLED = True
 WTF_CSRF_TIME_LIMIT = None
 
@@ -41,38 +48,24 @@ if SQLALCHEMY_DATABASE_URI.startswith('sqlite'):
         'connect_args': {
             'check_same_thread': False,
         },
+        'poolclass': InstrumentedNullPool,  # SQLite file default, timing connects
         'pool_pre_ping': True,
         'pool_recycle': 3600,
     }
     
-    # Apply Firestore-like limits
     from sqlalchemy import event
     from sqlalchemy.engine import Engine
-    
-    # Track daily operations
-    daily_reads = 0
-    daily_writes = 0
-    daily_deletes = 0
-    
-    @event.listens_for(Engine, "before_execute")
-    def receive_before_execute(conn, clauseelement, multiparams, params, execution_options):
-        global daily_reads, daily_writes, daily_deletes
-        
-        # Simple operation counting (would need reset logic for daily limits)
-        statement = str(clauseelement)
-        if statement.upper().startswith('SELECT'):
-            daily_reads += 1
-            if daily_reads > 50000:
-                logging.warning("Firestore read limit exceeded!")
-        elif statement.upper().startswith(('INSERT', 'UPDATE')):
-            daily_writes += 1
-            if daily_writes > 20000:
-                logging.warning("Firestore write limit exceeded!")
-        elif statement.upper().startswith('DELETE'):
-            daily_deletes += 1
-            if daily_deletes > 20000:
-                logging.warning("Firestore delete limit exceeded!")
-    
+    from superset_ext.opmeter import OperationMeter
+
+    # Apply Firestore-like daily limits. Statements are classified from the
+    # compiled cursor SQL and counted for all workers in one SQLite file.
+    OPERATION_METER = OperationMeter(
+        path='/app/superset_home/usage/operations.db',
+        sample_rate=float(os.environ.get('OPERATION_METER_SAMPLE_RATE', 1.0)),
+        limits={'reads': 50000, 'writes': 20000, 'deletes': 20000},
+    )
+    OPERATION_METER.install()
+
     @event.listens_for(Engine, "connect")
     def set_sqlite_pragma(dbapi_connection, connection_record):
         cursor = dbapi_connection.cursor()
@@ -86,15 +79,16 @@ if SQLALCHEMY_DATABASE_URI.startswith('sqlite'):
 # CACHE CONFIGURATION (No Redis in free tier)
 # =============================================================================
 
+# SQLite-backed caches are shared by all gunicorn workers and survive restarts
+
 CACHE_CONFIG = {
-    'CACHE_TYPE': 'SimpleCache',
+    'CACHE_TYPE': 'superset_ext.cache.SQLiteCache',
     'CACHE_DEFAULT_TIMEOUT': 300,
     'CACHE_KEY_PREFIX': 'superset_',
+    'CACHE_SQLITE_PATH': '/app/superset_home/cache/metadata.db',
+    'CACHE_MAX_BYTES': 64 * 1024 * 1024,  # 64MB
 }
 
-# Results backend - use database with size limits
-RESULTS_BACKEND = None  # Will use database
-
 # =============================================================================
 # CLOUD STORAGE EMULATION (MinIO)
 # =============================================================================
@@ -107,9 +101,9 @@ if os.environ.get('MINIO_ENDPOINT'):
     
     # Limit uploads to match free tier
     CSV_UPLOAD_MAX_SIZE = 50 * 1024 * 1024  # 50MB max
-    
-    # Track storage usage (5GB limit)
-    MAX_STORAGE_BYTES = 5 * 1024 * 1024 * 1024  # 5GB
+
+# Track storage usage (5GB limit)
+MAX_STORAGE_BYTES = 5 * 1024 * 1024 * 1024  # 5GB
 
 # =============================================================================
 # PUB/SUB CONFIGURATION (Emulated)
@@ -140,7 +134,7 @@ MAX_GB_SECONDS_PER_MONTH = 360000  # 360K GB-seconds
 MAX_VCPU_SECONDS_PER_MONTH = 180000  # 180K vCPU-seconds
 
 # Concurrency limits
-SUPERSET_WORKERS = 1  # Single worker
+SUPERSET_WORKERS = RUNTIME.workers
 CONCURRENT_REQUESTS = 80  # Cloud Run default
 
 # =============================================================================
@@ -222,8 +216,8 @@ RECAPTCHA_ASSESSMENTS_LIMIT_MONTH = 10000  # 10K/month
 LOG_LEVEL = 'WARNING'  # Reduce log volume
 ENABLE_TIME_ROTATE = False
 
-# Prometheus metrics
-ENABLE_PROMETHEUS_EXPORTER = True
+# Prometheus metrics (exporter installed with the middlewares below)
+ENABLE_PROMETHEUS_EXPORTER = os.environ.get('ENABLE_PROMETHEUS_EXPORTER', 'true').lower() == 'true'
 PROMETHEUS_EXPORTER_PORT = 8088  # Same port (path-based)
 PROMETHEUS_EXPORTER_PATH = '/metrics'
 
@@ -324,50 +318,108 @@ THUMBNAIL_SELENIUM_USER = None
 # CACHE CONFIGURATIONS
 # =============================================================================
 
+# Chart data misses are single-flight: one worker re-runs an expired query
+# while the others wait for its result instead of hitting the database too
 DATA_CACHE_CONFIG = {
-    'CACHE_TYPE': 'SimpleCache',
+    'CACHE_TYPE': 'superset_ext.singleflight.SingleFlightCache',
+    'CACHE_BACKEND': 'superset_ext.cache.SQLiteCache',
+    'CACHE_LOCK_TIMEOUT': SUPERSET_WEBSERVER_TIMEOUT,
+    'CACHE_LOCK_WAIT': 5,  # then run the query: never wait out a failed leader
     'CACHE_DEFAULT_TIMEOUT': 86400,  # 24 hours
     'CACHE_KEY_PREFIX': 'superset_data_',
+    'CACHE_SQLITE_PATH': '/app/superset_home/cache/data.db',
+    'CACHE_MAX_BYTES': 512 * 1024 * 1024,  # 512MB of the 5GB disk budget
 }
 
 FILTER_STATE_CACHE_CONFIG = {
-    'CACHE_TYPE': 'SimpleCache',
+    'CACHE_TYPE': 'superset_ext.cache.SQLiteCache',
     'CACHE_DEFAULT_TIMEOUT': 86400,
     'CACHE_KEY_PREFIX': 'superset_filter_',
+    'CACHE_SQLITE_PATH': '/app/superset_home/cache/filter_state.db',
+    'CACHE_MAX_BYTES': 32 * 1024 * 1024,  # 32MB
 }
 
 EXPLORE_FORM_DATA_CACHE_CONFIG = {
-    'CACHE_TYPE': 'SimpleCache',
+    'CACHE_TYPE': 'superset_ext.cache.SQLiteCache',
     'CACHE_DEFAULT_TIMEOUT': 86400,
     'CACHE_KEY_PREFIX': 'superset_explore_',
+    'CACHE_SQLITE_PATH': '/app/superset_home/cache/explore_form_data.db',
+    'CACHE_MAX_BYTES': 32 * 1024 * 1024,  # 32MB
 }
 
+# Results backend - compressed files under superset_home instead of Redis.
+# Whatever the SQLite caches do not use of the 5GB storage budget is theirs.
+RESULTS_BACKEND = DiskResultsBackend(
+    path='/app/superset_home/results',
+    max_bytes=MAX_STORAGE_BYTES - sum(
+        config['CACHE_MAX_BYTES']
+        for config in (
+            CACHE_CONFIG,
+            DATA_CACHE_CONFIG,
+            FILTER_STATE_CACHE_CONFIG,
+            EXPLORE_FORM_DATA_CACHE_CONFIG,
+        )
+    ),
+)
+
+# =============================================================================
+# SLOW METADATA QUERY LOG
+# =============================================================================
+
+# Metadata statements slower than SLOW_QUERY_THRESHOLD_MS are logged (a
+# SLOW_QUERY_SAMPLE_RATE share of them); latency per statement fingerprint is
+# ranked across workers by `python -m superset_ext.slowlog --top 20`
+SLOW_QUERY_LOG = SlowQueryLog(
+    path='/app/superset_home/slowlog',
+    threshold_seconds=float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 250)) / 1000,
+    sample_rate=float(os.environ.get('SLOW_QUERY_SAMPLE_RATE', 1.0)),
+)
+SLOW_QUERY_LOG.install(url=SQLALCHEMY_DATABASE_URI)
+
 # =============================================================================
 # USAGE TRACKING (for staying within limits)
 # =============================================================================
 
-class UsageTracker:
-    """Track usage to stay within free tier limits"""
-    
-    def __init__(self):
-        self.requests_today = 0
-        self.gb_seconds_today = 0
-        self.vcpu_seconds_today = 0
-        self.storage_bytes_used = 0
-        
-    def check_limits(self):
-        """Check if we're approaching free tier limits"""
-        if self.requests_today > MAX_REQUESTS_PER_DAY * 0.8:
-            logging.warning(f"Approaching daily request limit: {self.requests_today}/{MAX_REQUESTS_PER_DAY}")
-        
-        monthly_gb_seconds = self.gb_seconds_today * 30
-        if monthly_gb_seconds > MAX_GB_SECONDS_PER_MONTH * 0.8:
-            logging.warning(f"Approaching monthly GB-seconds limit: {monthly_gb_seconds}/{MAX_GB_SECONDS_PER_MONTH}")
-
-# Initialize usage tracker
-usage_tracker = UsageTracker()
+# Every worker records request count, GB-seconds (wall time x memory) and
+# CPU seconds into one SQLite file; sliding-window usage against the limits
+# above is served in the Prometheus text format on /usage/metrics, to private
+# addresses only unless USAGE_METRICS_TOKEN is set (then as a bearer token).
+usage_tracker = UsageTracker(
+    path='/app/superset_home/usage/requests.db',
+    memory_gb=float(os.environ.get('USAGE_MEMORY_GB', 1.0)),  # e2-micro
+    limits={
+        'requests_day': MAX_REQUESTS_PER_DAY,
+        'gb_seconds_month': MAX_GB_SECONDS_PER_MONTH,
+        'vcpu_seconds_month': MAX_VCPU_SECONDS_PER_MONTH,
+    },
+)
+
+# Token buckets per route class (chart data, SQL Lab, static) from the
+# stack's superset.admission section in system.yaml, shared by all workers.
+# Listed first so usage tracking (outermost) also counts shed requests.
+ADMISSION_ROUTES = load_admission_config(
+    os.environ.get('SUPERSET_SYSTEM_CONFIG_PATH', '/app/system.yaml'),
+    os.environ.get('SUPERSET_STACK', 'gcp-free-tier'),
+)
+ADDITIONAL_MIDDLEWARE = [
+    partial(AdmissionMiddleware, routes=ADMISSION_ROUTES, path='/app/superset_home/admission.db',
+            threads=RUNTIME.threads),
+    partial(UsageMiddleware, tracker=usage_tracker, metrics_token=os.environ.get('USAGE_METRICS_TOKEN')),
+]
+
+# Superset's own query, cache and API timings, recorded even when the
+# exporter is off
+STATS_LOGGER = PrometheusStatsLogger()
+
+# Per-endpoint latency histograms, in-flight requests, metadata pool checkout
+# wait and cache hits/misses, summed over all workers. Listed last so it wraps
+# the other middlewares and sees shed requests.
+if ENABLE_PROMETHEUS_EXPORTER:
+    FLASK_APP_MUTATOR = instrument_app
+    ADDITIONAL_MIDDLEWARE.append(partial(MetricsMiddleware, path=PROMETHEUS_EXPORTER_PATH))
 
 print("Superset configured for FULL GCP Free Tier emulation")
+print(f"Runtime tuning: {RUNTIME!r}")
 print(f"Project: {PUBSUB_PROJECT_ID}")
 print(f"Firestore emulator: {os.environ.get('FIRESTORE_EMULATOR_HOST', 'Not configured')}")
 print(f"Pub/Sub emulator: {PUBSUB_EMULATOR_HOST or 'Not configured'}")
\ No newline at end of file
@@ -4,6 +4,10 @@ No external dependencies required
 """
 
 import os
+from functools import partial
+from superset_ext.metrics import MetricsMiddleware, PrometheusStatsLogger, instrument_app
+from superset_ext.runtime import tune
+from superset_ext.slowlog import SlowQueryLog
 
 # Flask App Configuration
 SECRET_KEY = os.environ.get('SUPERSET_SECRET_KEY', 'thisISaSECRET_1234')
@@ -13,7 +17,9 @@ SQLALCHEMY_DATABASE_URI = 'sqlite:////app/superset_home/superset.db'
 
 # Basic configuration
 ROW_LIMIT = 5000
-SUPERSET_WEBSERVER_THREADS = 2
+RUNTIME = tune()  # from the container's cgroup limits
+SUPERSET_WEBSERVER_THREADS = RUNTIME.threads
+SUPERSET_WEBSERVER_TIMEOUT = RUNTIME.timeout
 
 # Flask-WTF flag for CSRF
 WTF_CSRF_ENABLED = True
@@ -30,10 +36,24 @@ FEATURE_FLAGS = {
     "ENABLE_TEMPLATE_PROCESSING": True,
 }
 
-# Cache configuration - use simple cache (no Redis)
+# Cache configuration - SQLite files shared by all gunicorn workers (no Redis)
 CACHE_CONFIG = {
-    'CACHE_TYPE': 'SimpleCache',
+    'CACHE_TYPE': 'superset_ext.cache.SQLiteCache',
     'CACHE_DEFAULT_TIMEOUT': 300,
+    'CACHE_SQLITE_PATH': '/app/superset_home/cache/metadata.db',
+    'CACHE_MAX_BYTES': 64 * 1024 * 1024,  # 64MB
+}
+
+# Chart data misses are single-flight: one worker re-runs an expired query
+# while the others wait for its result instead of hitting the database too
+DATA_CACHE_CONFIG = {
+    'CACHE_TYPE': 'superset_ext.singleflight.SingleFlightCache',
+    'CACHE_BACKEND': 'superset_ext.cache.SQLiteCache',
+    'CACHE_LOCK_TIMEOUT': 60,
+    'CACHE_LOCK_WAIT': 5,  # then run the query: never wait out a failed leader
+    'CACHE_DEFAULT_TIMEOUT': 86400,  # 24 hours
+    'CACHE_SQLITE_PATH': '/app/superset_home/cache/data.db',
+    'CACHE_MAX_BYTES': 256 * 1024 * 1024,  # 256MB
 }
 
 # No Celery/Redis needed for basic setup
@@ -46,4 +66,19 @@ class CeleryConfig:
 
 CELERY_CONFIG = CeleryConfig
 
-print("Superset is starting with minimal configuration...")
\ No newline at end of file
+# Metadata statements slower than SLOW_QUERY_THRESHOLD_MS are logged;
+# `python -m superset_ext.slowlog --top 20` ranks them by total time
+SLOW_QUERY_LOG = SlowQueryLog(
+    path='/app/superset_home/slowlog',
+    threshold_seconds=float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 250)) / 1000,
+)
+SLOW_QUERY_LOG.install(url=SQLALCHEMY_DATABASE_URI)
+
+# Superset's query, cache and API timings (STATS_LOGGER) and request latency
+# per endpoint, served in the Prometheus text format on /metrics
+STATS_LOGGER = PrometheusStatsLogger()
+FLASK_APP_MUTATOR = instrument_app
+ADDITIONAL_MIDDLEWARE = [partial(MetricsMiddleware, path='/metrics')]
+
+print("Superset is starting with minimal configuration...")
+print(f"Runtime tuning: {RUNTIME!r}")
\ No newline at end of file
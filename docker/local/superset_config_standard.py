@@ -4,12 +4,19 @@ Compatible with Apache Superset 5.0.0+
 """
 
 import os
+from functools import partial
 from celery.schedules import crontab
+from superset_ext.metrics import InstrumentedQueuePool, MetricsMiddleware, PrometheusStatsLogger, instrument_app
+from superset_ext.runtime import tune
+from superset_ext.slowlog import SlowQueryLog
+
+# Threads, pool and L1 sizes follow the container's cgroup CPU/memory limits
+RUNTIME = tune()
 
 # Flask App Configuration
 ROW_LIMIT = 5000
-SUPERSET_WEBSERVER_THREADS = 4
-SUPERSET_WEBSERVER_TIMEOUT = 120
+SUPERSET_WEBSERVER_THREADS = RUNTIME.threads
+SUPERSET_WEBSERVER_TIMEOUT = RUNTIME.timeout
 WTF_CSRF_ENABLED = True
 WTF_CSRF_TIME_LIMIT = None
 
@@ -28,10 +35,11 @@ SQLALCHEMY_DATABASE_URI = os.environ.get(
 
 # PostgreSQL specific settings
 SQLALCHEMY_ENGINE_OPTIONS = {
+    'poolclass': InstrumentedQueuePool,  # QueuePool timing checkout waits
     'pool_pre_ping': True,
     'pool_recycle': 3600,
-    'pool_size': 20,
-    'max_overflow': 40,
+    'pool_size': RUNTIME.pool_size,  # one connection per thread
+    'max_overflow': RUNTIME.max_overflow,
 }
 
 # Redis configuration
@@ -40,12 +48,18 @@ REDIS_PORT = os.environ.get('REDIS_PORT', '6379')
 REDIS_PASSWORD = os.environ.get('REDIS_PASSWORD', '')
 REDIS_URL = os.environ.get('REDIS_URL', f'redis://:{REDIS_PASSWORD}@{REDIS_HOST}:{REDIS_PORT}/0')
 
-# Cache configuration using Redis
+# Follow Redis expired-key events (Memorystore ships with notify-keyspace-events Ex)
+CACHE_L1_KEYSPACE_EVENTS = os.environ.get('CACHE_L1_KEYSPACE_EVENTS', 'true').lower() == 'true'
+
+# Cache configuration using Redis with a per-worker in-process L1
 CACHE_CONFIG = {
-    'CACHE_TYPE': 'RedisCache',
+    'CACHE_TYPE': 'superset_ext.cache.LayeredRedisCache',
     'CACHE_DEFAULT_TIMEOUT': 300,
     'CACHE_KEY_PREFIX': 'superset_',
     'CACHE_REDIS_URL': REDIS_URL,
+    'CACHE_L1_MAX_BYTES': RUNTIME.cache_l1_bytes,  # per worker
+    'CACHE_L1_TIMEOUT': 30,
+    'CACHE_L1_KEYSPACE_EVENTS': CACHE_L1_KEYSPACE_EVENTS,
 }
 
 # Results backend using Redis
@@ -59,10 +73,34 @@ RESULTS_BACKEND = {
 # Celery configuration
 class CeleryConfig:
     broker_url = REDIS_URL
-    imports = ('superset.sql_lab', 'superset.tasks', 'superset.tasks.thumbnails')
+    imports = (
+        'superset.sql_lab',
+        'superset.tasks',
+        'superset.tasks.thumbnails',
+        'superset_ext.tasks',
+    )
     result_backend = REDIS_URL
-    worker_prefetch_multiplier = 10
+    # Long tasks are acked late: reserve one at a time so the backlog stays
+    # in Redis, where idle workers and make worker-autoscale see it
+    worker_prefetch_multiplier = 1
     task_acks_late = True
+    # Batch work gets its own queues and the superset-worker-batch service,
+    # so reports, thumbnails and warm-up never hold the processes interactive
+    # SQL Lab and async chart queries wait for (pulumi.config.workers)
+    task_routes = {
+        'sql_lab.get_sql_results': {'queue': 'sql_lab'},
+        'load_chart_data_into_cache': {'queue': 'sql_lab'},
+        'load_explore_json_into_cache': {'queue': 'sql_lab'},
+        'reports.scheduler': {'queue': 'reports'},
+        'reports.execute': {'queue': 'reports'},
+        'reports.prune_log': {'queue': 'reports'},
+        'cache_chart_thumbnail': {'queue': 'thumbnails'},
+        'cache_dashboard_thumbnail': {'queue': 'thumbnails'},
+        'cache_dashboard_screenshot': {'queue': 'thumbnails'},
+        'superset_ext.warm_up_dashboards': {'queue': 'warmup'},
+        'cache-warmup': {'queue': 'warmup'},
+        'fetch_url': {'queue': 'warmup'},
+    }
     task_annotations = {
         'sql_lab.get_sql_results': {
             'rate_limit': '100/s',
@@ -77,10 +115,22 @@ class CeleryConfig:
             'task': 'reports.prune_log',
             'schedule': crontab(minute=0, hour=0),
         },
+        'superset_ext.warm_up_dashboards': {
+            'task': 'superset_ext.warm_up_dashboards',
+            'schedule': crontab(minute='*/30'),
+        },
     }
 
 CELERY_CONFIG = CeleryConfig
 
+# Chart data warm-up for the most viewed dashboards (superset_ext.warmup).
+# Beat re-runs it every 30 minutes, which also refills the cache after a
+# Redis failover; deploys run it once against the new revision.
+WARMUP_BASE_URL = os.environ.get('SUPERSET_WARMUP_URL', 'http://superset:8088')
+WARMUP_TOP_DASHBOARDS = int(os.environ.get('WARMUP_TOP_DASHBOARDS', 10))
+WARMUP_LOOKBACK_DAYS = int(os.environ.get('WARMUP_LOOKBACK_DAYS', 7))
+WARMUP_CONCURRENCY = int(os.environ.get('WARMUP_CONCURRENCY', 4))
+
 # Security
 SESSION_COOKIE_SECURE = True
 SESSION_COOKIE_HTTPONLY = True
@@ -137,13 +187,23 @@ CORS_OPTIONS = {
 }
 
 # Additional cache configurations
+# Chart data misses are single-flight: one worker re-runs an expired query
+# while the others wait for its result instead of hitting the database too
 DATA_CACHE_CONFIG = {
-    'CACHE_TYPE': 'RedisCache',
+    'CACHE_TYPE': 'superset_ext.singleflight.SingleFlightCache',
+    'CACHE_BACKEND': 'superset_ext.cache.LayeredRedisCache',
+    'CACHE_LOCK_TIMEOUT': SUPERSET_WEBSERVER_TIMEOUT,
+    'CACHE_LOCK_WAIT': 5,  # then run the query: never wait out a failed leader
     'CACHE_DEFAULT_TIMEOUT': 86400,
     'CACHE_KEY_PREFIX': 'superset_data_',
     'CACHE_REDIS_URL': REDIS_URL,
+    'CACHE_L1_MAX_BYTES': RUNTIME.data_cache_l1_bytes,  # per worker
+    'CACHE_L1_TIMEOUT': 60,
+    'CACHE_L1_KEYSPACE_EVENTS': CACHE_L1_KEYSPACE_EVENTS,
 }
 
+# Filter state and explore form data are per-user state that is rewritten
+# often, so they stay on plain Redis without an L1
 FILTER_STATE_CACHE_CONFIG = {
     'CACHE_TYPE': 'RedisCache',
     'CACHE_DEFAULT_TIMEOUT': 86400,
@@ -177,4 +237,31 @@ TALISMAN_CONFIG = {
 LOG_FORMAT = '%(asctime)s:%(levelname)s:%(name)s:%(message)s'
 LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
 
-print("Superset configured for standard deployment with PostgreSQL and Redis")
\ No newline at end of file
+# =============================================================================
+# SLOW METADATA QUERY LOG
+# =============================================================================
+
+# Metadata statements slower than SLOW_QUERY_THRESHOLD_MS are logged (a
+# SLOW_QUERY_SAMPLE_RATE share of them); latency per statement fingerprint is
+# ranked across workers by `python -m superset_ext.slowlog --top 20`
+SLOW_QUERY_LOG = SlowQueryLog(
+    path='/app/superset_home/slowlog',
+    threshold_seconds=float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 100)) / 1000,
+    sample_rate=float(os.environ.get('SLOW_QUERY_SAMPLE_RATE', 1.0)),
+)
+SLOW_QUERY_LOG.install(url=SQLALCHEMY_DATABASE_URI)
+
+# =============================================================================
+# PROMETHEUS METRICS (scraped on /metrics by the prometheus service)
+# =============================================================================
+
+# Per-endpoint latency histograms, in-flight requests, metadata pool checkout
+# wait (pool class above) and cache hits/misses, summed over all workers,
+# next to Superset's own query, cache and API timings (STATS_LOGGER).
+PROMETHEUS_EXPORTER_PATH = '/metrics'
+STATS_LOGGER = PrometheusStatsLogger()
+FLASK_APP_MUTATOR = instrument_app
+ADDITIONAL_MIDDLEWARE = [partial(MetricsMiddleware, path=PROMETHEUS_EXPORTER_PATH)]
+
+print("Superset configured for standard deployment with PostgreSQL and Redis")
+print(f"Runtime tuning: {RUNTIME!r}")
@@ -0,0 +1,6 @@
+"""Runtime extensions for Superset deployments.
+
+This package is mounted next to ``superset_config.py`` (``/app/pythonpath``)
+so the configuration files in ``docker/local`` can reference its cache
+backends and helpers by import path.
+"""
@@ -0,0 +1,284 @@
+"""Token-bucket admission control for small Superset deployments.
+
+Route classes and their buckets come from the stack's ``superset.admission``
+section in system.yaml::
+
+    from functools import partial
+    from superset_ext.admission import AdmissionMiddleware, load_admission_config
+
+    ADMISSION_ROUTES = load_admission_config('/app/system.yaml', 'gcp-free-tier')
+    ADDITIONAL_MIDDLEWARE = [
+        partial(AdmissionMiddleware, routes=ADMISSION_ROUTES,
+                path='/app/superset_home/admission.db'),
+    ]
+"""
+
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Route class -> PATH_INFO prefixes (and optional suffix) it covers
+ROUTE_CLASSES = (
+    ('static', ('/static/',), None),
+    ('chart_data', ('/api/v1/chart/data', '/superset/explore_json'), None),
+    ('chart_data', ('/api/v1/chart/',), '/data/'),
+    ('sql_lab', ('/api/v1/sqllab/', '/superset/sql_json', '/superset/results/'), None),
+)
+
+# Used when system.yaml has no admission section for the stack
+DEFAULT_ROUTES = {
+    'chart_data': {'rate': 2.0, 'burst': 4, 'max_queue': 8, 'max_wait_seconds': 10.0},
+    'sql_lab': {'rate': 0.5, 'burst': 2, 'max_queue': 2, 'max_wait_seconds': 30.0},
+    'static': {'rate': 50.0, 'burst': 100, 'max_queue': 50, 'max_wait_seconds': 2.0},
+}
+
+
+def route_class(path: str) -> Optional[str]:
+    """Return the route class of a request path, or None if it is not limited."""
+    for name, prefixes, suffix in ROUTE_CLASSES:
+        if path.startswith(prefixes) and (suffix is None or path.rstrip('/').endswith(suffix.rstrip('/'))):
+            return name
+    return None
+
+
+def load_admission_config(path: str, stack: str) -> Dict[str, Dict[str, float]]:
+    """Read the route class settings of ``stack`` from a system.yaml file.
+
+    Returns:
+        Route class settings, ``DEFAULT_ROUTES`` if the file or section is
+        missing, or an empty dict if admission control is disabled
+    """
+    try:
+        import yaml
+        with open(path) as handle:
+            system = yaml.safe_load(handle) or {}
+    except FileNotFoundError:
+        logger.info(f"{path} not found, using default admission control settings")
+        return dict(DEFAULT_ROUTES)
+    admission = ((system.get('stacks') or {}).get(stack) or {}).get('superset', {}).get('admission')
+    if admission is None:
+        return dict(DEFAULT_ROUTES)
+    if not admission.get('enabled', False):
+        return {}
+    routes = dict(DEFAULT_ROUTES)
+    for name, settings in (admission.get('routes') or {}).items():
+        routes[name] = {**DEFAULT_ROUTES.get(name, {}), **settings}
+    return routes
+
+
+def reserve(
+    tokens: float,
+    updated: float,
+    now: float,
+    rate: float,
+    burst: int,
+    max_queue: int,
+    max_wait: float,
+) -> Tuple[float, bool, float]:
+    """Try to reserve one token from a bucket.
+
+    Reservations may drive the token count negative: each one owns the
+    token that will be refilled ``wait`` seconds from now, so waiters are
+    served in arrival order without polling. A reservation is refused when
+    ``max_queue`` are already outstanding or its wait exceeds ``max_wait``.
+
+    Returns:
+        ``(tokens, admitted, wait)``: the new token count, whether the
+        request was admitted and how long it must wait (for refused
+        requests, when to retry)
+    """
+    tokens = min(float(burst), tokens + max(0.0, now - updated) * rate)
+    if tokens >= 1:
+        return tokens - 1, True, 0.0
+    wait = (1 - tokens) / rate
+    if -tokens >= max_queue or wait > max_wait:
+        return tokens, False, wait
+    return tokens - 1, True, wait
+
+
+class TokenBucket:
+    """Thread-safe token bucket shared by the threads of one process."""
+
+    def __init__(self, name: str, rate: float, burst: int, max_queue: int = 0, max_wait_seconds: float = 0.0):
+        self.name = name
+        self.rate = float(rate)
+        self.burst = int(burst)
+        self.max_queue = int(max_queue)
+        self.max_wait = float(max_wait_seconds)
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+
+    def reserve(self) -> Tuple[bool, float]:
+        """Return ``(admitted, wait_seconds)`` for one request."""
+        with self._lock:
+            now = time.monotonic()
+            tokens, admitted, wait = reserve(
+                self._tokens, self._updated, now, self.rate, self.burst, self.max_queue, self.max_wait
+            )
+            self._tokens, self._updated = tokens, now
+        return admitted, wait
+
+    def release(self) -> None:
+        """Give back the token of a reservation that will not be served."""
+        with self._lock:
+            self._tokens += 1
+
+
+class SQLiteTokenBucket(TokenBucket):
+    """Token bucket shared by every worker process through a SQLite file."""
+
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)',
+    )
+
+    def __init__(self, name: str, path: str, **kwargs: Any):
+        super().__init__(name, **kwargs)
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        for statement in self.SCHEMA:
+            conn.execute(statement)
+        conn.execute(
+            'INSERT OR IGNORE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)',
+            (name, float(self.burst), time.time()),
+        )
+
+    def reserve(self) -> Tuple[bool, float]:
+        conn = self._connection()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            tokens, updated = conn.execute(
+                'SELECT tokens, updated FROM buckets WHERE name = ?', (self.name,)
+            ).fetchone()
+            now = time.time()
+            tokens, admitted, wait = reserve(
+                tokens, updated, now, self.rate, self.burst, self.max_queue, self.max_wait
+            )
+            conn.execute(
+                'UPDATE buckets SET tokens = ?, updated = ? WHERE name = ?', (tokens, now, self.name)
+            )
+            conn.execute('COMMIT')
+        except sqlite3.Error as e:
+            # Never turn a storage problem into an outage: fall back to admitting
+            logger.warning(f"Admission bucket {self.name} unavailable: {e}")
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            return True, 0.0
+        return admitted, wait
+
+    def release(self) -> None:
+        try:
+            self._connection().execute(
+                'UPDATE buckets SET tokens = tokens + 1 WHERE name = ?', (self.name,)
+            )
+        except sqlite3.Error as e:
+            logger.warning(f"Admission bucket {self.name} unavailable: {e}")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+
+class AdmissionMiddleware:
+    """WSGI middleware admitting, queueing or shedding requests per route class.
+
+    Admitted requests that reserved a future token sleep until it is
+    theirs; requests that would wait past the class's ``max_wait_seconds``
+    or find ``max_queue`` requests already waiting are rejected at once
+    with ``503`` and a ``Retry-After`` header instead of timing out later.
+    Waiters sleep on a worker thread, so at most ``threads - 1`` of them
+    wait per process and the rest are shed too, keeping one thread free
+    for requests that need no token. Paths outside the configured route
+    classes are passed through.
+    """
+
+    def __init__(
+        self,
+        app: Callable,
+        routes: Optional[Dict[str, Dict[str, float]]] = None,
+        path: Optional[str] = None,
+        threads: Optional[int] = None,
+    ):
+        """Initialize the middleware.
+
+        Args:
+            app: WSGI application to protect
+            routes: Route class -> ``rate``, ``burst``, ``max_queue`` and
+                ``max_wait_seconds`` (default ``DEFAULT_ROUTES``)
+            path: SQLite file to share buckets between processes; buckets
+                are per process when omitted
+            threads: Threads of each worker process (default the
+                ``superset_ext.runtime`` tuning)
+        """
+        self.app = app
+        self.buckets: Dict[str, TokenBucket] = {}
+        for name, settings in (DEFAULT_ROUTES if routes is None else routes).items():
+            if path:
+                self.buckets[name] = SQLiteTokenBucket(name, path, **settings)
+            else:
+                self.buckets[name] = TokenBucket(name, **settings)
+        if threads is None:
+            from superset_ext.runtime import tune
+            threads = tune(log=False).threads
+        self.max_waiting = max(0, int(threads) - 1)
+        self._waiting = 0
+        self._counters_lock = threading.Lock()
+        self.counters: Dict[str, Dict[str, int]] = {
+            name: {'admitted': 0, 'queued': 0, 'shed': 0} for name in self.buckets
+        }
+
+    def __call__(self, environ: Dict[str, Any], start_response: Callable) -> Iterable[bytes]:
+        name = route_class(environ.get('PATH_INFO', ''))
+        bucket = self.buckets.get(name) if name else None
+        if bucket is None:
+            return self.app(environ, start_response)
+
+        admitted, wait = bucket.reserve()
+        with self._counters_lock:
+            if admitted and wait > 0:
+                if self._waiting < self.max_waiting:
+                    self._waiting += 1
+                else:
+                    # Every other thread is already asleep: shed instead
+                    bucket.release()
+                    admitted = False
+            outcome = 'shed' if not admitted else ('queued' if wait > 0 else 'admitted')
+            self.counters[name][outcome] += 1
+        if not admitted:
+            return self._reject(name, wait, start_response)
+        if wait > 0:
+            try:
+                time.sleep(wait)
+            finally:
+                with self._counters_lock:
+                    self._waiting -= 1
+        return self.app(environ, start_response)
+
+    def _reject(self, name: str, wait: float, start_response: Callable) -> Iterable[bytes]:
+        retry_after = max(1, math.ceil(wait))
+        body = json.dumps({
+            'message': f'Superset is busy serving {name.replace("_", " ")} requests, '
+                       f'please retry in {retry_after}s',
+        }).encode('utf-8')
+        start_response('503 Service Unavailable', [
+            ('Content-Type', 'application/json'),
+            ('Content-Length', str(len(body))),
+            ('Retry-After', str(retry_after)),
+        ])
+        return [body]
@@ -0,0 +1,284 @@
+"""Idempotent container bootstrap: migrate, create the admin and init only when needed.
+
+Run it in place of ``superset db upgrade && superset fab create-admin ... &&
+superset init`` before starting gunicorn::
+
+    python -m superset_ext.bootstrap && gunicorn --config /app/gunicorn.conf.py
+
+Each phase first checks whether it has anything to do:
+
+- migrate: ``superset db upgrade`` only if the ``alembic_version`` of the
+  metadata database differs from the heads of Superset's migrations
+- admin: ``superset fab create-admin`` only if ``SUPERSET_ADMIN_USERNAME``
+  is not in ``ab_user`` yet
+- init: ``superset init`` (roles and permissions) only after a migration or
+  when the Superset version recorded by the last init differs
+
+Replicas starting together serialize on a database lock (an advisory lock
+on PostgreSQL, ``GET_LOCK`` on MySQL, a lock file next to a SQLite file),
+so one migrates and the others find everything current. The time spent in
+each phase is logged and written to ``--timings`` as JSON.
+"""
+
+import argparse
+import fcntl
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+import zlib
+from contextlib import ExitStack, contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Set
+
+logger = logging.getLogger(__name__)
+
+# Table recording what the last successful init was run for
+MARKER_TABLE = 'superset_ext_bootstrap'
+
+LOCK_NAME = 'superset_ext.bootstrap'
+
+Runner = Callable[[Sequence[str]], None]
+
+
+def run_command(command: Sequence[str]):
+    """Run a superset CLI command, failing the bootstrap if it fails."""
+    subprocess.run(list(command), check=True)
+
+
+def migration_heads() -> Set[str]:
+    """Return the Alembic heads of the installed Superset's migrations."""
+    import superset
+    from alembic.script import ScriptDirectory
+
+    directory = os.path.join(os.path.dirname(superset.__file__), 'migrations')
+    return set(ScriptDirectory(directory).get_heads())
+
+
+def superset_version() -> str:
+    try:
+        from importlib.metadata import version
+        return version('apache-superset')
+    except Exception:
+        return 'unknown'
+
+
+def database_uri() -> str:
+    """Return the metadata database URI as the Superset configuration sees it."""
+    uri = os.environ.get('DATABASE_URL')
+    if uri:
+        return uri
+    import superset_config
+    return superset_config.SQLALCHEMY_DATABASE_URI
+
+
+class Bootstrap:
+    """Brings the metadata database up to date, skipping phases already done."""
+
+    def __init__(
+        self,
+        uri: str,
+        heads: Optional[Set[str]] = None,
+        version: Optional[str] = None,
+        admin: Optional[Dict[str, str]] = None,
+        run: Runner = run_command,
+        lock_timeout: float = 600.0,
+        force: bool = False,
+    ):
+        """Initialize the bootstrap.
+
+        Args:
+            uri: Metadata database URI
+            heads: Alembic heads to migrate to (default: installed Superset's)
+            version: Superset version init is recorded for (default: installed)
+            admin: ``username``, ``password``, ``email`` of the admin to create
+            run: Runs a CLI command, raising on failure
+            lock_timeout: Seconds to wait for another replica's bootstrap
+            force: Run every phase regardless of the database state
+        """
+        from sqlalchemy import create_engine
+        from sqlalchemy.pool import NullPool
+
+        self.uri = uri
+        self.engine = create_engine(uri, poolclass=NullPool)
+        self._heads = heads
+        self.version = version or superset_version()
+        self.admin = admin
+        self.run = run
+        self.lock_timeout = lock_timeout
+        self.force = force
+        self.timings: Dict[str, float] = {}
+        self.actions: List[str] = []
+
+    @property
+    def heads(self) -> Set[str]:
+        if self._heads is None:
+            self._heads = migration_heads()
+        return self._heads
+
+    @contextmanager
+    def _phase(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = time.perf_counter() - started
+            logger.info(f"Bootstrap phase {name}: {self.timings[name]:.2f}s")
+
+    @contextmanager
+    def lock(self) -> Iterator[None]:
+        """Hold the bootstrap lock of this metadata database."""
+        backend = self.engine.url.get_backend_name()
+        deadline = time.monotonic() + self.lock_timeout
+        if backend == 'sqlite':
+            path = (self.engine.url.database or ':memory:')
+            path = '/tmp/superset_bootstrap.lock' if path == ':memory:' else f'{path}.bootstrap.lock'
+            with open(path, 'a') as handle:
+                while True:
+                    try:
+                        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        break
+                    except BlockingIOError:
+                        self._wait(deadline)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+            return
+
+        from sqlalchemy import text
+        key = zlib.crc32(LOCK_NAME.encode())
+        # The lock belongs to the session, so no transaction may stay open around it
+        with self.engine.execution_options(isolation_level='AUTOCOMMIT').connect() as conn:
+            if backend == 'postgresql':
+                acquire = text('SELECT pg_try_advisory_lock(:key)').bindparams(key=key)
+                release = text('SELECT pg_advisory_unlock(:key)').bindparams(key=key)
+            elif backend == 'mysql':
+                acquire = text('SELECT GET_LOCK(:name, 0)').bindparams(name=LOCK_NAME)
+                release = text('SELECT RELEASE_LOCK(:name)').bindparams(name=LOCK_NAME)
+            else:
+                logger.warning(f"No bootstrap lock for {backend}; replicas may migrate concurrently")
+                yield
+                return
+            while not conn.execute(acquire).scalar():
+                self._wait(deadline)
+            try:
+                yield
+            finally:
+                conn.execute(release)
+
+    def _wait(self, deadline: float):
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"Another bootstrap held the lock for more than {self.lock_timeout:.0f}s")
+        time.sleep(0.5)
+
+    def current_revisions(self) -> Set[str]:
+        """Return the database's Alembic revisions (empty for a new database)."""
+        from sqlalchemy import inspect, text
+        with self.engine.connect() as conn:
+            if not inspect(conn).has_table('alembic_version'):
+                return set()
+            return {row[0] for row in conn.execute(text('SELECT version_num FROM alembic_version'))}
+
+    def admin_exists(self, username: str) -> bool:
+        from sqlalchemy import inspect, text
+        with self.engine.connect() as conn:
+            if not inspect(conn).has_table('ab_user'):
+                return False
+            query = text('SELECT 1 FROM ab_user WHERE username = :username').bindparams(username=username)
+            return conn.execute(query).first() is not None
+
+    def _marker(self) -> Optional[str]:
+        from sqlalchemy import inspect, text
+        with self.engine.connect() as conn:
+            if not inspect(conn).has_table(MARKER_TABLE):
+                return None
+            query = text(f"SELECT value FROM {MARKER_TABLE} WHERE name = 'init'")
+            return conn.execute(query).scalar()
+
+    def _set_marker(self, value: str):
+        from sqlalchemy import text
+        with self.engine.begin() as conn:
+            conn.execute(text(
+                f'CREATE TABLE IF NOT EXISTS {MARKER_TABLE} (name VARCHAR(64) PRIMARY KEY, value VARCHAR(255))'
+            ))
+            conn.execute(text(f"DELETE FROM {MARKER_TABLE} WHERE name = 'init'"))
+            conn.execute(text(f"INSERT INTO {MARKER_TABLE} (name, value) VALUES ('init', :value)").bindparams(
+                value=value
+            ))
+
+    def run_all(self) -> Dict[str, float]:
+        """Run every phase that has work to do; return seconds per phase."""
+        started = time.perf_counter()
+        with ExitStack() as held:
+            with self._phase('lock'):
+                held.enter_context(self.lock())
+            with self._phase('migrate'):
+                migrated = self.force or self.current_revisions() != self.heads
+                if migrated:
+                    self.run(['superset', 'db', 'upgrade'])
+                    self.actions.append('migrate')
+
+            with self._phase('admin'):
+                if self.admin and (self.force or not self.admin_exists(self.admin['username'])):
+                    self.run([
+                        'superset', 'fab', 'create-admin',
+                        '--username', self.admin['username'],
+                        '--firstname', 'Admin',
+                        '--lastname', 'User',
+                        '--email', self.admin['email'],
+                        '--password', self.admin['password'],
+                    ])
+                    self.actions.append('admin')
+
+            with self._phase('init'):
+                marker = f"{self.version} {' '.join(sorted(self.heads))}"
+                if migrated or self._marker() != marker:
+                    self.run(['superset', 'init'])
+                    self._set_marker(marker)
+                    self.actions.append('init')
+        self.timings['total'] = time.perf_counter() - started
+        logger.info(
+            f"Bootstrap done in {self.timings['total']:.2f}s, "
+            f"ran: {', '.join(self.actions) or 'nothing (database current)'}"
+        )
+        return self.timings
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point for the container command."""
+    parser = argparse.ArgumentParser(description='Bring the Superset metadata database up to date')
+    parser.add_argument('--timings', default='/app/superset_home/bootstrap.json',
+                        help='Write seconds per phase here as JSON')
+    parser.add_argument('--lock-timeout', type=float, default=600.0)
+    parser.add_argument('--force', action='store_true', help='Run every phase')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(message)s')
+    admin = None
+    if os.environ.get('SUPERSET_ADMIN_USERNAME') and os.environ.get('SUPERSET_ADMIN_PASSWORD'):
+        admin = {
+            'username': os.environ['SUPERSET_ADMIN_USERNAME'],
+            'password': os.environ['SUPERSET_ADMIN_PASSWORD'],
+            'email': os.environ.get('SUPERSET_ADMIN_EMAIL', 'admin@example.com'),
+        }
+
+    bootstrap = Bootstrap(
+        database_uri(),
+        admin=admin,
+        lock_timeout=args.lock_timeout,
+        force=args.force or os.environ.get('SUPERSET_BOOTSTRAP_FORCE', '').lower() == 'true',
+    )
+    timings = bootstrap.run_all()
+    if args.timings:
+        try:
+            with open(args.timings, 'w') as handle:
+                json.dump({'timings': timings, 'actions': bootstrap.actions, 'at': time.time()}, handle)
+        except OSError as e:
+            logger.warning(f"Could not write bootstrap timings to {args.timings}: {e}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
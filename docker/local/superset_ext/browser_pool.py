@@ -0,0 +1,262 @@
+"""Warm headless browsers shared by the thumbnail and report tasks.
+
+Superset's ``WebDriverSelenium`` starts a browser for every screenshot and
+quits it afterwards, which costs seconds and hundreds of MB per thumbnail
+or report. ``install`` makes ``create()`` take a browser from a per-process
+``BrowserPool`` and ``destroy()`` give it back:
+
+- at most ``size`` browsers per worker process, which is also the number
+  of renders running at once; further renders wait up to
+  ``acquire_timeout`` seconds for one
+- a returned browser has its cookies cleared and is parked on
+  ``about:blank``; one that fails that, or has done ``max_renders``
+  renders, is quit and replaced on the next render
+- ``warm()`` starts the browsers before the first task arrives
+
+Enable it with ``BROWSER_POOL`` in ``superset_config.py``::
+
+    BROWSER_POOL = {'size': 2, 'max_renders': 50, 'acquire_timeout': 120, 'warm': True}
+
+Workers of a ``threads`` pool share the browsers of their process, so the
+``thumbnails`` and ``reports`` queues run their tasks as threads and
+``size`` limits the renders. Render, wait and launch times go to the
+registry of :mod:`superset_ext.metrics`.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, Optional
+
+from superset_ext.metrics import REGISTRY, MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+
+class BrowserPoolTimeout(TimeoutError):
+    """No browser became free within ``acquire_timeout``."""
+
+
+class _Browser:
+    __slots__ = ('driver', 'renders', 'acquired_at')
+
+    def __init__(self, driver: Any):
+        self.driver = driver
+        self.renders = 0
+        self.acquired_at = 0.0
+
+
+class BrowserPool:
+    """A bounded set of reusable browsers of one worker process."""
+
+    def __init__(
+        self,
+        create: Callable[[], Any],
+        size: int = 2,
+        max_renders: int = 50,
+        acquire_timeout: float = 120,
+        registry: Optional[MetricsRegistry] = None,
+        clock: Callable[[], float] = time.perf_counter,
+    ):
+        """Initialize the pool.
+
+        Args:
+            create: Starts a browser (a Selenium ``WebDriver``)
+            size: Browsers kept, and renders running at once
+            max_renders: Renders before a browser is replaced
+            acquire_timeout: Seconds a render waits for a free browser
+            registry: Metrics registry (default ``superset_ext.metrics.REGISTRY``)
+            clock: Monotonic clock in seconds
+        """
+        if size < 1:
+            raise ValueError(f'size must be at least 1, got {size}')
+        self.create = create
+        self.size = size
+        self.max_renders = max_renders
+        self.acquire_timeout = acquire_timeout
+        self.registry = registry or REGISTRY
+        self.clock = clock
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._idle: Deque[_Browser] = deque()
+        self._busy: Dict[int, _Browser] = {}
+
+    def _launch(self, reason: str) -> _Browser:
+        started = self.clock()
+        browser = _Browser(self.create())
+        self.registry.observe('superset_browser_launch_seconds', (('reason', reason),), self.clock() - started)
+        return browser
+
+    def warm(self) -> int:
+        """Start browsers until ``size`` are idle; return how many were started."""
+        started = 0
+        while True:
+            with self._lock:
+                if len(self._idle) + len(self._busy) >= self.size:
+                    return started
+            # Outside the lock: starting a browser takes seconds
+            browser = self._launch('warm')
+            with self._lock:
+                self._idle.append(browser)
+            started += 1
+
+    def acquire(self) -> Any:
+        """Return a browser, waiting for a free one up to ``acquire_timeout``."""
+        started = self.clock()
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            self.registry.inc('superset_browser_acquire_timeouts_total')
+            raise BrowserPoolTimeout(f'No browser free after {self.acquire_timeout}s ({self.size} in use)')
+        self.registry.observe('superset_browser_wait_seconds', (), self.clock() - started)
+        try:
+            with self._lock:
+                browser = self._idle.popleft() if self._idle else None
+            if browser is None:
+                browser = self._launch('cold')
+        except BaseException:
+            self._slots.release()
+            raise
+        browser.acquired_at = self.clock()
+        with self._lock:
+            self._busy[id(browser.driver)] = browser
+        self.registry.inc('superset_browser_renders_in_flight')
+        return browser.driver
+
+    def owns(self, driver: Any) -> bool:
+        """Return whether ``driver`` is a browser of this pool in use."""
+        with self._lock:
+            return id(driver) in self._busy
+
+    def release(self, driver: Any, failed: bool = False) -> None:
+        """Give a browser back after a render; ``failed`` replaces it."""
+        with self._lock:
+            browser = self._busy.pop(id(driver))
+        browser.renders += 1
+        outcome = 'error' if failed else 'ok'
+        self.registry.observe(
+            'superset_browser_render_seconds', (('outcome', outcome),), self.clock() - browser.acquired_at
+        )
+        self.registry.dec('superset_browser_renders_in_flight')
+
+        reason = None
+        if failed:
+            reason = 'error'
+        elif browser.renders >= self.max_renders:
+            reason = 'max_renders'
+        elif not self._reset(driver):
+            reason = 'reset_failed'
+        try:
+            if reason:
+                self.registry.inc('superset_browser_recycles_total', (('reason', reason),))
+                self._quit(driver)
+            else:
+                with self._lock:
+                    self._idle.append(browser)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def render(self) -> Iterator[Any]:
+        """Context manager lending a browser; an exception replaces it."""
+        driver = self.acquire()
+        try:
+            yield driver
+        except BaseException:
+            self.release(driver, failed=True)
+            raise
+        self.release(driver)
+
+    def close(self) -> None:
+        """Quit the idle browsers."""
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for browser in idle:
+            self._quit(browser.driver)
+
+    @staticmethod
+    def _reset(driver: Any) -> bool:
+        # Cookies of every site (the logged-in user), not only the current page's
+        try:
+            if hasattr(driver, 'execute_cdp_cmd'):
+                driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+            else:
+                driver.delete_all_cookies()
+            driver.get('about:blank')
+            return True
+        except Exception as e:
+            logger.info(f'Replacing a browser that could not be reset: {e}')
+            return False
+
+    @staticmethod
+    def _quit(driver: Any) -> None:
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.warning(f'Could not quit browser: {e}')
+
+
+_pools: Dict[int, BrowserPool] = {}
+_pools_lock = threading.Lock()
+
+
+def process_pool(factory: Callable[[], BrowserPool]) -> BrowserPool:
+    """Return this process's pool, built with ``factory`` on first use.
+
+    Browsers are never inherited across a fork: a prefork child gets its own.
+    """
+    pid = os.getpid()
+    with _pools_lock:
+        pool = _pools.get(pid)
+        if pool is None:
+            pool = _pools[pid] = factory()
+        return pool
+
+
+def install(settings: Dict[str, Any], webdriver_type: str, window: Any) -> Optional[BrowserPool]:
+    """Route ``WebDriverSelenium.create``/``destroy`` of this process through a pool.
+
+    ``settings`` is ``BROWSER_POOL`` (``size``, ``max_renders``,
+    ``acquire_timeout``); browsers are started like Superset's with
+    ``webdriver_type`` and resized to each render's window. Returns the
+    process pool, or None when Superset's Selenium driver is not available.
+    """
+    try:
+        from superset.utils.webdriver import WebDriverSelenium
+    except ImportError as e:
+        logger.warning(f'Browser pool not installed: {e}')
+        return None
+
+    if getattr(WebDriverSelenium, '_browser_pool_factory', None) is None:
+        original_create = WebDriverSelenium.create
+        original_destroy = WebDriverSelenium.destroy
+
+        def create(self):
+            pool = process_pool(WebDriverSelenium._browser_pool_factory)
+            driver = pool.acquire()
+            try:
+                driver.set_window_size(*self._window)
+            except Exception:
+                pool.release(driver, failed=True)
+                raise
+            return driver
+
+        def destroy(driver, tries: int = 2):
+            pool = _pools.get(os.getpid())
+            if pool is not None and pool.owns(driver):
+                pool.release(driver)
+            else:
+                original_destroy(driver, tries)
+
+        WebDriverSelenium._original_create = original_create
+        WebDriverSelenium.create = create
+        WebDriverSelenium.destroy = staticmethod(destroy)
+
+    WebDriverSelenium._browser_pool_factory = lambda: BrowserPool(
+        lambda: WebDriverSelenium._original_create(WebDriverSelenium(webdriver_type, window)),
+        size=settings.get('size', 2),
+        max_renders=settings.get('max_renders', 50),
+        acquire_timeout=settings.get('acquire_timeout', 120),
+    )
+    return process_pool(WebDriverSelenium._browser_pool_factory)
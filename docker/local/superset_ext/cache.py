@@ -0,0 +1,547 @@
+"""Cache backends for Superset's Flask-Caching based cache roles.
+
+Use a backend by setting ``CACHE_TYPE`` in one of the ``*_CACHE_CONFIG``
+dictionaries to its import path, e.g.::
+
+    CACHE_CONFIG = {
+        'CACHE_TYPE': 'superset_ext.cache.LayeredRedisCache',
+        'CACHE_REDIS_URL': REDIS_URL,
+        'CACHE_L1_MAX_BYTES': 32 * 1024 * 1024,
+        'CACHE_L1_TIMEOUT': 10,
+    }
+"""
+
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+from flask_caching.backends.base import BaseCache
+from flask_caching.backends.rediscache import RedisCache
+
+from .lru import BoundedLRU
+
+logger = logging.getLogger(__name__)
+
+# Latency samples kept per tier for percentile reporting
+LATENCY_SAMPLES = 2048
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Return the ``pct`` percentile (0-100) of ``samples`` (0.0 if empty)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class LayeredRedisCache(RedisCache):
+    """Redis cache with a bounded in-process L1 LRU in front of it.
+
+    Reads are served from the per-worker L1 when possible and fall back to
+    Redis (L2). L1 entries live for at most ``l1_timeout`` seconds and never
+    past the remaining Redis TTL. Writes and deletes are published on an
+    invalidation channel so the other workers drop their L1 copy; with
+    ``l1_keyspace_events`` the listener also follows Redis ``expired``
+    keyspace events (``notify-keyspace-events Ex``).
+
+    Extra ``*_CACHE_CONFIG`` keys:
+        CACHE_L1_MAX_BYTES: L1 byte budget per worker (default 32 MiB)
+        CACHE_L1_TIMEOUT: Maximum L1 entry age in seconds (default 10)
+        CACHE_L1_KEYSPACE_EVENTS: Subscribe to ``__keyevent@<db>__:expired``
+    """
+
+    def __init__(
+        self,
+        *args: Any,
+        l1_max_bytes: int = 32 * 1024 * 1024,
+        l1_timeout: int = 10,
+        l1_keyspace_events: bool = False,
+        **kwargs: Any
+    ):
+        super().__init__(*args, **kwargs)
+        self.l1 = BoundedLRU(l1_max_bytes)
+        self.l1_timeout = l1_timeout
+        self.l1_keyspace_events = l1_keyspace_events
+        self.l1_hits = 0
+        self.l2_hits = 0
+        self.misses = 0
+        self._latency: Dict[str, Deque[float]] = {
+            tier: deque(maxlen=LATENCY_SAMPLES) for tier in ('l1', 'l2', 'miss')
+        }
+        self._listener_pid: Optional[int] = None
+        self._origin = ''
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        kwargs.update(
+            l1_max_bytes=int(config.get('CACHE_L1_MAX_BYTES', 32 * 1024 * 1024)),
+            l1_timeout=int(config.get('CACHE_L1_TIMEOUT', 10)),
+            l1_keyspace_events=bool(config.get('CACHE_L1_KEYSPACE_EVENTS', False)),
+        )
+        return super().factory(app, config, args, kwargs)
+
+    @property
+    def invalidation_channel(self) -> str:
+        return f'{self._get_prefix()}__l1_invalidate'
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def get(self, key: str) -> Any:
+        self._ensure_listener()
+        started = time.perf_counter()
+        full_key = self._get_prefix() + key
+
+        raw = self.l1.get(full_key)
+        if raw is not None:
+            self.l1_hits += 1
+            self._latency['l1'].append(time.perf_counter() - started)
+            return self._loads(raw)
+
+        pipe = self._read_client.pipeline(transaction=False)
+        pipe.get(full_key)
+        pipe.pttl(full_key)
+        raw, pttl = pipe.execute()
+        if raw is None:
+            self.misses += 1
+            self._latency['miss'].append(time.perf_counter() - started)
+            return None
+
+        self.l2_hits += 1
+        self._l1_store(full_key, raw, pttl)
+        self._latency['l2'].append(time.perf_counter() - started)
+        return self._loads(raw)
+
+    def get_many(self, *keys: str) -> List[Any]:
+        return [self.get(key) for key in keys]
+
+    def has(self, key: str) -> bool:
+        if self.l1.get(self._get_prefix() + key) is not None:
+            return True
+        return super().has(key)
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def set(self, key: str, value: Any, timeout: Optional[int] = None) -> bool:
+        self._ensure_listener()
+        full_key = self._get_prefix() + key
+        dump = self._dumps(value)
+        timeout = self._normalize_timeout(timeout)
+
+        pipe = self._write_client.pipeline(transaction=False)
+        if timeout == -1:
+            pipe.set(full_key, dump)
+        else:
+            pipe.setex(full_key, timeout, dump)
+        pipe.publish(self.invalidation_channel, self._message(full_key))
+        result = pipe.execute()[0]
+
+        self._l1_store(full_key, dump, timeout * 1000 if timeout > 0 else -1)
+        return bool(result)
+
+    def add(self, key: str, value: Any, timeout: Optional[int] = None) -> bool:
+        added = super().add(key, value, timeout)
+        if added:
+            self._invalidate(self._get_prefix() + key)
+        return bool(added)
+
+    def set_many(self, mapping: Dict[str, Any], timeout: Optional[int] = None) -> List[Any]:
+        return [key for key, value in mapping.items() if self.set(key, value, timeout)]
+
+    def delete(self, key: str) -> bool:
+        self._invalidate(self._get_prefix() + key)
+        return super().delete(key)
+
+    def delete_many(self, *keys: str) -> List[Any]:
+        for key in keys:
+            self._invalidate(self._get_prefix() + key)
+        return super().delete_many(*keys)
+
+    def inc(self, key: str, delta: int = 1) -> Any:
+        self._invalidate(self._get_prefix() + key)
+        return super().inc(key, delta)
+
+    def dec(self, key: str, delta: int = 1) -> Any:
+        self._invalidate(self._get_prefix() + key)
+        return super().dec(key, delta)
+
+    def clear(self) -> bool:
+        self.l1.clear()
+        self._write_client.publish(self.invalidation_channel, self._message('*'))
+        return super().clear()
+
+    # ------------------------------------------------------------------
+    # Statistics
+    # ------------------------------------------------------------------
+
+    def stats(self) -> Dict[str, Any]:
+        """Return L1/L2 hit ratios, latency percentiles (ms) and L1 usage."""
+        lookups = self.l1_hits + self.l2_hits + self.misses
+        stats: Dict[str, Any] = {
+            'l1_hits': self.l1_hits,
+            'l2_hits': self.l2_hits,
+            'misses': self.misses,
+            'l1_hit_ratio': self.l1_hits / lookups if lookups else 0.0,
+            'l2_hit_ratio': self.l2_hits / lookups if lookups else 0.0,
+            'l1': self.l1.stats(),
+        }
+        for tier, samples in self._latency.items():
+            values = list(samples)
+            stats[f'{tier}_p50_ms'] = percentile(values, 50) * 1000
+            stats[f'{tier}_p99_ms'] = percentile(values, 99) * 1000
+        return stats
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+
+    def _l1_ttl(self, pttl_ms: int) -> float:
+        """L1 lifetime: ``l1_timeout`` capped by the remaining Redis TTL."""
+        if pttl_ms is None or pttl_ms < 0:
+            return float(self.l1_timeout)
+        return min(float(self.l1_timeout), pttl_ms / 1000.0)
+
+    def _l1_store(self, full_key: str, raw: bytes, pttl_ms: int):
+        ttl = self._l1_ttl(pttl_ms)
+        if ttl > 0:
+            self.l1.set(full_key, raw, ttl)
+        else:
+            # The LRU reads a TTL of 0 as "never expires": keys about to
+            # expire in Redis (or l1_timeout 0) stay out of L1
+            self.l1.delete(full_key)
+
+    def _dumps(self, value: Any) -> bytes:
+        serializer = getattr(self, 'serializer', None)
+        if serializer is not None:
+            return serializer.dumps(value)
+        return self.dump_object(value)
+
+    def _loads(self, raw: bytes) -> Any:
+        serializer = getattr(self, 'serializer', None)
+        if serializer is not None:
+            return serializer.loads(raw)
+        return self.load_object(raw)
+
+    def _message(self, full_key: str) -> str:
+        return f'{self._origin}|{full_key}'
+
+    def _invalidate(self, full_key: str):
+        self.l1.delete(full_key)
+        self._write_client.publish(self.invalidation_channel, self._message(full_key))
+
+    def _ensure_listener(self):
+        """Start the invalidation listener once per (forked) worker process."""
+        pid = os.getpid()
+        if self._listener_pid == pid:
+            return
+        self._listener_pid = pid
+        self._origin = uuid.uuid4().hex
+        # Anything inherited from the master process is not being invalidated
+        self.l1.clear()
+        thread = threading.Thread(
+            target=self._listen, name='l1-invalidation', daemon=True
+        )
+        thread.start()
+
+    def _listen(self):
+        channels = [self.invalidation_channel]
+        if self.l1_keyspace_events:
+            db = self._write_client.connection_pool.connection_kwargs.get('db', 0)
+            channels.append(f'__keyevent@{db}__:expired')
+
+        backoff = 1.0
+        while True:
+            try:
+                pubsub = self._write_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(*channels)
+                backoff = 1.0
+                for message in pubsub.listen():
+                    self._handle_message(message)
+            except Exception as e:  # Redis restarts must not kill the worker
+                logger.warning(f"L1 invalidation listener error, retrying: {e}")
+                # Entries may have changed while we were disconnected
+                self.l1.clear()
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+
+    def _handle_message(self, message: Dict[str, Any]):
+        data = message.get('data')
+        if isinstance(data, bytes):
+            data = data.decode('utf-8', 'replace')
+        if not isinstance(data, str):
+            return
+        channel = message.get('channel')
+        if isinstance(channel, bytes):
+            channel = channel.decode('utf-8', 'replace')
+
+        if channel != self.invalidation_channel:
+            # Keyspace event: the payload is the expired key itself
+            self.l1.delete(data)
+            return
+
+        origin, _, full_key = data.partition('|')
+        if origin == self._origin:
+            return
+        if full_key == '*':
+            self.l1.clear()
+        else:
+            self.l1.delete(full_key)
+
+
+class SQLiteCache(BaseCache):
+    """Cache shared by every worker on a host, stored in a SQLite WAL file.
+
+    Meant for Redis-less profiles: all gunicorn workers (and restarts) see
+    the same entries. Writes are single transactions, so readers never see
+    partial values. The total payload size is kept in a trigger-maintained
+    counter; when it exceeds ``max_bytes`` the least recently used entries
+    are evicted. Expired entries are swept every ``sweep_interval`` seconds.
+    Give each cache role its own file so budgets and ``clear()`` stay per role.
+
+    Extra ``*_CACHE_CONFIG`` keys:
+        CACHE_SQLITE_PATH: Database file (default ``/app/superset_home/cache/superset.db``)
+        CACHE_MAX_BYTES: Byte budget for stored values (default 256 MiB)
+        CACHE_SWEEP_INTERVAL: Seconds between expired-entry sweeps (default 60)
+    """
+
+    # Access times are only refreshed when older than this, to keep reads
+    # from turning into writes on every hit
+    TOUCH_INTERVAL = 30.0
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS cache (
+            key TEXT PRIMARY KEY,
+            value BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            expires REAL NOT NULL,
+            accessed REAL NOT NULL
+        )
+        """,
+        'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+        'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+        'CREATE TABLE IF NOT EXISTS cache_size (id INTEGER PRIMARY KEY CHECK (id = 0), total INTEGER NOT NULL)',
+        'INSERT OR IGNORE INTO cache_size (id, total) VALUES (0, 0)',
+        """
+        CREATE TRIGGER IF NOT EXISTS cache_size_insert AFTER INSERT ON cache
+        BEGIN UPDATE cache_size SET total = total + NEW.size WHERE id = 0; END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS cache_size_delete AFTER DELETE ON cache
+        BEGIN UPDATE cache_size SET total = total - OLD.size WHERE id = 0; END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS cache_size_update AFTER UPDATE OF size ON cache
+        BEGIN UPDATE cache_size SET total = total - OLD.size + NEW.size WHERE id = 0; END
+        """,
+    )
+
+    def __init__(
+        self,
+        path: str = '/app/superset_home/cache/superset.db',
+        max_bytes: int = 256 * 1024 * 1024,
+        default_timeout: int = 300,
+        key_prefix: str = '',
+        sweep_interval: float = 60.0,
+        ignore_delete_many_errors: bool = False,
+    ):
+        super().__init__(
+            default_timeout=default_timeout,
+            ignore_delete_many_errors=ignore_delete_many_errors,
+        )
+        self.path = path
+        self.max_bytes = max_bytes
+        self.key_prefix = key_prefix
+        self.sweep_interval = sweep_interval
+        self._local = threading.local()
+        self._last_sweep = 0.0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._transaction() as conn:
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        kwargs.update(
+            path=config.get('CACHE_SQLITE_PATH', '/app/superset_home/cache/superset.db'),
+            max_bytes=int(config.get('CACHE_MAX_BYTES', 256 * 1024 * 1024)),
+            key_prefix=config.get('CACHE_KEY_PREFIX') or '',
+            sweep_interval=float(config.get('CACHE_SWEEP_INTERVAL', 60)),
+        )
+        return cls(*args, **kwargs)
+
+    def get(self, key: str) -> Any:
+        full_key = self.key_prefix + key
+        now = time.time()
+        row = self._connection().execute(
+            'SELECT value, expires, accessed FROM cache WHERE key = ?', (full_key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires, accessed = row
+        if expires and expires <= now:
+            return None
+        if now - accessed > self.TOUCH_INTERVAL:
+            self._touch(full_key, now)
+        try:
+            return pickle.loads(value)
+        except Exception:
+            logger.warning(f"Discarding unreadable cache entry {full_key}")
+            self.delete(key)
+            return None
+
+    def has(self, key: str) -> bool:
+        row = self._connection().execute(
+            'SELECT expires FROM cache WHERE key = ?', (self.key_prefix + key,)
+        ).fetchone()
+        return row is not None and (not row[0] or row[0] > time.time())
+
+    def set(self, key: str, value: Any, timeout: Optional[int] = None) -> bool:
+        return self._write(key, value, timeout, replace=True)
+
+    def add(self, key: str, value: Any, timeout: Optional[int] = None) -> bool:
+        return self._write(key, value, timeout, replace=False)
+
+    def set_many(self, mapping: Dict[str, Any], timeout: Optional[int] = None) -> List[Any]:
+        return [key for key, value in mapping.items() if self.set(key, value, timeout)]
+
+    def delete(self, key: str) -> bool:
+        full_key = self.key_prefix + key
+        with self._transaction() as conn:
+            row = conn.execute('SELECT 1 FROM cache WHERE key = ?', (full_key,)).fetchone()
+            if row is None:
+                return False
+            self._delete_rows(conn, [full_key])
+        return True
+
+    def delete_many(self, *keys: str) -> List[Any]:
+        return [key for key in keys if self.delete(key)]
+
+    def clear(self) -> bool:
+        with self._transaction() as conn:
+            keys = [row[0] for row in conn.execute(
+                "SELECT key FROM cache WHERE key LIKE ? ESCAPE '\\'", (self._like_prefix(),)
+            )]
+            self._delete_rows(conn, keys)
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        """Return item count and stored bytes for the whole database file."""
+        conn = self._connection()
+        items = conn.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        total = conn.execute('SELECT total FROM cache_size WHERE id = 0').fetchone()[0]
+        return {'items': items, 'bytes': total, 'max_bytes': self.max_bytes}
+
+    def sweep(self) -> int:
+        """Delete expired entries, returning how many were removed."""
+        self._last_sweep = time.time()
+        with self._transaction() as conn:
+            keys = [row[0] for row in conn.execute(
+                'SELECT key FROM cache WHERE expires > 0 AND expires <= ?', (self._last_sweep,)
+            )]
+            self._delete_rows(conn, keys)
+        return len(keys)
+
+    def _write(self, key: str, value: Any, timeout: Optional[int], replace: bool) -> bool:
+        dump = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(dump) > self.max_bytes:
+            return False
+        return self._store(self.key_prefix + key, dump, len(dump), timeout, replace)
+
+    def _store(
+        self, full_key: str, blob: bytes, size: int, timeout: Optional[int], replace: bool
+    ) -> bool:
+        """Insert or replace a row and evict down to the byte budget."""
+        timeout = self._normalize_timeout(timeout)
+        now = time.time()
+        expires = now + timeout if timeout > 0 else 0.0
+
+        with self._transaction() as conn:
+            if not replace:
+                row = conn.execute(
+                    'SELECT expires FROM cache WHERE key = ?', (full_key,)
+                ).fetchone()
+                if row is not None and (not row[0] or row[0] > now):
+                    return False
+            conn.execute(
+                'INSERT INTO cache (key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET value = excluded.value, size = excluded.size, '
+                'expires = excluded.expires, accessed = excluded.accessed',
+                (full_key, blob, size, expires, now),
+            )
+            self._evict(conn)
+
+        if now - self._last_sweep > self.sweep_interval:
+            self.sweep()
+        return True
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Drop least recently used entries until under the byte budget."""
+        total = conn.execute('SELECT total FROM cache_size WHERE id = 0').fetchone()[0]
+        excess = total - self.max_bytes
+        if excess <= 0:
+            return
+        victims = []
+        for key, size in conn.execute('SELECT key, size FROM cache ORDER BY accessed'):
+            victims.append(key)
+            excess -= size
+            if excess <= 0:
+                break
+        self._delete_rows(conn, victims)
+
+    def _delete_rows(self, conn: sqlite3.Connection, full_keys: List[str]):
+        """Delete rows by full key; every removal path goes through here."""
+        conn.executemany('DELETE FROM cache WHERE key = ?', [(key,) for key in full_keys])
+
+    def _touch(self, full_key: str, now: float):
+        try:
+            self._connection().execute(
+                'UPDATE cache SET accessed = ? WHERE key = ?', (now, full_key)
+            )
+        except sqlite3.OperationalError:
+            # A busy database only costs us LRU precision
+            pass
+
+    def _like_prefix(self) -> str:
+        escaped = self.key_prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        return escaped + '%'
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run a write transaction, taking the database write lock up front."""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection, reopening it after a fork."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            # Autocommit mode; writes use explicit BEGIN IMMEDIATE transactions
+            conn = sqlite3.connect(
+                self.path, timeout=5.0, isolation_level=None, check_same_thread=False
+            )
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
@@ -0,0 +1,128 @@
+"""gunicorn server hooks recording boot time and request latency.
+
+Import the hooks into ``gunicorn.conf.py`` so gunicorn finds them by name::
+
+    from superset_ext.gunicorn_hooks import (
+        child_exit, install_pid_guard, post_fork, post_request, post_worker_init,
+        pre_fork, pre_request, when_ready, worker_abort,
+    )
+
+    install_pid_guard()
+    preload_app = True
+
+Values go to the Prometheus registry of :mod:`superset_ext.metrics`, next to
+the exporter's own request metrics: master readiness, worker boot time,
+per-request latency by method and status, and worker exits and timeouts.
+Requests slower than ``GUNICORN_SLOW_REQUEST_SECONDS`` (default 10) are
+logged.
+"""
+
+import gc
+import logging
+import os
+import time
+
+from superset_ext.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# gunicorn.conf.py imports this module first, so this is close to master start
+STARTED = time.monotonic()
+
+SLOW_REQUEST_SECONDS = float(os.environ.get('GUNICORN_SLOW_REQUEST_SECONDS', 10))
+
+_pid_guard_installed = False
+_frozen = False
+
+
+def install_pid_guard():
+    """Keep forked workers off database connections opened by the master.
+
+    With ``preload_app`` the application (and possibly a pooled connection)
+    exists before the fork. Connections are tagged with the pid that opened
+    them and a checkout from any other process discards the connection
+    instead of sharing the socket, as in SQLAlchemy's multiprocessing recipe.
+    """
+    global _pid_guard_installed
+    if _pid_guard_installed:
+        return
+    from sqlalchemy import event, exc
+    from sqlalchemy.pool import Pool
+
+    def connect(dbapi_connection, connection_record):
+        connection_record.info['pid'] = os.getpid()
+
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        pid = os.getpid()
+        if connection_record.info.get('pid') != pid:
+            connection_record.dbapi_connection = connection_proxy.dbapi_connection = None
+            raise exc.DisconnectionError(
+                f"Connection record belongs to pid {connection_record.info.get('pid')}, "
+                f"attempting to check out in pid {pid}"
+            )
+
+    event.listen(Pool, 'connect', connect)
+    event.listen(Pool, 'checkout', checkout)
+    _pid_guard_installed = True
+
+
+def when_ready(server):
+    """Record how long the master took to load (and preload) the application."""
+    seconds = time.monotonic() - STARTED
+    REGISTRY.set('superset_gunicorn_master_ready_seconds', (), seconds)
+    logger.info(f"gunicorn ready in {seconds:.2f}s (preload_app={server.cfg.preload_app})")
+
+
+def pre_fork(server, worker):
+    """Move the preloaded application out of the collector before the first fork.
+
+    Objects left in the tracked generations get their headers written by
+    every collection in the workers, un-sharing copy-on-write pages.
+    """
+    global _frozen
+    if server.cfg.preload_app and not _frozen and hasattr(gc, 'freeze'):
+        gc.collect()
+        gc.freeze()
+        _frozen = True
+
+
+def post_fork(server, worker):
+    worker._superset_forked = time.monotonic()
+
+
+def post_worker_init(worker):
+    """Record the time from fork to a worker being ready to serve."""
+    forked = getattr(worker, '_superset_forked', None)
+    if forked is None:
+        return
+    seconds = time.monotonic() - forked
+    REGISTRY.observe('superset_gunicorn_worker_boot_seconds', (), seconds)
+    logger.info(f"gunicorn worker {worker.pid} booted in {seconds:.2f}s")
+
+
+def pre_request(worker, req):
+    req._superset_started = time.perf_counter()
+
+
+def post_request(worker, req, environ, resp):
+    """Record the request's latency and log it if slow."""
+    started = getattr(req, '_superset_started', None)
+    if started is None:
+        return
+    seconds = time.perf_counter() - started
+    status = str(getattr(resp, 'status_code', None) or str(resp.status).split(' ', 1)[0])
+    REGISTRY.observe(
+        'superset_gunicorn_request_duration_seconds', (('method', req.method), ('status', status)), seconds,
+    )
+    if seconds >= SLOW_REQUEST_SECONDS:
+        logger.warning(f"Slow request: {req.method} {req.path} {status} in {seconds:.2f}s (worker {worker.pid})")
+
+
+def worker_abort(worker):
+    """Count a worker killed for exceeding ``timeout``; flush before it dies."""
+    REGISTRY.inc('superset_gunicorn_worker_timeouts_total')
+    REGISTRY.flush()
+
+
+def child_exit(server, worker):
+    REGISTRY.inc('superset_gunicorn_worker_exits_total')
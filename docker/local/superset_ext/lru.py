@@ -0,0 +1,116 @@
+"""Bounded, byte-accounted in-process LRU with per-entry TTLs."""
+
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+
+def reset_lock_after_fork(owner, attribute: str = '_lock'):
+    """Give ``owner`` a fresh lock in forked children.
+
+    A lock held by another thread (a flush or listener thread) at fork time
+    would stay locked forever in the child; gunicorn's ``preload_app``
+    forks workers from a master that may run such threads.
+    """
+    if not hasattr(os, 'register_at_fork'):
+        return
+    ref = weakref.ref(owner)
+
+    def after_in_child():
+        instance = ref()
+        if instance is not None:
+            setattr(instance, attribute, threading.Lock())
+
+    os.register_at_fork(after_in_child=after_in_child)
+
+
+class BoundedLRU:
+    """Thread-safe LRU map of ``str -> bytes`` bounded by total payload size.
+
+    Entries carry their own expiry so a short L1 TTL can be layered in front
+    of a slower shared cache without ever serving data older than the TTL.
+    """
+
+    def __init__(self, max_bytes: int, max_item_bytes: Optional[int] = None):
+        """Initialize the LRU.
+
+        Args:
+            max_bytes: Upper bound for the sum of stored value sizes
+            max_item_bytes: Values larger than this are never stored
+                (defaults to 1/8 of ``max_bytes``)
+        """
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes or max(1, max_bytes // 8)
+        self._data: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        reset_lock_after_fork(self)
+        self.current_bytes = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the stored value, or None if missing or expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at and expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: float) -> bool:
+        """Store a value for ``ttl`` seconds (0 means no expiry).
+
+        Returns:
+            True if the value was stored, False if it was too large
+        """
+        size = len(value)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            if size > self.max_item_bytes:
+                return False
+            expires_at = time.monotonic() + ttl if ttl else 0.0
+            self._data[key] = (value, expires_at)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes and self._data:
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+            return True
+
+    def delete(self, key: str) -> bool:
+        """Remove a key, returning whether it was present."""
+        with self._lock:
+            if key not in self._data:
+                return False
+            self._remove(key)
+            return True
+
+    def clear(self):
+        """Drop every entry."""
+        with self._lock:
+            self._data.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Return size and eviction counters."""
+        with self._lock:
+            return {
+                'items': len(self._data),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'evictions': self.evictions,
+            }
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _remove(self, key: str):
+        value, _ = self._data.pop(key)
+        self.current_bytes -= len(value)
@@ -0,0 +1,601 @@
+"""Prometheus request metrics for Superset, aggregated across gunicorn workers.
+
+Install the exporter from ``superset_config.py``::
+
+    from functools import partial
+    from superset_ext.metrics import (
+        InstrumentedQueuePool, MetricsMiddleware, PrometheusStatsLogger, instrument_app, instrument_celery,
+    )
+
+    SQLALCHEMY_ENGINE_OPTIONS = {'poolclass': InstrumentedQueuePool, ...}
+    STATS_LOGGER = PrometheusStatsLogger()
+    FLASK_APP_MUTATOR = instrument_app
+    ADDITIONAL_MIDDLEWARE = [partial(MetricsMiddleware, path='/metrics')]
+    instrument_celery()  # Celery queue waits, with a broker
+
+Every worker writes its values to ``PROMETHEUS_MULTIPROC_DIR`` (default
+``/tmp/superset_metrics``) and whichever worker serves the scrape merges them.
+"""
+
+import atexit
+import bisect
+import fcntl
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.pool import NullPool, QueuePool
+
+from superset_ext.admission import route_class
+from superset_ext.lru import reset_lock_after_fork
+from superset_ext.usage import _RecordingIterable
+
+logger = logging.getLogger(__name__)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+POOL_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30)
+BOOT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+RENDER_BUCKETS = (0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+QUEUE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+# Metric name -> (type, help, histogram buckets)
+METRICS = {
+    'superset_http_request_duration_seconds': (
+        'histogram', 'Request latency by endpoint, including streaming the response', REQUEST_BUCKETS,
+    ),
+    'superset_http_requests_total': ('counter', 'Requests by endpoint, method and status', None),
+    'superset_http_requests_in_flight': ('gauge', 'Requests being served by route class', None),
+    'superset_db_pool_checkout_seconds': (
+        'histogram', 'Time waited to check a metadata database connection out of the pool', POOL_BUCKETS,
+    ),
+    'superset_db_pool_checkout_timeouts_total': (
+        'counter', 'Metadata database checkouts that gave up waiting for a connection', None,
+    ),
+    'superset_cache_requests_total': ('counter', 'Cache lookups by cache and result', None),
+    'superset_stats_events_total': ('counter', 'Superset stats logger incr() calls by key', None),
+    'superset_stats_decrements_total': ('counter', 'Superset stats logger decr() calls by key', None),
+    'superset_stats_timing_seconds': ('histogram', 'Superset stats logger timings by key', REQUEST_BUCKETS),
+    'superset_stats_gauge': ('gauge', 'Superset stats logger gauges by key, summed over workers', None),
+    'superset_gunicorn_master_ready_seconds': (
+        'gauge', 'Seconds from loading the gunicorn configuration to accepting requests', None,
+    ),
+    'superset_gunicorn_worker_boot_seconds': (
+        'histogram', 'Seconds from forking a gunicorn worker to it being ready', BOOT_BUCKETS,
+    ),
+    'superset_gunicorn_request_duration_seconds': (
+        'histogram', 'Request latency seen by gunicorn by method and status', REQUEST_BUCKETS,
+    ),
+    'superset_gunicorn_worker_exits_total': ('counter', 'gunicorn workers exited, including recycling', None),
+    'superset_gunicorn_worker_timeouts_total': ('counter', 'gunicorn workers killed for exceeding timeout', None),
+    'superset_browser_render_seconds': (
+        'histogram', 'Seconds a pooled browser was lent to a screenshot, by outcome', RENDER_BUCKETS,
+    ),
+    'superset_browser_wait_seconds': ('histogram', 'Seconds a screenshot waited for a free browser', POOL_BUCKETS),
+    'superset_browser_launch_seconds': ('histogram', 'Seconds to start a browser, warm or cold', BOOT_BUCKETS),
+    'superset_browser_acquire_timeouts_total': ('counter', 'Screenshots that gave up waiting for a browser', None),
+    'superset_browser_recycles_total': ('counter', 'Pooled browsers quit, by reason', None),
+    'superset_browser_renders_in_flight': ('gauge', 'Pooled browsers lent to a screenshot', None),
+    'superset_celery_queue_wait_seconds': (
+        'histogram', 'Seconds a Celery task waited in its queue before a worker started it', QUEUE_BUCKETS,
+    ),
+}
+
+# WSGI environ key instrument_app() stores the matched Flask URL rule under
+ENDPOINT_ENVIRON_KEY = 'superset_ext.endpoint'
+
+# Celery message header with the publish time (epoch seconds)
+PUBLISHED_HEADER = 'superset_published_at'
+
+# Distinct endpoint labels a worker reports before folding the rest into "other"
+MAX_ENDPOINTS = 200
+
+# Same for stats logger keys
+MAX_STATS_KEYS = 300
+
+_ID_SEGMENT = re.compile(r'^(\d+|[0-9a-fA-F-]{32,36}|(?=.*\d)[0-9A-Za-z_-]{20,})$')
+
+
+def normalize_path(path: str) -> str:
+    """Return a low-cardinality endpoint label for a path no URL rule matched.
+
+    Numeric ids, UUIDs and other long opaque segments become ``<id>`` and
+    everything below ``/static/`` is one endpoint.
+    """
+    if path.startswith('/static/'):
+        return '/static/'
+    segments = ['<id>' if _ID_SEGMENT.match(segment) else segment for segment in path.split('/')]
+    return '/'.join(segments)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    pairs = ','.join(f'{name}="{_escape(str(value))}"' for name, value in labels)
+    return f'{{{pairs}}}' if pairs else ''
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class MetricsRegistry:
+    """Counters, gauges and histograms shared by every gunicorn worker.
+
+    Updates only touch in-process dictionaries; a daemon thread writes them
+    to ``<directory>/<pid>.json`` every ``flush_interval`` seconds. ``render``
+    sums the files of every worker with its own live values. Counters and
+    histograms of workers that exited (``max_requests`` restarts, crashes)
+    are folded into ``archive.json`` so totals never go backwards; their
+    gauges are dropped.
+    """
+
+    ARCHIVE = 'archive.json'
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        flush_interval: float = 1.0,
+        metrics: Optional[Dict[str, Tuple[str, str, Optional[Tuple[float, ...]]]]] = None,
+    ):
+        """Initialize the registry.
+
+        Args:
+            directory: Directory shared by the workers (default
+                ``PROMETHEUS_MULTIPROC_DIR`` or ``/tmp/superset_metrics``)
+            flush_interval: Seconds between writes of this worker's values
+            metrics: Metric name -> ``(type, help, buckets)`` (default ``METRICS``)
+        """
+        self.directory = directory or os.environ.get('PROMETHEUS_MULTIPROC_DIR', '/tmp/superset_metrics')
+        self.flush_interval = flush_interval
+        self.metrics = METRICS if metrics is None else metrics
+        self._lock = threading.Lock()
+        reset_lock_after_fork(self)
+        self._pid = None
+        self._reset()
+        atexit.register(self.flush)
+
+    def _reset(self):
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._gauges: Dict[Tuple[str, Labels], float] = {}
+        self._histograms: Dict[Tuple[str, Labels], List[float]] = {}
+
+    def _check_process(self):
+        # Called with the lock held. A forked worker starts from zero and
+        # needs its own flush thread; the parent's values are not ours.
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._reset()
+            threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True).start()
+
+    def inc(self, name: str, labels: Labels = (), value: float = 1.0):
+        """Add ``value`` to a counter or gauge."""
+        key = (name, labels)
+        with self._lock:
+            self._check_process()
+            values = self._gauges if self.metrics[name][0] == 'gauge' else self._counters
+            values[key] = values.get(key, 0.0) + value
+
+    def dec(self, name: str, labels: Labels = (), value: float = 1.0):
+        """Subtract ``value`` from a gauge."""
+        self.inc(name, labels, -value)
+
+    def set(self, name: str, labels: Labels, value: float):
+        """Set this worker's value of a gauge."""
+        with self._lock:
+            self._check_process()
+            self._gauges[(name, labels)] = value
+
+    def observe(self, name: str, labels: Labels, value: float):
+        """Add one observation to a histogram."""
+        buckets = self.metrics[name][2]
+        key = (name, labels)
+        with self._lock:
+            self._check_process()
+            counts = self._histograms.get(key)
+            if counts is None:
+                # One slot per bucket, one for +Inf, then the sum
+                counts = self._histograms[key] = [0.0] * (len(buckets) + 2)
+            counts[bisect.bisect_left(buckets, value)] += 1
+            counts[-1] += value
+
+    def snapshot(self) -> Dict[str, List[Any]]:
+        """Return this worker's values in the on-disk format."""
+        with self._lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self._counters.items()],
+                'gauges': [[name, list(labels), value] for (name, labels), value in self._gauges.items()],
+                'histograms': [[name, list(labels), list(counts)] for (name, labels), counts in self._histograms.items()],
+            }
+
+    def flush(self):
+        """Write this worker's values to its file in the shared directory."""
+        if self._pid != os.getpid():
+            return
+        try:
+            self._write(os.path.join(self.directory, f'{self._pid}.json'), self.snapshot())
+        except OSError as e:
+            logger.warning(f"Could not write metrics to {self.directory}: {e}")
+
+    def _flush_loop(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def _write(self, path: str, data: Dict[str, Any]):
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as handle:
+                json.dump(data, handle)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def collect(self) -> Dict[str, Dict[Labels, Any]]:
+        """Return ``{metric: {labels: value}}`` summed over every worker.
+
+        Histogram values are ``[bucket counts..., +Inf count, sum]``.
+        """
+        snapshots = [self.snapshot()]
+        if os.path.isdir(self.directory):
+            # Scrapes are serialized so a dead worker's values are read
+            # either from its own file or from the archive, never both
+            with open(os.path.join(self.directory, 'archive.lock'), 'w') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                self._archive_dead_workers()
+                for filename in os.listdir(self.directory):
+                    if not filename.endswith('.json') or filename == f'{self._pid}.json':
+                        continue
+                    try:
+                        with open(os.path.join(self.directory, filename)) as handle:
+                            snapshots.append(json.load(handle))
+                    except (OSError, ValueError):
+                        continue
+
+        merged: Dict[str, Dict[Labels, Any]] = {name: {} for name in self.metrics}
+        for snapshot in snapshots:
+            for kind in ('counters', 'gauges'):
+                for name, labels, value in snapshot.get(kind, []):
+                    if name in merged:
+                        key = tuple(map(tuple, labels))
+                        merged[name][key] = merged[name].get(key, 0.0) + value
+            for name, labels, counts in snapshot.get('histograms', []):
+                if name in merged:
+                    key = tuple(map(tuple, labels))
+                    total = merged[name].get(key)
+                    if total is None or len(total) != len(counts):
+                        merged[name][key] = list(counts)
+                    else:
+                        merged[name][key] = [a + b for a, b in zip(total, counts)]
+        return merged
+
+    def _archive_dead_workers(self):
+        # Called with archive.lock held
+        dead = [
+            filename for filename in os.listdir(self.directory)
+            if filename.endswith('.json') and filename[:-5].isdigit() and not _pid_alive(int(filename[:-5]))
+        ]
+        if not dead:
+            return
+        archive_path = os.path.join(self.directory, self.ARCHIVE)
+        try:
+            with open(archive_path) as handle:
+                archive = json.load(handle)
+        except (OSError, ValueError):
+            archive = {'counters': [], 'histograms': []}
+        counters = {(name, tuple(map(tuple, labels))): value for name, labels, value in archive['counters']}
+        histograms = {(name, tuple(map(tuple, labels))): counts for name, labels, counts in archive['histograms']}
+        archived = []
+        for filename in dead:
+            path = os.path.join(self.directory, filename)
+            try:
+                with open(path) as handle:
+                    snapshot = json.load(handle)
+            except (OSError, ValueError):
+                continue
+            for name, labels, value in snapshot.get('counters', []):
+                key = (name, tuple(map(tuple, labels)))
+                counters[key] = counters.get(key, 0.0) + value
+            for name, labels, counts in snapshot.get('histograms', []):
+                key = (name, tuple(map(tuple, labels)))
+                total = histograms.get(key)
+                histograms[key] = counts if total is None else [a + b for a, b in zip(total, counts)]
+            archived.append(path)
+        self._write(archive_path, {
+            'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+            'histograms': [[name, list(labels), counts] for (name, labels), counts in histograms.items()],
+        })
+        for path in archived:
+            os.unlink(path)
+
+    def render(self) -> str:
+        """Return every metric in the Prometheus text format."""
+        lines = []
+        for name, series in self.collect().items():
+            kind, help_text, buckets = self.metrics[name]
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels in sorted(series):
+                value = series[labels]
+                if kind != 'histogram':
+                    lines.append(f'{name}{_format_labels(labels)} {value:.6g}')
+                    continue
+                cumulative = 0.0
+                for bound, count in zip(list(buckets) + ['+Inf'], value[:-1]):
+                    cumulative += count
+                    le = bound if bound == '+Inf' else f'{bound:g}'
+                    lines.append(f'{name}_bucket{_format_labels(labels + (("le", le),))} {cumulative:.6g}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {value[-1]:.6g}')
+                lines.append(f'{name}_count{_format_labels(labels)} {cumulative:.6g}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+
+def serve_metrics(port: int, registry: Optional[MetricsRegistry] = None, host: str = '0.0.0.0') -> HTTPServer:
+    """Serve ``/metrics`` from a daemon thread, for processes without a web server.
+
+    Celery workers call it from their main process; it merges the values of
+    every child process like the gunicorn workers' scrape does.
+    """
+    metrics = registry or REGISTRY
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = metrics.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    return server
+
+
+class MetricsMiddleware:
+    """WSGI middleware recording request metrics and serving ``path``.
+
+    Latency covers the whole response, including streaming the body. The
+    endpoint label is the Flask URL rule stored by :func:`instrument_app`,
+    or the normalized path; after ``MAX_ENDPOINTS`` distinct labels new ones
+    are reported as ``other`` so unmatched URLs cannot blow up cardinality.
+    """
+
+    def __init__(self, app: Callable, registry: Optional[MetricsRegistry] = None, path: str = '/metrics'):
+        self.app = app
+        self.registry = registry or REGISTRY
+        self.path = path
+        self._endpoints = set()
+
+    def __call__(self, environ: Dict[str, Any], start_response: Callable) -> Iterable[bytes]:
+        path = environ.get('PATH_INFO', '')
+        if path == self.path:
+            body = self.registry.render().encode('utf-8')
+            start_response('200 OK', [
+                ('Content-Type', 'text/plain; version=0.0.4; charset=utf-8'),
+                ('Content-Length', str(len(body))),
+            ])
+            return [body]
+
+        in_flight = (('route_class', route_class(path) or 'other'),)
+        self.registry.inc('superset_http_requests_in_flight', in_flight)
+        started = time.perf_counter()
+        status = ['500']
+
+        def recording_start_response(status_line, headers, exc_info=None):
+            status[0] = status_line.split(' ', 1)[0]
+            return start_response(status_line, headers, exc_info)
+
+        def finish():
+            elapsed = time.perf_counter() - started
+            self.registry.dec('superset_http_requests_in_flight', in_flight)
+            endpoint = self._endpoint(environ.get(ENDPOINT_ENVIRON_KEY) or normalize_path(path))
+            method = environ.get('REQUEST_METHOD', 'GET')
+            self.registry.observe(
+                'superset_http_request_duration_seconds', (('endpoint', endpoint), ('method', method)), elapsed,
+            )
+            self.registry.inc(
+                'superset_http_requests_total',
+                (('endpoint', endpoint), ('method', method), ('status', status[0])),
+            )
+
+        try:
+            return _RecordingIterable(self.app(environ, recording_start_response), finish)
+        except BaseException:
+            finish()
+            raise
+
+    def _endpoint(self, endpoint: str) -> str:
+        if endpoint in self._endpoints:
+            return endpoint
+        if len(self._endpoints) >= MAX_ENDPOINTS:
+            return 'other'
+        self._endpoints.add(endpoint)
+        return endpoint
+
+
+try:
+    from superset.stats_logger import BaseStatsLogger
+except ImportError:  # Outside the Superset image
+    BaseStatsLogger = object
+
+
+class PrometheusStatsLogger(BaseStatsLogger):
+    """``STATS_LOGGER`` turning Superset's stats calls into Prometheus metrics.
+
+    Keys become the ``key`` label of ``superset_stats_*`` in the registry
+    served by :class:`MetricsMiddleware`. Numeric and opaque id segments
+    of keys are replaced by ``<id>`` and past ``MAX_STATS_KEYS`` distinct
+    keys new ones are reported as ``other``. Superset passes timings in
+    milliseconds; they are stored in seconds.
+    """
+
+    def __init__(self, prefix: str = 'superset', registry: Optional[MetricsRegistry] = None):
+        self.prefix = prefix
+        self.registry = registry or REGISTRY
+        self._keys = set()
+
+    def key(self, key: str) -> str:
+        if self.prefix:
+            return f'{self.prefix}.{key}'
+        return key
+
+    def incr(self, key: str):
+        self.registry.inc('superset_stats_events_total', self._labels(key))
+
+    def decr(self, key: str):
+        self.registry.inc('superset_stats_decrements_total', self._labels(key))
+
+    def timing(self, key: str, value: float):
+        self.registry.observe('superset_stats_timing_seconds', self._labels(key), value / 1000.0)
+
+    def gauge(self, key: str, value: float):
+        self.registry.set('superset_stats_gauge', self._labels(key), value)
+
+    def _labels(self, key: str) -> Labels:
+        key = '.'.join('<id>' if _ID_SEGMENT.match(part) else part for part in str(key).split('.'))
+        if key not in self._keys:
+            if len(self._keys) >= MAX_STATS_KEYS:
+                return (('key', 'other'),)
+            self._keys.add(key)
+        return (('key', key),)
+
+
+def instrumented_pool(pool_class: type, registry: Optional[MetricsRegistry] = None) -> type:
+    """Return a subclass of a SQLAlchemy pool class timing every checkout.
+
+    The wait covers queueing for a free connection and, when the pool
+    opens a new one, connecting; checkouts that raise (pool timeout) are
+    also counted in ``superset_db_pool_checkout_timeouts_total``.
+    """
+
+    def _do_get(self):
+        metrics = registry or REGISTRY
+        started = time.perf_counter()
+        try:
+            return pool_class._do_get(self)
+        except Exception:
+            metrics.inc('superset_db_pool_checkout_timeouts_total')
+            raise
+        finally:
+            metrics.observe('superset_db_pool_checkout_seconds', (), time.perf_counter() - started)
+
+    return type(f'Instrumented{pool_class.__name__}', (pool_class,), {'_do_get': _do_get})
+
+
+InstrumentedQueuePool: type = instrumented_pool(QueuePool)
+InstrumentedNullPool: type = instrumented_pool(NullPool)
+
+
+def instrument_cache(cache: Any, name: str, registry: Optional[MetricsRegistry] = None):
+    """Count hits and misses of a Flask-Caching backend's ``get``."""
+    if getattr(cache, '_metrics_instrumented', False):
+        return
+    get = cache.get
+    hit, miss = (('cache', name), ('result', 'hit')), (('cache', name), ('result', 'miss'))
+
+    def counted_get(key):
+        value = get(key)
+        (registry or REGISTRY).inc('superset_cache_requests_total', miss if value is None else hit)
+        return value
+
+    cache.get = counted_get
+    cache._metrics_instrumented = True
+
+
+def instrument_app(app: Any, registry: Optional[MetricsRegistry] = None):
+    """``FLASK_APP_MUTATOR`` labelling requests by URL rule and counting cache lookups."""
+    from flask import request
+
+    @app.before_request
+    def _store_endpoint():
+        rule = request.url_rule
+        if rule is not None:
+            request.environ[ENDPOINT_ENVIRON_KEY] = rule.rule
+
+    try:
+        from superset.extensions import cache_manager, results_backend_manager
+    except ImportError:
+        return
+    for attribute, name in (
+        ('cache', 'default'),
+        ('data_cache', 'data'),
+        ('thumbnail_cache', 'thumbnail'),
+        ('filter_state_cache', 'filter_state'),
+        ('explore_form_data_cache', 'explore_form_data'),
+    ):
+        try:
+            instrument_cache(getattr(cache_manager, attribute).cache, name, registry)
+        except (AttributeError, KeyError) as e:
+            logger.info(f"Not counting {name} cache lookups: {e}")
+    if results_backend_manager.results_backend is not None:
+        instrument_cache(results_backend_manager.results_backend, 'results', registry)
+
+
+def stamp_published(headers: Optional[Dict[str, Any]] = None, clock: Callable[[], float] = time.time, **kwargs):
+    """``before_task_publish`` handler stamping the message with the publish time.
+
+    Retries are published again, so their wait starts over.
+    """
+    if headers is not None:
+        headers[PUBLISHED_HEADER] = clock()
+
+
+def observe_queue_wait(
+    task: Any = None,
+    registry: Optional[MetricsRegistry] = None,
+    clock: Callable[[], float] = time.time,
+    **kwargs,
+):
+    """``task_prerun`` handler observing how long the task waited in its queue.
+
+    Tasks with an ETA or countdown wait on purpose and are left out.
+    """
+    request = getattr(task, 'request', None)
+    if request is None or getattr(request, 'eta', None):
+        return
+    # Protocol 2 puts custom headers on the request itself
+    published = getattr(request, PUBLISHED_HEADER, None) or (getattr(request, 'headers', None) or {}).get(
+        PUBLISHED_HEADER
+    )
+    if published is None:
+        return
+    queue = (getattr(request, 'delivery_info', None) or {}).get('routing_key') or 'celery'
+    (registry or REGISTRY).observe(
+        'superset_celery_queue_wait_seconds', (('queue', queue),), max(0.0, clock() - float(published)),
+    )
+
+
+def instrument_celery():
+    """Time Celery queue waits: call from ``superset_config.py``, which web, beat and workers all load."""
+    from celery.signals import before_task_publish, task_prerun
+
+    before_task_publish.connect(stamp_published, weak=False)
+    task_prerun.connect(observe_queue_wait, weak=False)
@@ -0,0 +1,231 @@
+"""Low-overhead metadata database operation meter.
+
+Counts reads, writes and deletes against Firestore-style daily quotas::
+
+    from superset_ext.opmeter import OperationMeter
+    OPERATION_METER = OperationMeter(
+        path='/app/superset_home/usage/operations.db',
+        limits={'reads': 50000, 'writes': 20000, 'deletes': 20000},
+    )
+    OPERATION_METER.install()
+"""
+
+import atexit
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Statement prefix (upper-cased, after leading whitespace) -> operation kind
+PREFIXES = (
+    ('SELECT', 'reads'),
+    ('WITH', 'reads'),
+    ('INSERT', 'writes'),
+    ('UPDATE', 'writes'),
+    ('REPLACE', 'writes'),
+    ('DELETE', 'deletes'),
+)
+
+KINDS = ('reads', 'writes', 'deletes')
+
+# Fraction of a limit at which a warning is logged before the limit itself
+WARN_RATIO = 0.8
+
+
+def classify(statement: str) -> Optional[str]:
+    """Return ``reads``, ``writes``, ``deletes`` or None for a SQL statement.
+
+    Only the first keyword is inspected, so this is cheap enough to run on
+    every cursor execution.
+    """
+    head = statement[:16].lstrip().upper()
+    if head.startswith('('):
+        head = head[1:].lstrip()
+    for prefix, kind in PREFIXES:
+        if head.startswith(prefix):
+            return kind
+    return None
+
+
+class OperationMeter:
+    """Counts metadata operations from ``before_cursor_execute`` events.
+
+    Statements are classified from the SQL string the dialect already
+    compiled, so nothing is compiled twice. With ``sample_rate`` < 1 only
+    that fraction of statements is classified and each counts
+    ``1 / sample_rate``. Counts are buffered per process and added to a
+    SQLite file shared by every gunicorn worker at most every
+    ``flush_interval`` seconds, in one row per UTC day and kind; days
+    older than ``retain_days`` are dropped.
+    """
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS operations (
+            day TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            count REAL NOT NULL,
+            PRIMARY KEY (day, kind)
+        )
+        """,
+    )
+
+    def __init__(
+        self,
+        path: str = '/app/superset_home/usage/operations.db',
+        sample_rate: float = 1.0,
+        flush_interval: float = 5.0,
+        limits: Optional[Dict[str, int]] = None,
+        retain_days: int = 7,
+    ):
+        """Initialize the meter.
+
+        Args:
+            path: SQLite file shared by the workers
+            sample_rate: Fraction of statements to classify (0 < rate <= 1)
+            flush_interval: Seconds between writes of buffered counts
+            limits: Daily limit per kind; warnings are logged at 80% and 100%
+            retain_days: Days of history kept in the database
+        """
+        if not 0 < sample_rate <= 1:
+            raise ValueError(f"sample_rate must be in (0, 1], got {sample_rate}")
+        self.path = path
+        self.sample_rate = sample_rate
+        self.weight = 1.0 / sample_rate
+        self.flush_interval = flush_interval
+        self.limits = limits or {}
+        self.retain_days = retain_days
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Dict[str, float]] = {}
+        self._last_flush = time.monotonic()
+        self._pid = os.getpid()
+        self._warned: Dict[str, float] = {}
+        self._day = ''
+        self._day_checked = float('-inf')
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+        atexit.register(self.flush)
+
+    def install(self, target=None):
+        """Listen for ``before_cursor_execute`` on ``target`` (default: every Engine)."""
+        from sqlalchemy import event
+        if target is None:
+            from sqlalchemy.engine import Engine
+            target = Engine
+        event.listen(target, 'before_cursor_execute', self._before_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return
+        kind = classify(statement)
+        if kind is None:
+            return
+        # executemany() runs the statement once per parameter set
+        count = len(parameters) if executemany and parameters else 1
+        self.record(kind, count * self.weight)
+
+    def record(self, kind: str, count: float = 1.0):
+        """Add ``count`` operations of ``kind`` to today's buffered counts."""
+        day = self._current_day()
+        with self._lock:
+            if os.getpid() != self._pid:
+                # Forked worker: counts buffered by the parent are not ours
+                self._pid = os.getpid()
+                self._pending = {}
+            counts = self._pending.setdefault(day, {})
+            counts[kind] = counts.get(kind, 0.0) + count
+            due = time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write buffered counts to the shared database and check limits."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+        cutoff = (self._now() - timedelta(days=self.retain_days)).strftime('%Y-%m-%d')
+        try:
+            with self._connection() as conn:
+                conn.executemany(
+                    """
+                    INSERT INTO operations (day, kind, count) VALUES (?, ?, ?)
+                    ON CONFLICT (day, kind) DO UPDATE SET count = count + excluded.count
+                    """,
+                    [
+                        (day, kind, count)
+                        for day, counts in pending.items()
+                        for kind, count in counts.items()
+                    ],
+                )
+                conn.execute('DELETE FROM operations WHERE day < ?', (cutoff,))
+        except sqlite3.Error as e:
+            logger.warning(f"Could not store operation counts: {e}")
+            return
+        self._check_limits()
+
+    def totals(self, day: Optional[str] = None) -> Dict[str, int]:
+        """Return the operation counts of every worker for ``day`` (default today)."""
+        day = day or self._today()
+        totals = {kind: 0.0 for kind in KINDS}
+        with self._connection() as conn:
+            for kind, count in conn.execute(
+                'SELECT kind, count FROM operations WHERE day = ?', (day,)
+            ):
+                totals[kind] = totals.get(kind, 0.0) + count
+        with self._lock:
+            for kind, count in self._pending.get(day, {}).items():
+                totals[kind] = totals.get(kind, 0.0) + count
+        return {kind: int(round(count)) for kind, count in totals.items()}
+
+    def _check_limits(self):
+        if not self.limits:
+            return
+        day = self._today()
+        totals = self.totals(day)
+        for kind, limit in self.limits.items():
+            used = totals.get(kind, 0)
+            for ratio in (1.0, WARN_RATIO):
+                if used >= limit * ratio:
+                    key = f'{day}:{kind}'
+                    if self._warned.get(key, 0) < ratio:
+                        self._warned[key] = ratio
+                        state = 'exceeded' if ratio >= 1 else 'at 80% of'
+                        logger.warning(f"Daily {kind} {state} limit: {used}/{limit}")
+                    break
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=5.0)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _now(self) -> datetime:
+        return datetime.now(timezone.utc)
+
+    def _today(self) -> str:
+        return self._now().strftime('%Y-%m-%d')
+
+    def _current_day(self) -> str:
+        # Formatting the date on every statement costs more than counting it
+        if time.monotonic() - self._day_checked >= 1.0:
+            self._day = self._today()
+            self._day_checked = time.monotonic()
+        return self._day
@@ -0,0 +1,196 @@
+"""Disk-backed SQL Lab results backend for Redis-less deployments.
+
+Superset expects ``RESULTS_BACKEND`` to be a cachelib cache instance::
+
+    from superset_ext.results import DiskResultsBackend
+    RESULTS_BACKEND = DiskResultsBackend(
+        path='/app/superset_home/results',
+        max_bytes=MAX_STORAGE_BYTES,
+    )
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import tempfile
+import time
+import zlib
+from typing import Any, Generator, List, Optional
+
+from .cache import SQLiteCache
+
+logger = logging.getLogger(__name__)
+
+# Size of the chunks streamed to and from disk
+CHUNK_SIZE = 1024 * 1024
+
+# Largest payload get() loads into memory
+MAX_READ_BYTES = 256 * 1024 * 1024
+
+# One-byte file headers describing how the payload was stored
+RAW = b'R'         # bytes written as-is (already compressed upstream)
+COMPRESSED = b'Z'  # bytes compressed with zlib
+PICKLED = b'P'     # non-bytes values, pickled then compressed with zlib
+
+
+def is_zlib_stream(data: bytes) -> bool:
+    """Return True if ``data`` starts with a zlib header."""
+    return len(data) >= 2 and data[0] == 0x78 and (data[0] * 256 + data[1]) % 31 == 0
+
+
+class DiskResultsBackend(SQLiteCache):
+    """Results backend storing each result set as a compressed file.
+
+    Payloads are streamed to disk in ``CHUNK_SIZE`` pieces through a temporary
+    file that is atomically renamed into place, so memory use does not grow
+    with result size and readers never see partial files. A SQLite index
+    (the :class:`SQLiteCache` schema) tracks file sizes, expiry and access
+    times; least recently used results are deleted once their total size
+    exceeds ``max_bytes``.
+
+    Superset already zlib-compresses result payloads, so those are stored
+    as-is instead of being compressed twice.
+
+    Superset deserializes a result in one piece, so ``get`` has to return
+    the whole payload; it refuses payloads over ``max_read_bytes`` (treated
+    as a miss, so SQL Lab asks to re-run the query) instead of letting a
+    huge result exhaust a worker's memory. Callers that can consume a
+    result incrementally use ``stream``, whose memory use is one chunk.
+    """
+
+    def __init__(
+        self,
+        path: str = '/app/superset_home/results',
+        max_bytes: int = 5 * 1024 * 1024 * 1024,
+        default_timeout: int = 86400,
+        key_prefix: str = '',
+        sweep_interval: float = 300.0,
+        compress_level: int = 1,
+        ignore_delete_many_errors: bool = False,
+        max_read_bytes: int = MAX_READ_BYTES,
+    ):
+        self.directory = path
+        self.compress_level = compress_level
+        self.max_read_bytes = max_read_bytes
+        os.makedirs(path, exist_ok=True)
+        super().__init__(
+            path=os.path.join(path, 'index.db'),
+            max_bytes=max_bytes,
+            default_timeout=default_timeout,
+            key_prefix=key_prefix,
+            sweep_interval=sweep_interval,
+            ignore_delete_many_errors=ignore_delete_many_errors,
+        )
+
+    def get(self, key: str) -> Any:
+        chunks = self.stream(key)
+        if chunks is None:
+            return None
+        header = next(chunks, b'')
+        if not header:
+            return None
+        payload = []
+        size = 0
+        for chunk in chunks:
+            size += len(chunk)
+            if size > self.max_read_bytes:
+                chunks.close()
+                logger.warning(
+                    f"Result {key} is over {self.max_read_bytes} bytes, not loading it; re-run the query"
+                )
+                return None
+            payload.append(chunk)
+        data = b''.join(payload)
+        if header == PICKLED:
+            return pickle.loads(data)
+        return data
+
+    def stream(self, key: str) -> Optional[Generator[bytes, None, None]]:
+        """Return an iterator over the stored result, or None if missing.
+
+        The first chunk starts with the one-byte storage header.
+        """
+        full_key = self.key_prefix + key
+        now = time.time()
+        row = self._connection().execute(
+            'SELECT expires, accessed FROM cache WHERE key = ?', (full_key,)
+        ).fetchone()
+        if row is None or (row[0] and row[0] <= now):
+            return None
+        try:
+            handle = open(self._file_path(full_key), 'rb')
+        except FileNotFoundError:
+            logger.warning(f"Result file for {full_key} is missing, dropping index entry")
+            self.delete(key)
+            return None
+        if now - row[1] > self.TOUCH_INTERVAL:
+            self._touch(full_key, now)
+        return self._read_chunks(handle)
+
+    def _read_chunks(self, handle) -> Generator[bytes, None, None]:
+        with handle:
+            header = handle.read(1)
+            decompressor = zlib.decompressobj() if header != RAW else None
+            yield header
+            while True:
+                chunk = handle.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield decompressor.decompress(chunk) if decompressor else chunk
+            if decompressor:
+                yield decompressor.flush()
+
+    def _write(self, key: str, value: Any, timeout: Optional[int], replace: bool) -> bool:
+        full_key = self.key_prefix + key
+        if not replace and self.has(key):
+            return False
+
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            payload = memoryview(value)
+            header = RAW if is_zlib_stream(bytes(payload[:2])) else COMPRESSED
+        else:
+            payload = memoryview(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+            header = PICKLED
+
+        size = self._write_file(full_key, header, payload)
+        if size > self.max_bytes:
+            self._remove_file(full_key)
+            return False
+        return self._store(full_key, b'', size, timeout, replace)
+
+    def _write_file(self, full_key: str, header: bytes, payload: memoryview) -> int:
+        """Stream ``payload`` into the key's file atomically; return bytes on disk."""
+        compressor = zlib.compressobj(self.compress_level) if header != RAW else None
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as handle:
+                handle.write(header)
+                for offset in range(0, len(payload), CHUNK_SIZE):
+                    chunk = payload[offset:offset + CHUNK_SIZE]
+                    handle.write(compressor.compress(chunk) if compressor else chunk)
+                if compressor:
+                    handle.write(compressor.flush())
+                size = handle.tell()
+            os.replace(tmp_path, self._file_path(full_key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return size
+
+    def _delete_rows(self, conn: sqlite3.Connection, full_keys: List[str]):
+        super()._delete_rows(conn, full_keys)
+        for full_key in full_keys:
+            self._remove_file(full_key)
+
+    def _remove_file(self, full_key: str):
+        try:
+            os.unlink(self._file_path(full_key))
+        except FileNotFoundError:
+            pass
+
+    def _file_path(self, full_key: str) -> str:
+        digest = hashlib.sha256(full_key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f'{digest}.result')
@@ -0,0 +1,230 @@
+"""Runtime sizing from the container's cgroup v2 limits.
+
+The same image runs on an e2-micro (0.25 CPU, 1GB) and on an n2-standard-4,
+so process counts and in-process budgets are derived at startup from the
+limits the container actually got instead of being hardcoded::
+
+    from superset_ext.runtime import tune
+
+    RUNTIME = tune()
+    SUPERSET_WEBSERVER_THREADS = RUNTIME.threads
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': RUNTIME.pool_size,
+        'max_overflow': RUNTIME.max_overflow,
+    }
+
+gunicorn reads its worker count before the configuration is imported, so
+``docker/local/gunicorn.conf.py`` calls ``tune()`` as well; without a
+configuration file the options can be taken from the command line::
+
+    gunicorn $(python -m superset_ext.runtime --gunicorn-args) 'superset.app:create_app()'
+
+The rules are those of ``derive_sizing`` in ``pulumi/config/generator.py``,
+applied to measured rather than declared resources. ``GUNICORN_WORKERS``,
+``GUNICORN_THREADS`` and ``GUNICORN_TIMEOUT`` override the derived values.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+
+MiB = 1024 * 1024
+
+# Memory kept for the gunicorn master, Python runtime and page cache
+BASE_MEMORY_BYTES = 256 * MiB
+
+# Resident memory of one Superset gunicorn worker under load
+WORKER_MEMORY_BYTES = 384 * MiB
+
+# Share of a worker's memory given to its in-process (L1) caches
+L1_MEMORY_SHARE = 0.05
+
+
+def _cgroup_dir(root: str) -> str:
+    """Return this process's cgroup v2 directory (``root`` inside a cgroup namespace)."""
+    try:
+        with open('/proc/self/cgroup') as handle:
+            for line in handle:
+                if line.startswith('0::'):
+                    path = os.path.join(root, line[3:].strip().lstrip('/'))
+                    if os.path.exists(os.path.join(path, 'cpu.max')):
+                        return path
+    except OSError:
+        pass
+    return root
+
+
+def _read(directory: str, name: str) -> Optional[str]:
+    try:
+        with open(os.path.join(directory, name)) as handle:
+            return handle.read().strip()
+    except OSError:
+        return None
+
+
+def read_cpu_limit(root: str = CGROUP_ROOT) -> Tuple[float, str]:
+    """Return the CPU limit in cores and where it came from.
+
+    ``cpu.max`` holds ``<quota> <period>`` or ``max <period>``; without a
+    quota the CPUs this process may run on are counted.
+    """
+    value = _read(_cgroup_dir(root), 'cpu.max')
+    if value:
+        quota, _, period = value.partition(' ')
+        if quota != 'max':
+            try:
+                return int(quota) / int(period or 100000), 'cgroup cpu.max'
+            except (ValueError, ZeroDivisionError):
+                logger.warning(f"Ignoring unreadable cpu.max {value!r}")
+    try:
+        return float(len(os.sched_getaffinity(0))), 'cpu affinity'
+    except AttributeError:
+        return float(os.cpu_count() or 1), 'cpu count'
+
+
+def read_memory_limit(root: str = CGROUP_ROOT) -> Tuple[int, str]:
+    """Return the memory limit in bytes and where it came from.
+
+    ``memory.max`` holds a byte count or ``max``; without a limit the
+    machine's physical memory is used.
+    """
+    value = _read(_cgroup_dir(root), 'memory.max')
+    if value and value != 'max':
+        try:
+            return int(value), 'cgroup memory.max'
+        except ValueError:
+            logger.warning(f"Ignoring unreadable memory.max {value!r}")
+    return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES'), 'physical memory'
+
+
+def _override(name: str) -> Optional[int]:
+    value = os.environ.get(name)
+    if not value:
+        return None
+    try:
+        return max(1, int(value))
+    except ValueError:
+        logger.warning(f"Ignoring {name}={value!r}: not an integer")
+        return None
+
+
+class RuntimeTuning:
+    """Process counts and budgets derived from CPU and memory limits.
+
+    - workers: ``2 x CPU + 1``, capped by how many ``WORKER_MEMORY_BYTES``
+      workers fit next to ``BASE_MEMORY_BYTES``
+    - threads: 4 per worker with a full core or more, 2 below that
+    - pool: one connection per thread plus as many overflow, shrunk so all
+      workers of all ``replicas`` fit in ``max_connections`` when given
+    - L1 caches: ``L1_MEMORY_SHARE`` of a worker's memory for chart data,
+      a quarter of that for metadata
+    - recycling: workers with less than 512MiB are replaced after 500
+      requests, others after 1000
+    """
+
+    def __init__(
+        self,
+        cpu: float,
+        memory_bytes: int,
+        max_connections: Optional[int] = None,
+        replicas: int = 1,
+        workers: Optional[int] = None,
+        threads: Optional[int] = None,
+        timeout: Optional[int] = None,
+    ):
+        """Derive the settings.
+
+        Args:
+            cpu: CPU limit in cores
+            memory_bytes: Memory limit in bytes
+            max_connections: Metadata database connections left for Superset
+            replicas: Containers sharing ``max_connections``
+            workers, threads, timeout: Explicit values replacing derived ones
+        """
+        self.cpu = cpu
+        self.memory_bytes = memory_bytes
+        self.workers = workers or int(max(
+            1, min(int(2 * cpu) + 1, (memory_bytes - BASE_MEMORY_BYTES) // WORKER_MEMORY_BYTES)
+        ))
+        self.threads = threads or (4 if cpu >= 1 else 2)
+        self.timeout = timeout or (120 if cpu >= 1 else 300)
+
+        budget = 2 * self.threads
+        if max_connections:
+            budget = max(2, min(budget, max_connections // (max(1, replicas) * self.workers)))
+        self.pool_size = min(self.threads, budget)
+        self.max_overflow = budget - self.pool_size
+
+        per_worker = max(WORKER_MEMORY_BYTES, (memory_bytes - BASE_MEMORY_BYTES) // self.workers)
+        self.data_cache_l1_bytes = int(per_worker * L1_MEMORY_SHARE) // MiB * MiB
+        self.cache_l1_bytes = self.data_cache_l1_bytes // 4
+        self.max_requests = 500 if per_worker < 512 * MiB else 1000
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(vars(self))
+
+    def gunicorn_args(self) -> List[str]:
+        """Return the gunicorn command line options for these settings."""
+        return [
+            f'--workers={self.workers}',
+            '--worker-class=gthread',
+            f'--threads={self.threads}',
+            f'--timeout={self.timeout}',
+        ]
+
+    def __repr__(self) -> str:
+        return (
+            f"RuntimeTuning(cpu={self.cpu:g}, memory={self.memory_bytes / MiB:.0f}MiB, "
+            f"workers={self.workers}, threads={self.threads}, timeout={self.timeout}, "
+            f"pool={self.pool_size}+{self.max_overflow}, "
+            f"l1={self.cache_l1_bytes // MiB}MiB/{self.data_cache_l1_bytes // MiB}MiB)"
+        )
+
+
+def tune(root: str = CGROUP_ROOT, log: bool = True) -> RuntimeTuning:
+    """Read the cgroup limits and derive this container's settings.
+
+    ``DATABASE_MAX_CONNECTIONS`` and ``SUPERSET_REPLICAS`` bound the pool
+    when the metadata database is shared by several containers.
+    """
+    cpu, cpu_source = read_cpu_limit(root)
+    memory, memory_source = read_memory_limit(root)
+    tuning = RuntimeTuning(
+        cpu,
+        memory,
+        max_connections=_override('DATABASE_MAX_CONNECTIONS'),
+        replicas=_override('SUPERSET_REPLICAS') or 1,
+        workers=_override('GUNICORN_WORKERS'),
+        threads=_override('GUNICORN_THREADS'),
+        timeout=_override('GUNICORN_TIMEOUT'),
+    )
+    if log:
+        logger.info(f"Runtime tuning from {cpu_source} and {memory_source}: {tuning!r}")
+    return tuning
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point printing the derived settings."""
+    parser = argparse.ArgumentParser(description='Derive Superset settings from cgroup limits')
+    parser.add_argument('--root', default=CGROUP_ROOT, help='cgroup v2 mount point')
+    parser.add_argument('--gunicorn-args', action='store_true', help='Print gunicorn options only')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr, format='%(message)s')
+    tuning = tune(args.root)
+    if args.gunicorn_args:
+        print(' '.join(tuning.gunicorn_args()))
+    else:
+        print(json.dumps(tuning.as_dict(), indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
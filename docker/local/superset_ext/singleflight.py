@@ -0,0 +1,333 @@
+"""Single-flight wrapper that keeps cache misses from stampeding the warehouse.
+
+Wrap any cache backend by pointing ``CACHE_TYPE`` at :class:`SingleFlightCache`
+and naming the real backend in ``CACHE_BACKEND``::
+
+    DATA_CACHE_CONFIG = {
+        'CACHE_TYPE': 'superset_ext.singleflight.SingleFlightCache',
+        'CACHE_BACKEND': 'superset_ext.cache.LayeredRedisCache',
+        'CACHE_REDIS_URL': REDIS_URL,
+        'CACHE_LOCK_TIMEOUT': 120,
+        'CACHE_LOCK_WAIT': 5,
+    }
+
+All other keys are passed on to the wrapped backend's factory.
+"""
+
+import hashlib
+import logging
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+import uuid
+from collections import namedtuple
+from typing import Any, Dict, Optional, Tuple
+
+from flask_caching.backends.base import BaseCache
+from flask_caching.backends.rediscache import RedisCache
+from werkzeug.utils import import_string
+
+logger = logging.getLogger(__name__)
+
+# Longest pause between two polls of a waiter
+MAX_POLL_INTERVAL = 0.5
+
+# Seconds a waiter polls before running the query itself. Well below the
+# web timeout: a leader that hangs must not take its waiters down with it
+DEFAULT_LOCK_WAIT = 5.0
+
+# What the wrapped backend stores: the value, how long it took to compute
+# and when it expires (wall clock, 0 for never)
+Entry = namedtuple('Entry', ['value', 'delta', 'expires_at'])
+
+
+class RedisLock:
+    """Short-lived lock on a Redis key (``SET NX PX`` with an owner token)."""
+
+    # Delete the key only if it still holds our token
+    RELEASE_SCRIPT = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('del', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, client, name: str, timeout: float):
+        self.client = client
+        self.name = name
+        self.timeout = timeout
+        self.token = uuid.uuid4().hex
+
+    def acquire(self) -> bool:
+        return bool(self.client.set(self.name, self.token, nx=True, px=int(self.timeout * 1000)))
+
+    def release(self):
+        self.client.eval(self.RELEASE_SCRIPT, 1, self.name, self.token)
+
+    def locked(self) -> bool:
+        return bool(self.client.exists(self.name))
+
+
+class FileLock:
+    """Short-lived lock file shared by the processes on one host.
+
+    The file is created with ``O_EXCL``; a lock file older than ``timeout``
+    belongs to a holder that died or gave up and may be taken over.
+    """
+
+    def __init__(self, path: str, timeout: float):
+        self.path = path
+        self.timeout = timeout
+        self.token = uuid.uuid4().hex
+
+    def acquire(self) -> bool:
+        for _ in range(2):
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except FileExistsError:
+                if not self._stale():
+                    return False
+                self._unlink()
+                continue
+            with os.fdopen(fd, 'w') as handle:
+                handle.write(self.token)
+            return True
+        return False
+
+    def release(self):
+        try:
+            with open(self.path) as handle:
+                owner = handle.read()
+        except FileNotFoundError:
+            return
+        if owner == self.token:
+            self._unlink()
+
+    def locked(self) -> bool:
+        return os.path.exists(self.path) and not self._stale()
+
+    def _stale(self) -> bool:
+        try:
+            return time.time() - os.path.getmtime(self.path) > self.timeout
+        except FileNotFoundError:
+            return False
+
+    def _unlink(self):
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class SingleFlightCache(BaseCache):
+    """Cache wrapper that lets one caller recompute a missing key at a time.
+
+    A ``get`` that misses takes a short-lived lock on the key and returns
+    None, so its caller runs the query; the lock is released by the ``set``
+    (or ``delete``) that follows. Concurrent callers that find the key
+    locked poll the backend until the value appears, the lock goes away or
+    ``wait_timeout`` passes, and only then fall back to computing it
+    themselves. A leader whose query fails or returns nothing cacheable
+    never calls ``set``; the locks a thread still holds are released when
+    the Flask app context ends (every request and Celery task), so its
+    waiters take over at once instead of waiting out ``lock_timeout``.
+    Locks live in Redis when the wrapped backend is a ``RedisCache`` and in
+    ``lock_dir`` otherwise.
+
+    With ``beta`` > 0 hits are refreshed early with probability rising as
+    the entry nears expiry, scaled by how long it took to compute
+    (XFetch). The caller that wins the lock recomputes while everyone else
+    keeps getting the cached value, so popular entries never expire under
+    load.
+
+    Extra ``*_CACHE_CONFIG`` keys:
+        CACHE_BACKEND: Import path of the wrapped backend (required)
+        CACHE_LOCK_TIMEOUT: Seconds a recompute may hold the lock (default 60)
+        CACHE_LOCK_WAIT: Seconds a waiter polls before computing itself (default 5)
+        CACHE_LOCK_POLL_INTERVAL: First poll interval in seconds (default 0.05)
+        CACHE_EARLY_EXPIRATION_BETA: XFetch beta, 0 disables (default 1.0)
+        CACHE_LOCK_DIR: Lock file directory for non-Redis backends
+    """
+
+    def __init__(
+        self,
+        backend: BaseCache,
+        lock_timeout: float = 60.0,
+        wait_timeout: float = DEFAULT_LOCK_WAIT,
+        poll_interval: float = 0.05,
+        beta: float = 1.0,
+        lock_dir: Optional[str] = None,
+        default_timeout: int = 300,
+        ignore_delete_many_errors: bool = False,
+    ):
+        super().__init__(
+            default_timeout=default_timeout,
+            ignore_delete_many_errors=ignore_delete_many_errors,
+        )
+        self.backend = backend
+        self.lock_timeout = lock_timeout
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.beta = beta
+        if not isinstance(backend, RedisCache):
+            if lock_dir is None:
+                backend_path = getattr(backend, 'path', None)
+                lock_dir = (
+                    os.path.join(os.path.dirname(backend_path), 'locks')
+                    if backend_path else os.path.join(tempfile.gettempdir(), 'superset_locks')
+                )
+            os.makedirs(lock_dir, exist_ok=True)
+        self.lock_dir = lock_dir
+        self._local = threading.local()
+        self.leaders = 0
+        self.coalesced = 0
+        self.wait_timeouts = 0
+        self.early_refreshes = 0
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        backend_cls = import_string(config['CACHE_BACKEND'])
+        backend = backend_cls.factory(app, config, list(args), dict(kwargs))
+        kwargs.update(
+            lock_timeout=float(config.get('CACHE_LOCK_TIMEOUT', 60)),
+            wait_timeout=float(config.get('CACHE_LOCK_WAIT', DEFAULT_LOCK_WAIT)),
+            poll_interval=float(config.get('CACHE_LOCK_POLL_INTERVAL', 0.05)),
+            beta=float(config.get('CACHE_EARLY_EXPIRATION_BETA', 1.0)),
+            lock_dir=config.get('CACHE_LOCK_DIR'),
+        )
+        cache = cls(backend, **kwargs)
+        if app is not None:
+            app.teardown_appcontext(cache.release_held)
+        return cache
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def get(self, key: str) -> Any:
+        entry = self.backend.get(key)
+        if entry is not None:
+            return self._hit(key, entry)
+        if key in self._held():
+            # This thread is already recomputing the key
+            return None
+
+        lock = self._lock(key)
+        if self._lead(key, lock):
+            return None
+
+        deadline = time.monotonic() + self.wait_timeout
+        interval = self.poll_interval
+        while time.monotonic() < deadline:
+            time.sleep(interval)
+            interval = min(interval * 2, MAX_POLL_INTERVAL)
+            entry = self.backend.get(key)
+            if entry is not None:
+                self.coalesced += 1
+                return self._unwrap(entry)
+            if not lock.locked() and self._lead(key, lock):
+                # The previous leader gave up without storing a value
+                return None
+
+        self.wait_timeouts += 1
+        logger.warning(f"Gave up waiting for cache key {key} after {self.wait_timeout}s")
+        return None
+
+    def has(self, key: str) -> bool:
+        return self.backend.has(key)
+
+    def _hit(self, key: str, entry: Any) -> Any:
+        if not isinstance(entry, Entry):
+            return entry
+        if self.beta > 0 and entry.expires_at and entry.delta > 0:
+            # XFetch: -log(u) is exponentially distributed, so the chance of
+            # refreshing grows smoothly as expiry approaches
+            early = -entry.delta * self.beta * math.log(1.0 - random.random())
+            if time.time() + early >= entry.expires_at and self._lead(key, self._lock(key)):
+                self.early_refreshes += 1
+                return None
+        return entry.value
+
+    def _unwrap(self, entry: Any) -> Any:
+        return entry.value if isinstance(entry, Entry) else entry
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def set(self, key: str, value: Any, timeout: Optional[int] = None) -> bool:
+        timeout = self._normalize_timeout(timeout)
+        lock, started = self._held().pop(key, (None, None))
+        delta = time.monotonic() - started if started is not None else 0.0
+        expires_at = time.time() + timeout if timeout else 0.0
+        try:
+            return self.backend.set(key, Entry(value, delta, expires_at), timeout)
+        finally:
+            if lock is not None:
+                lock.release()
+
+    def add(self, key: str, value: Any, timeout: Optional[int] = None) -> bool:
+        timeout = self._normalize_timeout(timeout)
+        expires_at = time.time() + timeout if timeout else 0.0
+        return self.backend.add(key, Entry(value, 0.0, expires_at), timeout)
+
+    def delete(self, key: str) -> bool:
+        lock, _ = self._held().pop(key, (None, None))
+        try:
+            return self.backend.delete(key)
+        finally:
+            if lock is not None:
+                lock.release()
+
+    def clear(self) -> bool:
+        return self.backend.clear()
+
+    # ------------------------------------------------------------------
+    # Locks
+    # ------------------------------------------------------------------
+
+    def _lock(self, key: str):
+        if isinstance(self.backend, RedisCache):
+            name = f'{self.backend._get_prefix()}{key}__lock'
+            return RedisLock(self.backend._write_client, name, self.lock_timeout)
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return FileLock(os.path.join(self.lock_dir, f'{digest}.lock'), self.lock_timeout)
+
+    def _lead(self, key: str, lock) -> bool:
+        """Try to become the caller that recomputes ``key``."""
+        if not lock.acquire():
+            return False
+        previous = self._held().pop(key, None)
+        if previous is not None:
+            previous[0].release()
+        self._held()[key] = (lock, time.monotonic())
+        self.leaders += 1
+        return True
+
+    def release_held(self, exc: Optional[BaseException] = None):
+        """Release the locks of recomputes this thread started but never stored."""
+        held = self._held()
+        while held:
+            key, (lock, _) = held.popitem()
+            try:
+                lock.release()
+            except Exception as e:  # the lock still expires after lock_timeout
+                logger.warning(f"Could not release the lock of cache key {key}: {e}")
+
+    def _held(self) -> Dict[str, Tuple[Any, float]]:
+        held = getattr(self._local, 'held', None)
+        if held is None:
+            held = self._local.held = {}
+        return held
+
+    def stats(self) -> Dict[str, int]:
+        """Return counters describing how misses were resolved."""
+        return {
+            'leaders': self.leaders,
+            'coalesced': self.coalesced,
+            'wait_timeouts': self.wait_timeouts,
+            'early_refreshes': self.early_refreshes,
+        }
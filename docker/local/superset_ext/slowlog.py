@@ -0,0 +1,299 @@
+"""Slow metadata query log with per-fingerprint latency statistics.
+
+Install it from ``superset_config.py``::
+
+    from superset_ext.slowlog import SlowQueryLog
+
+    SLOW_QUERY_LOG = SlowQueryLog(
+        path='/app/superset_home/slowlog',
+        threshold_seconds=0.1,
+        sample_rate=0.1,
+    )
+    SLOW_QUERY_LOG.install(url=SQLALCHEMY_DATABASE_URI)
+
+and print the statements that took the most time, summed over every worker::
+
+    python -m superset_ext.slowlog --path /app/superset_home/slowlog --top 20
+"""
+
+import argparse
+import atexit
+import bisect
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import weakref
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Fingerprint statements are counted under once max_fingerprints is reached
+OTHER = 'other'
+
+SORT_KEYS = ('total', 'mean', 'max', 'count')
+
+_NORMALIZE = (
+    (re.compile(r'--[^\n]*'), ' '),
+    (re.compile(r'/\*.*?\*/', re.S), ' '),
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'%\(\w+\)s|%s|\$\d+|(?<![:\w]):\w+'), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'\s+'), ' '),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(?)'),
+    (re.compile(r'(\(\?\))(?:\s*,\s*\(\?\))+'), r'\1'),
+)
+
+
+def normalize(statement: str) -> str:
+    """Return ``statement`` with literals, parameters and whitespace normalized.
+
+    Comments are removed, string/numeric literals and bound parameters of
+    every paramstyle become ``?``, and ``IN``/``VALUES`` lists collapse to
+    one ``(?)`` so statements differing only in list length match.
+    """
+    for pattern, replacement in _NORMALIZE:
+        statement = pattern.sub(replacement, statement)
+    return statement.strip()
+
+
+def fingerprint(statement: str) -> str:
+    """Return a short stable id for the normalized form of ``statement``."""
+    return hashlib.sha1(normalize(statement).encode('utf-8')).hexdigest()[:16]
+
+
+def _percentile(buckets: List[float], quantile: float) -> float:
+    """Upper bound of the histogram bucket holding ``quantile``."""
+    total = sum(buckets)
+    if not total:
+        return 0.0
+    seen = 0.0
+    for bound, count in zip(BUCKETS + (float('inf'),), buckets):
+        seen += count
+        if seen >= quantile * total:
+            return bound
+    return float('inf')
+
+
+class SlowQueryLog:
+    """Times cursor executions and keeps latency statistics per fingerprint.
+
+    Each statement is timed between ``before_cursor_execute`` and
+    ``after_cursor_execute``. Statements slower than ``threshold_seconds``
+    are logged (a ``sample_rate`` fraction of them, with the normalized SQL
+    but never the parameters). Count, total and max time and a latency
+    histogram are kept per fingerprint, up to ``max_fingerprints``; every
+    ``flush_interval`` seconds a worker writes them to ``<path>/<pid>.json``
+    so :func:`top` can rank statements across workers. Files of workers
+    idle for ``retain_seconds`` are removed.
+    """
+
+    def __init__(
+        self,
+        path: str = '/app/superset_home/slowlog',
+        threshold_seconds: float = 0.1,
+        sample_rate: float = 1.0,
+        max_fingerprints: int = 500,
+        flush_interval: float = 30.0,
+        retain_seconds: float = 7 * 86400,
+    ):
+        """Initialize the log.
+
+        Args:
+            path: Directory shared by the workers
+            threshold_seconds: Statements slower than this are logged
+            sample_rate: Fraction of slow statements logged (0 < rate <= 1)
+            max_fingerprints: Distinct statements tracked per worker
+            flush_interval: Seconds between writes of this worker's statistics
+            retain_seconds: Age after which files of other workers are removed
+        """
+        if not 0 < sample_rate <= 1:
+            raise ValueError(f"sample_rate must be in (0, 1], got {sample_rate}")
+        self.path = path
+        self.threshold = threshold_seconds
+        self.sample_rate = sample_rate
+        self.max_fingerprints = max_fingerprints
+        self.flush_interval = flush_interval
+        self.retain_seconds = retain_seconds
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._fingerprints: Dict[str, str] = {}
+        self._last_flush = time.monotonic()
+        self._pid = os.getpid()
+        self._engines = weakref.WeakKeyDictionary()
+        self._match = None
+        atexit.register(self.flush)
+
+    def install(self, target=None, url: Optional[str] = None):
+        """Listen for cursor executions on ``target`` (default: every Engine).
+
+        With ``url``, only statements of engines connected to that database
+        (same backend, host, port and database) are timed, so queries Superset
+        runs against analytics databases are left out.
+        """
+        from sqlalchemy import event
+        if target is None:
+            from sqlalchemy.engine import Engine
+            target = Engine
+        if url is not None:
+            from sqlalchemy.engine import make_url
+            self._match = self._url_key(make_url(url))
+        event.listen(target, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(target, 'after_cursor_execute', self._after_cursor_execute)
+
+    @staticmethod
+    def _url_key(url) -> tuple:
+        return (url.get_backend_name(), url.host, url.port, url.database)
+
+    def _tracked(self, engine) -> bool:
+        if self._match is None:
+            return True
+        tracked = self._engines.get(engine)
+        if tracked is None:
+            tracked = self._engines[engine] = self._url_key(engine.url) == self._match
+        return tracked
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self._tracked(conn.engine):
+            conn.info.setdefault('slowlog_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get('slowlog_started')
+        if not started:
+            return
+        self.record(statement, time.perf_counter() - started.pop(), getattr(cursor, 'rowcount', -1))
+
+    def record(self, statement: str, seconds: float, rowcount: int = -1):
+        """Add one execution of ``statement`` to its fingerprint's statistics."""
+        key = self._fingerprints.get(statement)
+        if key is None:
+            key = fingerprint(statement)
+            if len(self._fingerprints) < 4 * self.max_fingerprints:
+                self._fingerprints[statement] = key
+        with self._lock:
+            if os.getpid() != self._pid:
+                # Forked worker: statistics gathered by the parent are not ours
+                self._pid = os.getpid()
+                self._stats = {}
+            stats = self._stats.get(key)
+            if stats is None:
+                if len(self._stats) >= self.max_fingerprints:
+                    key, statement = OTHER, ''
+                    stats = self._stats.get(key)
+                if stats is None:
+                    stats = self._stats[key] = {
+                        'sql': normalize(statement) if statement else '',
+                        'count': 0,
+                        'total': 0.0,
+                        'max': 0.0,
+                        'buckets': [0] * (len(BUCKETS) + 1),
+                    }
+            stats['count'] += 1
+            stats['total'] += seconds
+            stats['max'] = max(stats['max'], seconds)
+            stats['buckets'][bisect.bisect_left(BUCKETS, seconds)] += 1
+            due = time.monotonic() - self._last_flush >= self.flush_interval
+        if seconds >= self.threshold and (self.sample_rate >= 1 or random.random() < self.sample_rate):
+            logger.warning(
+                f"Slow metadata query {key}: {seconds * 1000:.1f}ms, rows={rowcount}, "
+                f"executions={stats['count']}: {stats['sql'][:1000]}"
+            )
+        if due:
+            self.flush()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return a copy of this worker's statistics keyed by fingerprint."""
+        with self._lock:
+            return {key: dict(value, buckets=list(value['buckets'])) for key, value in self._stats.items()}
+
+    def flush(self):
+        """Write this worker's statistics and drop files of long-idle workers."""
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if os.getpid() != self._pid or not self._stats:
+                return
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+            with os.fdopen(fd, 'w') as handle:
+                json.dump(self.stats(), handle)
+            os.replace(tmp, os.path.join(self.path, f'{self._pid}.json'))
+            cutoff = time.time() - self.retain_seconds
+            for entry in os.scandir(self.path):
+                if entry.name.endswith('.json') and entry.stat().st_mtime < cutoff:
+                    os.unlink(entry.path)
+        except OSError as e:
+            logger.warning(f"Could not write slow query statistics to {self.path}: {e}")
+
+
+def top(path: str, limit: int = 20, by: str = 'total') -> List[Dict[str, Any]]:
+    """Return the ``limit`` statements with the highest ``by`` over every worker file."""
+    if by not in SORT_KEYS:
+        raise ValueError(f"by must be one of {SORT_KEYS}, got {by!r}")
+    merged: Dict[str, Dict[str, Any]] = {}
+    for entry in sorted(os.scandir(path), key=lambda entry: entry.name) if os.path.isdir(path) else []:
+        if not entry.name.endswith('.json'):
+            continue
+        try:
+            with open(entry.path) as handle:
+                worker = json.load(handle)
+        except (OSError, ValueError):
+            continue
+        for key, stats in worker.items():
+            total = merged.get(key)
+            if total is None:
+                merged[key] = dict(stats, buckets=list(stats['buckets']))
+                continue
+            total['count'] += stats['count']
+            total['total'] += stats['total']
+            total['max'] = max(total['max'], stats['max'])
+            total['buckets'] = [a + b for a, b in zip(total['buckets'], stats['buckets'])]
+
+    rows = []
+    for key, stats in merged.items():
+        rows.append({
+            'fingerprint': key,
+            'count': stats['count'],
+            'total': stats['total'],
+            'mean': stats['total'] / stats['count'] if stats['count'] else 0.0,
+            'p95': _percentile(stats['buckets'], 0.95),
+            'max': stats['max'],
+            'sql': stats['sql'],
+        })
+    rows.sort(key=lambda row: row[by], reverse=True)
+    return rows[:limit]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point printing the top statements."""
+    parser = argparse.ArgumentParser(description='Rank metadata statements by time spent')
+    parser.add_argument('--path', default='/app/superset_home/slowlog')
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--by', choices=SORT_KEYS, default='total')
+    parser.add_argument('--json', action='store_true', help='Print JSON instead of a table')
+    args = parser.parse_args(argv)
+
+    rows = top(args.path, args.top, args.by)
+    if args.json:
+        json.dump(rows, sys.stdout, indent=2)
+        print()
+        return 0
+    print(f"{'fingerprint':<16} {'count':>8} {'total s':>10} {'mean ms':>9} {'p95 ms':>8} {'max ms':>9}  sql")
+    for row in rows:
+        print(
+            f"{row['fingerprint']:<16} {row['count']:>8} {row['total']:>10.3f} {row['mean'] * 1000:>9.2f} "
+            f"{row['p95'] * 1000:>8.0f} {row['max'] * 1000:>9.2f}  {row['sql'][:120]}"
+        )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""Celery tasks registered with Superset's worker.
+
+Add ``'superset_ext.tasks'`` to ``CeleryConfig.imports`` to load them. The
+worker signals below also serve ``/metrics`` on ``WORKER_METRICS_PORT`` and
+install the browser pool of ``BROWSER_POOL`` (see ``superset_ext.browser_pool``).
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict
+
+from celery.signals import worker_init, worker_process_init, worker_ready
+from flask import current_app
+from superset import db
+from superset.extensions import celery_app
+
+from . import browser_pool
+from .metrics import serve_metrics
+from .warmup import CacheWarmer, top_dashboards
+
+logger = logging.getLogger(__name__)
+
+
+def _worker_config() -> Dict[str, Any]:
+    # Signals run outside an app context; this is the worker's Flask app
+    from superset.tasks.celery_app import flask_app
+
+    return flask_app.config
+
+
+def _install_browser_pool(warm: bool) -> None:
+    config = _worker_config()
+    settings = config.get('BROWSER_POOL')
+    if not settings:
+        return
+    window = config.get('WEBDRIVER_WINDOW', {}).get('dashboard', (1600, 2000))
+    pool = browser_pool.install(settings, config.get('WEBDRIVER_TYPE', 'chrome'), window)
+    if pool is not None and warm and settings.get('warm', True):
+        threading.Thread(target=_warm, args=(pool,), name='browser-pool-warm', daemon=True).start()
+
+
+def _warm(pool: browser_pool.BrowserPool) -> None:
+    try:
+        logger.info(f'Started {pool.warm()} pooled browsers')
+    except Exception as e:
+        logger.warning(f'Could not warm the browser pool: {e}')
+
+
+@worker_init.connect
+def start_worker_services(**kwargs):
+    """Serve worker metrics and patch screenshots to use the browser pool."""
+    port = _worker_config().get('WORKER_METRICS_PORT')
+    if port:
+        serve_metrics(int(port))
+    _install_browser_pool(warm=False)
+
+
+@worker_process_init.connect
+def warm_process_browsers(**kwargs):
+    """Start the browsers of a prefork child before its first task."""
+    _install_browser_pool(warm=True)
+
+
+@worker_ready.connect
+def warm_worker_browsers(sender=None, **kwargs):
+    """Start the browsers of a threads (or solo) worker, which has no children."""
+    if sender is not None and 'prefork' not in type(sender.pool).__module__:
+        _install_browser_pool(warm=True)
+
+
+@celery_app.task(name='superset_ext.warm_up_dashboards', ignore_result=False)
+def warm_up_dashboards() -> Dict[str, Any]:
+    """Warm the chart data cache of the most viewed dashboards.
+
+    Tuned with ``WARMUP_TOP_DASHBOARDS``, ``WARMUP_LOOKBACK_DAYS``,
+    ``WARMUP_CONCURRENCY`` and ``WARMUP_BASE_URL`` in ``superset_config.py``.
+    """
+    config = current_app.config
+    dashboard_ids = top_dashboards(
+        db.engine,
+        limit=config.get('WARMUP_TOP_DASHBOARDS', 10),
+        lookback_days=config.get('WARMUP_LOOKBACK_DAYS', 7),
+    )
+    warmer = CacheWarmer(
+        base_url=config.get('WARMUP_BASE_URL', 'http://superset:8088'),
+        username=os.environ.get('SUPERSET_ADMIN_USERNAME', 'admin'),
+        password=os.environ.get('SUPERSET_ADMIN_PASSWORD', 'admin'),
+        concurrency=config.get('WARMUP_CONCURRENCY', 4),
+    )
+    return warmer.run(dashboard_ids)
+
+
+@celery_app.task(name='superset_ext.synthetic_task')
+def synthetic_task(seconds: float = 1.0) -> float:
+    """Occupy a worker process for ``seconds``, standing in for a report or query."""
+    time.sleep(seconds)
+    return seconds
+
+
+@celery_app.task(name='superset_ext.synthetic_burst')
+def synthetic_burst(count: int = 100, seconds: float = 1.0, queue: str = 'celery') -> int:
+    """Enqueue ``count`` synthetic tasks on ``queue``, e.g. to watch workers scale::
+
+        celery --app=superset.tasks.celery_app:app call superset_ext.synthetic_burst --args='[200, 2]'
+    """
+    for _ in range(count):
+        synthetic_task.apply_async(args=(seconds,), queue=queue)
+    logger.info(f'Enqueued {count} synthetic tasks of {seconds}s on {queue}')
+    return count
@@ -0,0 +1,320 @@
+"""Cross-worker request usage tracking against Cloud Run free-tier quotas.
+
+Install the middleware from ``superset_config.py``::
+
+    from functools import partial
+    from superset_ext.usage import UsageMiddleware, UsageTracker
+
+    usage_tracker = UsageTracker(
+        path='/app/superset_home/usage/requests.db',
+        memory_gb=1.0,
+        limits={'requests_day': 66666, 'gb_seconds_month': 360000},
+    )
+    ADDITIONAL_MIDDLEWARE = [partial(UsageMiddleware, tracker=usage_tracker)]
+"""
+
+import atexit
+import hmac
+import ipaddress
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Bucket width of the stored time series
+BUCKET_SECONDS = 60
+
+# Sliding windows usage is reported for, in seconds
+WINDOWS = {
+    'hour': 3600,
+    'day': 86400,
+    'month': 30 * 86400,
+}
+
+# Limit name -> (metric, window)
+LIMITS = {
+    'requests_day': ('requests', 'day'),
+    'gb_seconds_month': ('gb_seconds', 'month'),
+    'vcpu_seconds_month': ('vcpu_seconds', 'month'),
+}
+
+METRICS = ('requests', 'gb_seconds', 'vcpu_seconds')
+
+# Fraction of a limit at which a warning is logged
+WARN_RATIO = 0.8
+
+# Clients allowed on the metrics path when no token is configured
+INTERNAL_NETWORKS = tuple(
+    ipaddress.ip_network(network)
+    for network in ('127.0.0.0/8', '10.0.0.0/8', '172.16.0.0/12', '192.168.0.0/16', '::1/128', 'fc00::/7')
+)
+
+
+class UsageTracker:
+    """Per-minute request usage shared by every worker through SQLite.
+
+    ``record`` only adds to in-process counters (a few microseconds); every
+    ``flush_interval`` seconds the buffered minutes are added to the shared
+    database, one row per minute. Usage is summed over sliding windows
+    (last hour, day and 30 days) and compared to ``limits``.
+
+    GB-seconds are wall time times ``memory_gb``, as Cloud Run bills
+    instance memory while a request is served; vCPU-seconds are the CPU
+    time the request's thread used. Overlapping requests are each counted
+    in full, so both are upper bounds of what would be billed.
+    """
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS usage (
+            bucket INTEGER PRIMARY KEY,
+            requests INTEGER NOT NULL,
+            gb_seconds REAL NOT NULL,
+            vcpu_seconds REAL NOT NULL
+        )
+        """,
+    )
+
+    def __init__(
+        self,
+        path: str = '/app/superset_home/usage/requests.db',
+        memory_gb: float = 1.0,
+        limits: Optional[Dict[str, float]] = None,
+        flush_interval: float = 5.0,
+    ):
+        """Initialize the tracker.
+
+        Args:
+            path: SQLite file shared by the workers
+            memory_gb: Memory allocated to the instance, in GB
+            limits: Quotas keyed by ``requests_day``, ``gb_seconds_month``
+                and ``vcpu_seconds_month``
+            flush_interval: Seconds between writes of buffered usage
+        """
+        unknown = set(limits or {}) - set(LIMITS)
+        if unknown:
+            raise ValueError(f"Unknown usage limits: {sorted(unknown)}")
+        self.path = path
+        self.memory_gb = memory_gb
+        self.limits = limits or {}
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pending: Dict[int, List[float]] = {}
+        self._last_flush = time.monotonic()
+        self._pid = os.getpid()
+        self._warned: Dict[str, float] = {}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+        atexit.register(self.flush)
+
+    def record(self, wall_seconds: float, cpu_seconds: float, now: Optional[float] = None):
+        """Add one finished request to the current minute."""
+        bucket = int((now or time.time()) // BUCKET_SECONDS)
+        with self._lock:
+            if os.getpid() != self._pid:
+                # Forked worker: usage buffered by the parent is not ours
+                self._pid = os.getpid()
+                self._pending = {}
+            counts = self._pending.get(bucket)
+            if counts is None:
+                counts = self._pending[bucket] = [0, 0.0, 0.0]
+            counts[0] += 1
+            counts[1] += wall_seconds * self.memory_gb
+            counts[2] += cpu_seconds
+            due = time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write buffered usage to the shared database and check limits."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+        oldest = int(time.time() // BUCKET_SECONDS) - max(WINDOWS.values()) // BUCKET_SECONDS
+        try:
+            with self._connection() as conn:
+                conn.executemany(
+                    """
+                    INSERT INTO usage (bucket, requests, gb_seconds, vcpu_seconds)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT (bucket) DO UPDATE SET
+                        requests = requests + excluded.requests,
+                        gb_seconds = gb_seconds + excluded.gb_seconds,
+                        vcpu_seconds = vcpu_seconds + excluded.vcpu_seconds
+                    """,
+                    [(bucket, *counts) for bucket, counts in pending.items()],
+                )
+                conn.execute('DELETE FROM usage WHERE bucket < ?', (oldest,))
+        except sqlite3.Error as e:
+            logger.warning(f"Could not store usage: {e}")
+            return
+        self.check_limits()
+
+    def usage(self, now: Optional[float] = None) -> Dict[str, Dict[str, float]]:
+        """Return ``{window: {metric: value}}`` summed over every worker."""
+        current = int((now or time.time()) // BUCKET_SECONDS)
+        result = {}
+        with self._connection() as conn:
+            for window, seconds in WINDOWS.items():
+                first = current - seconds // BUCKET_SECONDS
+                totals = conn.execute(
+                    """
+                    SELECT COALESCE(SUM(requests), 0), COALESCE(SUM(gb_seconds), 0),
+                           COALESCE(SUM(vcpu_seconds), 0)
+                    FROM usage WHERE bucket > ? AND bucket <= ?
+                    """,
+                    (first, current),
+                ).fetchone()
+                result[window] = dict(zip(METRICS, totals))
+        with self._lock:
+            for bucket, counts in self._pending.items():
+                for window, seconds in WINDOWS.items():
+                    if current - seconds // BUCKET_SECONDS < bucket <= current:
+                        for metric, value in zip(METRICS, counts):
+                            result[window][metric] += value
+        return result
+
+    def check_limits(self, usage: Optional[Dict[str, Dict[str, float]]] = None) -> Dict[str, float]:
+        """Log a warning at 80% and 100% of each limit; return used ratios."""
+        if not self.limits:
+            return {}
+        usage = usage or self.usage()
+        ratios = {}
+        for name, limit in self.limits.items():
+            metric, window = LIMITS[name]
+            used = usage[window][metric]
+            ratios[name] = used / limit if limit else 0.0
+            for threshold in (1.0, WARN_RATIO):
+                if ratios[name] >= threshold:
+                    if self._warned.get(name, 0) < threshold:
+                        self._warned[name] = threshold
+                        state = 'exceeded' if threshold >= 1 else 'approaching'
+                        logger.warning(f"Free tier {name} {state}: {used:.0f}/{limit}")
+                    break
+            else:
+                self._warned.pop(name, None)
+        return ratios
+
+    def render_metrics(self) -> str:
+        """Return usage, limits and ratios in the Prometheus text format."""
+        usage = self.usage()
+        lines = [
+            '# HELP superset_free_tier_usage Usage summed over a sliding window',
+            '# TYPE superset_free_tier_usage gauge',
+        ]
+        for window, metrics in usage.items():
+            for metric, value in metrics.items():
+                lines.append(f'superset_free_tier_usage{{metric="{metric}",window="{window}"}} {value:.6g}')
+        lines += [
+            '# HELP superset_free_tier_limit_ratio Fraction of a free tier limit used',
+            '# TYPE superset_free_tier_limit_ratio gauge',
+        ]
+        for name, ratio in self.check_limits(usage).items():
+            lines.append(f'superset_free_tier_limit_ratio{{limit="{name}"}} {ratio:.6g}')
+        return '\n'.join(lines) + '\n'
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=5.0)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+
+class _RecordingIterable:
+    """Response body wrapper that records usage once the body is consumed."""
+
+    def __init__(self, iterable: Iterable[bytes], on_close: Callable[[], None]):
+        self._iterable = iterable
+        self._on_close = on_close
+
+    def __iter__(self) -> Iterator[bytes]:
+        return iter(self._iterable)
+
+    def close(self):
+        try:
+            if hasattr(self._iterable, 'close'):
+                self._iterable.close()
+        finally:
+            self._on_close()
+
+
+class UsageMiddleware:
+    """WSGI middleware feeding a :class:`UsageTracker` and serving its metrics.
+
+    Wall and CPU time cover the whole response, including streaming the
+    body. Responses built with the server's ``wsgi.file_wrapper`` are
+    returned unwrapped so it can still send them with ``sendfile()``; they
+    are recorded before their body is sent.
+
+    ``GET metrics_path`` returns the usage in the Prometheus text format
+    without being counted itself. With ``metrics_token`` it requires
+    ``Authorization: Bearer <metrics_token>``; without, it only answers
+    clients on loopback and private addresses.
+    """
+
+    def __init__(
+        self,
+        app: Callable,
+        tracker: UsageTracker,
+        metrics_path: str = '/usage/metrics',
+        metrics_token: Optional[str] = None,
+    ):
+        self.app = app
+        self.tracker = tracker
+        self.metrics_path = metrics_path
+        self.metrics_token = metrics_token
+
+    def __call__(self, environ: Dict[str, Any], start_response: Callable) -> Iterable[bytes]:
+        if environ.get('PATH_INFO') == self.metrics_path:
+            if not self._metrics_allowed(environ):
+                start_response('403 Forbidden', [('Content-Type', 'text/plain'), ('Content-Length', '0')])
+                return [b'']
+            body = self.tracker.render_metrics().encode('utf-8')
+            start_response('200 OK', [
+                ('Content-Type', 'text/plain; version=0.0.4; charset=utf-8'),
+                ('Content-Length', str(len(body))),
+            ])
+            return [body]
+
+        started = time.perf_counter()
+        cpu_started = time.thread_time()
+
+        def finish():
+            self.tracker.record(time.perf_counter() - started, time.thread_time() - cpu_started)
+
+        try:
+            response = self.app(environ, start_response)
+        except BaseException:
+            finish()
+            raise
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        if isinstance(file_wrapper, type) and isinstance(response, file_wrapper):
+            finish()
+            return response
+        return _RecordingIterable(response, finish)
+
+    def _metrics_allowed(self, environ: Dict[str, Any]) -> bool:
+        if self.metrics_token:
+            expected = f'Bearer {self.metrics_token}'
+            return hmac.compare_digest(environ.get('HTTP_AUTHORIZATION', '').encode(), expected.encode())
+        try:
+            address = ipaddress.ip_address(environ.get('REMOTE_ADDR', ''))
+        except ValueError:
+            return False
+        return any(address in network for network in INTERNAL_NETWORKS)
@@ -0,0 +1,204 @@
+"""Chart data cache warm-up for the most viewed dashboards.
+
+Runs from Celery beat (``superset_ext.tasks.warm_up_dashboards``) and as a
+one-shot after a deploy::
+
+    python -m superset_ext.warmup --base-url http://superset:8088 \\
+        --database-url "$DATABASE_URL" --top 10 --days 7 --concurrency 4
+
+Dashboards are ranked by views recorded in Superset's ``logs`` table
+(``DASHBOARD_VIEW_ACTIONS``) and
+their charts are replayed through the ``/api/v1/chart/warm_up_cache`` API
+of the running revision, so the entries land in whatever
+``DATA_CACHE_CONFIG`` that revision uses.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Log actions of a dashboard being opened: the page (older and newer
+# Superset views) and the dashboard API the frontend loads it from. Chart
+# data calls and frontend events also carry a dashboard_id, but count once
+# per chart or per interaction rather than per view.
+DASHBOARD_VIEW_ACTIONS = ('dashboard', 'Superset.dashboard', 'DashboardRestApi.get')
+
+TOP_DASHBOARDS_SQL = """
+    SELECT dashboard_id, COUNT(*) AS views
+    FROM logs
+    WHERE dashboard_id IS NOT NULL AND dttm >= :since AND action IN :actions
+    GROUP BY dashboard_id
+    ORDER BY views DESC
+    LIMIT :limit
+"""
+
+
+def top_dashboards(engine, limit: int = 10, lookback_days: int = 7) -> List[int]:
+    """Return the ids of the most viewed dashboards, most viewed first.
+
+    Args:
+        engine: SQLAlchemy engine (or connection) for the metadata database
+        limit: Number of dashboards to return
+        lookback_days: Only count views from the last ``lookback_days`` days
+    """
+    from sqlalchemy import bindparam, text
+
+    since = datetime.utcnow() - timedelta(days=lookback_days)
+    query = text(TOP_DASHBOARDS_SQL).bindparams(bindparam('actions', expanding=True))
+    with engine.connect() as conn:
+        rows = conn.execute(query, {'since': since, 'limit': limit, 'actions': list(DASHBOARD_VIEW_ACTIONS)})
+        return [int(row[0]) for row in rows]
+
+
+class CacheWarmer:
+    """Replays chart data requests of dashboards against a Superset instance."""
+
+    def __init__(
+        self,
+        base_url: str,
+        username: str,
+        password: str,
+        concurrency: int = 4,
+        timeout: float = 120.0,
+        session: Optional[requests.Session] = None,
+    ):
+        """Initialize the warmer.
+
+        Args:
+            base_url: Superset URL of the revision to warm
+            username: Database-auth user allowed to read the dashboards
+            password: Password for ``username``
+            concurrency: Maximum chart requests in flight
+            timeout: Per-request timeout in seconds
+            session: Optional requests session (one is created otherwise)
+        """
+        self.base_url = base_url.rstrip('/')
+        self.username = username
+        self.password = password
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.session = session or requests.Session()
+
+    def login(self):
+        """Authenticate and attach the access token to the session."""
+        response = self.session.post(
+            f'{self.base_url}/api/v1/security/login',
+            json={
+                'username': self.username,
+                'password': self.password,
+                'provider': 'db',
+                'refresh': False,
+            },
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        self.session.headers['Authorization'] = f"Bearer {response.json()['access_token']}"
+
+    def dashboard_charts(self, dashboard_id: int) -> List[int]:
+        """Return the chart ids on a dashboard."""
+        response = self.session.get(
+            f'{self.base_url}/api/v1/dashboard/{dashboard_id}/charts',
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return [chart['id'] for chart in response.json()['result']]
+
+    def warm_chart(self, chart_id: int, dashboard_id: int) -> bool:
+        """Run one chart's query in the context of its dashboard.
+
+        Returns:
+            True if Superset computed (or already had) the chart data
+        """
+        try:
+            response = self.session.put(
+                f'{self.base_url}/api/v1/chart/warm_up_cache',
+                json={'chart_id': chart_id, 'dashboard_id': dashboard_id},
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            results = response.json()['result']
+        except (requests.RequestException, KeyError, ValueError) as e:
+            logger.warning(f"Warming chart {chart_id} on dashboard {dashboard_id} failed: {e}")
+            return False
+        errors = [result.get('viz_error') for result in results if result.get('viz_error')]
+        if errors:
+            logger.warning(f"Chart {chart_id} on dashboard {dashboard_id}: {errors[0]}")
+        return not errors
+
+    def run(self, dashboard_ids: List[int]) -> Dict[str, Any]:
+        """Warm every chart of the given dashboards.
+
+        Returns:
+            Report with dashboard and chart counts and the time taken
+        """
+        started = time.perf_counter()
+        if 'Authorization' not in self.session.headers:
+            self.login()
+
+        targets: List[Tuple[int, int]] = []
+        for dashboard_id in dashboard_ids:
+            try:
+                targets.extend((chart_id, dashboard_id) for chart_id in self.dashboard_charts(dashboard_id))
+            except requests.RequestException as e:
+                logger.warning(f"Listing charts of dashboard {dashboard_id} failed: {e}")
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            results = list(pool.map(lambda target: self.warm_chart(*target), targets))
+
+        report = {
+            'dashboards': len(dashboard_ids),
+            'charts': len(targets),
+            'warmed': sum(results),
+            'failed': len(results) - sum(results),
+            'seconds': round(time.perf_counter() - started, 3),
+        }
+        logger.info(
+            f"Warmed {report['warmed']}/{report['charts']} charts on "
+            f"{report['dashboards']} dashboards in {report['seconds']}s"
+        )
+        return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point for one-shot warm-ups."""
+    parser = argparse.ArgumentParser(description='Warm the chart data cache of the top dashboards')
+    parser.add_argument('--base-url', default=os.environ.get('SUPERSET_WARMUP_URL', 'http://localhost:8088'))
+    parser.add_argument('--database-url', default=os.environ.get('DATABASE_URL'))
+    parser.add_argument('--username', default=os.environ.get('SUPERSET_ADMIN_USERNAME', 'admin'))
+    parser.add_argument('--top', type=int, default=10, help='Number of dashboards to warm')
+    parser.add_argument('--days', type=int, default=7, help='Days of view history to rank by')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--timeout', type=float, default=120.0)
+    args = parser.parse_args(argv)
+
+    if not args.database_url:
+        parser.error('--database-url (or DATABASE_URL) is required')
+
+    from sqlalchemy import create_engine
+
+    logging.basicConfig(level=logging.INFO)
+    dashboard_ids = top_dashboards(create_engine(args.database_url), args.top, args.days)
+    warmer = CacheWarmer(
+        base_url=args.base_url,
+        username=args.username,
+        password=os.environ.get('SUPERSET_ADMIN_PASSWORD', 'admin'),
+        concurrency=args.concurrency,
+        timeout=args.timeout,
+    )
+    report = warmer.run(dashboard_ids)
+    print(json.dumps(report))
+    return 0 if not report['failed'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,179 @@
+"""Celery worker autoscaling from the backlog of the Redis broker queues.
+
+Celery's Redis transport keeps each queue as a list named after it (plus
+``<queue>\\x06\\x16<n>`` lists when task priorities are used), so the
+backlog is the sum of their lengths. ``QueueScaler`` turns it into a
+replica count:
+
+- desired: ``ceil(backlog / target_queue_length)`` within
+  ``min_workers``..``max_workers``
+- scale up at once; scale down only to the highest count desired during
+  the last ``cooldown_seconds``, so a burst arriving in waves does not
+  stop workers that are needed again a minute later
+
+On GKE the HPA does the same from the ``celery_queue_length`` external
+metric (see ``pulumi.config.scaling``); locally this module scales the
+compose worker service::
+
+    python -m superset_ext.worker_scaling --redis-url redis://localhost:6379/0 \\
+        --compose-file docker/docker-compose.yaml --min 1 --max 4 --target 10 --cooldown 300
+
+Workers get ``SIGTERM`` on scale-down and finish their current task first
+(compose ``stop_grace_period``); acknowledged-late tasks of a killed worker
+return to the queue.
+"""
+
+import argparse
+import logging
+import math
+import os
+import subprocess
+import sys
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Priority sub-queues of kombu's Redis transport: <queue>\x06\x16<priority>
+PRIORITY_SEPARATOR = '\x06\x16'
+PRIORITY_STEPS = (3, 6, 9)
+
+
+def queue_keys(queue: str) -> List[str]:
+    """Return the Redis lists holding the messages of one Celery queue."""
+    return [queue] + [f'{queue}{PRIORITY_SEPARATOR}{step}' for step in PRIORITY_STEPS]
+
+
+def queue_lengths(client, queues: Sequence[str]) -> Dict[str, int]:
+    """Return the number of waiting messages per queue, in one round trip."""
+    keys = {queue: queue_keys(queue) for queue in queues}
+    pipeline = client.pipeline(transaction=False)
+    for queue in queues:
+        for key in keys[queue]:
+            pipeline.llen(key)
+    counts = iter(pipeline.execute())
+    return {queue: sum(next(counts) for _ in keys[queue]) for queue in queues}
+
+
+class QueueScaler:
+    """Decide worker replicas from the queue backlog."""
+
+    def __init__(
+        self,
+        min_workers: int = 1,
+        max_workers: int = 4,
+        target_queue_length: int = 10,
+        cooldown_seconds: float = 300,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if min_workers > max_workers:
+            raise ValueError(f'min_workers ({min_workers}) cannot be greater than max_workers ({max_workers})')
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.target_queue_length = target_queue_length
+        self.cooldown_seconds = cooldown_seconds
+        self.clock = clock
+        self._history: Deque[Tuple[float, int]] = deque()
+
+    def desired(self, backlog: int) -> int:
+        """Return the replicas the backlog needs, within the bounds."""
+        return max(self.min_workers, min(self.max_workers, math.ceil(backlog / self.target_queue_length)))
+
+    def recommend(self, backlog: int, current: int) -> int:
+        """Return the replicas to run now, given the backlog and current replicas."""
+        now = self.clock()
+        desired = self.desired(backlog)
+        self._history.append((now, desired))
+        while self._history and self._history[0][0] < now - self.cooldown_seconds:
+            self._history.popleft()
+
+        if desired >= current:
+            return desired
+        # Scale down only as far as the last cooldown_seconds allow
+        return min(current, max(desired for _, desired in self._history))
+
+
+class ComposeWorkers:
+    """Worker replicas of a docker compose service."""
+
+    def __init__(self, compose_file: str, service: str = 'superset-worker', profile: Optional[str] = 'worker'):
+        self.command = ['docker', 'compose', '-f', compose_file]
+        if profile:
+            self.command += ['--profile', profile]
+        self.service = service
+
+    def current(self) -> int:
+        """Return the number of running containers of the service."""
+        result = subprocess.run(
+            self.command + ['ps', '--quiet', '--status', 'running', self.service],
+            check=True, capture_output=True, text=True,
+        )
+        return len(result.stdout.split())
+
+    def scale(self, replicas: int) -> None:
+        """Start or stop containers until ``replicas`` run; others are left alone."""
+        subprocess.run(
+            self.command + ['up', '--detach', '--no-recreate', '--no-deps',
+                            '--scale', f'{self.service}={replicas}', self.service],
+            check=True,
+        )
+
+
+def run(
+    scaler: QueueScaler,
+    read_backlog: Callable[[], Dict[str, int]],
+    workers,
+    interval: float = 15,
+    iterations: Optional[int] = None,
+    dry_run: bool = False,
+) -> None:
+    """Poll the queues every ``interval`` seconds and scale the workers."""
+    done = 0
+    while iterations is None or done < iterations:
+        lengths = read_backlog()
+        backlog = sum(lengths.values())
+        current = workers.current()
+        replicas = scaler.recommend(backlog, current)
+        logger.info(f'Backlog {backlog} {lengths}: {current} -> {replicas} workers')
+        if replicas != current and not dry_run:
+            workers.scale(replicas)
+        done += 1
+        if iterations is None or done < iterations:
+            time.sleep(interval)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point scaling the compose worker service."""
+    parser = argparse.ArgumentParser(description='Scale Celery workers from the broker queue backlog')
+    parser.add_argument('--redis-url', default=os.environ.get('REDIS_URL', 'redis://localhost:6379/0'))
+    parser.add_argument('--queues', default='celery', help='Comma-separated queues to count')
+    parser.add_argument('--compose-file', default='docker/docker-compose.yaml')
+    parser.add_argument('--service', default='superset-worker')
+    parser.add_argument('--min', type=int, default=1, help='Workers when the queues are empty')
+    parser.add_argument('--max', type=int, default=4)
+    parser.add_argument('--target', type=int, default=10, help='Waiting tasks per worker')
+    parser.add_argument('--cooldown', type=float, default=300, help='Seconds before scaling down')
+    parser.add_argument('--interval', type=float, default=15, help='Seconds between polls')
+    parser.add_argument('--once', action='store_true', help='Poll and scale once')
+    parser.add_argument('--dry-run', action='store_true', help='Only log the decisions')
+    args = parser.parse_args(argv)
+
+    import redis
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    client = redis.Redis.from_url(args.redis_url)
+    queues = [queue.strip() for queue in args.queues.split(',') if queue.strip()]
+    run(
+        QueueScaler(args.min, args.max, args.target, args.cooldown),
+        lambda: queue_lengths(client, queues),
+        ComposeWorkers(args.compose_file, args.service),
+        interval=args.interval,
+        iterations=1 if args.once else None,
+        dry_run=args.dry_run,
+    )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
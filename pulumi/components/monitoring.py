@@ -1,58 +1,97 @@
 """Monitoring stack component with Prometheus and Grafana."""
 
 import pulumi
-import pulumi_gcp as gcp
-from typing import Dict, Any
+import pulumi_kubernetes as k8s
+from typing import Dict, Any, Optional
+
+from ..config.alerting import ALERTMANAGER_PORT
+from ..config.gke import NAMESPACE
+from ..config.models import StackConfig
+from ..config.monitoring import GRAFANA_PORT, MONITORING_NAMESPACE, PROMETHEUS_PORT, monitoring_manifests
+from .superset import MANIFEST_ARGS, RESOURCE_TYPES
 
 
 class MonitoringStack:
-    """Deploy Prometheus and Grafana for monitoring."""
-    
+    """Deploy Prometheus, Alertmanager and Grafana for monitoring.
+
+    Creates the manifests of ``pulumi.config.monitoring.monitoring_manifests``
+    in the ``monitoring`` namespace through ``k8s_provider``: Prometheus
+    scraping the annotated pods of the Superset namespace (web, workers,
+    redis and postgres exporters) and the kubelets' cAdvisor, with the
+    recording rules and latency SLO alerts of ``pulumi.config.alerting``,
+    Alertmanager when ``monitoring.alerting`` is enabled, and Grafana with
+    the repository's dashboards. Deploy it before ``SupersetGKE`` and
+    pass ``prometheus`` on, so prometheus-adapter finds its Prometheus.
+    """
+
     def __init__(
         self,
         name: str,
         config: Dict[str, Any],
-        cluster: gcp.container.Cluster,
-        project_id: str,
-        labels: Dict[str, str] = None
+        k8s_provider: k8s.Provider,
+        labels: Dict[str, str] = None,
+        superset_namespace: str = NAMESPACE,
+        namespace: str = MONITORING_NAMESPACE
     ):
-        """Initialize monitoring stack."""
+        """Initialize monitoring stack.
+
+        ``config`` is the stack configuration (``StackConfig.dict()``);
+        ``monitoring.grafana.admin_password`` is required.
+        """
         self.name = name
         self.config = config
-        self.cluster = cluster
-        self.project_id = project_id
+        self.k8s_provider = k8s_provider
         self.labels = labels or {}
-        
+        self.superset_namespace = superset_namespace
+        self.namespace = namespace
+        self.prometheus: Optional[pulumi.Resource] = None
+
     def deploy(self) -> Dict[str, Any]:
-        """Deploy monitoring stack on GKE."""
-        # This is a simplified placeholder
-        # Full implementation would deploy:
-        # - Prometheus Operator
-        # - Prometheus instance with retention and storage
-        # - Grafana with dashboards
-        # - AlertManager for alerting
-        # - ServiceMonitors for Superset metrics
-        
+        """Deploy Prometheus, Alertmanager and Grafana on GKE."""
+        stack = StackConfig(**self.config)
+        password = stack.monitoring.grafana.get('admin_password')
+        if not password:
+            raise ValueError('monitoring.grafana.admin_password is required to deploy Grafana')
+
+        manifests = monitoring_manifests(
+            stack,
+            self.name,
+            grafana_password=pulumi.Output.secret(password),
+            superset_namespace=self.superset_namespace,
+            namespace=self.namespace,
+        )
+
+        namespace = None
+        resources = {}
+        for manifest in manifests:
+            kind = manifest['kind']
+            metadata = {**manifest['metadata'], 'labels': {**self.labels, **manifest['metadata'].get('labels', {})}}
+            args = {'metadata': metadata}
+            for key, arg in MANIFEST_ARGS:
+                if key in manifest:
+                    args[arg] = manifest[key]
+            if kind == 'Secret':
+                # Alertmanager's configuration carries the channels' keys
+                args['string_data'] = {key: pulumi.Output.secret(value) for key, value in args['string_data'].items()}
+
+            resource = RESOURCE_TYPES[kind](
+                f"{self.name}-{metadata['name']}-{kind.lower()}",
+                **args,
+                opts=pulumi.ResourceOptions(
+                    provider=self.k8s_provider,
+                    depends_on=[namespace] if namespace else [],
+                ),
+            )
+            resources[(kind, metadata['name'])] = resource
+            if kind == 'Namespace':
+                namespace = resource
+
+        self.prometheus = resources[('StatefulSet', 'prometheus')]
         outputs = {
-            'prometheus_url': pulumi.Output.concat('https://prometheus-', self.name, '.example.com'),
-            'grafana_url': pulumi.Output.concat('https://grafana-', self.name, '.example.com'),
-            'alertmanager_url': pulumi.Output.concat('https://alertmanager-', self.name, '.example.com'),
+            'prometheus_url': f'http://prometheus.{self.namespace}.svc:{PROMETHEUS_PORT}',
+            'grafana_url': f'http://grafana.{self.namespace}.svc:{GRAFANA_PORT}',
+            'grafana_port_forward': f'kubectl -n {self.namespace} port-forward svc/grafana {GRAFANA_PORT}',
         }
-        
-        # If alerting is enabled, set up notification channels
-        if self.config.get('alerting', {}).get('enabled', False):
-            self._setup_alerting(self.config['alerting'])
-        
+        if ('Deployment', 'alertmanager') in resources:
+            outputs['alertmanager_url'] = f'http://alertmanager.{self.namespace}.svc:{ALERTMANAGER_PORT}'
         return outputs
-    
-    def _setup_alerting(self, alerting_config: Dict[str, Any]):
-        """Set up alerting notification channels."""
-        channels = alerting_config.get('channels', [])
-        
-        for channel in channels:
-            if channel['type'] == 'email':
-                # Set up email notifications
-                pass
-            elif channel['type'] == 'slack':
-                # Set up Slack notifications
-                pass
\ No newline at end of file
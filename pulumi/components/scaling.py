@@ -0,0 +1,137 @@
+"""Scheduled scaling component for Superset services."""
+
+import base64
+import pulumi
+import pulumi_gcp as gcp
+import pulumi_kubernetes as k8s
+from typing import Dict, Any, List, Optional
+
+from ..config.models import AutoscalingConfig
+from ..config.scaling import cloud_run_scaling_request, hpa_patch_cronjob, hpa_patch_role
+
+
+class ScheduledScaling:
+    """Apply ``autoscaling.windows`` to a Cloud Run service or a GKE HPA.
+
+    Cloud Run: one Cloud Scheduler job per window updating the service's
+    scaling, as a service account that may update only that service. GKE:
+    one CronJob per window patching the HPA, with a service account that
+    may patch only that HPA. See ``pulumi.config.scaling``.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        config: Dict[str, Any],
+        project_id: str,
+        region: str,
+        service_name: Optional[pulumi.Input[str]] = None,
+        hpa_name: Optional[str] = None,
+        namespace: str = 'superset',
+        k8s_provider: Optional[k8s.Provider] = None,
+        labels: Dict[str, str] = None
+    ):
+        """Initialize scheduled scaling.
+
+        ``config`` is the ``autoscaling`` section. Pass ``service_name`` for
+        Cloud Run, or ``hpa_name`` (and ``k8s_provider``) for GKE.
+        """
+        self.name = name
+        self.config = config
+        self.project_id = project_id
+        self.region = region
+        self.service_name = service_name
+        self.hpa_name = hpa_name
+        self.namespace = namespace
+        self.k8s_provider = k8s_provider
+        self.labels = labels or {}
+
+    def deploy(self) -> Dict[str, Any]:
+        """Create one scheduler job or CronJob per window."""
+        autoscaling = AutoscalingConfig(**self.config)
+        if not autoscaling.windows:
+            return {'jobs': []}
+        if self.hpa_name:
+            return {'jobs': self._deploy_cronjobs(autoscaling)}
+        return {'jobs': self._deploy_scheduler_jobs(autoscaling)}
+
+    def _deploy_scheduler_jobs(self, autoscaling: AutoscalingConfig) -> List[pulumi.Output]:
+        service_account = gcp.serviceaccount.Account(
+            f'{self.name}-sa',
+            account_id=self.name,
+            display_name='Superset Scheduled Scaling',
+            project=self.project_id
+        )
+        # run.services.update on this service only
+        developer = gcp.cloudrun.IamMember(
+            f'{self.name}-developer',
+            service=self.service_name,
+            location=self.region,
+            project=self.project_id,
+            role='roles/run.developer',
+            member=pulumi.Output.concat('serviceAccount:', service_account.email)
+        )
+        jobs = []
+        for window in autoscaling.windows:
+            request = pulumi.Output.from_input(self.service_name).apply(
+                lambda service, window=window: cloud_run_scaling_request(
+                    self.project_id, self.region, service, window
+                )
+            )
+            job = gcp.cloudscheduler.Job(
+                f'{self.name}-{window.name}',
+                name=f'{self.name}-{window.name}',
+                project=self.project_id,
+                region=self.region,
+                description=f'Scale to {window.min_replicas}-{window.max_replicas} instances',
+                schedule=window.schedule,
+                time_zone=autoscaling.timezone,
+                http_target={
+                    'http_method': 'PATCH',
+                    'uri': request.apply(lambda r: r['uri']),
+                    'headers': request.apply(lambda r: r['headers']),
+                    'body': request.apply(lambda r: base64.b64encode(r['body'].encode()).decode()),
+                    'oauth_token': {
+                        'service_account_email': service_account.email,
+                    },
+                },
+                opts=pulumi.ResourceOptions(depends_on=[developer]),
+            )
+            jobs.append(job.name)
+        return jobs
+
+    def _deploy_cronjobs(self, autoscaling: AutoscalingConfig) -> List[pulumi.Output]:
+        opts = pulumi.ResourceOptions(provider=self.k8s_provider)
+        account = k8s.core.v1.ServiceAccount(
+            f'{self.name}-sa',
+            metadata={'name': self.name, 'namespace': self.namespace, 'labels': self.labels},
+            opts=opts,
+        )
+        role_manifest = hpa_patch_role(self.name, self.namespace, self.hpa_name)
+        role = k8s.rbac.v1.Role(
+            f'{self.name}-role',
+            metadata=role_manifest['metadata'],
+            rules=role_manifest['rules'],
+            opts=opts,
+        )
+        k8s.rbac.v1.RoleBinding(
+            f'{self.name}-binding',
+            metadata={'name': self.name, 'namespace': self.namespace},
+            role_ref={'apiGroup': 'rbac.authorization.k8s.io', 'kind': 'Role', 'name': self.name},
+            subjects=[{'kind': 'ServiceAccount', 'name': self.name, 'namespace': self.namespace}],
+            opts=opts,
+        )
+
+        jobs = []
+        for window in autoscaling.windows:
+            manifest = hpa_patch_cronjob(
+                self.name, self.namespace, self.hpa_name, window, autoscaling.timezone, self.name, self.labels
+            )
+            job = k8s.batch.v1.CronJob(
+                f'{self.name}-{window.name}',
+                metadata=manifest['metadata'],
+                spec=manifest['spec'],
+                opts=pulumi.ResourceOptions(provider=self.k8s_provider, depends_on=[account, role]),
+            )
+            jobs.append(job.metadata.name)
+        return jobs
@@ -2,6 +2,7 @@
 
 import pulumi
 import pulumi_gcp as gcp
+import pulumi_random
 from typing import Dict, Any
 import secrets
 import base64
@@ -31,6 +32,11 @@ class SecurityManager:
         secret_key = self._manage_secret_key()
         outputs['secret_key'] = secret_key
         
+        # Generate the admin password; jobs read it from Secret Manager
+        admin_password, admin_password_secret = self._manage_admin_password()
+        outputs['admin_password'] = admin_password
+        outputs['admin_password_secret'] = admin_password_secret
+        
         # Set up SSL if enabled
         ssl_config = self.config.get('ssl', {})
         if ssl_config.get('enabled', False):
@@ -71,6 +77,37 @@ class SecurityManager:
         # Return the secret value (marked as secret in Pulumi)
         return pulumi.Output.secret(secret_value)
     
+    def _manage_admin_password(self) -> tuple:
+        """Generate the Superset admin password and store it in Secret Manager.
+
+        The password lives in the stack state, so it stays the same across
+        deploys: bootstrap creates the admin once and never updates it.
+        """
+        password = pulumi_random.RandomPassword(
+            f'{self.name}-admin-password',
+            length=32,
+            special=False,
+        ).result
+        
+        secret = gcp.secretmanager.Secret(
+            f'{self.name}-admin-password',
+            secret_id=f'{self.name}-admin-password',
+            project=self.project_id,
+            labels=self.labels,
+            replication={
+                'automatic': {}
+            }
+        )
+        
+        gcp.secretmanager.SecretVersion(
+            f'{self.name}-admin-password-version',
+            secret=secret.id,
+            secret_data=password,
+        )
+        
+        # The value for the service's bootstrap, the secret ID for value sources
+        return password, secret.secret_id
+    
     def _setup_ssl(self, ssl_config: Dict[str, Any]) -> Dict[str, Any]:
         """Set up SSL certificates."""
         outputs = {}
@@ -3,10 +3,48 @@
 import pulumi
 import pulumi_gcp as gcp
 import pulumi_docker as docker
+import pulumi_kubernetes as k8s
 from typing import Dict, Any, Optional
 import json
 import base64
 
+from ..config.generator import CloudRunSettings
+from ..config.gke import (
+    NAMESPACE,
+    PROMETHEUS_URL,
+    needs_metrics_adapter,
+    prometheus_adapter_values,
+    superset_manifests,
+)
+from ..config.models import StackConfig
+
+# pulumi_kubernetes resource of each manifest kind of pulumi.config.gke
+RESOURCE_TYPES = {
+    'Namespace': k8s.core.v1.Namespace,
+    'ConfigMap': k8s.core.v1.ConfigMap,
+    'Secret': k8s.core.v1.Secret,
+    'Deployment': k8s.apps.v1.Deployment,
+    'Service': k8s.core.v1.Service,
+    'Ingress': k8s.networking.v1.Ingress,
+    'HorizontalPodAutoscaler': k8s.autoscaling.v2.HorizontalPodAutoscaler,
+    'PodDisruptionBudget': k8s.policy.v1.PodDisruptionBudget,
+    'ServiceAccount': k8s.core.v1.ServiceAccount,
+    'ClusterRole': k8s.rbac.v1.ClusterRole,
+    'ClusterRoleBinding': k8s.rbac.v1.ClusterRoleBinding,
+    'StatefulSet': k8s.apps.v1.StatefulSet,
+}
+
+# Top-level manifest fields and the resource arguments they are passed as
+MANIFEST_ARGS = (
+    ('spec', 'spec'),
+    ('data', 'data'),
+    ('stringData', 'string_data'),
+    ('type', 'type'),
+    ('rules', 'rules'),
+    ('roleRef', 'role_ref'),
+    ('subjects', 'subjects'),
+)
+
 
 class SupersetCloudRun:
     """Deploy Superset on Cloud Run (serverless)."""
@@ -18,13 +56,27 @@ class SupersetCloudRun:
         project_id: str,
         region: str,
         database_url: pulumi.Output[str],
+        cloud_run: CloudRunSettings,
         redis_url: Optional[pulumi.Output[str]] = None,
         secret_key: pulumi.Output[str] = None,
         network: Optional[gcp.compute.Network] = None,
         subnet: Optional[gcp.compute.Subnetwork] = None,
-        labels: Dict[str, str] = None
+        labels: Dict[str, str] = None,
+        gunicorn_args: Optional[str] = None,
+        image: Optional[pulumi.Input[str]] = None,
+        admin_password: Optional[pulumi.Output[str]] = None
     ):
-        """Initialize Cloud Run Superset deployment."""
+        """Initialize Cloud Run Superset deployment.
+
+        ``image`` is a prebaked image reference pinned by digest (see
+        ``SupersetImage``); it ships its own ``gunicorn.conf.py``. Without it
+        the stock ``apache/superset`` image runs with ``gunicorn_args``
+        passed as ``GUNICORN_CMD_ARGS`` (see
+        ``pulumi.config.generator.gunicorn_command_args``). ``cloud_run``
+        holds concurrency, CPU and probe settings (see
+        ``pulumi.config.generator.cloud_run_settings``). With
+        ``admin_password``, the image's bootstrap creates the ``admin`` user.
+        """
         self.name = name
         self.config = config
         self.project_id = project_id
@@ -35,6 +87,10 @@ class SupersetCloudRun:
         self.network = network
         self.subnet = subnet
         self.labels = labels or {}
+        self.gunicorn_args = gunicorn_args or '--bind=0.0.0.0:8088 --workers=2'
+        self.image = image
+        self.cloud_run = cloud_run
+        self.admin_password = admin_password
         
     def deploy(self) -> Dict[str, Any]:
         """Deploy Superset on Cloud Run."""
@@ -42,11 +98,21 @@ class SupersetCloudRun:
         version = self.config.get('version', '3.0.0')
         cpu = self.config.get('resources', {}).get('cpu', '1')
         memory = self.config.get('resources', {}).get('memory', '2Gi')
-        min_instances = 0 if self.name.endswith('-dev') else 1  # Scale to zero for dev
-        max_instances = self.config.get('autoscaling', {}).get('max_replicas', 100)
+        port = self.config.get('port', 8088)
         
-        # Build custom Superset image if needed
-        image = f'apache/superset:{version}'
+        # Prebaked image if the stack builds one, else the stock image
+        image = self.image or f'apache/superset:{version}'
+        envs = [
+            {'name': 'SUPERSET_SECRET_KEY', 'value': self.secret_key},
+            {'name': 'DATABASE_URL', 'value': self.database_url},
+            {'name': 'REDIS_URL', 'value': self.redis_url or ''},
+            {'name': 'SUPERSET_LOAD_EXAMPLES', 'value': 'no'},
+        ]
+        if not self.image:
+            envs.append({'name': 'GUNICORN_CMD_ARGS', 'value': self.gunicorn_args})
+        if self.admin_password:
+            envs.append({'name': 'SUPERSET_ADMIN_USERNAME', 'value': 'admin'})
+            envs.append({'name': 'SUPERSET_ADMIN_PASSWORD', 'value': self.admin_password})
         
         # Create Cloud Run service
         service = gcp.cloudrun.Service(
@@ -57,37 +123,26 @@ class SupersetCloudRun:
             template={
                 'metadata': {
                     'annotations': {
-                        'autoscaling.knative.dev/minScale': str(min_instances),
-                        'autoscaling.knative.dev/maxScale': str(max_instances),
+                        **self.cloud_run.annotations(),
                         'run.googleapis.com/execution-environment': 'gen2',
                     },
                     'labels': self.labels,
                 },
                 'spec': {
+                    'container_concurrency': self.cloud_run.container_concurrency,
                     'containers': [{
                         'image': image,
-                        'ports': [{'containerPort': 8088}],
+                        'ports': [{'containerPort': port}],
                         'resources': {
                             'limits': {
                                 'cpu': cpu,
                                 'memory': memory,
                             }
                         },
-                        'envs': [
-                            {'name': 'SUPERSET_SECRET_KEY', 'value': self.secret_key},
-                            {'name': 'DATABASE_URL', 'value': self.database_url},
-                            {'name': 'REDIS_URL', 'value': self.redis_url or ''},
-                            {'name': 'SUPERSET_LOAD_EXAMPLES', 'value': 'no'},
-                            {'name': 'GUNICORN_CMD_ARGS', 'value': '--bind=0.0.0.0:8088 --workers=2'},
-                        ],
-                        'livenessProbe': {
-                            'httpGet': {
-                                'path': '/health',
-                                'port': 8088,
-                            },
-                            'initialDelaySeconds': 30,
-                            'periodSeconds': 30,
-                        },
+                        'envs': envs,
+                        # Traffic and liveness checks wait for the start-up probe
+                        'startup_probe': self.cloud_run.startup_probe,
+                        'liveness_probe': self.cloud_run.liveness_probe,
                     }],
                     'serviceAccountName': f'{self.name}@{self.project_id}.iam.gserviceaccount.com',
                 },
@@ -113,45 +168,122 @@ class SupersetCloudRun:
 
 
 class SupersetGKE:
-    """Deploy Superset on Google Kubernetes Engine."""
+    """Deploy Superset on Google Kubernetes Engine.
+
+    Creates the manifests of ``pulumi.config.gke.superset_manifests``
+    (namespace, ConfigMap, Secret, web/worker/beat Deployments, Service,
+    Ingress, HPA and PodDisruptionBudgets) through ``k8s_provider``. With
+    a concurrency or latency autoscaling target, or queue-driven Celery
+    worker autoscaling, prometheus-adapter is installed to serve those
+    metrics to the HPAs.
+    """
     
     def __init__(
         self,
         name: str,
         config: Dict[str, Any],
-        cluster: gcp.container.Cluster,
+        k8s_provider: k8s.Provider,
         database_url: pulumi.Output[str],
         redis_url: pulumi.Output[str],
         secret_key: pulumi.Output[str],
         project_id: str,
-        labels: Dict[str, str] = None
+        labels: Dict[str, str] = None,
+        image: Optional[pulumi.Input[str]] = None,
+        namespace: str = NAMESPACE,
+        prometheus: Optional[pulumi.Resource] = None,
+        admin_password: Optional[pulumi.Output[str]] = None
     ):
-        """Initialize GKE Superset deployment."""
+        """Initialize GKE Superset deployment.
+
+        ``config`` is the stack configuration (``StackConfig.dict()``);
+        ``image`` a prebaked image (see ``SupersetImage``), else the stock
+        ``apache/superset`` image runs with the generated configuration
+        mounted from the ConfigMap. ``prometheus`` is the Prometheus of
+        ``MonitoringStack``, which prometheus-adapter is installed after.
+        With ``admin_password``, the image's bootstrap creates the ``admin``
+        user.
+        """
         self.name = name
         self.config = config
-        self.cluster = cluster
+        self.k8s_provider = k8s_provider
         self.database_url = database_url
         self.redis_url = redis_url
         self.secret_key = secret_key
         self.project_id = project_id
         self.labels = labels or {}
+        self.image = image
+        self.namespace = namespace
+        self.prometheus = prometheus
+        self.admin_password = admin_password
         
     def deploy(self) -> Dict[str, Any]:
         """Deploy Superset on GKE using Kubernetes resources."""
-        # This is a simplified version - in production, you'd use Helm charts
-        # or more sophisticated Kubernetes manifests
-        
-        # For now, return placeholder outputs
-        # Full implementation would create:
-        # - Namespace
-        # - ConfigMaps
-        # - Secrets
-        # - Deployments
-        # - Services
-        # - Ingress
-        # - HPA (Horizontal Pod Autoscaler)
+        stack = StackConfig(**self.config)
+
+        secret_values = {
+            'SUPERSET_SECRET_KEY': self.secret_key,
+            'DATABASE_URL': self.database_url,
+            'REDIS_URL': self.redis_url,
+        }
+        if self.admin_password:
+            secret_values['SUPERSET_ADMIN_USERNAME'] = 'admin'
+            secret_values['SUPERSET_ADMIN_PASSWORD'] = self.admin_password
+        manifests = superset_manifests(
+            stack,
+            self.name,
+            secret_values=secret_values,
+            image=self.image,
+            namespace=self.namespace,
+        )
+
+        # Serves the in-flight, p95 latency and queue length metrics of the HPAs
+        adapter = None
+        if needs_metrics_adapter(stack):
+            adapter = k8s.helm.v3.Release(
+                f'{self.name}-prometheus-adapter',
+                chart='prometheus-adapter',
+                repository_opts={'repo': 'https://prometheus-community.github.io/helm-charts'},
+                namespace='monitoring',
+                create_namespace=True,
+                values=prometheus_adapter_values(PROMETHEUS_URL),
+                opts=pulumi.ResourceOptions(
+                    provider=self.k8s_provider,
+                    depends_on=[self.prometheus] if self.prometheus else [],
+                ),
+            )
+
+        namespace = None
+        resources = {}
+        for manifest in manifests:
+            kind = manifest['kind']
+            metadata = {**manifest['metadata'], 'labels': {**self.labels, **manifest['metadata'].get('labels', {})}}
+            args = {'metadata': metadata}
+            for key, arg in MANIFEST_ARGS:
+                if key in manifest:
+                    args[arg] = manifest[key]
+
+            depends_on = [namespace] if namespace else []
+            if kind == 'HorizontalPodAutoscaler' and adapter:
+                depends_on.append(adapter)
+            resource = RESOURCE_TYPES[kind](
+                f"{metadata['name']}-{kind.lower()}",
+                **args,
+                opts=pulumi.ResourceOptions(provider=self.k8s_provider, depends_on=depends_on),
+            )
+            resources[(kind, metadata['name'])] = resource
+            if kind == 'Namespace':
+                namespace = resource
+
+        ingress = resources[('Ingress', f'{self.name}-web')]
+        hostname = stack.cloudflare.hostname if stack.cloudflare.enabled else None
+        url = (
+            pulumi.Output.from_input(f'https://{hostname}') if hostname
+            else ingress.status.apply(lambda status: f'http://{status.load_balancer.ingress[0].ip}')
+        )
         
         return {
-            'url': pulumi.Output.concat('https://superset-', self.name, '.example.com'),
-            'namespace': 'superset',
-        }
\ No newline at end of file
+            'url': url,
+            'namespace': self.namespace,
+            'service_name': f'{self.name}-web',
+            'hpa_name': f'{self.name}-web' if ('HorizontalPodAutoscaler', f'{self.name}-web') in resources else None,
+        }
@@ -0,0 +1,183 @@
+"""Cache warm-up component for the most viewed Superset dashboards."""
+
+import pulumi
+import pulumi_gcp as gcp
+from typing import Dict, Any, Optional
+
+
+class CacheWarmupJob:
+    """Cloud Run job that replays chart data requests of the top dashboards.
+
+    The job runs ``python -m superset_ext.warmup`` against the Superset
+    service, so it needs the stack's prebaked image, which ships
+    ``superset_ext`` on ``/app/pythonpath``. It logs in as the admin whose
+    password is the stack's ``admin_password_secret``; that secret and the
+    database URL are read from Secret Manager by the job's own service
+    account. With ``network``, the job egresses to private ranges through
+    the VPC to reach a private Cloud SQL instance.
+
+    Cloud Scheduler re-runs it on ``warmup.schedule``, which stands in for
+    Celery beat on stacks without a beat process; ``scripts/deploy.sh``
+    executes it once after ``pulumi up``.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        config: Dict[str, Any],
+        project_id: str,
+        region: str,
+        superset_url: pulumi.Output[str],
+        database_url: pulumi.Output[str],
+        admin_password_secret: Optional[pulumi.Input[str]],
+        image: Optional[pulumi.Input[str]],
+        network: Optional[gcp.compute.Network] = None,
+        subnet: Optional[gcp.compute.Subnetwork] = None,
+        labels: Dict[str, str] = None
+    ):
+        """Initialize cache warm-up job."""
+        if image is None:
+            raise ValueError('The cache warm-up job needs the prebaked image: enable superset.image')
+        if admin_password_secret is None:
+            raise ValueError('The cache warm-up job needs the Secret Manager secret of the admin password')
+        self.name = name
+        self.config = config
+        self.project_id = project_id
+        self.region = region
+        self.superset_url = superset_url
+        self.database_url = database_url
+        self.admin_password_secret = admin_password_secret
+        self.image = image
+        self.network = network
+        self.subnet = subnet
+        self.labels = labels or {}
+
+    def deploy(self) -> Dict[str, Any]:
+        """Deploy the warm-up job, its service account and its schedule."""
+        warmup = self.config.get('warmup', {})
+
+        service_account = gcp.serviceaccount.Account(
+            f'{self.name}-sa',
+            account_id=self.name,
+            display_name='Superset Cache Warm-up',
+            project=self.project_id
+        )
+        member = pulumi.Output.concat('serviceAccount:', service_account.email)
+
+        # The URL carries the metadata database password
+        database_url = gcp.secretmanager.Secret(
+            f'{self.name}-database-url',
+            secret_id=f'{self.name}-database-url',
+            project=self.project_id,
+            labels=self.labels,
+            replication={'automatic': {}}
+        )
+        gcp.secretmanager.SecretVersion(
+            f'{self.name}-database-url-version',
+            secret=database_url.id,
+            secret_data=self.database_url,
+        )
+
+        secret_accessors = [
+            gcp.secretmanager.SecretIamMember(
+                f'{self.name}-{key}-accessor',
+                secret_id=secret_id,
+                role='roles/secretmanager.secretAccessor',
+                member=member,
+                project=self.project_id
+            )
+            for key, secret_id in (
+                ('database-url', database_url.secret_id),
+                ('admin-password', self.admin_password_secret),
+            )
+        ]
+
+        task = {
+            'max_retries': 1,
+            'timeout': '1800s',
+            'service_account': service_account.email,
+            'containers': [{
+                'image': self.image,
+                'commands': ['python', '-m', 'superset_ext.warmup'],
+                'args': [
+                    '--top', str(warmup.get('top_dashboards', 10)),
+                    '--days', str(warmup.get('lookback_days', 7)),
+                    '--concurrency', str(warmup.get('concurrency', 4)),
+                ],
+                'envs': [
+                    {'name': 'PYTHONPATH', 'value': '/app/pythonpath'},
+                    {'name': 'SUPERSET_WARMUP_URL', 'value': self.superset_url},
+                    {
+                        'name': 'DATABASE_URL',
+                        'value_source': {'secret_key_ref': {'secret': database_url.secret_id, 'version': 'latest'}},
+                    },
+                    {
+                        'name': 'SUPERSET_ADMIN_PASSWORD',
+                        'value_source': {'secret_key_ref': {'secret': self.admin_password_secret, 'version': 'latest'}},
+                    },
+                ],
+                'resources': {
+                    'limits': {'cpu': '1', 'memory': '512Mi'},
+                },
+            }],
+        }
+        if self.network:
+            # Direct VPC egress: Cloud SQL's private IP is only reachable from the VPC
+            task['vpc_access'] = {
+                'network_interfaces': [{
+                    'network': self.network.id,
+                    'subnetwork': self.subnet.id if self.subnet else None,
+                }],
+                'egress': 'PRIVATE_RANGES_ONLY',
+            }
+
+        job = gcp.cloudrunv2.Job(
+            self.name,
+            name=self.name,
+            location=self.region,
+            project=self.project_id,
+            labels=self.labels,
+            template={
+                'task_count': 1,
+                'template': task,
+            },
+            opts=pulumi.ResourceOptions(depends_on=secret_accessors)
+        )
+
+        # Cloud Scheduler calls the run endpoint as the job's account (run.jobs.run)
+        invoker = gcp.cloudrunv2.JobIamMember(
+            f'{self.name}-invoker',
+            name=job.name,
+            location=self.region,
+            project=self.project_id,
+            role='roles/run.invoker',
+            member=member
+        )
+
+        # Re-run on a schedule, as Celery beat does for compose deployments
+        gcp.cloudscheduler.Job(
+            f'{self.name}-schedule',
+            name=f'{self.name}-schedule',
+            project=self.project_id,
+            region=self.region,
+            schedule=warmup.get('schedule', '*/30 * * * *'),
+            time_zone='Etc/UTC',
+            http_target={
+                'http_method': 'POST',
+                'uri': job.name.apply(
+                    lambda job_name: (
+                        f'https://run.googleapis.com/v2/projects/{self.project_id}'
+                        f'/locations/{self.region}/jobs/{job_name}:run'
+                    )
+                ),
+                'oauth_token': {
+                    'service_account_email': service_account.email,
+                },
+            },
+            opts=pulumi.ResourceOptions(depends_on=[invoker])
+        )
+
+        return {
+            'job_name': job.name,
+            'service_account': service_account.email,
+        }
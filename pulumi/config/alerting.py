@@ -0,0 +1,270 @@
+"""Prometheus recording rules, latency SLO alerts and their Alertmanager routing.
+
+``prometheus_rules`` is the ``rules.yml`` both Prometheus setups of
+``pulumi.config.monitoring`` load:
+
+- ``superset-recording``: request latency quantiles per endpoint, cache hit
+  ratio, metadata database pool saturation and Celery queue age, so
+  dashboards and alerts read cheap precomputed series
+- ``superset-slo``: the share of requests slower than
+  ``monitoring.alerting.latency_slo.threshold_seconds`` over each alert
+  window, and multi-window burn-rate alerts on it (fast burns page as
+  ``critical``, slow ones are ``warning``)
+
+The threshold is a bucket of ``superset_http_request_duration_seconds``,
+so the ratio is exact rather than interpolated. ``alertmanager_config``
+sends each severity to the channels that asked for it and ``rule_tests``
+is a promtool unit test of the alerts (``promtool test rules``).
+"""
+
+import re
+from typing import Any, Dict, List, Tuple
+
+import yaml
+
+from .models import StackConfig
+
+ALERTMANAGER_PORT = 9093
+
+RULES_FILE = 'rules.yml'
+
+REQUEST_HISTOGRAM = 'superset_http_request_duration_seconds'
+
+LATENCY_ALERT = 'SupersetLatencyBudgetBurn'
+
+# (long window, short window, share of the error budget spent over the long window, severity)
+# as in the multiwindow, multi-burn-rate alerts of the Google SRE workbook
+BURN_RATE_WINDOWS = (
+    ('1h', '5m', 0.02, 'critical'),
+    ('6h', '30m', 0.05, 'critical'),
+    ('1d', '2h', 0.10, 'warning'),
+    ('3d', '6h', 0.10, 'warning'),
+)
+
+# Time a burn must last before the alert fires, by severity
+ALERT_FOR = {'critical': '2m', 'warning': '15m'}
+
+_WINDOW_HOURS = {'m': 1 / 60, 'h': 1, 'd': 24}
+
+
+def _hours(window: str) -> float:
+    return int(window[:-1]) * _WINDOW_HOURS[window[-1]]
+
+
+def _record(record: str, expr: str) -> Dict[str, str]:
+    return {'record': record, 'expr': expr}
+
+
+def _quantile(q: float, histogram: str, by: str, matchers: str = '') -> str:
+    return f'histogram_quantile({q:g}, sum by (le, {by}) (rate({histogram}_bucket{matchers}[5m])))'
+
+
+def _endpoint_matchers(stack: StackConfig) -> str:
+    excluded = stack.monitoring.alerting.latency_slo.exclude_endpoints
+    if not excluded:
+        return ''
+    # Endpoints are URL rules; each exclusion is a prefix
+    pattern = '(' + '|'.join(re.escape(prefix) for prefix in excluded) + ').*'
+    return 'endpoint!~"' + pattern.replace('\\', '\\\\') + '"'
+
+
+def burn_rate_alerts(stack: StackConfig) -> List[Tuple[str, str, float, str]]:
+    """Return ``(long window, short window, burn rate, severity)`` of the latency SLO alerts.
+
+    A burn rate of 1 spends the budget in exactly ``window_days``; windows
+    longer than the SLO's own are left out.
+    """
+    slo_hours = stack.monitoring.alerting.latency_slo.window_days * 24
+    return [
+        (long, short, budget * slo_hours / _hours(long), severity)
+        for long, short, budget, severity in BURN_RATE_WINDOWS
+        if _hours(long) <= slo_hours
+    ]
+
+
+def recording_rules(stack: StackConfig) -> Dict[str, Any]:
+    """Return the ``superset-recording`` rule group."""
+    matchers = _endpoint_matchers(stack)
+    endpoints = '{' + matchers + '}' if matchers else ''
+    rules = [
+        _record(f'endpoint:{REQUEST_HISTOGRAM}:p{q}', _quantile(q / 100, REQUEST_HISTOGRAM, 'endpoint', endpoints))
+        for q in (50, 95, 99)
+    ]
+    rules += [
+        _record(
+            'cache:superset_cache_requests:hit_ratio_rate5m',
+            'sum by (cache) (rate(superset_cache_requests_total{result="hit"}[5m]))'
+            ' / sum by (cache) (rate(superset_cache_requests_total[5m]))',
+        ),
+        # Metadata database pool: waits for a connection, timeouts, server connections
+        _record('job:superset_db_pool_checkout_seconds:p95', _quantile(0.95, 'superset_db_pool_checkout_seconds', 'job')),
+        _record(
+            'job:superset_db_pool_checkouts_waited:ratio_rate5m',
+            '1 - sum by (job) (rate(superset_db_pool_checkout_seconds_bucket{le="0.001"}[5m]))'
+            ' / sum by (job) (rate(superset_db_pool_checkout_seconds_count[5m]))',
+        ),
+        _record(
+            'job:superset_db_pool_checkout_timeouts:rate5m',
+            'sum by (job) (rate(superset_db_pool_checkout_timeouts_total[5m]))',
+        ),
+        _record(
+            'job:pg_stat_database_numbackends:ratio_max_connections',
+            'sum by (job) (pg_stat_database_numbackends) / max by (job) (pg_settings_max_connections)',
+        ),
+        # Celery queue age: how long started tasks waited, and how long the backlog takes to drain
+        _record(
+            'queue:superset_celery_queue_wait_seconds:p95',
+            _quantile(0.95, 'superset_celery_queue_wait_seconds', 'queue'),
+        ),
+        _record(
+            'queue:celery_backlog:length',
+            'sum by (queue) (label_replace(redis_key_size, "queue", "$1", "key", "(.+)"))',
+        ),
+        _record(
+            'queue:celery_backlog_drain_seconds:estimate',
+            'queue:celery_backlog:length / sum by (queue) (rate(superset_celery_queue_wait_seconds_count[5m]))',
+        ),
+    ]
+    return {'name': 'superset-recording', 'rules': rules}
+
+
+def slo_rules(stack: StackConfig) -> Dict[str, Any]:
+    """Return the ``superset-slo`` rule group: slow request ratios and burn-rate alerts."""
+    slo = stack.monitoring.alerting.latency_slo
+    matchers = _endpoint_matchers(stack)
+    bucket = ','.join(filter(None, [f'le="{slo.threshold_seconds:g}"', matchers]))
+    count = '{' + matchers + '}' if matchers else ''
+    alerts = burn_rate_alerts(stack)
+    windows = sorted({window for long, short, _, _ in alerts for window in (long, short)}, key=_hours)
+    rules = [
+        _record(
+            f'slo:superset_http_latency:error_ratio_rate{window}',
+            f'1 - sum(rate({REQUEST_HISTOGRAM}_bucket{{{bucket}}}[{window}]))'
+            f' / sum(rate({REQUEST_HISTOGRAM}_count{count}[{window}]))',
+        )
+        for window in windows
+    ]
+
+    budget = 1 - slo.objective
+    for long, short, burn_rate, severity in alerts:
+        threshold = f'{burn_rate * budget:g}'
+        rules.append({
+            'alert': LATENCY_ALERT,
+            'expr': (
+                f'slo:superset_http_latency:error_ratio_rate{long} > {threshold}'
+                f' and slo:superset_http_latency:error_ratio_rate{short} > {threshold}'
+            ),
+            'for': ALERT_FOR[severity],
+            'labels': {'severity': severity, 'slo': 'superset-latency', 'long_window': long},
+            'annotations': {
+                'summary': f'Superset latency error budget burn rate above {burn_rate:g}',
+                'description': (
+                    f'Over the last {long} and {short}, more than {float(threshold):.2%} of requests took'
+                    f' longer than {slo.threshold_seconds:g}s; at this rate the {slo.window_days}-day budget of'
+                    f' {budget:.2%} slow requests runs out in {slo.window_days * 24 / burn_rate:g}h.'
+                ),
+            },
+        })
+    return {'name': 'superset-slo', 'rules': rules}
+
+
+def prometheus_rules(stack: StackConfig) -> Dict[str, Any]:
+    """Return the ``rules.yml`` of a stack; SLO rules only when its alerting is enabled."""
+    alerting = stack.monitoring.alerting
+    groups = [recording_rules(stack)]
+    if alerting.enabled and alerting.latency_slo.enabled:
+        groups.append(slo_rules(stack))
+    return {'groups': groups}
+
+
+def _receiver(stack: StackConfig, severity: str) -> Dict[str, Any]:
+    receiver: Dict[str, Any] = {'name': severity}
+    for channel in stack.monitoring.alerting.channels:
+        if severity not in channel.severities:
+            continue
+        if channel.type == 'email':
+            config = {'to': ', '.join(channel.addresses), 'send_resolved': True}
+            receiver.setdefault('email_configs', []).append(config)
+        elif channel.type == 'slack':
+            config = {'api_url': channel.webhook_url, 'send_resolved': True}
+            if channel.channel:
+                config['channel'] = channel.channel
+            receiver.setdefault('slack_configs', []).append(config)
+        else:
+            receiver.setdefault('pagerduty_configs', []).append({'routing_key': channel.integration_key})
+    return receiver
+
+
+def alertmanager_config(stack: StackConfig) -> Dict[str, Any]:
+    """Return the ``alertmanager.yml`` of a stack.
+
+    ``critical`` and ``warning`` alerts go to the receiver of that name,
+    made of the channels listing the severity; a receiver without channels
+    drops its alerts.
+    """
+    alerting = stack.monitoring.alerting
+    config: Dict[str, Any] = {}
+    if any(channel.type == 'email' for channel in alerting.channels):
+        config['global'] = {'smtp_smarthost': alerting.smtp_smarthost, 'smtp_from': alerting.smtp_from}
+    config['route'] = {
+        'receiver': 'warning',
+        'group_by': ['alertname', 'severity'],
+        'group_wait': '30s',
+        'group_interval': '5m',
+        'repeat_interval': '4h',
+        'routes': [{'matchers': ['severity="critical"'], 'receiver': 'critical', 'repeat_interval': '1h'}],
+    }
+    config['receivers'] = [_receiver(stack, 'critical'), _receiver(stack, 'warning')]
+    return config
+
+
+def rule_tests(stack: StackConfig, rule_file: str = RULES_FILE) -> Dict[str, Any]:
+    """Return a promtool unit test of the latency SLO alerts of ``rule_file``.
+
+    Half the requests slower than the threshold fire every burn-rate alert;
+    a tenth of the error budget fires none.
+    """
+    slo = stack.monitoring.alerting.latency_slo
+    alerts = slo_rules(stack)['rules']
+    series = f'{REQUEST_HISTOGRAM}_%s{{endpoint="/api/v1/chart/data",method="POST"%s}}'
+
+    def requests(per_minute: int, fast_per_minute: float) -> List[Dict[str, str]]:
+        return [
+            {'series': series % ('count', ''), 'values': f'0+{per_minute}x240'},
+            {'series': series % ('bucket', f',le="{slo.threshold_seconds:g}"'), 'values': f'0+{fast_per_minute:g}x240'},
+            {'series': series % ('bucket', ',le="+Inf"'), 'values': f'0+{per_minute}x240'},
+        ]
+
+    fired = [rule for rule in alerts if 'alert' in rule]
+    return {
+        'rule_files': [rule_file],
+        'evaluation_interval': '1m',
+        'tests': [
+            {
+                'interval': '1m',
+                'input_series': requests(600, 300),
+                'promql_expr_test': [{
+                    'expr': 'slo:superset_http_latency:error_ratio_rate5m',
+                    'eval_time': '70m',
+                    'exp_samples': [{'labels': 'slo:superset_http_latency:error_ratio_rate5m', 'value': 0.5}],
+                }],
+                'alert_rule_test': [{
+                    'eval_time': '70m',
+                    'alertname': LATENCY_ALERT,
+                    'exp_alerts': [
+                        {'exp_labels': rule['labels'], 'exp_annotations': rule['annotations']} for rule in fired
+                    ],
+                }],
+            },
+            {
+                'interval': '1m',
+                'input_series': requests(600, 600 - 60 * (1 - slo.objective)),
+                'alert_rule_test': [{'eval_time': '70m', 'alertname': LATENCY_ALERT, 'exp_alerts': []}],
+            },
+        ],
+    }
+
+
+def render_rules(config: Dict[str, Any]) -> str:
+    """Return a rules, promtool test or Alertmanager file as YAML."""
+    return yaml.safe_dump(config, sort_keys=False, width=1000)
@@ -0,0 +1,755 @@
+"""Render superset_config.py for a stack from system.yaml.
+
+The configuration is built from profile layers. Each layer looks at the
+``StackConfig`` and the sizing derived from its declared resources and
+returns a ``ConfigFragment``; fragments are merged in order, later
+settings overriding earlier ones, and rendered as one Python module.
+Performance-related values (gunicorn workers/threads, pool sizes, row
+limits, cache TTLs and byte budgets) are only computed in
+``derive_sizing``.
+"""
+
+import math
+import os
+import re
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from pydantic import BaseModel, Field
+
+from .models import StackConfig
+from .workers import WORKER_METRICS_PORT, task_routes, worker_pools
+
+MiB = 1024 * 1024
+GiB = 1024 * MiB
+
+# Memory kept for the gunicorn master, Python runtime and page cache
+BASE_MEMORY_BYTES = 256 * MiB
+
+# Resident memory of one Superset gunicorn worker under load
+WORKER_MEMORY_BYTES = 384 * MiB
+
+# In-memory size of one result row (DataFrame plus serialized payload)
+ROW_BYTES = 2 * 1024
+
+# Disk budget of the Redis-less profiles (Cloud Storage free tier)
+LOCAL_STORAGE_BYTES = 5 * GiB
+
+# Seconds a single-flight waiter polls before running the query itself,
+# far below the web timeout so a failed leader cannot stall its waiters
+CACHE_LOCK_WAIT = 5
+
+# Connections kept free for Celery, superset init and admin sessions
+RESERVED_CONNECTIONS = 10
+
+# Default max_connections of the metadata database by Cloud SQL tier
+MAX_CONNECTIONS = {
+    'db-f1-micro': 25,
+    'db-g1-small': 50,
+    'db-n1-standard-1': 100,
+    'db-n1-standard-2': 200,
+    'db-n1-standard-4': 400,
+}
+DEFAULT_MAX_CONNECTIONS = 100
+
+
+def parse_cpu(cpu: str) -> float:
+    """Return a ``ResourceConfig.cpu`` value in cores."""
+    return float(cpu)
+
+
+def parse_memory(memory: str) -> int:
+    """Return a ``ResourceConfig.memory`` value (``512Mi``, ``2Gi``) in bytes."""
+    match = re.match(r'^(\d+(?:\.\d+)?)(Mi|Gi)$', memory)
+    if not match:
+        raise ValueError(f"Invalid memory format: {memory}")
+    value, unit = float(match.group(1)), match.group(2)
+    return int(value * (GiB if unit == 'Gi' else MiB))
+
+
+class SupersetSizing(BaseModel):
+    """Runtime sizing derived from a stack's resources and backends."""
+    cpu: float
+    memory_bytes: int
+    workers: int = Field(..., description="gunicorn worker processes")
+    threads: int = Field(..., description="gunicorn threads per worker")
+    webserver_timeout: int = Field(..., description="gunicorn and cache lock timeout, seconds")
+    pool_size: Optional[int] = Field(None, description="SQLAlchemy pool size per worker")
+    max_overflow: Optional[int] = Field(None, description="SQLAlchemy overflow per worker")
+    row_limit: int
+    sql_max_row: int
+    display_max_row: int
+    cache_default_timeout: int
+    data_cache_timeout: int
+    l1_max_bytes: int = Field(..., description="In-process L1 cache per worker (Redis backends)")
+    preload_app: bool = True
+    max_requests: int = Field(..., description="Requests after which a worker is replaced")
+    max_requests_jitter: int
+    keepalive: int = Field(..., description="Seconds an idle client connection is kept open")
+
+
+def _round_down(value: float, step: int) -> int:
+    return int(value // step * step)
+
+
+def _clamp(value: float, low: float, high: float) -> float:
+    return max(low, min(high, value))
+
+
+def database_max_connections(stack: StackConfig) -> Optional[int]:
+    """Return the metadata database's connection limit, or None for SQLite."""
+    if stack.database.type == 'sqlite':
+        return None
+    return MAX_CONNECTIONS.get(stack.database.tier or '', DEFAULT_MAX_CONNECTIONS)
+
+
+def derive_sizing(stack: StackConfig) -> SupersetSizing:
+    """Derive workers, threads, pool sizes, row limits and cache settings.
+
+    - workers: ``2 x CPU + 1``, capped by how many ``WORKER_MEMORY_BYTES``
+      workers fit next to ``BASE_MEMORY_BYTES``
+    - threads: 4 per worker with a full core or more, 2 below that
+    - pool: one connection per thread plus overflow, shrunk so every worker
+      of every replica (``autoscaling.max_replicas`` when enabled) fits in
+      the database's ``max_connections`` minus ``RESERVED_CONNECTIONS``
+    - rows: one SQL Lab result may use a quarter of a worker's memory share;
+      charts get a tenth of that
+    - TTLs: the less CPU, the longer chart data is kept (1h at 4 CPUs,
+      up to 24h), as recomputing it costs more
+    - gunicorn: preloaded gthread workers (gevent would need psycopg2
+      patched for greenlets and pools sized per greenlet). Workers with
+      less than 512Mi are recycled after 500 requests, others after 1000,
+      with 10% jitter. Behind a GCP load balancer keep-alive outlasts its
+      600s idle timeout.
+    """
+    cpu = parse_cpu(stack.superset.resources.cpu)
+    memory = parse_memory(stack.superset.resources.memory)
+
+    workers = int(max(1, min(int(2 * cpu) + 1, (memory - BASE_MEMORY_BYTES) // WORKER_MEMORY_BYTES)))
+    threads = 4 if cpu >= 1 else 2
+    per_worker = max(WORKER_MEMORY_BYTES, (memory - BASE_MEMORY_BYTES) // workers)
+
+    pool_size = max_overflow = None
+    max_connections = database_max_connections(stack)
+    if max_connections is not None:
+        autoscaling = stack.superset.autoscaling
+        replicas = autoscaling.max_replicas if autoscaling and autoscaling.enabled else stack.superset.replicas
+        budget = max(2, (max_connections - RESERVED_CONNECTIONS) // (replicas * workers))
+        pool_size = min(threads, budget)
+        max_overflow = max(0, min(threads, budget - pool_size))
+
+    sql_max_row = int(_clamp(_round_down(per_worker / 4 / ROW_BYTES, 1000), 10000, 1000000))
+    row_limit = int(_clamp(_round_down(sql_max_row / 10, 1000), 1000, 50000))
+
+    max_requests = 500 if per_worker < 512 * MiB else 1000
+
+    return SupersetSizing(
+        cpu=cpu,
+        memory_bytes=memory,
+        workers=workers,
+        threads=threads,
+        webserver_timeout=120 if cpu >= 1 else 300,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        row_limit=row_limit,
+        sql_max_row=sql_max_row,
+        display_max_row=min(10000, sql_max_row),
+        cache_default_timeout=300,
+        data_cache_timeout=3600 * int(_clamp(math.ceil(4 / cpu), 1, 24)),
+        l1_max_bytes=_round_down(per_worker / 20, MiB),
+        max_requests=max_requests,
+        max_requests_jitter=max_requests // 10,
+        keepalive=620 if stack.environment == 'gcp' and stack.type == 'production' else 5,
+    )
+
+
+class Raw:
+    """A Python expression rendered as is instead of as a literal."""
+
+    def __init__(self, expression: str):
+        self.expression = expression
+
+    def __repr__(self) -> str:
+        return self.expression
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, Raw) and other.expression == self.expression
+
+
+class ConfigFragment(BaseModel):
+    """Settings, imports and statements contributed by one layer."""
+    title: str
+    imports: List[str] = Field(default_factory=list)
+    settings: Dict[str, Any] = Field(default_factory=dict)
+    code: List[str] = Field(default_factory=list, description="Statements run after the settings")
+
+
+Layer = Callable[[StackConfig, SupersetSizing], ConfigFragment]
+
+
+def _env(name: str, default: Any) -> Raw:
+    return Raw(f"os.environ.get({name!r}, {default!r})")
+
+
+def base_layer(stack: StackConfig, sizing: SupersetSizing) -> ConfigFragment:
+    """Secrets, CSRF, feature flags and the middleware list other layers extend."""
+    features = stack.features
+    reports = bool(features and (features.alerts or features.reports)) and stack.cache.type == 'redis'
+    return ConfigFragment(
+        title='CORE',
+        imports=['import os', 'from functools import partial'],
+        settings={
+            'SECRET_KEY': _env('SUPERSET_SECRET_KEY', 'CHANGE_ME_IN_PRODUCTION'),
+            'WTF_CSRF_ENABLED': True,
+            'WTF_CSRF_TIME_LIMIT': None,
+            'ENABLE_PROXY_FIX': True,
+            'LOG_LEVEL': _env('LOG_LEVEL', 'INFO'),
+            'FEATURE_FLAGS': {
+                'ENABLE_TEMPLATE_PROCESSING': True,
+                'ALERT_REPORTS': reports,
+            },
+            'ADDITIONAL_MIDDLEWARE': [],
+        },
+    )
+
+
+def sizing_layer(stack: StackConfig, sizing: SupersetSizing) -> ConfigFragment:
+    """Row limits and webserver settings derived from the declared resources."""
+    return ConfigFragment(
+        title=f'SIZING ({stack.superset.resources.cpu} CPU, {stack.superset.resources.memory})',
+        settings={
+            'SUPERSET_WEBSERVER_WORKERS': sizing.workers,
+            'SUPERSET_WEBSERVER_THREADS': sizing.threads,
+            'SUPERSET_WEBSERVER_TIMEOUT': sizing.webserver_timeout,
+            'ROW_LIMIT': sizing.row_limit,
+            'SQL_MAX_ROW': sizing.sql_max_row,
+            'DISPLAY_MAX_ROW': sizing.display_max_row,
+            'SQLLAB_TIMEOUT': sizing.webserver_timeout,
+        },
+    )
+
+
+def database_layer(stack: StackConfig, sizing: SupersetSizing) -> ConfigFragment:
+    """Metadata database URI, pool sizing and the slow query log."""
+    database = stack.database
+    if database.type == 'sqlite':
+        # The database file lives on the superset_home volume of the container
+        path = '/app/superset_home/' + os.path.basename(database.path or 'superset.db')
+        fragment = ConfigFragment(
+            title='METADATA DATABASE (SQLite)',
+            imports=[
+                'from sqlalchemy import event',
+                'from sqlalchemy.engine import Engine',
+                'from superset_ext.metrics import InstrumentedNullPool',
+            ],
+            settings={
+                'SQLALCHEMY_DATABASE_URI': _env('DATABASE_URL', f'sqlite:///{path}'),
+                'SQLALCHEMY_ENGINE_OPTIONS': {
+                    'connect_args': {'check_same_thread': False},
+                    'poolclass': Raw('InstrumentedNullPool'),
+                },
+            },
+            code=[
+                '@event.listens_for(Engine, "connect")\n'
+                'def set_sqlite_pragma(dbapi_connection, connection_record):\n'
+                '    cursor = dbapi_connection.cursor()\n'
+                '    cursor.execute("PRAGMA journal_mode=WAL")\n'
+                '    cursor.execute("PRAGMA synchronous=NORMAL")\n'
+                '    cursor.close()',
+            ],
+        )
+    else:
+        host = database.host or 'db'
+        fragment = ConfigFragment(
+            title='METADATA DATABASE (PostgreSQL)',
+            imports=['from superset_ext.metrics import InstrumentedQueuePool'],
+            settings={
+                'SQLALCHEMY_DATABASE_URI': _env(
+                    'DATABASE_URL', f'postgresql://{database.user}@{host}:{database.port}/{database.name}'
+                ),
+                'SQLALCHEMY_ENGINE_OPTIONS': {
+                    'poolclass': Raw('InstrumentedQueuePool'),
+                    'pool_size': sizing.pool_size,
+                    'max_overflow': sizing.max_overflow,
+                    'pool_timeout': 30,
+                    'pool_pre_ping': True,
+                    'pool_recycle': 3600,
+                },
+            },
+        )
+    fragment.imports.append('from superset_ext.slowlog import SlowQueryLog')
+    fragment.settings['SLOW_QUERY_LOG'] = Raw(
+        "SlowQueryLog(\n"
+        "    path='/app/superset_home/slowlog',\n"
+        "    threshold_seconds=float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 250)) / 1000,\n"
+        "    sample_rate=float(os.environ.get('SLOW_QUERY_SAMPLE_RATE', 1.0)),\n"
+        ")"
+    )
+    fragment.code.append('SLOW_QUERY_LOG.install(url=SQLALCHEMY_DATABASE_URI)')
+    return fragment
+
+
+def sqlite_cache_layer(stack: StackConfig, sizing: SupersetSizing) -> ConfigFragment:
+    """SQLite caches and disk results sharing ``LOCAL_STORAGE_BYTES``."""
+    budgets = {
+        'CACHE_CONFIG': ('metadata', LOCAL_STORAGE_BYTES // 80),
+        'DATA_CACHE_CONFIG': ('data', LOCAL_STORAGE_BYTES // 10),
+        'FILTER_STATE_CACHE_CONFIG': ('filter_state', LOCAL_STORAGE_BYTES // 160),
+        'EXPLORE_FORM_DATA_CACHE_CONFIG': ('explore_form_data', LOCAL_STORAGE_BYTES // 160),
+    }
+    timeouts = {
+        'CACHE_CONFIG': sizing.cache_default_timeout,
+        'DATA_CACHE_CONFIG': sizing.data_cache_timeout,
+        'FILTER_STATE_CACHE_CONFIG': 86400,
+        'EXPLORE_FORM_DATA_CACHE_CONFIG': 86400,
+    }
+    settings: Dict[str, Any] = {}
+    for key, (role, max_bytes) in budgets.items():
+        settings[key] = {
+            'CACHE_TYPE': 'superset_ext.cache.SQLiteCache',
+            'CACHE_DEFAULT_TIMEOUT': timeouts[key],
+            'CACHE_KEY_PREFIX': f'superset_{role}_',
+            'CACHE_SQLITE_PATH': f'/app/superset_home/cache/{role}.db',
+            'CACHE_MAX_BYTES': max_bytes,
+        }
+    settings['DATA_CACHE_CONFIG'].update({
+        'CACHE_TYPE': 'superset_ext.singleflight.SingleFlightCache',
+        'CACHE_BACKEND': 'superset_ext.cache.SQLiteCache',
+        'CACHE_LOCK_TIMEOUT': sizing.webserver_timeout,
+        'CACHE_LOCK_WAIT': CACHE_LOCK_WAIT,
+    })
+    settings['RESULTS_BACKEND'] = Raw(
+        f"DiskResultsBackend(path='/app/superset_home/results', "
+        f"max_bytes={LOCAL_STORAGE_BYTES - sum(max_bytes for _, max_bytes in budgets.values())})"
+    )
+    settings['CELERY_CONFIG'] = None
+    return ConfigFragment(
+        title='CACHES (SQLite, shared by all workers)',
+        imports=['from superset_ext.results import DiskResultsBackend'],
+        settings=settings,
+    )
+
+
+def redis_cache_layer(stack: StackConfig, sizing: SupersetSizing) -> ConfigFragment:
+    """Redis caches with a per-worker L1 sized from the worker's memory share."""
+    redis = Raw('REDIS_URL')
+    layered = {
+        'CACHE_TYPE': 'superset_ext.cache.LayeredRedisCache',
+        'CACHE_REDIS_URL': redis,
+        'CACHE_L1_KEYSPACE_EVENTS': True,
+    }
+    return ConfigFragment(
+        title='CACHES (Redis with in-process L1)',
+        settings={
+            'REDIS_URL': _env('REDIS_URL', f'redis://{stack.cache.host or "redis"}:{stack.cache.port}/0'),
+            'CACHE_CONFIG': {
+                **layered,
+                'CACHE_DEFAULT_TIMEOUT': sizing.cache_default_timeout,
+                'CACHE_KEY_PREFIX': 'superset_',
+                'CACHE_L1_MAX_BYTES': sizing.l1_max_bytes // 4,
+                'CACHE_L1_TIMEOUT': 30,
+            },
+            'DATA_CACHE_CONFIG': {
+                **layered,
+                'CACHE_TYPE': 'superset_ext.singleflight.SingleFlightCache',
+                'CACHE_BACKEND': 'superset_ext.cache.LayeredRedisCache',
+                'CACHE_LOCK_TIMEOUT': sizing.webserver_timeout,
+                'CACHE_LOCK_WAIT': CACHE_LOCK_WAIT,
+                'CACHE_DEFAULT_TIMEOUT': sizing.data_cache_timeout,
+                'CACHE_KEY_PREFIX': 'superset_data_',
+                'CACHE_L1_MAX_BYTES': sizing.l1_max_bytes,
+                'CACHE_L1_TIMEOUT': 60,
+            },
+            'FILTER_STATE_CACHE_CONFIG': {
+                'CACHE_TYPE': 'RedisCache',
+                'CACHE_DEFAULT_TIMEOUT': 86400,
+                'CACHE_KEY_PREFIX': 'superset_filter_',
+                'CACHE_REDIS_URL': redis,
+            },
+            'EXPLORE_FORM_DATA_CACHE_CONFIG': {
+                'CACHE_TYPE': 'RedisCache',
+                'CACHE_DEFAULT_TIMEOUT': 86400,
+                'CACHE_KEY_PREFIX': 'superset_explore_',
+                'CACHE_REDIS_URL': redis,
+            },
+            'RESULTS_BACKEND': {
+                'CACHE_TYPE': 'RedisCache',
+                'CACHE_KEY_PREFIX': 'superset_results_',
+                'CACHE_DEFAULT_TIMEOUT': 86400,
+                'CACHE_REDIS_URL': redis,
+            },
+        },
+    )
+
+
+def celery_layer(stack: StackConfig, sizing: SupersetSizing) -> ConfigFragment:
+    """Celery workers and beat on the Redis broker, including dashboard warm-up.
+
+    ``worker_prefetch_multiplier`` is the default pool's; pools of dedicated
+    queues pass their own on the command line.
+    """
+    warmup = stack.superset.warmup
+    # Celery's crontab has no '?' for "any day"
+    minute, hour, day_of_month, month_of_year, day_of_week = (
+        '*' if field == '?' else field for field in warmup.schedule.split()
+    )
+    prefetch = worker_pools(stack, sizing.workers)[0].prefetch_multiplier
+    routes = task_routes(stack)
+    beat = [
+        ("'reports.scheduler'", "'reports.scheduler'", "crontab(minute='*/15')"),
+        ("'reports.prune_log'", "'reports.prune_log'", "crontab(minute=0, hour=0)"),
+    ]
+    if warmup.enabled:
+        beat.append((
+            "'superset_ext.warm_up_dashboards'", "'superset_ext.warm_up_dashboards'",
+            f"crontab(minute={minute!r}, hour={hour!r}, day_of_month={day_of_month!r},"
+            f" month_of_year={month_of_year!r}, day_of_week={day_of_week!r})",
+        ))
+    schedule = ''.join(
+        f"        {name}: {{'task': {task}, 'schedule': {when}}},\n" for name, task, when in beat
+    )
+    return ConfigFragment(
+        title='CELERY',
+        imports=['from celery.schedules import crontab', 'from superset_ext.metrics import instrument_celery'],
+        settings={
+            'WARMUP_BASE_URL': _env('SUPERSET_WARMUP_URL', 'http://superset:8088'),
+            'WARMUP_TOP_DASHBOARDS': warmup.top_dashboards,
+            'WARMUP_LOOKBACK_DAYS': warmup.lookback_days,
+            'WARMUP_CONCURRENCY': warmup.concurrency,
+            # Served by superset_ext.tasks: queue waits, browser pool render timings
+            'WORKER_METRICS_PORT': WORKER_METRICS_PORT,
+        },
+        code=[
+            'class CeleryConfig:\n'
+            '    broker_url = REDIS_URL\n'
+            '    result_backend = REDIS_URL\n'
+            "    imports = ('superset.sql_lab', 'superset.tasks', 'superset.tasks.thumbnails', 'superset_ext.tasks')\n"
+            f'    worker_prefetch_multiplier = {prefetch}\n'
+            '    task_acks_late = True\n'
+            + (f'    task_routes = {format_value(routes, 4)}\n' if routes else '')
+            + '    beat_schedule = {\n'
+            f'{schedule}'
+            '    }\n'
+            '\n'
+            '\n'
+            'CELERY_CONFIG = CeleryConfig',
+            '# Stamps published tasks and times their wait in the queue\n'
+            'instrument_celery()',
+        ],
+    )
+
+
+def browser_pool_layer(stack: StackConfig, sizing: SupersetSizing) -> ConfigFragment:
+    """Headless Chrome shared by screenshots of a worker process (``superset_ext.browser_pool``)."""
+    browser_pool = stack.superset.celery.browser_pool
+    return ConfigFragment(
+        title='BROWSER POOL',
+        settings={
+            'WEBDRIVER_TYPE': 'chrome',
+            'WEBDRIVER_OPTION_ARGS': ['--headless', '--no-sandbox', '--disable-dev-shm-usage', '--disable-gpu'],
+            'BROWSER_POOL': {
+                'size': browser_pool.size,
+                'max_renders': browser_pool.max_renders,
+                'acquire_timeout': browser_pool.acquire_timeout_seconds,
+                'warm': browser_pool.warm,
+            },
+        },
+    )
+
+
+def admission_layer(stack: StackConfig, sizing: SupersetSizing) -> ConfigFragment:
+    """Token-bucket admission control from ``superset.admission``."""
+    routes = {
+        name: route.model_dump() for name, route in stack.superset.admission.routes.items()
+    }
+    return ConfigFragment(
+        title='ADMISSION CONTROL',
+        imports=['from superset_ext.admission import AdmissionMiddleware'],
+        settings={'ADMISSION_ROUTES': routes},
+        code=[
+            'ADDITIONAL_MIDDLEWARE.append(\n'
+            "    partial(AdmissionMiddleware, routes=ADMISSION_ROUTES, path='/app/superset_home/admission.db',\n"
+            f"            threads={sizing.threads})\n"
+            ')',
+        ],
+    )
+
+
+def observability_layer(stack: StackConfig, sizing: SupersetSizing) -> ConfigFragment:
+    """Prometheus exporter and stats logger, wrapping every other middleware."""
+    return ConfigFragment(
+        title='PROMETHEUS METRICS',
+        imports=['from superset_ext.metrics import MetricsMiddleware, PrometheusStatsLogger, instrument_app'],
+        settings={
+            'PROMETHEUS_EXPORTER_PATH': '/metrics',
+            'STATS_LOGGER': Raw('PrometheusStatsLogger()'),
+            'FLASK_APP_MUTATOR': Raw('instrument_app'),
+        },
+        code=['ADDITIONAL_MIDDLEWARE.append(partial(MetricsMiddleware, path=PROMETHEUS_EXPORTER_PATH))'],
+    )
+
+
+def profile_layers(stack: StackConfig) -> List[Layer]:
+    """Return the layers making up a stack's configuration, in merge order."""
+    layers: List[Layer] = [base_layer, sizing_layer, database_layer]
+    if stack.cache.type == 'redis':
+        layers += [redis_cache_layer, celery_layer]
+        if stack.superset.celery.browser_pool.enabled:
+            layers.append(browser_pool_layer)
+    else:
+        layers.append(sqlite_cache_layer)
+    if stack.superset.admission.enabled:
+        layers.append(admission_layer)
+    layers.append(observability_layer)
+    return layers
+
+
+def build_fragments(stack: StackConfig, layers: Optional[Sequence[Layer]] = None) -> List[ConfigFragment]:
+    """Run each layer (default ``profile_layers(stack)``) against the stack."""
+    sizing = derive_sizing(stack)
+    return [layer(stack, sizing) for layer in (layers or profile_layers(stack))]
+
+
+def build_settings(stack: StackConfig, layers: Optional[Sequence[Layer]] = None) -> Dict[str, Any]:
+    """Return the merged settings of every layer; later layers win."""
+    settings: Dict[str, Any] = {}
+    for fragment in build_fragments(stack, layers):
+        settings.update(fragment.settings)
+    return settings
+
+
+def format_value(value: Any, indent: int = 0) -> str:
+    """Render a setting as Python source, one dict item or list element per line."""
+    pad = ' ' * indent
+    if isinstance(value, dict) and value:
+        items = ''.join(
+            f"{pad}    {key!r}: {format_value(item, indent + 4)},\n" for key, item in value.items()
+        )
+        return '{\n' + items + pad + '}'
+    if isinstance(value, list) and value:
+        items = ''.join(f"{pad}    {format_value(item, indent + 4)},\n" for item in value)
+        return '[\n' + items + pad + ']'
+    return repr(value)
+
+
+def _merge_imports(fragments: Sequence[ConfigFragment]) -> List[str]:
+    """Return the fragments' import statements with one line per module."""
+    plain, names = [], {}
+    for fragment in fragments:
+        for statement in fragment.imports:
+            match = re.match(r'^from (\S+) import (.+)$', statement)
+            if match is None:
+                if statement not in plain:
+                    plain.append(statement)
+                continue
+            module = names.setdefault(match.group(1), [])
+            for name in match.group(2).split(','):
+                if name.strip() not in module:
+                    module.append(name.strip())
+    return sorted(plain) + [
+        f"from {module} import {', '.join(sorted(imported))}" for module, imported in sorted(names.items())
+    ]
+
+
+def render_superset_config(
+    stack: StackConfig,
+    stack_name: str,
+    layers: Optional[Sequence[Layer]] = None,
+) -> str:
+    """Render the ``superset_config.py`` module of a stack."""
+    sizing = derive_sizing(stack)
+    fragments = build_fragments(stack, layers)
+
+    # A setting is rendered in the last fragment that sets it
+    owner = {}
+    for index, fragment in enumerate(fragments):
+        for key in fragment.settings:
+            owner[key] = index
+
+    pool = (
+        f"pool {sizing.pool_size}+{sizing.max_overflow} per worker"
+        if sizing.pool_size is not None else 'no connection pool (SQLite)'
+    )
+    lines = [
+        '"""',
+        f'Superset configuration for stack {stack_name!r} ({stack.type}, {stack.environment})',
+        'Generated by scripts/generate_superset_config.py from system.yaml - do not edit.',
+        '',
+        f'{sizing.workers} gunicorn workers x {sizing.threads} threads, {pool},',
+        f'ROW_LIMIT {sizing.row_limit}, SQL_MAX_ROW {sizing.sql_max_row}, '
+        f'chart data cached for {sizing.data_cache_timeout // 3600}h.',
+        '"""',
+        '',
+    ]
+    lines += _merge_imports(fragments)
+    for index, fragment in enumerate(fragments):
+        body = [
+            f'{key} = {format_value(value)}'
+            for key, value in fragment.settings.items()
+            if owner[key] == index
+        ]
+        if not body and not fragment.code:
+            continue
+        lines += ['', '# ' + '=' * 77, f'# {fragment.title}', '# ' + '=' * 77, '']
+        lines += body
+        for statement in fragment.code:
+            lines += ['', statement]
+    return '\n'.join(lines) + '\n'
+
+
+def gunicorn_settings(sizing: SupersetSizing, port: int = 8088) -> Dict[str, Any]:
+    """Return gunicorn settings (``gunicorn.conf.py`` names) for a sizing."""
+    settings: Dict[str, Any] = {
+        'bind': f'0.0.0.0:{port}',
+        'workers': sizing.workers,
+        'worker_class': 'gthread',
+        'threads': sizing.threads,
+    }
+    settings.update({
+        'timeout': sizing.webserver_timeout,
+        'graceful_timeout': 30,
+        'keepalive': sizing.keepalive,
+        'preload_app': sizing.preload_app,
+        'max_requests': sizing.max_requests,
+        'max_requests_jitter': sizing.max_requests_jitter,
+        # Heartbeat files on tmpfs, not on the container's overlay filesystem
+        'worker_tmp_dir': '/dev/shm',
+    })
+    return settings
+
+
+def gunicorn_command_args(sizing: SupersetSizing, port: int = 8088) -> str:
+    """Return ``GUNICORN_CMD_ARGS`` for images without our ``gunicorn.conf.py``."""
+    flags = {'keepalive': 'keep-alive', 'preload_app': 'preload'}
+    args = []
+    for name, value in gunicorn_settings(sizing, port).items():
+        flag = '--' + flags.get(name, name.replace('_', '-'))
+        if value is True:
+            args.append(flag)
+        elif value is not False:
+            args.append(f'{flag}={value}')
+    return ' '.join(args)
+
+
+# superset_ext.gunicorn_hooks functions the rendered config re-exports
+GUNICORN_HOOKS = (
+    'child_exit',
+    'post_fork',
+    'post_request',
+    'post_worker_init',
+    'pre_fork',
+    'pre_request',
+    'when_ready',
+    'worker_abort',
+)
+
+
+def render_gunicorn_config(stack: StackConfig, stack_name: str) -> str:
+    """Render the ``gunicorn.conf.py`` of a stack, with the superset_ext hooks."""
+    sizing = derive_sizing(stack)
+    lines = [
+        '"""',
+        f'gunicorn configuration for stack {stack_name!r} ({stack.type}, {stack.environment})',
+        'Generated by scripts/generate_superset_config.py from system.yaml - do not edit.',
+        '"""',
+        '',
+        'from superset_ext.gunicorn_hooks import (',
+        *[f'    {name},' for name in sorted(GUNICORN_HOOKS + ('install_pid_guard',))],
+        ')',
+        '',
+        '# Server hooks gunicorn looks up by name in this module',
+        '__all__ = [',
+        *[f'    {hook!r},' for hook in GUNICORN_HOOKS],
+        ']',
+        '',
+        'wsgi_app = \'superset.app:create_app()\'',
+    ]
+    lines += [f'{name} = {value!r}' for name, value in gunicorn_settings(sizing, stack.superset.port).items()]
+    if sizing.preload_app:
+        lines += ['', '# Workers must not reuse database connections the master opened', 'install_pid_guard()']
+    return '\n'.join(lines) + '\n'
+
+
+# Cloud Run start-up probe interval; the probe gets this long to answer
+STARTUP_PROBE_PERIOD_SECONDS = 5
+
+# Requests per Cloud Run instance are capped by the platform
+MAX_CONTAINER_CONCURRENCY = 1000
+
+# Share of container concurrency at which Cloud Run starts more instances
+CLOUD_RUN_TARGET_UTILIZATION = 0.6
+
+
+class CloudRunSettings(BaseModel):
+    """Scaling and start-up settings of a Superset Cloud Run service."""
+    min_instances: int
+    max_instances: int
+    container_concurrency: int = Field(..., description="Requests routed to one instance at once")
+    cpu_boost: bool
+    cpu_always_allocated: bool
+    startup_probe: Dict[str, Any]
+    liveness_probe: Dict[str, Any]
+
+    def annotations(self) -> Dict[str, str]:
+        """Return the revision template annotations."""
+        return {
+            'autoscaling.knative.dev/minScale': str(self.min_instances),
+            'autoscaling.knative.dev/maxScale': str(self.max_instances),
+            'run.googleapis.com/startup-cpu-boost': str(self.cpu_boost).lower(),
+            'run.googleapis.com/cpu-throttling': str(not self.cpu_always_allocated).lower(),
+        }
+
+
+def cloud_run_settings(stack: StackConfig, service_name: str) -> CloudRunSettings:
+    """Derive Cloud Run scaling and start-up settings from ``superset.cold_start``.
+
+    - concurrency: what the gunicorn workers can serve at once (workers x
+      threads), so Cloud Run starts another instance instead of queueing
+      requests inside one. Cloud Run
+      scales out at ``CLOUD_RUN_TARGET_UTILIZATION`` of it, so with
+      ``autoscaling.target_concurrency`` the limit is lowered until that
+      point is the target
+    - start-up probe: HTTP on ``startup_probe_path``, which Superset only
+      answers once a worker has loaded the app, every
+      ``STARTUP_PROBE_PERIOD_SECONDS`` up to ``startup_timeout_seconds``;
+      the default TCP probe passes as soon as the gunicorn master binds
+    - liveness: starts after the start-up probe passed, so no initial delay
+    - CPU stays allocated between requests when there is no Celery, as
+      post-response work (cache writes, usage flushes) runs in the web
+      process
+    """
+    sizing = derive_sizing(stack)
+    cold_start = stack.superset.cold_start
+    autoscaling = stack.superset.autoscaling
+    port = stack.superset.port
+
+    concurrency = min(MAX_CONTAINER_CONCURRENCY, sizing.workers * sizing.threads)
+    if autoscaling and autoscaling.target_concurrency:
+        concurrency = min(concurrency, math.ceil(autoscaling.target_concurrency / CLOUD_RUN_TARGET_UTILIZATION))
+    concurrency = cold_start.container_concurrency or concurrency
+
+    min_instances = cold_start.min_instances
+    if min_instances is None:
+        min_instances = 0 if service_name.endswith('-dev') else 1
+    cpu_always_allocated = cold_start.cpu_always_allocated
+    if cpu_always_allocated is None:
+        cpu_always_allocated = stack.cache.type != 'redis'
+
+    return CloudRunSettings(
+        min_instances=min_instances,
+        max_instances=autoscaling.max_replicas if autoscaling else 100,
+        container_concurrency=concurrency,
+        cpu_boost=cold_start.cpu_boost,
+        cpu_always_allocated=cpu_always_allocated,
+        startup_probe={
+            'http_get': {'path': cold_start.startup_probe_path, 'port': port},
+            'period_seconds': STARTUP_PROBE_PERIOD_SECONDS,
+            'timeout_seconds': 3,
+            'failure_threshold': math.ceil(cold_start.startup_timeout_seconds / STARTUP_PROBE_PERIOD_SECONDS),
+        },
+        liveness_probe={
+            'http_get': {'path': '/health', 'port': port},
+            'period_seconds': 30,
+            'timeout_seconds': 5,
+            'failure_threshold': 3,
+        },
+    )
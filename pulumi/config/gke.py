@@ -0,0 +1,564 @@
+"""Kubernetes manifests of a Superset stack on GKE.
+
+``superset_manifests`` returns, in apply order, the namespace, the
+ConfigMap with the generated configuration, the Secret, the web, Celery
+worker (one per pool, see ``pulumi.config.workers``) and beat Deployments,
+the web Service and Ingress, the redis and postgres exporters (with
+``monitoring``; the redis one also for queue-driven worker autoscaling),
+the HorizontalPodAutoscalers and the PodDisruptionBudgets. They are plain
+dicts: ``SupersetGKE`` creates them with ``pulumi_kubernetes`` and
+``scripts/render_k8s_manifests.py`` writes them as YAML for a local kind
+cluster. Secret values may be Pulumi outputs. Prometheus and Grafana
+scraping them are in ``pulumi.config.monitoring``.
+
+Container resources come from ``superset.resources``: the allocation is
+the limit, ``resources.requests`` what is guaranteed (the limit when not
+set, which gives pods the Guaranteed QoS class and makes the HPA's CPU
+utilization relative to what a pod may actually use).
+"""
+
+import hashlib
+import json
+import math
+from typing import Any, Dict, List, Optional
+
+from .generator import STARTUP_PROBE_PERIOD_SECONDS, derive_sizing
+from .image import base_image, context_files
+from .models import ResourceConfig, StackConfig
+from .scaling import (
+    hpa_behavior,
+    hpa_metrics,
+    prometheus_adapter_rules,
+    worker_hpa_behavior,
+    worker_hpa_metrics,
+)
+from .workers import CELERY_APP, WORKER_METRICS_PORT, WorkerPool, worker_command, worker_pools
+
+NAMESPACE = 'superset'
+
+# Configuration files are mounted here when the stock image is used
+PYTHONPATH = '/app/pythonpath'
+
+WEB_COMMAND = 'python -m superset_ext.bootstrap && exec gunicorn --config /app/gunicorn.conf.py'
+
+# Beat only sends scheduled tasks
+BEAT_RESOURCES = {'requests': {'cpu': '50m', 'memory': '256Mi'}, 'limits': {'cpu': '500m', 'memory': '512Mi'}}
+
+# Celery workers finish their current task before exiting
+WORKER_TERMINATION_SECONDS = 300
+
+# In-cluster Prometheus queried by prometheus-adapter (see MonitoringStack)
+PROMETHEUS_URL = 'http://prometheus.monitoring.svc'
+
+REDIS_EXPORTER_IMAGE = 'oliver006/redis_exporter:v1.62.0'
+REDIS_EXPORTER_PORT = 9121
+
+POSTGRES_EXPORTER_IMAGE = 'quay.io/prometheuscommunity/postgres-exporter:v0.15.0'
+POSTGRES_EXPORTER_PORT = 9187
+
+EXPORTER_RESOURCES = {'requests': {'cpu': '10m', 'memory': '32Mi'}, 'limits': {'cpu': '100m', 'memory': '64Mi'}}
+
+
+def component_labels(name: str, component: str) -> Dict[str, str]:
+    """Return the selector labels of one component of a stack."""
+    return {
+        'app.kubernetes.io/name': 'superset',
+        'app.kubernetes.io/instance': name,
+        'app.kubernetes.io/component': component,
+    }
+
+
+def container_resources(resources: ResourceConfig) -> Dict[str, Dict[str, str]]:
+    """Return container requests and limits for ``superset.resources``."""
+    requests = resources.requests or resources
+    return {
+        'requests': {'cpu': requests.cpu, 'memory': requests.memory},
+        'limits': {'cpu': resources.cpu, 'memory': resources.memory},
+    }
+
+
+def config_files(stack: StackConfig, name: str) -> Dict[str, bytes]:
+    """Return the configuration files a stock-image pod needs under ``PYTHONPATH``."""
+    files = context_files(stack, name)
+    files.pop('Dockerfile')
+    files.pop('requirements-plugins.txt')
+    return files
+
+
+def _config_key(path: str) -> str:
+    # ConfigMap keys cannot contain slashes
+    return path.replace('/', '-')
+
+
+def config_map_manifest(stack: StackConfig, name: str, namespace: str = NAMESPACE) -> Dict[str, Any]:
+    """Return the ConfigMap holding the generated configuration and ``superset_ext``."""
+    return {
+        'apiVersion': 'v1',
+        'kind': 'ConfigMap',
+        'metadata': {'name': f'{name}-config', 'namespace': namespace, 'labels': component_labels(name, 'config')},
+        'data': {_config_key(path): content.decode() for path, content in config_files(stack, name).items()},
+    }
+
+
+def secret_manifest(name: str, values: Dict[str, Any], namespace: str = NAMESPACE) -> Dict[str, Any]:
+    """Return the Secret passed to every container as environment variables."""
+    return {
+        'apiVersion': 'v1',
+        'kind': 'Secret',
+        'metadata': {'name': f'{name}-env', 'namespace': namespace, 'labels': component_labels(name, 'config')},
+        'type': 'Opaque',
+        'stringData': values,
+    }
+
+
+def _pod_template(
+    stack: StackConfig,
+    name: str,
+    component: str,
+    image: Optional[str],
+    containers: List[Dict[str, Any]],
+    termination_seconds: int,
+) -> Dict[str, Any]:
+    """Pod template shared by the web, worker and beat Deployments.
+
+    Without a prebaked ``image`` the stock image gets the ConfigMap mounted;
+    its checksum is an annotation, so configuration changes roll the pods.
+    """
+    annotations: Dict[str, str] = {}
+    volumes: List[Dict[str, Any]] = [{'name': 'metrics', 'emptyDir': {'medium': 'Memory'}}]
+    mounts: List[Dict[str, Any]] = [{'name': 'metrics', 'mountPath': '/tmp/superset_metrics'}]
+    if not image:
+        files = config_files(stack, name)
+        annotations['checksum/config'] = hashlib.sha256(
+            json.dumps({path: content.decode() for path, content in files.items()}, sort_keys=True).encode()
+        ).hexdigest()
+        volumes.append({
+            'name': 'config',
+            'configMap': {
+                'name': f'{name}-config',
+                'items': [
+                    {'key': _config_key(path), 'path': path} for path in files if path != 'gunicorn.conf.py'
+                ],
+            },
+        })
+        volumes.append({
+            'name': 'gunicorn',
+            'configMap': {'name': f'{name}-config', 'items': [{'key': 'gunicorn.conf.py', 'path': 'gunicorn.conf.py'}]},
+        })
+        mounts += [
+            {'name': 'config', 'mountPath': PYTHONPATH, 'readOnly': True},
+            {'name': 'gunicorn', 'mountPath': '/app/gunicorn.conf.py', 'subPath': 'gunicorn.conf.py', 'readOnly': True},
+        ]
+
+    env = [
+        {'name': 'SUPERSET_CONFIG_PATH', 'value': f'{PYTHONPATH}/superset_config.py'},
+        {'name': 'SUPERSET_WARMUP_URL', 'value': f'http://{name}-web:{stack.superset.port}'},
+        {'name': 'PROMETHEUS_MULTIPROC_DIR', 'value': '/tmp/superset_metrics'},
+    ]
+    for container in containers:
+        container.setdefault('image', image or base_image(stack))
+        container['env'] = env + container.get('env', [])
+        container['envFrom'] = [{'secretRef': {'name': f'{name}-env'}}]
+        container['volumeMounts'] = mounts
+
+    return {
+        'metadata': {'labels': component_labels(name, component), 'annotations': annotations},
+        'spec': {
+            'containers': containers,
+            'volumes': volumes,
+            'terminationGracePeriodSeconds': termination_seconds,
+            # The superset user of the apache/superset image; runAsNonRoot
+            # alone cannot verify an image whose USER is a name
+            'securityContext': {'runAsNonRoot': True, 'runAsUser': 1000, 'runAsGroup': 1000, 'fsGroup': 1000},
+        },
+    }
+
+
+def web_deployment(stack: StackConfig, name: str, image: Optional[str], namespace: str = NAMESPACE) -> Dict[str, Any]:
+    """Return the gunicorn Deployment.
+
+    With autoscaling the HPA owns the replica count, so it is left out
+    here and updates do not reset it. New pods must pass the start-up probe
+    (``superset.cold_start``) before old ones are removed.
+    """
+    port = stack.superset.port
+    cold_start = stack.superset.cold_start
+    autoscaling = stack.superset.autoscaling
+    container = {
+        'name': 'superset',
+        'command': ['sh', '-c', WEB_COMMAND],
+        'ports': [{'name': 'http', 'containerPort': port}],
+        'resources': container_resources(stack.superset.resources),
+        'startupProbe': {
+            'httpGet': {'path': cold_start.startup_probe_path, 'port': 'http'},
+            'periodSeconds': STARTUP_PROBE_PERIOD_SECONDS,
+            'failureThreshold': math.ceil(cold_start.startup_timeout_seconds / STARTUP_PROBE_PERIOD_SECONDS),
+        },
+        'readinessProbe': {
+            'httpGet': {'path': '/health', 'port': 'http'},
+            'periodSeconds': 10,
+            'timeoutSeconds': 5,
+        },
+        'livenessProbe': {
+            'httpGet': {'path': '/health', 'port': 'http'},
+            'periodSeconds': 30,
+            'timeoutSeconds': 5,
+            'failureThreshold': 3,
+        },
+        # Let the load balancer stop routing before gunicorn stops accepting
+        'lifecycle': {'preStop': {'exec': {'command': ['sleep', '10']}}},
+    }
+    template = _pod_template(stack, name, 'web', image, [container], derive_sizing(stack).webserver_timeout)
+    template['metadata']['annotations'].update({
+        'prometheus.io/scrape': 'true',
+        'prometheus.io/port': str(port),
+        'prometheus.io/path': '/metrics',
+    })
+    template['spec']['topologySpreadConstraints'] = [{
+        'maxSkew': 1,
+        'topologyKey': 'topology.kubernetes.io/zone',
+        'whenUnsatisfiable': 'ScheduleAnyway',
+        'labelSelector': {'matchLabels': component_labels(name, 'web')},
+    }]
+
+    spec: Dict[str, Any] = {
+        'selector': {'matchLabels': component_labels(name, 'web')},
+        'strategy': {'type': 'RollingUpdate', 'rollingUpdate': {'maxSurge': '25%', 'maxUnavailable': 0}},
+        'template': template,
+    }
+    if not (autoscaling and autoscaling.enabled):
+        spec['replicas'] = stack.superset.replicas
+    return {
+        'apiVersion': 'apps/v1',
+        'kind': 'Deployment',
+        'metadata': {'name': f'{name}-web', 'namespace': namespace, 'labels': component_labels(name, 'web')},
+        'spec': spec,
+    }
+
+
+def worker_deployment(
+    stack: StackConfig,
+    name: str,
+    image: Optional[str],
+    pool: WorkerPool,
+    namespace: str = NAMESPACE,
+) -> Dict[str, Any]:
+    """Return the Celery worker Deployment of one pool.
+
+    When the pool is autoscaled its HPA owns the replica count.
+    """
+    ping = f'celery --app={CELERY_APP} inspect ping --destination {pool.queue}@$HOSTNAME'
+    container = {
+        'name': 'worker',
+        'command': worker_command(pool),
+        'resources': container_resources(pool.resources),
+        'livenessProbe': {
+            'exec': {'command': ['sh', '-c', ping]},
+            'periodSeconds': 60,
+            'timeoutSeconds': 20,
+            'failureThreshold': 3,
+        },
+    }
+    template = _pod_template(stack, name, pool.component, image, [container], WORKER_TERMINATION_SECONDS)
+    # superset_ext.tasks serves queue waits and the browser pool's render timings
+    container['ports'] = [{'name': 'metrics', 'containerPort': WORKER_METRICS_PORT}]
+    template['metadata']['annotations'].update({
+        'prometheus.io/scrape': 'true',
+        'prometheus.io/port': str(WORKER_METRICS_PORT),
+        'prometheus.io/path': '/metrics',
+    })
+    spec: Dict[str, Any] = {
+        'selector': {'matchLabels': component_labels(name, pool.component)},
+        'template': template,
+    }
+    if not pool.autoscaled_queues:
+        spec['replicas'] = pool.replicas
+    return {
+        'apiVersion': 'apps/v1',
+        'kind': 'Deployment',
+        'metadata': {
+            'name': f'{name}-{pool.component}',
+            'namespace': namespace,
+            'labels': component_labels(name, pool.component),
+        },
+        'spec': spec,
+    }
+
+
+def beat_deployment(stack: StackConfig, name: str, image: Optional[str], namespace: str = NAMESPACE) -> Dict[str, Any]:
+    """Return the Celery beat Deployment: one replica, never two during a rollout."""
+    container = {
+        'name': 'beat',
+        'command': [
+            'celery', f'--app={CELERY_APP}', 'beat', '--loglevel=INFO',
+            '--pidfile=/tmp/celerybeat.pid', '--schedule=/tmp/celerybeat-schedule',
+        ],
+        'resources': BEAT_RESOURCES,
+    }
+    return {
+        'apiVersion': 'apps/v1',
+        'kind': 'Deployment',
+        'metadata': {'name': f'{name}-beat', 'namespace': namespace, 'labels': component_labels(name, 'beat')},
+        'spec': {
+            'replicas': 1,
+            'strategy': {'type': 'Recreate'},
+            'selector': {'matchLabels': component_labels(name, 'beat')},
+            'template': _pod_template(stack, name, 'beat', image, [container], 30),
+        },
+    }
+
+
+def web_service(stack: StackConfig, name: str, namespace: str = NAMESPACE) -> Dict[str, Any]:
+    """Return the web Service, load balanced through network endpoint groups."""
+    return {
+        'apiVersion': 'v1',
+        'kind': 'Service',
+        'metadata': {
+            'name': f'{name}-web',
+            'namespace': namespace,
+            'labels': component_labels(name, 'web'),
+            'annotations': {'cloud.google.com/neg': '{"ingress": true}'},
+        },
+        'spec': {
+            'type': 'ClusterIP',
+            'selector': component_labels(name, 'web'),
+            'ports': [{'name': 'http', 'port': stack.superset.port, 'targetPort': 'http'}],
+        },
+    }
+
+
+def web_ingress(stack: StackConfig, name: str, namespace: str = NAMESPACE) -> Dict[str, Any]:
+    """Return the GCE Ingress of the web Service.
+
+    The load balancer health check follows the readiness probe. With a
+    Cloudflare hostname the rule is limited to it.
+    """
+    rule: Dict[str, Any] = {'http': {'paths': [{
+        'path': '/',
+        'pathType': 'Prefix',
+        'backend': {'service': {'name': f'{name}-web', 'port': {'name': 'http'}}},
+    }]}}
+    if stack.cloudflare.enabled and stack.cloudflare.hostname:
+        rule['host'] = stack.cloudflare.hostname
+    return {
+        'apiVersion': 'networking.k8s.io/v1',
+        'kind': 'Ingress',
+        'metadata': {
+            'name': f'{name}-web',
+            'namespace': namespace,
+            'labels': component_labels(name, 'web'),
+            'annotations': {'kubernetes.io/ingress.class': 'gce'},
+        },
+        'spec': {'rules': [rule]},
+    }
+
+
+def web_hpa(stack: StackConfig, name: str, namespace: str = NAMESPACE) -> Optional[Dict[str, Any]]:
+    """Return the web HPA, or None without ``autoscaling.enabled``.
+
+    Metrics and behavior are those of ``pulumi.config.scaling``; scaling
+    windows patch its bounds.
+    """
+    autoscaling = stack.superset.autoscaling
+    if not (autoscaling and autoscaling.enabled):
+        return None
+    return {
+        'apiVersion': 'autoscaling/v2',
+        'kind': 'HorizontalPodAutoscaler',
+        'metadata': {'name': f'{name}-web', 'namespace': namespace, 'labels': component_labels(name, 'web')},
+        'spec': {
+            'scaleTargetRef': {'apiVersion': 'apps/v1', 'kind': 'Deployment', 'name': f'{name}-web'},
+            'minReplicas': autoscaling.min_replicas,
+            'maxReplicas': autoscaling.max_replicas,
+            'metrics': hpa_metrics(autoscaling),
+            'behavior': hpa_behavior(autoscaling),
+        },
+    }
+
+
+def worker_hpa(
+    stack: StackConfig,
+    name: str,
+    pool: WorkerPool,
+    namespace: str = NAMESPACE,
+) -> Optional[Dict[str, Any]]:
+    """Return the HPA of a worker pool on its queues' backlog, or None when not autoscaled.
+
+    An HPA keeps at least one replica, so ``min_workers`` 0 runs one.
+    """
+    if not pool.autoscaled_queues:
+        return None
+    autoscaling = stack.superset.celery.autoscaling.model_copy(update={'queues': pool.autoscaled_queues})
+    deployment = f'{name}-{pool.component}'
+    return {
+        'apiVersion': 'autoscaling/v2',
+        'kind': 'HorizontalPodAutoscaler',
+        'metadata': {'name': deployment, 'namespace': namespace, 'labels': component_labels(name, pool.component)},
+        'spec': {
+            'scaleTargetRef': {'apiVersion': 'apps/v1', 'kind': 'Deployment', 'name': deployment},
+            'minReplicas': max(1, autoscaling.min_workers),
+            'maxReplicas': autoscaling.max_workers,
+            'metrics': worker_hpa_metrics(autoscaling),
+            'behavior': worker_hpa_behavior(autoscaling),
+        },
+    }
+
+
+def _exporter_deployment(
+    name: str,
+    component: str,
+    image: str,
+    port: int,
+    args: List[str],
+    env: List[Dict[str, Any]],
+    namespace: str,
+) -> Dict[str, Any]:
+    """Deployment of one Prometheus exporter, scraped through its annotations."""
+    labels = component_labels(name, component)
+    container: Dict[str, Any] = {
+        'name': component,
+        'image': image,
+        'env': env,
+        'ports': [{'name': 'metrics', 'containerPort': port}],
+        'resources': EXPORTER_RESOURCES,
+    }
+    if args:
+        container['args'] = args
+    return {
+        'apiVersion': 'apps/v1',
+        'kind': 'Deployment',
+        'metadata': {'name': f'{name}-{component}', 'namespace': namespace, 'labels': labels},
+        'spec': {
+            'replicas': 1,
+            'selector': {'matchLabels': labels},
+            'template': {
+                'metadata': {
+                    'labels': labels,
+                    'annotations': {
+                        'prometheus.io/scrape': 'true',
+                        'prometheus.io/port': str(port),
+                    },
+                },
+                'spec': {'containers': [container]},
+            },
+        },
+    }
+
+
+def _secret_env(name: str, variable: str, key: str) -> Dict[str, Any]:
+    return {'name': variable, 'valueFrom': {'secretKeyRef': {'name': f'{name}-env', 'key': key}}}
+
+
+def redis_exporter_deployment(stack: StackConfig, name: str, namespace: str = NAMESPACE) -> Dict[str, Any]:
+    """Return a redis_exporter reporting Redis saturation and the Celery queue lengths.
+
+    The lengths of the queues the worker pools consume, and of the
+    autoscaled queues, are ``redis_key_size`` series.
+    """
+    queues = [pool.queue for pool in worker_pools(stack, derive_sizing(stack).workers)]
+    queues += [queue for queue in stack.superset.celery.autoscaling.queues if queue not in queues]
+    return _exporter_deployment(
+        name, 'redis-exporter', REDIS_EXPORTER_IMAGE, REDIS_EXPORTER_PORT,
+        args=[f"--check-single-keys={','.join(f'db0={queue}' for queue in queues)}"],
+        env=[_secret_env(name, 'REDIS_ADDR', 'REDIS_URL')],
+        namespace=namespace,
+    )
+
+
+def postgres_exporter_deployment(name: str, namespace: str = NAMESPACE) -> Dict[str, Any]:
+    """Return a postgres_exporter reporting connections, locks and activity of the metadata database."""
+    return _exporter_deployment(
+        name, 'postgres-exporter', POSTGRES_EXPORTER_IMAGE, POSTGRES_EXPORTER_PORT,
+        args=[],
+        env=[_secret_env(name, 'DATA_SOURCE_NAME', 'DATABASE_URL')],
+        namespace=namespace,
+    )
+
+
+def needs_metrics_adapter(stack: StackConfig) -> bool:
+    """Return whether an HPA of the stack uses custom or external metrics."""
+    autoscaling = stack.superset.autoscaling
+    web = bool(autoscaling and autoscaling.enabled and (
+        autoscaling.target_concurrency or autoscaling.target_latency_p95_ms
+    ))
+    return web or stack.superset.celery.autoscaling.enabled
+
+
+def pod_disruption_budget(name: str, component: str, namespace: str = NAMESPACE) -> Dict[str, Any]:
+    """Return a PodDisruptionBudget letting node drains evict one pod at a time."""
+    return {
+        'apiVersion': 'policy/v1',
+        'kind': 'PodDisruptionBudget',
+        'metadata': {'name': f'{name}-{component}', 'namespace': namespace, 'labels': component_labels(name, component)},
+        'spec': {'maxUnavailable': 1, 'selector': {'matchLabels': component_labels(name, component)}},
+    }
+
+
+def superset_manifests(
+    stack: StackConfig,
+    name: str,
+    secret_values: Dict[str, Any],
+    image: Optional[str] = None,
+    namespace: str = NAMESPACE,
+) -> List[Dict[str, Any]]:
+    """Return every manifest of the stack's Superset, in apply order.
+
+    ``secret_values`` are the Secret's environment variables
+    (``SUPERSET_SECRET_KEY``, ``DATABASE_URL``, ``REDIS_URL``); ``image``
+    a prebaked image, else ``apache/superset`` with the ConfigMap mounted.
+    """
+    pools = worker_pools(stack, derive_sizing(stack).workers)
+    manifests = [
+        {'apiVersion': 'v1', 'kind': 'Namespace', 'metadata': {'name': namespace}},
+        config_map_manifest(stack, name, namespace),
+        secret_manifest(name, secret_values, namespace),
+        web_deployment(stack, name, image, namespace),
+    ]
+    manifests += [worker_deployment(stack, name, image, pool, namespace) for pool in pools]
+    manifests += [
+        beat_deployment(stack, name, image, namespace),
+        web_service(stack, name, namespace),
+        web_ingress(stack, name, namespace),
+    ]
+    # The queue lengths also drive the worker HPAs
+    if stack.cache.type == 'redis' and (stack.monitoring.enabled or stack.superset.celery.autoscaling.enabled):
+        manifests.append(redis_exporter_deployment(stack, name, namespace))
+    if stack.monitoring.enabled and stack.database.type != 'sqlite':
+        manifests.append(postgres_exporter_deployment(name, namespace))
+    hpas = [web_hpa(stack, name, namespace)] + [worker_hpa(stack, name, pool, namespace) for pool in pools]
+    manifests += [hpa for hpa in hpas if hpa]
+    manifests.append(pod_disruption_budget(name, 'web', namespace))
+    manifests += [pod_disruption_budget(name, pool.component, namespace) for pool in pools]
+    return manifests
+
+
+def prometheus_adapter_values(prometheus_url: str) -> Dict[str, Any]:
+    """Return prometheus-adapter Helm values serving the HPA's custom metrics."""
+    rules = prometheus_adapter_rules()
+    return {
+        'prometheus': {'url': prometheus_url, 'port': 9090},
+        'rules': {'default': False, 'custom': rules['rules'], 'external': rules['externalRules']},
+    }
+
+
+def kubeconfig(cluster_name: str, endpoint: str, ca_certificate: str) -> str:
+    """Return a kubeconfig for a GKE cluster, authenticated by gke-gcloud-auth-plugin."""
+    return json.dumps({
+        'apiVersion': 'v1',
+        'kind': 'Config',
+        'clusters': [{
+            'name': cluster_name,
+            'cluster': {'server': f'https://{endpoint}', 'certificate-authority-data': ca_certificate},
+        }],
+        'contexts': [{'name': cluster_name, 'context': {'cluster': cluster_name, 'user': cluster_name}}],
+        'current-context': cluster_name,
+        'users': [{
+            'name': cluster_name,
+            'user': {'exec': {
+                'apiVersion': 'client.authentication.k8s.io/v1beta1',
+                'command': 'gke-gcloud-auth-plugin',
+                'provideClusterInfo': True,
+                'installHint': 'gcloud components install gke-gcloud-auth-plugin',
+            }},
+        }],
+    })
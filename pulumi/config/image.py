@@ -0,0 +1,154 @@
+"""Build context of the prebaked Superset image of a stack.
+
+The image adds the stack's plugins, ``superset_ext``, the generated
+``superset_config.py`` and ``gunicorn.conf.py`` and precompiled bytecode to
+``apache/superset:<version>``, so containers start without installing or
+compiling anything. Layers go from least to most frequently changed
+(plugins, then ``superset_ext``, then the configuration), so editing
+``system.yaml`` only rebuilds the last small layers. The image is tagged
+with a hash of the whole build context: an unchanged stack maps to the same
+tag and is not rebuilt or pushed again.
+"""
+
+import hashlib
+from pathlib import Path
+from typing import Dict, List
+
+from .generator import render_gunicorn_config, render_superset_config
+from .models import StackConfig
+
+# Version of the compose stacks when system.yaml does not set one
+DEFAULT_SUPERSET_VERSION = '5.0.0'
+
+SUPERSET_EXT_DIR = Path(__file__).parent.parent.parent / 'docker' / 'local' / 'superset_ext'
+
+# Length of the content hash used as image tag
+TAG_LENGTH = 16
+
+
+def base_image(stack: StackConfig) -> str:
+    """Return the ``apache/superset`` reference, pinned by digest when configured."""
+    image = f'apache/superset:{stack.superset.version or DEFAULT_SUPERSET_VERSION}'
+    if stack.superset.image.base_digest:
+        image += f'@{stack.superset.image.base_digest}'
+    return image
+
+
+def plugin_requirements(stack: StackConfig) -> str:
+    """Return ``superset.plugins`` as a pip requirements file.
+
+    Entries are pip requirement specifiers (database drivers, Python
+    packages with Superset extensions). They are sorted so reordering the
+    list in ``system.yaml`` keeps the plugin layer cached.
+    """
+    plugins = sorted({plugin.strip() for plugin in stack.superset.plugins if plugin.strip()})
+    return ''.join(f'{plugin}\n' for plugin in plugins)
+
+
+def render_dockerfile(stack: StackConfig, stack_name: str) -> str:
+    """Render the Dockerfile of the stack's image."""
+    image = stack.superset.image
+    lines = [
+        '# syntax=docker/dockerfile:1',
+        f'# Superset image for stack {stack_name!r} ({stack.type}, {stack.environment})',
+        '# Generated by scripts/build_superset_image.py from system.yaml - do not edit.',
+        f'FROM {base_image(stack)}',
+        '',
+        'USER root',
+        '',
+    ]
+    if stack.superset.celery.browser_pool.enabled:
+        lines += [
+            '# Headless Chromium and its driver for the pooled screenshot browsers',
+            'RUN apt-get update \\',
+            '    && apt-get install -y --no-install-recommends chromium chromium-driver \\',
+            '    && rm -rf /var/lib/apt/lists/*',
+            '',
+        ]
+    lines += [
+        '# Plugins: rebuilt only when the plugin list changes; the download cache',
+        '# survives between builds',
+        'COPY requirements-plugins.txt /app/requirements-plugins.txt',
+        'RUN --mount=type=cache,target=/root/.cache \\',
+        '    if [ -s /app/requirements-plugins.txt ]; then \\',
+        '        if command -v uv >/dev/null 2>&1; then \\',
+        '            uv pip install --python "$(command -v python)" -r /app/requirements-plugins.txt; \\',
+        '        else \\',
+        '            python -m pip install -r /app/requirements-plugins.txt; \\',
+        '        fi; \\',
+        '    fi',
+    ]
+    if image.compile_bytecode:
+        lines += [
+            '',
+            '# Installed packages never change in a container: skip the source check.',
+            '# Some packages ship files that are not importable Python (templates,',
+            '# tests), so compile errors are ignored',
+            'RUN python -m compileall -q -j 0 --invalidation-mode unchecked-hash \\',
+            '    "$(python -c \'import sysconfig; print(sysconfig.get_paths()["purelib"])\')" || true',
+        ]
+    lines += [
+        '',
+        'COPY superset_ext /app/pythonpath/superset_ext',
+        'COPY superset_config.py /app/pythonpath/superset_config.py',
+        'COPY gunicorn.conf.py /app/gunicorn.conf.py',
+    ]
+    if image.compile_bytecode:
+        lines += [
+            '# Checked against the source, so a file mounted over these still wins',
+            'RUN python -m compileall -q --invalidation-mode checked-hash /app/pythonpath',
+        ]
+    lines += [
+        '',
+        'USER superset',
+        'ENV SUPERSET_CONFIG_PATH=/app/pythonpath/superset_config.py',
+        f'EXPOSE {stack.superset.port}',
+        'CMD ["sh", "-c", "python -m superset_ext.bootstrap && exec gunicorn --config /app/gunicorn.conf.py"]',
+    ]
+    return '\n'.join(lines) + '\n'
+
+
+def context_files(stack: StackConfig, stack_name: str) -> Dict[str, bytes]:
+    """Return the build context as relative path to content."""
+    files = {
+        'Dockerfile': render_dockerfile(stack, stack_name).encode(),
+        'requirements-plugins.txt': plugin_requirements(stack).encode(),
+        'superset_config.py': render_superset_config(stack, stack_name).encode(),
+        'gunicorn.conf.py': render_gunicorn_config(stack, stack_name).encode(),
+    }
+    for path in sorted(SUPERSET_EXT_DIR.glob('*.py')):
+        files[f'superset_ext/{path.name}'] = path.read_bytes()
+    return files
+
+
+def content_tag(files: Dict[str, bytes]) -> str:
+    """Return the image tag of a build context: a hash of paths and contents."""
+    digest = hashlib.sha256()
+    for path in sorted(files):
+        content = files[path]
+        digest.update(f'{path}\0{len(content)}\0'.encode())
+        digest.update(content)
+    return digest.hexdigest()[:TAG_LENGTH]
+
+
+def write_context(stack: StackConfig, stack_name: str, directory: Path) -> str:
+    """Write the build context to ``directory`` and return its tag.
+
+    Files of an earlier context that are no longer part of it are removed,
+    so the directory always hashes to the returned tag.
+    """
+    directory = Path(directory)
+    files = context_files(stack, stack_name)
+    for path, content in files.items():
+        target = directory / path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if not target.exists() or target.read_bytes() != content:
+            target.write_bytes(content)
+
+    stale: List[Path] = [
+        path for path in directory.rglob('*')
+        if path.is_file() and path.relative_to(directory).as_posix() not in files
+    ]
+    for path in stale:
+        path.unlink()
+    return content_tag(files)
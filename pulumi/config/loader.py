@@ -208,6 +208,7 @@ def print_validation_warnings(config: SystemConfig):
         validate_backup_configuration,
         validate_monitoring_configuration,
         validate_network_configuration,
+        validate_warmup_configuration,
         check_version_compatibility
     )
     
@@ -252,6 +253,14 @@ def print_validation_warnings(config: SystemConfig):
         for warning in monitoring_warnings:
             warnings.append(f"Stack '{stack_name}': {warning}")
         
+        # Check cache warm-up configuration
+        warmup_warnings = validate_warmup_configuration(
+            stack.superset.model_dump(),
+            stack.type
+        )
+        for warning in warmup_warnings:
+            warnings.append(f"Stack '{stack_name}': {warning}")
+        
         # Check network configuration
         if stack.security and stack.security.vpc:
             network_warnings = validate_network_configuration(
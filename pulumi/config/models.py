@@ -2,7 +2,7 @@
 
 from typing import Dict, List, Optional, Literal, Union, Any
 from pathlib import Path
-from pydantic import BaseModel, Field, field_validator, model_validator, ConfigDict
+from pydantic import AliasChoices, BaseModel, Field, field_validator, model_validator, ConfigDict
 import re
 import os
 
@@ -45,10 +45,10 @@ CLOUD_SQL_TIERS = {
 }
 
 
-class ResourceConfig(BaseModel):
-    """Resource configuration for containers."""
-    cpu: str = Field("1", description="CPU allocation (e.g., '0.5', '1', '2')")
-    memory: str = Field("2Gi", description="Memory allocation (e.g., '512Mi', '2Gi')")
+class ResourceRequestsConfig(BaseModel):
+    """CPU and memory a Kubernetes container is guaranteed."""
+    cpu: str = Field(..., description="CPU request (e.g., '0.5', '2')")
+    memory: str = Field(..., description="Memory request (e.g., '512Mi', '4Gi')")
     
     @field_validator('cpu')
     def validate_cpu(cls, v):
@@ -69,20 +69,223 @@ class ResourceConfig(BaseModel):
         return v
 
 
+def _memory_mib(memory: str) -> float:
+    value = float(memory[:-2])
+    return value * 1024 if memory.endswith('Gi') else value
+
+
+class ResourceConfig(ResourceRequestsConfig):
+    """Resource configuration for containers."""
+    cpu: str = Field("1", description="CPU allocation (e.g., '0.5', '1', '2')")
+    memory: str = Field("2Gi", description="Memory allocation (e.g., '512Mi', '2Gi')")
+    requests: Optional[ResourceRequestsConfig] = Field(
+        None, description="Guaranteed resources on GKE; the allocation above is the limit (default: equal)"
+    )
+    
+    @model_validator(mode='after')
+    def validate_requests(self):
+        if self.requests:
+            if float(self.requests.cpu) > float(self.cpu):
+                raise ValueError(f"CPU request {self.requests.cpu} exceeds the allocation {self.cpu}")
+            if _memory_mib(self.requests.memory) > _memory_mib(self.memory):
+                raise ValueError(f"Memory request {self.requests.memory} exceeds the allocation {self.memory}")
+        return self
+
+
+class ScalingWindowConfig(BaseModel):
+    """Replica bounds applied on a cron schedule, until the next window starts."""
+    name: str = Field(..., description="Window name, used in scheduler job names")
+    schedule: str = Field(..., description="Cron expression of the window start")
+    min_replicas: int = Field(..., ge=0, le=100)
+    max_replicas: int = Field(..., ge=1, le=100)
+    
+    @field_validator('name')
+    def validate_name(cls, v):
+        if not re.match(r'^[a-z][a-z0-9-]{0,30}$', v):
+            raise ValueError(f"Invalid window name: {v}. Use lowercase letters, digits and hyphens.")
+        return v
+    
+    @field_validator('schedule')
+    def validate_schedule(cls, v):
+        from ..config.validators import validate_cron_expression
+        valid, error = validate_cron_expression(v)
+        if not valid:
+            raise ValueError(error)
+        return v
+    
+    @model_validator(mode='after')
+    def validate_replicas_range(self):
+        if self.min_replicas > self.max_replicas:
+            raise ValueError(f"min_replicas ({self.min_replicas}) cannot be greater than max_replicas ({self.max_replicas})")
+        return self
+
+
 class AutoscalingConfig(BaseModel):
     """Autoscaling configuration."""
     enabled: bool = False
     min_replicas: int = Field(1, ge=1, le=100)
     max_replicas: int = Field(10, ge=1, le=100)
     cpu_threshold: int = Field(70, ge=10, le=95)
+    target_concurrency: Optional[int] = Field(
+        None, ge=1, le=1000, description="Requests in flight per instance to scale at"
+    )
+    target_latency_p95_ms: Optional[int] = Field(
+        None, ge=50, le=300000, description="p95 request latency to scale at (GKE, from /metrics)"
+    )
+    scale_down_stabilization_seconds: int = Field(
+        300, ge=0, le=3600, description="Highest recommendation of this long ago is kept before scaling down"
+    )
+    timezone: str = Field("Etc/UTC", description="Time zone of the window schedules")
+    windows: List[ScalingWindowConfig] = Field(
+        default_factory=list,
+        description="Scheduled replica bounds, e.g. raised ahead of the morning peak"
+    )
+    
+    @field_validator('timezone')
+    def validate_timezone(cls, v):
+        from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+        try:
+            ZoneInfo(v)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ValueError(f"Unknown time zone: {v}")
+        return v
     
     @model_validator(mode='after')
     def validate_replicas_range(self):
         if self.min_replicas > self.max_replicas:
             raise ValueError(f"min_replicas ({self.min_replicas}) cannot be greater than max_replicas ({self.max_replicas})")
+        names = [window.name for window in self.windows]
+        if len(names) != len(set(names)):
+            raise ValueError(f"Scaling window names must be unique: {names}")
         return self
 
 
+class WarmupConfig(BaseModel):
+    """Chart data cache warm-up for the most viewed dashboards."""
+    enabled: bool = True
+    top_dashboards: int = Field(10, ge=1, le=100, description="Dashboards to warm, by views")
+    lookback_days: int = Field(7, ge=1, le=90, description="Days of view history to rank by")
+    concurrency: int = Field(4, ge=1, le=32, description="Chart requests in flight")
+    schedule: str = Field("*/30 * * * *", description="Cron expression for Celery beat")
+    
+    @field_validator('schedule')
+    def validate_schedule(cls, v):
+        from ..config.validators import validate_cron_expression
+        valid, error = validate_cron_expression(v)
+        if not valid:
+            raise ValueError(error)
+        return v
+
+
+class WorkerAutoscalingConfig(BaseModel):
+    """Celery worker replicas following the backlog of the broker queues."""
+    enabled: bool = False
+    min_workers: int = Field(1, ge=0, le=100, description="Replicas when the queues are empty")
+    max_workers: int = Field(4, ge=1, le=100)
+    target_queue_length: int = Field(
+        10, ge=1, le=10000, description="Waiting tasks per worker replica before adding one"
+    )
+    cooldown_seconds: int = Field(
+        300, ge=0, le=3600, description="Replicas are only removed once this long without a higher need"
+    )
+    queues: List[str] = Field(default_factory=lambda: ["celery"], description="Broker queues counted")
+    
+    @model_validator(mode='after')
+    def validate_workers_range(self):
+        if self.min_workers > self.max_workers:
+            raise ValueError(f"min_workers ({self.min_workers}) cannot be greater than max_workers ({self.max_workers})")
+        if not self.queues:
+            raise ValueError("At least one queue is required")
+        return self
+
+
+class CeleryQueueConfig(BaseModel):
+    """Worker pool consuming one dedicated Celery queue."""
+    concurrency: Optional[int] = Field(
+        None, ge=1, le=64, description="Processes (or threads) per worker (default: per queue)"
+    )
+    prefetch_multiplier: int = Field(1, ge=1, le=100, description="Tasks reserved per process")
+    pool: Optional[Literal["prefork", "threads"]] = Field(
+        None, description="Worker pool (default: threads for browser queues with browser_pool, else prefork)"
+    )
+    max_tasks_per_child: Optional[int] = Field(None, ge=1, description="Tasks before a process is replaced")
+    replicas: int = Field(1, ge=1, le=100, description="Worker replicas (unless autoscaled)")
+    resources: Optional[ResourceConfig] = Field(None, description="Worker resources (default: superset.resources)")
+
+
+class BrowserPoolConfig(BaseModel):
+    """Warm headless browsers reused by thumbnail and report screenshots."""
+    enabled: bool = False
+    size: int = Field(2, ge=1, le=16, description="Browsers per worker process, and renders at once")
+    max_renders: int = Field(50, ge=1, le=10000, description="Renders before a browser is replaced")
+    acquire_timeout_seconds: int = Field(120, ge=1, le=3600, description="Longest wait for a free browser")
+    warm: bool = Field(True, description="Start the browsers when the worker starts")
+
+
+class CeleryConfig(BaseModel):
+    """Celery workers of stacks with a Redis broker."""
+    autoscaling: WorkerAutoscalingConfig = Field(default_factory=WorkerAutoscalingConfig)
+    browser_pool: BrowserPoolConfig = Field(default_factory=BrowserPoolConfig)
+    queues: Dict[Literal["sql_lab", "reports", "thumbnails", "warmup"], CeleryQueueConfig] = Field(
+        default_factory=dict,
+        description="Task classes routed to their own queue and worker pool; others stay on 'celery'"
+    )
+
+
+class RouteClassConfig(BaseModel):
+    """Token bucket settings for one class of Superset routes."""
+    rate: float = Field(..., gt=0, description="Requests admitted per second")
+    burst: int = Field(..., ge=1, description="Requests admitted at once after idle time")
+    max_queue: int = Field(0, ge=0, description="Requests allowed to wait for a token")
+    max_wait_seconds: float = Field(0, ge=0, description="Longest wait before shedding")
+
+
+class AdmissionConfig(BaseModel):
+    """Request admission control (token buckets per route class)."""
+    enabled: bool = False
+    routes: Dict[Literal["chart_data", "sql_lab", "static"], RouteClassConfig] = Field(
+        default_factory=dict,
+        description="Overrides of the built-in route class defaults"
+    )
+
+
+class ImageConfig(BaseModel):
+    """Prebaked Superset image with plugins, generated config and bytecode."""
+    enabled: bool = False
+    repository: str = Field("superset", description="Artifact Registry repository to push to")
+    base_digest: Optional[str] = Field(None, description="sha256 digest pinning apache/superset:<version>")
+    platform: str = Field("linux/amd64", description="Target platform of the build")
+    compile_bytecode: bool = Field(True, description="Precompile .pyc files into the image")
+
+    @field_validator('base_digest')
+    def validate_base_digest(cls, v):
+        if v and not re.match(r'^sha256:[0-9a-f]{64}$', v):
+            raise ValueError(f"Invalid image digest: {v}. Use format 'sha256:<64 hex characters>'")
+        return v
+
+
+class ColdStartConfig(BaseModel):
+    """Cloud Run instance start-up and scale-to-zero behaviour."""
+    min_instances: Optional[int] = Field(
+        None, ge=0, le=100, description="Warm instances (default: 0 for -dev stacks, else 1)"
+    )
+    container_concurrency: Optional[int] = Field(
+        None, ge=1, le=1000, description="Requests per instance (default: gunicorn workers x threads)"
+    )
+    cpu_boost: bool = Field(True, description="Extra CPU while an instance starts")
+    cpu_always_allocated: Optional[bool] = Field(
+        None, description="Keep CPU between requests (default: when there is no Celery)"
+    )
+    startup_probe_path: str = Field("/health", description="HTTP path answered once Superset serves")
+    startup_timeout_seconds: int = Field(240, ge=10, le=3600, description="Longest start-up allowed")
+
+    @field_validator('startup_probe_path')
+    def validate_startup_probe_path(cls, v):
+        if not v.startswith('/'):
+            raise ValueError(f"Invalid probe path: {v}. Must start with '/'")
+        return v
+
+
 class SupersetDefaults(BaseModel):
     """Global Superset defaults."""
     default_version: str = Field("3.0.0", description="Default Superset version")
@@ -105,6 +308,11 @@ class SupersetConfig(BaseModel):
     resources: ResourceConfig = Field(default_factory=ResourceConfig)
     autoscaling: Optional[AutoscalingConfig] = None
     plugins: List[str] = Field(default_factory=list, description="Superset plugins to install")
+    warmup: WarmupConfig = Field(default_factory=WarmupConfig)
+    admission: AdmissionConfig = Field(default_factory=AdmissionConfig)
+    image: ImageConfig = Field(default_factory=ImageConfig)
+    cold_start: ColdStartConfig = Field(default_factory=ColdStartConfig)
+    celery: CeleryConfig = Field(default_factory=CeleryConfig)
     
     @field_validator('version')
     def validate_version(cls, v):
@@ -296,12 +504,86 @@ class CloudflareConfig(BaseModel):
         return v
 
 
+# Bounds of superset_ext.metrics.REQUEST_BUCKETS; a latency threshold must be one
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+class LatencySLOConfig(BaseModel):
+    """Latency objective of the web tier, alerted on by error budget burn rate."""
+    enabled: bool = True
+    threshold_seconds: float = Field(
+        2.5, description="Requests slower than this spend the error budget; a latency histogram bucket"
+    )
+    objective: float = Field(0.99, ge=0.95, le=0.9999, description="Share of requests faster than the threshold")
+    window_days: int = Field(30, ge=1, le=90, description="Period the objective is measured over")
+    exclude_endpoints: List[str] = Field(
+        default_factory=lambda: ['/static/', '/metrics', '/health'],
+        description="Endpoints (URL rules) left out of the objective, e.g. long exports"
+    )
+
+    @field_validator('threshold_seconds')
+    def validate_threshold(cls, v):
+        if v not in LATENCY_BUCKETS:
+            raise ValueError(f"Latency threshold {v}s is not a bucket of the request histogram: {LATENCY_BUCKETS}")
+        return v
+
+
+class AlertChannelConfig(BaseModel):
+    """A notification channel of Alertmanager."""
+    type: Literal["email", "slack", "pagerduty"]
+    addresses: List[str] = Field(default_factory=list, description="Email recipients")
+    webhook_url: Optional[str] = Field(
+        None, validation_alias=AliasChoices('webhook_url', 'webhook'), description="Slack incoming webhook URL"
+    )
+    channel: Optional[str] = Field(None, description="Slack channel, when not the webhook's own")
+    integration_key: Optional[str] = Field(None, description="PagerDuty Events API v2 integration key")
+    severities: List[Literal["critical", "warning"]] = Field(
+        default_factory=lambda: ['critical', 'warning'], min_length=1, description="Alert severities sent here"
+    )
+
+    @model_validator(mode='after')
+    def validate_destination(self):
+        required = {'email': 'addresses', 'slack': 'webhook_url', 'pagerduty': 'integration_key'}[self.type]
+        if not getattr(self, required):
+            raise ValueError(f"{self.type} channel requires {required}")
+        return self
+
+
+class AlertingConfig(BaseModel):
+    """Burn-rate alerts of the latency SLO and where they are sent."""
+    enabled: bool = False
+    latency_slo: LatencySLOConfig = Field(default_factory=LatencySLOConfig)
+    channels: List[AlertChannelConfig] = Field(default_factory=list)
+    smtp_smarthost: Optional[str] = Field(None, description="SMTP relay (host:port) of email channels")
+    smtp_from: str = Field("alertmanager@localhost", description="Sender of alert emails")
+
+    @model_validator(mode='before')
+    @classmethod
+    def reject_removed_keys(cls, data):
+        # Earlier configurations listed threshold rules and per-service flags, now replaced
+        removed = {
+            'rules': "alerts are generated from latency_slo; remove the rules list",
+            'pagerduty': "add a channel of type 'pagerduty' with its integration_key",
+            'slack': "add a channel of type 'slack' with its webhook_url",
+        }
+        for key, replacement in removed.items():
+            if isinstance(data, dict) and key in data:
+                raise ValueError(f"alerting.{key} is no longer supported: {replacement}")
+        return data
+
+    @model_validator(mode='after')
+    def validate_smtp(self):
+        if any(channel.type == 'email' for channel in self.channels) and not self.smtp_smarthost:
+            raise ValueError("Email channels require smtp_smarthost")
+        return self
+
+
 class MonitoringConfig(BaseModel):
     """Monitoring configuration."""
     enabled: bool = False
     prometheus: Dict[str, Any] = Field(default_factory=dict)
     grafana: Dict[str, Any] = Field(default_factory=dict)
-    alerting: Dict[str, Any] = Field(default_factory=dict)
+    alerting: AlertingConfig = Field(default_factory=AlertingConfig)
 
 
 class StackBackupConfig(BaseModel):
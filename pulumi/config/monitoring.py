@@ -0,0 +1,492 @@
+"""Prometheus and Grafana of a stack, and the targets they scrape.
+
+Saturation of the tiers Superset waits on is scraped next to Superset's
+own ``/metrics``:
+
+- metadata database: postgres_exporter (connections against
+  ``max_connections``, activity by state, locks)
+- cache and Celery broker: redis_exporter (memory against ``maxmemory``,
+  clients, evictions, queue lengths)
+- containers: cAdvisor (CPU and throttling, working set against the memory
+  limit); on GKE the kubelet's, elsewhere the ``cadvisor`` compose service
+
+``compose_prometheus_config`` is the ``prometheus.yml`` of the compose
+``monitoring`` profile (``make config`` writes it for a stack);
+``gke_prometheus_config`` discovers the annotated pods of the Superset
+namespace (web, browser-pool workers and the exporters of
+``pulumi.config.gke``) and the nodes' kubelets. Both name the ``job`` of a
+target after its component (``web``, ``worker-reports``,
+``redis-exporter``...), so dashboards and rules work on either.
+Both load the recording rules and latency SLO alerts of
+``pulumi.config.alerting`` from ``rules.yml`` and, when
+``monitoring.alerting`` is enabled, send alerts to the ``alertmanager``
+service. ``monitoring_manifests`` runs Prometheus, Alertmanager and
+Grafana, with the dashboards of ``docker/monitoring/grafana``, in the
+``monitoring`` namespace that ``PROMETHEUS_URL`` points prometheus-adapter at.
+"""
+
+import hashlib
+from pathlib import Path
+from typing import Any, Dict, List
+
+import yaml
+
+from .alerting import ALERTMANAGER_PORT, RULES_FILE, alertmanager_config, prometheus_rules, render_rules
+from .generator import derive_sizing
+from .gke import NAMESPACE, POSTGRES_EXPORTER_PORT, REDIS_EXPORTER_PORT
+from .models import StackConfig
+from .workers import WORKER_METRICS_PORT, worker_pools
+
+MONITORING_NAMESPACE = 'monitoring'
+
+PROMETHEUS_IMAGE = 'prom/prometheus:v2.54.1'
+PROMETHEUS_PORT = 9090
+PROMETHEUS_RESOURCES = {'requests': {'cpu': '250m', 'memory': '1Gi'}, 'limits': {'cpu': '1', 'memory': '2Gi'}}
+
+ALERTMANAGER_IMAGE = 'prom/alertmanager:v0.27.0'
+ALERTMANAGER_RESOURCES = {'requests': {'cpu': '10m', 'memory': '64Mi'}, 'limits': {'cpu': '100m', 'memory': '256Mi'}}
+
+GRAFANA_IMAGE = 'grafana/grafana:11.2.0'
+GRAFANA_PORT = 3000
+GRAFANA_RESOURCES = {'requests': {'cpu': '50m', 'memory': '128Mi'}, 'limits': {'cpu': '500m', 'memory': '512Mi'}}
+
+# Dashboards and provisioning shared with the compose grafana service
+GRAFANA_DIR = Path(__file__).parent.parent.parent / 'docker' / 'monitoring' / 'grafana'
+
+CADVISOR_PORT = 8080
+
+# cAdvisor series the dashboards use; the others are dropped at scrape time
+CADVISOR_METRICS = (
+    'container_(cpu_usage_seconds_total|cpu_cfs_periods_total|cpu_cfs_throttled_periods_total'
+    '|memory_working_set_bytes|spec_memory_limit_bytes|spec_cpu_quota|spec_cpu_period|oom_events_total)'
+)
+
+SERVICE_ACCOUNT_DIR = '/var/run/secrets/kubernetes.io/serviceaccount'
+
+
+def _global(stack: StackConfig) -> Dict[str, str]:
+    interval = stack.monitoring.prometheus.get('scrape_interval', '15s')
+    return {'scrape_interval': interval, 'evaluation_interval': interval}
+
+
+def _rules_and_alerting(stack: StackConfig) -> Dict[str, Any]:
+    # Alertmanager runs next to Prometheus, in compose and in the monitoring namespace
+    config: Dict[str, Any] = {'rule_files': [f'/etc/prometheus/{RULES_FILE}']}
+    if stack.monitoring.alerting.enabled:
+        config['alerting'] = {
+            'alertmanagers': [{'static_configs': [{'targets': [f'alertmanager:{ALERTMANAGER_PORT}']}]}],
+        }
+    return config
+
+
+def _static_job(job: str, target: str, **extra: Any) -> Dict[str, Any]:
+    return {'job_name': job, 'static_configs': [{'targets': [target]}], **extra}
+
+
+def _keep_cadvisor_metrics() -> Dict[str, Any]:
+    return {'source_labels': ['__name__'], 'regex': CADVISOR_METRICS, 'action': 'keep'}
+
+
+def compose_prometheus_config(stack: StackConfig) -> Dict[str, Any]:
+    """Return the ``prometheus.yml`` of the compose ``monitoring`` profile.
+
+    Targets are compose services: ``superset``, the worker services of
+    ``compose_worker_services``, the exporters and ``cadvisor``, whose
+    series are labelled ``container`` with the compose service name.
+    """
+    jobs = [_static_job('web', f'superset:{stack.superset.port}', metrics_path='/metrics')]
+    if stack.cache.type == 'redis':
+        # Every replica of a scaled service is an A record of its name
+        jobs += [
+            {
+                'job_name': pool.component,
+                'dns_sd_configs': [{
+                    'names': [f'superset-{pool.component}'],
+                    'type': 'A',
+                    'port': WORKER_METRICS_PORT,
+                }],
+            }
+            for pool in worker_pools(stack, derive_sizing(stack).workers)
+        ]
+        jobs.append(_static_job('redis-exporter', f'redis-exporter:{REDIS_EXPORTER_PORT}'))
+    if stack.database.type != 'sqlite':
+        jobs.append(_static_job('postgres-exporter', f'postgres-exporter:{POSTGRES_EXPORTER_PORT}'))
+    jobs.append(_static_job('cadvisor', f'cadvisor:{CADVISOR_PORT}', metric_relabel_configs=[
+        _keep_cadvisor_metrics(),
+        {'source_labels': ['container_label_com_docker_compose_service'], 'target_label': 'container'},
+        # cAdvisor copies every Docker label of the container
+        {'regex': 'container_label_.+', 'action': 'labeldrop'},
+    ]))
+    jobs.append(_static_job('prometheus', f'localhost:{PROMETHEUS_PORT}'))
+    return {'global': _global(stack), **_rules_and_alerting(stack), 'scrape_configs': jobs}
+
+
+def gke_prometheus_config(stack: StackConfig, superset_namespace: str = NAMESPACE) -> Dict[str, Any]:
+    """Return the ``prometheus.yml`` of the in-cluster Prometheus.
+
+    Pods of ``superset_namespace`` are scraped when annotated
+    ``prometheus.io/scrape``, on their ``prometheus.io/port`` and
+    ``prometheus.io/path``; container series come from each node's
+    kubelet through the API server proxy.
+    """
+    pods = {
+        'job_name': 'pods',
+        'kubernetes_sd_configs': [{'role': 'pod', 'namespaces': {'names': [superset_namespace]}}],
+        'relabel_configs': [
+            {'source_labels': ['__meta_kubernetes_pod_annotation_prometheus_io_scrape'], 'regex': 'true', 'action': 'keep'},
+            {
+                'source_labels': ['__meta_kubernetes_pod_annotation_prometheus_io_path'],
+                'regex': '(.+)',
+                'target_label': '__metrics_path__',
+            },
+            {
+                'source_labels': ['__address__', '__meta_kubernetes_pod_annotation_prometheus_io_port'],
+                'regex': r'([^:]+)(?::\d+)?;(\d+)',
+                'replacement': '$1:$2',
+                'target_label': '__address__',
+            },
+            {'source_labels': ['__meta_kubernetes_pod_label_app_kubernetes_io_component'], 'target_label': 'job'},
+            {'source_labels': ['__meta_kubernetes_namespace'], 'target_label': 'namespace'},
+            {'source_labels': ['__meta_kubernetes_pod_name'], 'target_label': 'pod'},
+        ],
+    }
+    cadvisor = {
+        'job_name': 'cadvisor',
+        'scheme': 'https',
+        'kubernetes_sd_configs': [{'role': 'node'}],
+        'authorization': {'credentials_file': f'{SERVICE_ACCOUNT_DIR}/token'},
+        'tls_config': {'ca_file': f'{SERVICE_ACCOUNT_DIR}/ca.crt'},
+        'relabel_configs': [
+            {'target_label': '__address__', 'replacement': 'kubernetes.default.svc:443'},
+            {
+                'source_labels': ['__meta_kubernetes_node_name'],
+                'regex': '(.+)',
+                'replacement': '/api/v1/nodes/$1/proxy/metrics/cadvisor',
+                'target_label': '__metrics_path__',
+            },
+        ],
+        'metric_relabel_configs': [
+            _keep_cadvisor_metrics(),
+            {'source_labels': ['namespace'], 'regex': f'{superset_namespace}|{MONITORING_NAMESPACE}', 'action': 'keep'},
+        ],
+    }
+    return {
+        'global': _global(stack),
+        **_rules_and_alerting(stack),
+        'scrape_configs': [pods, cadvisor, _static_job('prometheus', f'localhost:{PROMETHEUS_PORT}')],
+    }
+
+
+def render_prometheus_config(config: Dict[str, Any]) -> str:
+    """Return a Prometheus configuration as YAML."""
+    return yaml.safe_dump(config, sort_keys=False)
+
+
+def grafana_files() -> Dict[str, Dict[str, str]]:
+    """Return the Grafana provisioning files and dashboards, by file name."""
+    return {
+        'provisioning': {
+            f'{path.parent.name}-{path.name}': path.read_text()
+            for path in sorted((GRAFANA_DIR / 'provisioning').glob('*/*.yml'))
+        },
+        'dashboards': {path.name: path.read_text() for path in sorted((GRAFANA_DIR / 'dashboards').glob('*.json'))},
+    }
+
+
+def _labels(name: str, app: str) -> Dict[str, str]:
+    return {'app.kubernetes.io/name': app, 'app.kubernetes.io/instance': name}
+
+
+def _checksum(data: Dict[str, str]) -> str:
+    return hashlib.sha256(''.join(f'{key}\0{value}\0' for key, value in sorted(data.items())).encode()).hexdigest()
+
+
+def prometheus_manifests(
+    stack: StackConfig,
+    name: str,
+    superset_namespace: str = NAMESPACE,
+    namespace: str = MONITORING_NAMESPACE,
+) -> List[Dict[str, Any]]:
+    """Return the Prometheus manifests: RBAC, configuration and rules, StatefulSet and Service.
+
+    ``monitoring.prometheus`` sets ``retention_days``, ``storage_size``
+    (GB per replica) and ``high_availability`` (two replicas scraping the
+    same targets). The Service is ``prometheus`` on port 9090, as
+    ``PROMETHEUS_URL`` and prometheus-adapter expect.
+    """
+    settings = stack.monitoring.prometheus
+    storage_size = settings.get('storage_size', 10)
+    labels = _labels(name, 'prometheus')
+    data = {
+        'prometheus.yml': render_prometheus_config(gke_prometheus_config(stack, superset_namespace)),
+        RULES_FILE: render_rules(prometheus_rules(stack)),
+    }
+    container = {
+        'name': 'prometheus',
+        'image': PROMETHEUS_IMAGE,
+        'args': [
+            '--config.file=/etc/prometheus/prometheus.yml',
+            '--storage.tsdb.path=/prometheus',
+            f"--storage.tsdb.retention.time={settings.get('retention_days', 30)}d",
+            # Leave headroom on the volume for compaction
+            f'--storage.tsdb.retention.size={int(storage_size * 0.9)}GB',
+        ],
+        'ports': [{'name': 'http', 'containerPort': PROMETHEUS_PORT}],
+        'readinessProbe': {'httpGet': {'path': '/-/ready', 'port': 'http'}, 'periodSeconds': 10},
+        'livenessProbe': {'httpGet': {'path': '/-/healthy', 'port': 'http'}, 'periodSeconds': 30},
+        'resources': PROMETHEUS_RESOURCES,
+        'volumeMounts': [
+            {'name': 'config', 'mountPath': '/etc/prometheus', 'readOnly': True},
+            {'name': 'data', 'mountPath': '/prometheus'},
+        ],
+    }
+    return [
+        {'apiVersion': 'v1', 'kind': 'ServiceAccount', 'metadata': {'name': 'prometheus', 'namespace': namespace}},
+        {
+            'apiVersion': 'rbac.authorization.k8s.io/v1',
+            'kind': 'ClusterRole',
+            'metadata': {'name': f'{name}-prometheus', 'labels': labels},
+            'rules': [
+                {
+                    'apiGroups': [''],
+                    'resources': ['nodes', 'nodes/proxy', 'nodes/metrics', 'services', 'endpoints', 'pods'],
+                    'verbs': ['get', 'list', 'watch'],
+                },
+                {'nonResourceURLs': ['/metrics'], 'verbs': ['get']},
+            ],
+        },
+        {
+            'apiVersion': 'rbac.authorization.k8s.io/v1',
+            'kind': 'ClusterRoleBinding',
+            'metadata': {'name': f'{name}-prometheus', 'labels': labels},
+            'roleRef': {'apiGroup': 'rbac.authorization.k8s.io', 'kind': 'ClusterRole', 'name': f'{name}-prometheus'},
+            'subjects': [{'kind': 'ServiceAccount', 'name': 'prometheus', 'namespace': namespace}],
+        },
+        {
+            'apiVersion': 'v1',
+            'kind': 'ConfigMap',
+            'metadata': {'name': 'prometheus-config', 'namespace': namespace, 'labels': labels},
+            'data': data,
+        },
+        {
+            'apiVersion': 'apps/v1',
+            'kind': 'StatefulSet',
+            'metadata': {'name': 'prometheus', 'namespace': namespace, 'labels': labels},
+            'spec': {
+                'serviceName': 'prometheus',
+                'replicas': 2 if settings.get('high_availability') else 1,
+                'podManagementPolicy': 'Parallel',
+                'selector': {'matchLabels': labels},
+                'template': {
+                    'metadata': {'labels': labels, 'annotations': {'checksum/config': _checksum(data)}},
+                    'spec': {
+                        'serviceAccountName': 'prometheus',
+                        'containers': [container],
+                        'volumes': [{'name': 'config', 'configMap': {'name': 'prometheus-config'}}],
+                        'securityContext': {'runAsNonRoot': True, 'runAsUser': 65534, 'fsGroup': 65534},
+                    },
+                },
+                'volumeClaimTemplates': [{
+                    'metadata': {'name': 'data'},
+                    'spec': {
+                        'accessModes': ['ReadWriteOnce'],
+                        'resources': {'requests': {'storage': f'{storage_size}Gi'}},
+                    },
+                }],
+            },
+        },
+        {
+            'apiVersion': 'v1',
+            'kind': 'Service',
+            'metadata': {'name': 'prometheus', 'namespace': namespace, 'labels': labels},
+            'spec': {
+                'type': 'ClusterIP',
+                'selector': labels,
+                'ports': [{'name': 'http', 'port': PROMETHEUS_PORT, 'targetPort': 'http'}],
+            },
+        },
+    ]
+
+
+def grafana_manifests(
+    stack: StackConfig,
+    name: str,
+    admin_password: Any,
+    namespace: str = MONITORING_NAMESPACE,
+) -> List[Dict[str, Any]]:
+    """Return the Grafana manifests, provisioned with the repository's datasource and dashboards.
+
+    ``monitoring.grafana`` sets ``anonymous_access`` and ``plugins``;
+    ``admin_password`` may be a Pulumi output.
+    """
+    settings = stack.monitoring.grafana
+    labels = _labels(name, 'grafana')
+    files = grafana_files()
+    env = [
+        {
+            'name': 'GF_SECURITY_ADMIN_PASSWORD',
+            'valueFrom': {'secretKeyRef': {'name': 'grafana-admin', 'key': 'admin-password'}},
+        },
+        {'name': 'GF_USERS_ALLOW_SIGN_UP', 'value': 'false'},
+        {'name': 'GF_AUTH_ANONYMOUS_ENABLED', 'value': str(bool(settings.get('anonymous_access'))).lower()},
+    ]
+    if settings.get('plugins'):
+        env.append({'name': 'GF_INSTALL_PLUGINS', 'value': ','.join(settings['plugins'])})
+    container = {
+        'name': 'grafana',
+        'image': GRAFANA_IMAGE,
+        'env': env,
+        'ports': [{'name': 'http', 'containerPort': GRAFANA_PORT}],
+        'readinessProbe': {'httpGet': {'path': '/api/health', 'port': 'http'}, 'periodSeconds': 10},
+        'resources': GRAFANA_RESOURCES,
+        'volumeMounts': [
+            {'name': 'provisioning', 'mountPath': '/etc/grafana/provisioning', 'readOnly': True},
+            {'name': 'dashboards', 'mountPath': '/etc/grafana/dashboards', 'readOnly': True},
+            {'name': 'data', 'mountPath': '/var/lib/grafana'},
+        ],
+    }
+    checksum = _checksum({**files['provisioning'], **files['dashboards']})
+    return [
+        {
+            'apiVersion': 'v1',
+            'kind': 'Secret',
+            'metadata': {'name': 'grafana-admin', 'namespace': namespace, 'labels': labels},
+            'type': 'Opaque',
+            'stringData': {'admin-password': admin_password},
+        },
+        {
+            'apiVersion': 'v1',
+            'kind': 'ConfigMap',
+            'metadata': {'name': 'grafana-provisioning', 'namespace': namespace, 'labels': labels},
+            'data': files['provisioning'],
+        },
+        {
+            'apiVersion': 'v1',
+            'kind': 'ConfigMap',
+            'metadata': {'name': 'grafana-dashboards', 'namespace': namespace, 'labels': labels},
+            'data': files['dashboards'],
+        },
+        {
+            'apiVersion': 'apps/v1',
+            'kind': 'Deployment',
+            'metadata': {'name': 'grafana', 'namespace': namespace, 'labels': labels},
+            'spec': {
+                'replicas': 1,
+                'strategy': {'type': 'Recreate'},
+                'selector': {'matchLabels': labels},
+                'template': {
+                    'metadata': {'labels': labels, 'annotations': {'checksum/config': checksum}},
+                    'spec': {
+                        'containers': [container],
+                        'volumes': [
+                            {
+                                'name': 'provisioning',
+                                'configMap': {
+                                    'name': 'grafana-provisioning',
+                                    'items': [
+                                        {'key': key, 'path': key.replace('-', '/', 1)}
+                                        for key in files['provisioning']
+                                    ],
+                                },
+                            },
+                            {'name': 'dashboards', 'configMap': {'name': 'grafana-dashboards'}},
+                            # Dashboards and the datasource are provisioned; nothing else to keep
+                            {'name': 'data', 'emptyDir': {}},
+                        ],
+                        'securityContext': {'runAsNonRoot': True, 'runAsUser': 472, 'fsGroup': 472},
+                    },
+                },
+            },
+        },
+        {
+            'apiVersion': 'v1',
+            'kind': 'Service',
+            'metadata': {'name': 'grafana', 'namespace': namespace, 'labels': labels},
+            'spec': {
+                'type': 'ClusterIP',
+                'selector': labels,
+                'ports': [{'name': 'http', 'port': GRAFANA_PORT, 'targetPort': 'http'}],
+            },
+        },
+    ]
+
+
+def alertmanager_manifests(stack: StackConfig, name: str, namespace: str = MONITORING_NAMESPACE) -> List[Dict[str, Any]]:
+    """Return the Alertmanager manifests: its configuration Secret, Deployment and Service.
+
+    The configuration holds the channels' webhook URLs and keys, hence a
+    Secret rather than a ConfigMap.
+    """
+    labels = _labels(name, 'alertmanager')
+    data = {'alertmanager.yml': render_rules(alertmanager_config(stack))}
+    container = {
+        'name': 'alertmanager',
+        'image': ALERTMANAGER_IMAGE,
+        'args': ['--config.file=/etc/alertmanager/alertmanager.yml', '--storage.path=/alertmanager'],
+        'ports': [{'name': 'http', 'containerPort': ALERTMANAGER_PORT}],
+        'readinessProbe': {'httpGet': {'path': '/-/ready', 'port': 'http'}, 'periodSeconds': 10},
+        'resources': ALERTMANAGER_RESOURCES,
+        'volumeMounts': [
+            {'name': 'config', 'mountPath': '/etc/alertmanager', 'readOnly': True},
+            {'name': 'data', 'mountPath': '/alertmanager'},
+        ],
+    }
+    return [
+        {
+            'apiVersion': 'v1',
+            'kind': 'Secret',
+            'metadata': {'name': 'alertmanager-config', 'namespace': namespace, 'labels': labels},
+            'type': 'Opaque',
+            'stringData': data,
+        },
+        {
+            'apiVersion': 'apps/v1',
+            'kind': 'Deployment',
+            'metadata': {'name': 'alertmanager', 'namespace': namespace, 'labels': labels},
+            'spec': {
+                'replicas': 1,
+                'selector': {'matchLabels': labels},
+                'template': {
+                    'metadata': {'labels': labels, 'annotations': {'checksum/config': _checksum(data)}},
+                    'spec': {
+                        'containers': [container],
+                        'volumes': [
+                            {'name': 'config', 'secret': {'secretName': 'alertmanager-config'}},
+                            {'name': 'data', 'emptyDir': {}},
+                        ],
+                        'securityContext': {'runAsNonRoot': True, 'runAsUser': 65534, 'fsGroup': 65534},
+                    },
+                },
+            },
+        },
+        {
+            'apiVersion': 'v1',
+            'kind': 'Service',
+            'metadata': {'name': 'alertmanager', 'namespace': namespace, 'labels': labels},
+            'spec': {
+                'type': 'ClusterIP',
+                'selector': labels,
+                'ports': [{'name': 'http', 'port': ALERTMANAGER_PORT, 'targetPort': 'http'}],
+            },
+        },
+    ]
+
+
+def monitoring_manifests(
+    stack: StackConfig,
+    name: str,
+    grafana_password: Any,
+    superset_namespace: str = NAMESPACE,
+    namespace: str = MONITORING_NAMESPACE,
+) -> List[Dict[str, Any]]:
+    """Return every manifest of the monitoring namespace, in apply order.
+
+    Alertmanager is included when ``monitoring.alerting`` is enabled.
+    """
+    manifests = (
+        [{'apiVersion': 'v1', 'kind': 'Namespace', 'metadata': {'name': namespace}}]
+        + prometheus_manifests(stack, name, superset_namespace, namespace)
+    )
+    if stack.monitoring.alerting.enabled:
+        manifests += alertmanager_manifests(stack, name, namespace)
+    return manifests + grafana_manifests(stack, name, grafana_password, namespace)
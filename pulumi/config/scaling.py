@@ -0,0 +1,425 @@
+"""Scheduled scaling windows of ``AutoscalingConfig``.
+
+A window sets the replica bounds when its cron ``schedule`` fires and they
+stay until the next window fires, so pre-scaling for a morning peak is one
+window raising ``min_replicas`` shortly before it and one lowering it in
+the evening. Cloud Run windows are Cloud Scheduler jobs updating the
+service's scaling through the Admin API; GKE windows are CronJobs patching
+the HorizontalPodAutoscaler. The builders here only return request bodies
+and manifests, so they can be checked without Pulumi.
+
+Besides CPU, replicas can follow requests in flight per instance
+(``target_concurrency``) and p95 latency (``target_latency_p95_ms``) from
+the ``superset_ext.metrics`` exporter: HPA custom metrics on GKE, served by
+prometheus-adapter with ``prometheus_adapter_rules``, and the concurrency
+limit on Cloud Run. ``simulate`` replays a traffic trace through the same
+policy to predict replica counts.
+
+Celery workers follow the broker queue backlog (``superset.celery.autoscaling``):
+an HPA on the ``celery_queue_length`` external metric on GKE, and
+``superset_ext.worker_scaling`` scaling the compose service locally.
+"""
+
+import json
+import math
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from pydantic import BaseModel
+
+from .models import AutoscalingConfig, ScalingWindowConfig, WorkerAutoscalingConfig
+from .validators import cron_matches
+
+# How far back window_in_effect looks for the last firing
+WINDOW_LOOKBACK = timedelta(days=8)
+
+# Image of the GKE CronJobs patching the HPA
+KUBECTL_IMAGE = 'bitnami/kubectl:1.30'
+
+# Custom metrics served to the HPA by prometheus-adapter
+IN_FLIGHT_METRIC = 'superset_http_requests_in_flight'
+LATENCY_P95_METRIC = 'superset_http_request_duration_seconds_p95'
+
+# External metric of the Celery queue backlog, from redis_exporter's key sizes
+CELERY_QUEUE_METRIC = 'celery_queue_length'
+
+# Change in a metric's ratio to its target the HPA ignores
+HPA_TOLERANCE = 0.1
+
+
+def window_in_effect(autoscaling: AutoscalingConfig, when: datetime) -> Optional[ScalingWindowConfig]:
+    """Return the window whose schedule fired last at or before ``when``.
+
+    ``when`` is taken in the windows' time zone; aware datetimes are
+    converted to it. Returns None without windows or if none fired in
+    ``WINDOW_LOOKBACK``.
+    """
+    if not autoscaling.windows:
+        return None
+    # Later windows win when two fire in the same minute
+    return _last_fired(autoscaling, when - WINDOW_LOOKBACK, when)
+
+
+def _local_minute(autoscaling: AutoscalingConfig, when: datetime) -> datetime:
+    if when.tzinfo is not None:
+        when = when.astimezone(ZoneInfo(autoscaling.timezone)).replace(tzinfo=None)
+    return when.replace(second=0, microsecond=0)
+
+
+def _last_fired(autoscaling: AutoscalingConfig, after: datetime, until: datetime) -> Optional[ScalingWindowConfig]:
+    """Return the window that fired last in ``(after, until]``."""
+    minute, earliest = _local_minute(autoscaling, until), _local_minute(autoscaling, after)
+    while minute > earliest:
+        for window in reversed(autoscaling.windows):
+            if cron_matches(window.schedule, minute):
+                return window
+        minute -= timedelta(minutes=1)
+    return None
+
+
+def replica_bounds(autoscaling: AutoscalingConfig, when: datetime) -> Tuple[int, int]:
+    """Return the (min, max) replicas in effect at ``when``."""
+    window = window_in_effect(autoscaling, when)
+    if window is None:
+        return autoscaling.min_replicas, autoscaling.max_replicas
+    return window.min_replicas, window.max_replicas
+
+
+def cloud_run_scaling_request(
+    project_id: str,
+    region: str,
+    service_name: str,
+    window: ScalingWindowConfig
+) -> Dict[str, Any]:
+    """Return the Cloud Scheduler HTTP target applying a window to a Cloud Run service.
+
+    Service-level scaling is updated in place (no new revision); Cloud Run
+    uses the higher of it and the revision's ``minScale``.
+    """
+    body = {'scaling': {'minInstanceCount': window.min_replicas, 'maxInstanceCount': window.max_replicas}}
+    return {
+        'http_method': 'PATCH',
+        'uri': (
+            f'https://run.googleapis.com/v2/projects/{project_id}/locations/{region}'
+            f'/services/{service_name}?updateMask=scaling.minInstanceCount,scaling.maxInstanceCount'
+        ),
+        'headers': {'Content-Type': 'application/json'},
+        'body': json.dumps(body, sort_keys=True),
+    }
+
+
+def hpa_patch_cronjob(
+    name: str,
+    namespace: str,
+    hpa_name: str,
+    window: ScalingWindowConfig,
+    timezone: str,
+    service_account: str,
+    labels: Optional[Dict[str, str]] = None
+) -> Dict[str, Any]:
+    """Return a CronJob manifest patching an HPA's bounds when a window starts."""
+    patch = json.dumps(
+        {'spec': {'minReplicas': max(1, window.min_replicas), 'maxReplicas': window.max_replicas}},
+        sort_keys=True,
+    )
+    return {
+        'apiVersion': 'batch/v1',
+        'kind': 'CronJob',
+        'metadata': {'name': f'{name}-{window.name}', 'namespace': namespace, 'labels': labels or {}},
+        'spec': {
+            'schedule': window.schedule,
+            'timeZone': timezone,
+            'concurrencyPolicy': 'Replace',
+            'successfulJobsHistoryLimit': 1,
+            'failedJobsHistoryLimit': 3,
+            'jobTemplate': {'spec': {
+                'backoffLimit': 3,
+                'template': {'spec': {
+                    'serviceAccountName': service_account,
+                    'restartPolicy': 'OnFailure',
+                    'containers': [{
+                        'name': 'scale',
+                        'image': KUBECTL_IMAGE,
+                        'args': ['patch', 'hpa', hpa_name, '--namespace', namespace, '--type', 'merge', '-p', patch],
+                        'resources': {'requests': {'cpu': '10m', 'memory': '32Mi'}},
+                    }],
+                }},
+            }},
+        },
+    }
+
+
+def hpa_patch_role(name: str, namespace: str, hpa_name: str) -> Dict[str, Any]:
+    """Return the Role allowing the window CronJobs to patch one HPA."""
+    return {
+        'apiVersion': 'rbac.authorization.k8s.io/v1',
+        'kind': 'Role',
+        'metadata': {'name': name, 'namespace': namespace},
+        'rules': [{
+            'apiGroups': ['autoscaling'],
+            'resources': ['horizontalpodautoscalers'],
+            'resourceNames': [hpa_name],
+            'verbs': ['get', 'patch'],
+        }],
+    }
+
+
+def hpa_metrics(autoscaling: AutoscalingConfig) -> List[Dict[str, Any]]:
+    """Return the ``autoscaling/v2`` metric specs of the Superset web HPA.
+
+    CPU is always included; the HPA follows whichever metric asks for the
+    most replicas.
+    """
+    metrics = [{
+        'type': 'Resource',
+        'resource': {'name': 'cpu', 'target': {'type': 'Utilization', 'averageUtilization': autoscaling.cpu_threshold}},
+    }]
+    if autoscaling.target_concurrency:
+        metrics.append({
+            'type': 'Pods',
+            'pods': {
+                'metric': {'name': IN_FLIGHT_METRIC},
+                'target': {'type': 'AverageValue', 'averageValue': str(autoscaling.target_concurrency)},
+            },
+        })
+    if autoscaling.target_latency_p95_ms:
+        metrics.append({
+            'type': 'Pods',
+            'pods': {
+                'metric': {'name': LATENCY_P95_METRIC},
+                'target': {'type': 'AverageValue', 'averageValue': f'{autoscaling.target_latency_p95_ms}m'},
+            },
+        })
+    return metrics
+
+
+def hpa_behavior(autoscaling: AutoscalingConfig) -> Dict[str, Any]:
+    """Return the HPA ``behavior``: double quickly, shrink after the stabilization window."""
+    return {
+        'scaleUp': {
+            'stabilizationWindowSeconds': 0,
+            'selectPolicy': 'Max',
+            'policies': [
+                {'type': 'Percent', 'value': 100, 'periodSeconds': 15},
+                {'type': 'Pods', 'value': 4, 'periodSeconds': 15},
+            ],
+        },
+        'scaleDown': {
+            'stabilizationWindowSeconds': autoscaling.scale_down_stabilization_seconds,
+            'policies': [{'type': 'Percent', 'value': 50, 'periodSeconds': 60}],
+        },
+    }
+
+
+def prometheus_adapter_rules() -> Dict[str, Any]:
+    """Return prometheus-adapter rules exposing the exporter's metrics per pod.
+
+    Static assets and scrapes are left out of the latency quantile. The
+    external rule serves the Celery queue lengths redis_exporter reports
+    for the keys it is told to check.
+    """
+    matchers = '<<.LabelMatchers>>,endpoint!~"/static/|/metrics"'
+    return {'rules': [
+        {
+            'seriesQuery': f'{IN_FLIGHT_METRIC}{{namespace!="",pod!=""}}',
+            'resources': {'overrides': {'namespace': {'resource': 'namespace'}, 'pod': {'resource': 'pod'}}},
+            'name': {'matches': f'^{IN_FLIGHT_METRIC}$', 'as': IN_FLIGHT_METRIC},
+            'metricsQuery': 'sum by (<<.GroupBy>>) (<<.Series>>{<<.LabelMatchers>>})',
+        },
+        {
+            'seriesQuery': 'superset_http_request_duration_seconds_bucket{namespace!="",pod!=""}',
+            'resources': {'overrides': {'namespace': {'resource': 'namespace'}, 'pod': {'resource': 'pod'}}},
+            'name': {'matches': '^superset_http_request_duration_seconds_bucket$', 'as': LATENCY_P95_METRIC},
+            'metricsQuery': (
+                'histogram_quantile(0.95, sum by (<<.GroupBy>>, le) '
+                f'(rate(<<.Series>>{{{matchers}}}[2m])))'
+            ),
+        },
+    ], 'externalRules': [
+        {
+            'seriesQuery': 'redis_key_size{key!=""}',
+            'resources': {'overrides': {'namespace': {'resource': 'namespace'}}},
+            'name': {'matches': '^redis_key_size$', 'as': CELERY_QUEUE_METRIC},
+            'metricsQuery': 'sum by (key) (<<.Series>>{<<.LabelMatchers>>})',
+        },
+    ]}
+
+
+def worker_hpa_metrics(autoscaling: WorkerAutoscalingConfig) -> List[Dict[str, Any]]:
+    """Return the metric spec of the Celery worker HPA: waiting tasks per worker.
+
+    The queues' lengths are summed and divided by the worker pods, as
+    ``superset_ext.worker_scaling`` does for compose.
+    """
+    return [{
+        'type': 'External',
+        'external': {
+            'metric': {
+                'name': CELERY_QUEUE_METRIC,
+                'selector': {'matchExpressions': [{'key': 'key', 'operator': 'In', 'values': autoscaling.queues}]},
+            },
+            'target': {'type': 'AverageValue', 'averageValue': str(autoscaling.target_queue_length)},
+        },
+    }]
+
+
+def worker_hpa_behavior(autoscaling: WorkerAutoscalingConfig) -> Dict[str, Any]:
+    """Return the worker HPA ``behavior``: add workers at once, remove them after the cooldown."""
+    return {
+        'scaleUp': {
+            'stabilizationWindowSeconds': 0,
+            'policies': [{'type': 'Pods', 'value': autoscaling.max_workers, 'periodSeconds': 15}],
+        },
+        'scaleDown': {
+            'stabilizationWindowSeconds': autoscaling.cooldown_seconds,
+            'policies': [{'type': 'Percent', 'value': 100, 'periodSeconds': 60}],
+        },
+    }
+
+
+class TracePoint(BaseModel):
+    """Traffic during one interval of a trace."""
+    time: datetime
+    requests_per_second: float
+    service_seconds: Optional[float] = None
+
+
+class SimulationStep(BaseModel):
+    """Predicted state at the end of one trace interval."""
+    time: datetime
+    requests_per_second: float
+    ready_replicas: int
+    desired_replicas: int
+    in_flight_per_replica: float
+    latency_p95_seconds: float
+
+
+def erlang_c(servers: int, load: float) -> float:
+    """Return the probability a request waits in an M/M/c queue (``load`` in Erlangs)."""
+    if load <= 0:
+        return 0.0
+    if load >= servers:
+        return 1.0
+    term = total = 1.0
+    for k in range(1, servers):
+        term *= load / k
+        total += term
+    last = term * load / servers
+    waiting = last * servers / (servers - load)
+    return waiting / (total + waiting)
+
+
+def latency_p95(arrival_rate: float, service_seconds: float, servers: int, timeout: float = 60.0) -> float:
+    """Estimate p95 latency of an instance with ``servers`` request slots (M/M/c).
+
+    Service times are taken as exponential, so their own p95 is three
+    times the mean; the queueing delay follows Erlang C. A saturated
+    instance answers at ``timeout``.
+    """
+    if arrival_rate <= 0:
+        return 3 * service_seconds
+    load = arrival_rate * service_seconds
+    if load >= servers:
+        return timeout
+    service_rate = 1 / service_seconds
+    wait_probability = erlang_c(servers, load)
+    wait_p95 = 0.0
+    if wait_probability > 0.05:
+        wait_p95 = math.log(wait_probability / 0.05) / (servers * service_rate - arrival_rate)
+    return min(timeout, 3 * service_seconds + wait_p95)
+
+
+def _ratio_replicas(current: int, value: float, target: float) -> int:
+    ratio = value / target
+    if abs(ratio - 1) <= HPA_TOLERANCE:
+        return current
+    return math.ceil(current * ratio)
+
+
+def simulate(
+    autoscaling: AutoscalingConfig,
+    trace: Iterable[TracePoint],
+    capacity: int,
+    service_seconds: float = 0.2,
+    startup_seconds: float = 60.0,
+    timeout: float = 60.0,
+) -> List[SimulationStep]:
+    """Replay a traffic trace through the concurrency and latency policies.
+
+    Follows the HPA: each metric asks for ``ceil(replicas x value / target)``
+    (ignoring changes within ``HPA_TOLERANCE``), the highest wins, scale-up
+    is limited to doubling or four replicas per step, scale-down waits for
+    the highest recommendation of ``scale_down_stabilization_seconds``, and
+    replica bounds follow the scaling windows. New replicas serve only
+    after ``startup_seconds`` (see ``scripts/benchmark.py coldstart``).
+    CPU is not modelled. Each replica serves ``capacity`` requests at once.
+    """
+    steps: List[SimulationStep] = []
+    recommendations: List[Tuple[datetime, int]] = []
+    starting: List[Tuple[datetime, int]] = []
+    ready = previous = None
+    for point in trace:
+        if previous is None:
+            minimum, maximum = replica_bounds(autoscaling, point.time)
+            ready = minimum
+        elif autoscaling.windows:
+            # Only the minutes since the previous point can start a window
+            window = _last_fired(autoscaling, previous, point.time)
+            if window is not None:
+                minimum, maximum = window.min_replicas, window.max_replicas
+        previous = point.time
+        # Replicas whose start-up finished
+        ready += sum(count for at, count in starting if at <= point.time)
+        starting = [(at, count) for at, count in starting if at > point.time]
+        scheduled = ready + sum(count for _, count in starting)
+
+        service = point.service_seconds or service_seconds
+        wanted = [minimum]
+        if ready == 0:
+            # Scaled to zero: requests wait for an instance to start
+            in_flight = 0.0
+            p95 = min(timeout, startup_seconds) if point.requests_per_second > 0 else 0.0
+            wanted.append(1 if point.requests_per_second > 0 else 0)
+        else:
+            per_replica_rate = point.requests_per_second / ready
+            in_flight = per_replica_rate * service
+            p95 = latency_p95(per_replica_rate, service, capacity, timeout)
+            if autoscaling.target_concurrency:
+                wanted.append(_ratio_replicas(ready, in_flight, autoscaling.target_concurrency))
+            if autoscaling.target_latency_p95_ms:
+                wanted.append(_ratio_replicas(ready, p95, autoscaling.target_latency_p95_ms / 1000))
+        desired = min(maximum, max(wanted))
+
+        recommendations.append((point.time, desired))
+        window_start = point.time - timedelta(seconds=autoscaling.scale_down_stabilization_seconds)
+        recommendations = [(at, count) for at, count in recommendations if at >= window_start]
+        if desired < scheduled:
+            desired = min(scheduled, max(count for _, count in recommendations))
+            desired = max(minimum, desired)
+        else:
+            desired = min(desired, max(2 * scheduled, scheduled + 4))
+
+        if desired > scheduled:
+            starting.append((point.time + timedelta(seconds=startup_seconds), desired - scheduled))
+        elif desired < scheduled:
+            # Replicas still starting are cancelled first
+            surplus = scheduled - desired
+            while surplus and starting:
+                at, count = starting.pop()
+                if count > surplus:
+                    starting.append((at, count - surplus))
+                    surplus = 0
+                else:
+                    surplus -= count
+            ready -= surplus
+
+        steps.append(SimulationStep(
+            time=point.time,
+            requests_per_second=point.requests_per_second,
+            ready_replicas=ready,
+            desired_replicas=desired,
+            in_flight_per_replica=round(in_flight, 3),
+            latency_p95_seconds=round(p95, 3),
+        ))
+    return steps
@@ -328,6 +328,13 @@ def validate_monitoring_configuration(monitoring_config: Dict[str, Any], stack_t
         storage_size = prometheus_config.get('storage_size', 10)
         if stack_type == 'production' and storage_size < 50:
             warnings.append(f"Prometheus storage ({storage_size}GB) might be insufficient for production.")
+
+        if stack_type == 'production' and not monitoring_config.get('grafana', {}).get('admin_password'):
+            warnings.append("Grafana admin password is not set; monitoring.grafana.admin_password is required on GKE.")
+
+        alerting = monitoring_config.get('alerting', {})
+        if alerting.get('enabled') and not alerting.get('channels'):
+            warnings.append("Alerting has no channels; latency SLO alerts are only visible in Alertmanager.")
     
     return warnings
 
@@ -377,6 +384,27 @@ def expand_environment_variables(value: str, strict: bool = False) -> str:
     return result
 
 
+def validate_warmup_configuration(superset_config: Dict[str, Any], stack_type: str) -> List[str]:
+    """Validate cache warm-up configuration.
+    
+    Args:
+        superset_config: Superset configuration dict
+        stack_type: Type of stack
+        
+    Returns:
+        List of warning messages
+    """
+    warnings = []
+    
+    # The Cloud Run warm-up job runs superset_ext from the prebaked image
+    warmup_enabled = superset_config.get('warmup', {}).get('enabled', True)
+    image_enabled = superset_config.get('image', {}).get('enabled', False)
+    if stack_type in ['standard', 'production'] and warmup_enabled and not image_enabled:
+        warnings.append("Cache warm-up needs the prebaked image (superset.image.enabled); no warm-up job will be deployed.")
+    
+    return warnings
+
+
 def validate_network_configuration(vpc_config: Dict[str, Any], stack_type: str) -> List[str]:
     """Validate network/VPC configuration.
     
@@ -558,6 +586,75 @@ def validate_cidr_format(cidr: str) -> tuple[bool, Optional[str]]:
     return True, None
 
 
+# Cron fields: name, lowest and highest value
+CRON_FIELDS = [
+    ('minute', 0, 59),
+    ('hour', 0, 23),
+    ('day', 1, 31),
+    ('month', 1, 12),
+    ('day of week', 0, 6),
+]
+
+
+def _parse_cron_field(part: str, name: str, low: int, high: int) -> frozenset:
+    """Return the values one cron field matches (``*``, ``a-b``, ``a,b``, ``*/n``, ``a-b/n``)."""
+    values = set()
+    try:
+        for item in part.split(','):
+            base, slash, step = item.partition('/')
+            step = int(step) if slash else 1
+            if base in ('*', '?'):
+                start, end = low, high
+            elif '-' in base:
+                start, end = map(int, base.split('-'))
+            else:
+                start = int(base)
+                # "5/15" means from 5 on, every 15
+                end = high if slash else start
+            if step < 1 or start < low or end > high or start > end:
+                raise ValueError
+            values.update(range(start, end + 1, step))
+    except ValueError:
+        kind = 'range' if '-' in part else 'list' if ',' in part else 'step' if '/' in part else 'value'
+        raise ValueError(f"Invalid {name} {kind}: {part}")
+    return frozenset(values)
+
+
+@lru_cache(maxsize=256)
+def parse_cron_expression(expression: str) -> tuple:
+    """Parse a cron expression into the set of values of each of its five fields.
+
+    A sixth field (year) is accepted and ignored.
+
+    Raises:
+        ValueError: If the expression is not valid
+    """
+    parts = expression.strip().split()
+    if len(parts) not in [5, 6]:
+        raise ValueError(f"Invalid cron expression: {expression}. Expected 5 or 6 fields.")
+    return tuple(
+        _parse_cron_field(part, name, low, high)
+        for part, (name, low, high) in zip(parts[:5], CRON_FIELDS)
+    )
+
+
+def cron_matches(expression: str, when: datetime) -> bool:
+    """Return whether a cron expression fires at the minute of ``when``.
+
+    As in cron, when both day of month and day of week are restricted a
+    day matching either fires.
+    """
+    minutes, hours, days, months, weekdays = parse_cron_expression(expression)
+    if when.minute not in minutes or when.hour not in hours or when.month not in months:
+        return False
+    day, weekday = when.day in days, (when.weekday() + 1) % 7 in weekdays
+    fields = expression.split()
+    day_part, weekday_part = fields[2], fields[4]
+    if day_part not in ('*', '?') and weekday_part not in ('*', '?'):
+        return day or weekday
+    return day and weekday
+
+
 def validate_cron_expression(expression: str) -> tuple[bool, Optional[str]]:
     """Validate cron expression format.
     
@@ -567,59 +664,8 @@ def validate_cron_expression(expression: str) -> tuple[bool, Optional[str]]:
     Returns:
         Tuple of (is_valid, error_message)
     """
-    # Simple cron validation (5 or 6 fields)
-    parts = expression.strip().split()
-    
-    if len(parts) not in [5, 6]:
-        return False, f"Invalid cron expression: {expression}. Expected 5 or 6 fields."
-    
-    # Field ranges
-    field_ranges = [
-        (0, 59),   # minute
-        (0, 23),   # hour
-        (1, 31),   # day of month
-        (1, 12),   # month
-        (0, 6),    # day of week
-    ]
-    
-    for i, (part, (min_val, max_val)) in enumerate(zip(parts[:5], field_ranges)):
-        # Handle special characters
-        if part in ['*', '?']:
-            continue
-        
-        # Handle ranges (e.g., "1-5")
-        if '-' in part:
-            try:
-                start, end = map(int, part.split('-'))
-                if start < min_val or end > max_val or start > end:
-                    raise ValueError
-            except ValueError:
-                field_names = ['minute', 'hour', 'day', 'month', 'day of week']
-                return False, f"Invalid {field_names[i]} range: {part}"
-            continue
-        
-        # Handle lists (e.g., "1,3,5")
-        if ',' in part:
-            try:
-                values = [int(v) for v in part.split(',')]
-                if any(v < min_val or v > max_val for v in values):
-                    raise ValueError
-            except ValueError:
-                field_names = ['minute', 'hour', 'day', 'month', 'day of week']
-                return False, f"Invalid {field_names[i]} list: {part}"
-            continue
-        
-        # Handle step values (e.g., "*/5")
-        if '/' in part:
-            continue  # More complex validation needed
-        
-        # Handle simple values
-        try:
-            value = int(part)
-            if value < min_val or value > max_val:
-                raise ValueError
-        except ValueError:
-            field_names = ['minute', 'hour', 'day', 'month', 'day of week']
-            return False, f"Invalid {field_names[i]} value: {part}"
-    
+    try:
+        parse_cron_expression(expression)
+    except ValueError as e:
+        return False, str(e)
     return True, None
\ No newline at end of file
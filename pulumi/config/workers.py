@@ -0,0 +1,153 @@
+"""Celery queues and the worker pools consuming them.
+
+Every task goes to the default ``celery`` queue unless its class is listed
+in ``superset.celery.queues``; listed classes get ``task_routes`` to a queue
+of their own and a worker pool with its own concurrency and prefetch, so a
+batch of thumbnails or a report run no longer waits in front of (or
+holds the processes of) interactive SQL Lab and async chart queries:
+
+- ``sql_lab``: SQL Lab and global async chart queries, a user waiting
+- ``reports``: alerts and reports, screenshots through a browser
+- ``thumbnails``: dashboard and chart thumbnails, also a browser each
+- ``warmup``: dashboard cache warm-up, HTTP requests to the web tier
+
+The default pool keeps the previous settings (one process per gunicorn
+worker, prefetch 10, 1 with queue autoscaling). With
+``superset.celery.browser_pool`` the ``reports`` and ``thumbnails`` pools
+default to one thread per warm browser of ``superset_ext.browser_pool``.
+The pools are rendered as ``celery worker`` commands for the GKE
+Deployments (``pulumi.config.gke``) and for compose services
+(``compose_worker_services``).
+"""
+
+import os
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from .models import ResourceConfig, StackConfig
+
+# Celery application of the Superset image
+CELERY_APP = 'superset.tasks.celery_app:app'
+
+DEFAULT_QUEUE = 'celery'
+
+# Tasks of each dedicated queue, by Celery task name
+QUEUE_TASKS = {
+    'sql_lab': (
+        'sql_lab.get_sql_results',
+        'load_chart_data_into_cache',
+        'load_explore_json_into_cache',
+    ),
+    'reports': ('reports.scheduler', 'reports.execute', 'reports.prune_log'),
+    'thumbnails': ('cache_chart_thumbnail', 'cache_dashboard_thumbnail', 'cache_dashboard_screenshot'),
+    'warmup': ('superset_ext.warm_up_dashboards', 'cache-warmup', 'fetch_url'),
+}
+
+# Browser renders take hundreds of MB each; warm-up runs its own threads
+DEFAULT_CONCURRENCY = {'reports': 2, 'thumbnails': 2, 'warmup': 1}
+
+# Queues whose tasks take screenshots
+BROWSER_QUEUES = ('reports', 'thumbnails')
+
+# Worker /metrics (queue waits, browser pool render timings)
+WORKER_METRICS_PORT = 9808
+
+
+class WorkerPool(BaseModel):
+    """Workers consuming one queue."""
+    queue: str
+    concurrency: int
+    prefetch_multiplier: int
+    pool: str = 'prefork'
+    max_tasks_per_child: Optional[int] = None
+    replicas: int
+    resources: ResourceConfig
+    # Queues whose backlog scales the pool (empty: fixed replicas)
+    autoscaled_queues: List[str] = []
+
+    @property
+    def component(self) -> str:
+        """Name suffix of the pool's Deployment or compose service."""
+        if self.queue == DEFAULT_QUEUE:
+            return 'worker'
+        return 'worker-' + self.queue.replace('_', '-')
+
+
+def task_routes(stack: StackConfig) -> Dict[str, Dict[str, str]]:
+    """Return Celery ``task_routes`` sending each listed task class to its queue."""
+    return {
+        task: {'queue': queue}
+        for queue in stack.superset.celery.queues
+        for task in QUEUE_TASKS[queue]
+    }
+
+
+def worker_pools(stack: StackConfig, processes: int) -> List[WorkerPool]:
+    """Return the default pool, then one pool per dedicated queue.
+
+    ``processes`` is the default concurrency, ``derive_sizing().workers``.
+    A pool is autoscaled on the ``celery.autoscaling`` queues it consumes;
+    the default pool counts the queues nobody else consumes.
+    """
+    celery = stack.superset.celery
+    autoscaling = celery.autoscaling
+    scaled = autoscaling.queues if autoscaling.enabled else []
+
+    pools = [WorkerPool(
+        queue=DEFAULT_QUEUE,
+        concurrency=processes,
+        # Queue-driven autoscaling needs the backlog in Redis, not prefetched by workers
+        prefetch_multiplier=1 if autoscaling.enabled else 10,
+        replicas=stack.superset.replicas,
+        resources=stack.superset.resources,
+        autoscaled_queues=[queue for queue in scaled if queue not in celery.queues],
+    )]
+    for queue, config in celery.queues.items():
+        browsers = celery.browser_pool.enabled and queue in BROWSER_QUEUES
+        pool = config.pool or ('threads' if browsers else 'prefork')
+        concurrency = DEFAULT_CONCURRENCY.get(queue, processes)
+        if browsers and pool == 'threads':
+            # Threads share the process's browsers; more would only wait for one
+            concurrency = celery.browser_pool.size
+        pools.append(WorkerPool(
+            queue=queue,
+            concurrency=config.concurrency or concurrency,
+            prefetch_multiplier=config.prefetch_multiplier,
+            pool=pool,
+            max_tasks_per_child=config.max_tasks_per_child,
+            replicas=config.replicas,
+            resources=config.resources or stack.superset.resources,
+            autoscaled_queues=[queue] if queue in scaled else [],
+        ))
+    return pools
+
+
+def worker_command(pool: WorkerPool) -> List[str]:
+    """Return the ``celery worker`` command line of a pool."""
+    command = [
+        'celery', f'--app={CELERY_APP}', 'worker', '--loglevel=INFO',
+        f'--queues={pool.queue}', f'--hostname={pool.queue}@%h',
+        f'--pool={pool.pool}', f'--concurrency={pool.concurrency}',
+        f'--prefetch-multiplier={pool.prefetch_multiplier}', '-O', 'fair',
+    ]
+    if pool.max_tasks_per_child:
+        command.append(f'--max-tasks-per-child={pool.max_tasks_per_child}')
+    return command
+
+
+def compose_worker_services(stack: StackConfig, processes: int, compose_file: str, output: str) -> Dict[str, Any]:
+    """Return a compose override running one worker service per pool.
+
+    The default pool replaces the ``superset-worker`` command; the others
+    extend that service from ``compose_file``, a path made relative to the
+    override written at ``output``.
+    """
+    base = os.path.relpath(compose_file, os.path.dirname(os.path.abspath(output)))
+    services: Dict[str, Any] = {}
+    for pool in worker_pools(stack, processes):
+        service = f'superset-{pool.component}'
+        services[service] = {'command': worker_command(pool)}
+        if pool.queue != DEFAULT_QUEUE:
+            services[service]['extends'] = {'file': base, 'service': 'superset-worker'}
+    return {'services': services}
@@ -3,6 +3,7 @@
 import pulumi
 from pulumi import Output
 import pulumi_gcp as gcp
+import pulumi_kubernetes as k8s
 from typing import Dict, Any
 
 from .base import BaseStack
@@ -12,6 +13,10 @@ from ..components.superset import SupersetGKE
 from ..components.monitoring import MonitoringStack
 from ..components.security import SecurityManager
 from ..components.cloudflare import CloudflareTunnel
+from ..components.warmup import CacheWarmupJob
+from ..components.image import SupersetImage
+from ..components.scaling import ScheduledScaling
+from ..config.gke import kubeconfig
 
 
 class ProductionStack(BaseStack):
@@ -153,30 +158,89 @@ class ProductionStack(BaseStack):
             project=project_id
         )
         
+        # Kubernetes provider of the cluster, usable once nodes exist
+        k8s_provider = k8s.Provider(
+            self.get_resource_name('k8s'),
+            kubeconfig=Output.all(
+                cluster.name, cluster.endpoint, cluster.master_auth.cluster_ca_certificate
+            ).apply(lambda args: kubeconfig(*args)),
+            opts=pulumi.ResourceOptions(depends_on=[node_pool])
+        )
+        
+        # Build the prebaked image (plugins, config, bytecode) if enabled
+        image_outputs = {}
+        if self.superset_config.get('image', {}).get('enabled', False):
+            image = SupersetImage(
+                name=self.get_resource_name('superset-image'),
+                config=self.config,
+                project_id=project_id,
+                region=region,
+                labels=self.get_labels()
+            )
+            image_outputs = image.deploy()
+        
+        # Deploy Prometheus and Grafana first: prometheus-adapter queries Prometheus
+        monitoring = None
+        monitoring_outputs = {}
+        if self.config.get('monitoring', {}).get('enabled', False):
+            monitoring = MonitoringStack(
+                name=self.get_resource_name('monitoring'),
+                config=self.config,
+                k8s_provider=k8s_provider,
+                labels=self.get_labels()
+            )
+            monitoring_outputs = monitoring.deploy()
+        
         # Deploy Superset on GKE
         superset = SupersetGKE(
             name=self.get_resource_name('superset'),
-            config=self.superset_config,
-            cluster=cluster,
+            config=self.config,
+            k8s_provider=k8s_provider,
             database_url=db_outputs['connection_string'],
             redis_url=cache_outputs['url'],
             secret_key=security_outputs['secret_key'],
             project_id=project_id,
-            labels=self.get_labels()
+            labels=self.get_labels(),
+            image=image_outputs.get('image'),
+            prometheus=monitoring.prometheus if monitoring else None,
+            admin_password=security_outputs['admin_password']
         )
         superset_outputs = superset.deploy()
         
-        # Deploy monitoring stack if enabled
-        monitoring_outputs = {}
-        if self.config.get('monitoring', {}).get('enabled', False):
-            monitoring = MonitoringStack(
-                name=self.get_resource_name('monitoring'),
-                config=self.config.get('monitoring', {}),
-                cluster=cluster,
+        # Patch the HPA bounds on the autoscaling windows' schedules
+        scaling_outputs = {}
+        autoscaling_config = self.superset_config.get('autoscaling') or {}
+        if autoscaling_config.get('windows') and superset_outputs['hpa_name']:
+            scaling = ScheduledScaling(
+                name=self.get_resource_name('scaling'),
+                config=autoscaling_config,
                 project_id=project_id,
+                region=region,
+                hpa_name=superset_outputs['hpa_name'],
+                namespace=superset_outputs['namespace'],
+                k8s_provider=k8s_provider,
                 labels=self.get_labels()
             )
-            monitoring_outputs = monitoring.deploy()
+            scaling_outputs = scaling.deploy()
+        
+        # Warm the chart data cache of the top dashboards after deploys
+        warmup_outputs = {}
+        # The job runs superset_ext from the prebaked image
+        if self.superset_config.get('warmup', {}).get('enabled', True) and image_outputs:
+            warmup = CacheWarmupJob(
+                name=self.get_resource_name('warmup'),
+                config=self.superset_config,
+                project_id=project_id,
+                region=region,
+                superset_url=superset_outputs['url'],
+                database_url=db_outputs['connection_string'],
+                admin_password_secret=security_outputs['admin_password_secret'],
+                image=image_outputs['image'],
+                network=network,
+                subnet=subnet,
+                labels=self.get_labels()
+            )
+            warmup_outputs = warmup.deploy()
         
         # Set up backups if enabled
         backup_config = self.config.get('backup', {})
@@ -205,15 +269,21 @@ class ProductionStack(BaseStack):
             'cluster_name': cluster.name,
             'cluster_endpoint': cluster.endpoint,
             'superset_url': superset_outputs['url'],
+            'superset_namespace': superset_outputs['namespace'],
+            'scaling_jobs': scaling_outputs.get('jobs'),
+            'warmup_job': warmup_outputs.get('job_name'),
+            'superset_image': image_outputs.get('image'),
             'database_instance': db_outputs['instance_name'],
             'database_connection_name': db_outputs['connection_name'],
             'cache_instance': cache_outputs['instance_name'],
             'monitoring_url': monitoring_outputs.get('grafana_url'),
+            'prometheus_url': monitoring_outputs.get('prometheus_url'),
+            'alertmanager_url': monitoring_outputs.get('alertmanager_url'),
             'backup_bucket': backup_bucket.url if backup_config.get('enabled') else None,
             'instructions': Output.concat(
                 'Production stack deployed successfully!\n',
                 'Superset URL: ', superset_outputs['url'], '\n',
-                'Grafana URL: ', monitoring_outputs.get('grafana_url', 'Not enabled'), '\n',
+                'Grafana: ', monitoring_outputs.get('grafana_port_forward', 'Not enabled'), '\n',
                 'To connect to cluster: gcloud container clusters get-credentials ',
                 cluster.name, ' --region=', region, ' --project=', project_id
             )
@@ -6,11 +6,16 @@ import pulumi_gcp as gcp
 from typing import Dict, Any
 
 from .base import BaseStack
+from ..config.generator import cloud_run_settings, derive_sizing, gunicorn_command_args
+from ..config.models import StackConfig
 from ..components.database import CloudSQLDatabase
 from ..components.cache import RedisCache
 from ..components.superset import SupersetCloudRun
 from ..components.security import SecurityManager
 from ..components.cloudflare import CloudflareTunnel
+from ..components.warmup import CacheWarmupJob
+from ..components.image import SupersetImage
+from ..components.scaling import ScheduledScaling
 
 
 class StandardStack(BaseStack):
@@ -86,7 +91,20 @@ class StandardStack(BaseStack):
         )
         security_outputs = security.deploy()
         
+        # Build the prebaked image (plugins, config, bytecode) if enabled
+        image_outputs = {}
+        if self.superset_config.get('image', {}).get('enabled', False):
+            image = SupersetImage(
+                name=self.get_resource_name('superset-image'),
+                config=self.config,
+                project_id=project_id,
+                region=region,
+                labels=self.get_labels()
+            )
+            image_outputs = image.deploy()
+        
         # Deploy Superset on Cloud Run
+        stack = StackConfig(**self.config)
         superset = SupersetCloudRun(
             name=self.get_resource_name('superset'),
             config=self.superset_config,
@@ -97,10 +115,47 @@ class StandardStack(BaseStack):
             secret_key=security_outputs['secret_key'],
             network=network,
             subnet=subnet,
-            labels=self.get_labels()
+            labels=self.get_labels(),
+            gunicorn_args=gunicorn_command_args(derive_sizing(stack), self.superset_config.get('port', 8088)),
+            image=image_outputs.get('image'),
+            cloud_run=cloud_run_settings(stack, self.get_resource_name('superset')),
+            admin_password=security_outputs['admin_password']
         )
         superset_outputs = superset.deploy()
         
+        # Apply scheduled scaling windows (e.g. pre-scale for the morning peak)
+        scaling_outputs = {}
+        autoscaling_config = self.superset_config.get('autoscaling') or {}
+        if autoscaling_config.get('windows'):
+            scaling = ScheduledScaling(
+                name=self.get_resource_name('scaling'),
+                config=autoscaling_config,
+                project_id=project_id,
+                region=region,
+                service_name=superset_outputs['service_name'],
+                labels=self.get_labels()
+            )
+            scaling_outputs = scaling.deploy()
+        
+        # Warm the chart data cache of the top dashboards after deploys
+        warmup_outputs = {}
+        # The job runs superset_ext from the prebaked image
+        if self.superset_config.get('warmup', {}).get('enabled', True) and image_outputs:
+            warmup = CacheWarmupJob(
+                name=self.get_resource_name('warmup'),
+                config=self.superset_config,
+                project_id=project_id,
+                region=region,
+                superset_url=superset_outputs['url'],
+                database_url=db_outputs['connection_string'],
+                admin_password_secret=security_outputs['admin_password_secret'],
+                image=image_outputs['image'],
+                network=network,
+                subnet=subnet,
+                labels=self.get_labels()
+            )
+            warmup_outputs = warmup.deploy()
+        
         # Deploy Cloudflare Tunnel if enabled
         cloudflare_outputs = {}
         cloudflare_config = self.config.get('cloudflare', {})
@@ -136,6 +191,9 @@ class StandardStack(BaseStack):
             'project_id': project_id,
             'region': region,
             'superset_url': superset_outputs['url'],
+            'warmup_job': warmup_outputs.get('job_name'),
+            'superset_image': image_outputs.get('image'),
+            'scaling_jobs': scaling_outputs.get('jobs', []),
             'superset_service': superset_outputs['service_name'],
             'database_instance': db_outputs['instance_name'],
             'database_connection_name': db_outputs['connection_name'],
@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""Micro-benchmarks for the Superset runtime extensions.
+
+Usage:
+    python scripts/benchmark.py cache --redis-url redis://localhost:6379/0
+    python scripts/benchmark.py singleflight --workers 32
+    python scripts/benchmark.py opmeter --statements 20000
+    python scripts/benchmark.py usage --requests 100000
+    python scripts/benchmark.py admission --clients 64 --service-ms 50
+    python scripts/benchmark.py coldstart --url http://localhost:8088/health \
+        --start-command "docker compose -f docker/docker-compose.minimal.yaml up -d --force-recreate superset"
+"""
+
+import argparse
+import multiprocessing
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add the mounted Superset pythonpath to the import path
+sys.path.append(str(Path(__file__).parent.parent / 'docker' / 'local'))
+
+
+def bench_cache(args):
+    """Compare hot-key read latency of plain Redis vs. the layered L1+Redis cache."""
+    from flask_caching.backends.rediscache import RedisCache
+    from superset_ext.cache import LayeredRedisCache, percentile
+
+    import redis
+    client = redis.from_url(args.redis_url)
+    payload = {'rows': [{'id': i, 'value': 'x' * 32} for i in range(args.rows)]}
+    keys = [f'bench_{i}' for i in range(args.keys)]
+
+    plain = RedisCache(host=client, key_prefix='bench_plain_')
+    layered = LayeredRedisCache(
+        host=client,
+        key_prefix='bench_layered_',
+        l1_max_bytes=args.l1_mb * 1024 * 1024,
+        l1_timeout=args.l1_timeout,
+    )
+
+    results = {}
+    for name, cache in (('redis', plain), ('layered', layered)):
+        for key in keys:
+            cache.set(key, payload, timeout=300)
+        if name == 'layered':
+            # Writes populate L1; start cold so L2 -> L1 promotion is measured too
+            cache.l1.clear()
+
+        samples = []
+        for _ in range(args.iterations):
+            # Zipf-like skew: most reads go to a few hot keys
+            key = keys[min(int(random.paretovariate(1.2)) - 1, len(keys) - 1)]
+            started = time.perf_counter()
+            cache.get(key)
+            samples.append(time.perf_counter() - started)
+        results[name] = samples
+        cache.clear()
+
+    print(f"{'backend':<10} {'p50 ms':>10} {'p99 ms':>10}")
+    for name, samples in results.items():
+        print(f"{name:<10} {percentile(samples, 50) * 1000:>10.3f} {percentile(samples, 99) * 1000:>10.3f}")
+
+    stats = layered.stats()
+    print(f"\nL1 hit ratio: {stats['l1_hit_ratio']:.1%}  L2 hit ratio: {stats['l2_hit_ratio']:.1%}")
+    saving = percentile(results['redis'], 99) - percentile(results['layered'], 99)
+    print(f"p99 latency saving: {saving * 1000:.3f} ms")
+
+
+def _burst_worker(make_cache, start, queries, query_seconds):
+    """One simulated browser: read the chart, run the query on a miss."""
+    cache = make_cache()
+    start.wait()
+    if cache.get('chart') is None:
+        with queries.get_lock():
+            queries.value += 1
+        time.sleep(query_seconds)
+        cache.set('chart', {'rows': 42}, timeout=300)
+
+
+def _make_sqlite_cache(path, single_flight):
+    from superset_ext.cache import SQLiteCache
+    from superset_ext.singleflight import SingleFlightCache
+    backend = SQLiteCache(path=path)
+    return SingleFlightCache(backend, poll_interval=0.01) if single_flight else backend
+
+
+def _make_redis_cache(url, single_flight):
+    import redis
+    from flask_caching.backends.rediscache import RedisCache
+    from superset_ext.singleflight import SingleFlightCache
+    backend = RedisCache(host=redis.from_url(url), key_prefix='bench_sf_')
+    return SingleFlightCache(backend, poll_interval=0.01) if single_flight else backend
+
+
+def bench_singleflight(args):
+    """Count backend queries when a burst of workers misses the same key."""
+    from functools import partial
+
+    print(f"{'cache':<15} {'workers':>8} {'queries':>8} {'seconds':>8}")
+    for single_flight in (False, True):
+        with tempfile.TemporaryDirectory() as directory:
+            if args.redis_url:
+                make_cache = partial(_make_redis_cache, args.redis_url, single_flight)
+            else:
+                make_cache = partial(_make_sqlite_cache, f'{directory}/data.db', single_flight)
+            make_cache().clear()
+
+            start = multiprocessing.Event()
+            queries = multiprocessing.Value('i', 0)
+            workers = [
+                multiprocessing.Process(
+                    target=_burst_worker,
+                    args=(make_cache, start, queries, args.query_seconds),
+                )
+                for _ in range(args.workers)
+            ]
+            for worker in workers:
+                worker.start()
+            started = time.perf_counter()
+            start.set()
+            for worker in workers:
+                worker.join()
+            elapsed = time.perf_counter() - started
+
+        name = 'single-flight' if single_flight else 'plain'
+        print(f"{name:<15} {args.workers:>8} {queries.value:>8} {elapsed:>8.2f}")
+
+
+def bench_opmeter(args):
+    """Per-statement overhead of the old before_execute hook vs. the operation meter."""
+    from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, event, select
+    from superset_ext.opmeter import OperationMeter
+
+    def legacy_hook(conn, clauseelement, multiparams, params, execution_options):
+        # What superset_config_full_free_tier.py used to do on every statement
+        statement = str(clauseelement)
+        if statement.upper().startswith('SELECT'):
+            pass
+        elif statement.upper().startswith(('INSERT', 'UPDATE')):
+            pass
+        elif statement.upper().startswith('DELETE'):
+            pass
+
+    def run(setup):
+        engine = create_engine('sqlite://')
+        metadata = MetaData()
+        table = Table('slices', metadata, Column('id', Integer, primary_key=True), Column('name', String(64)))
+        metadata.create_all(engine)
+        setup(engine)
+        query = select(table.c.id, table.c.name).where(table.c.id == 1)
+        timings = []
+        with engine.connect() as conn:
+            # Best of several rounds, after one warm-up round
+            for _ in range(args.rounds + 1):
+                started = time.perf_counter()
+                for _ in range(args.statements):
+                    conn.execute(query).fetchall()
+                timings.append((time.perf_counter() - started) / args.statements)
+        return min(timings[1:])
+
+    with tempfile.TemporaryDirectory() as directory:
+        variants = [
+            ('none', lambda engine: None),
+            ('before_execute', lambda engine: event.listen(engine, 'before_execute', legacy_hook)),
+            # SQLAlchemy's own cost of dispatching a cursor event
+            ('noop listener', lambda engine: event.listen(engine, 'before_cursor_execute', lambda *_: None)),
+        ]
+        meters = []
+        for rate in args.sample_rates:
+            meter = OperationMeter(path=f'{directory}/operations-{rate}.db', sample_rate=rate)
+            meters.append(meter)
+            variants.append((f'meter@{rate:g}', meter.install))
+
+        baseline = None
+        print(f"{'hook':<16} {'us/stmt':>10} {'overhead us':>12}")
+        for name, setup in variants:
+            seconds = run(setup)
+            baseline = seconds if baseline is None else baseline
+            print(f"{name:<16} {seconds * 1e6:>10.2f} {(seconds - baseline) * 1e6:>12.2f}")
+        for meter in meters:
+            meter.flush()
+
+
+def bench_usage(args):
+    """Per-request cost of the usage tracking middleware."""
+    from superset_ext.usage import UsageMiddleware, UsageTracker
+
+    def app(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [b'ok']
+
+    def run(wsgi_app):
+        environ = {'PATH_INFO': '/api/v1/chart/data', 'REQUEST_METHOD': 'POST'}
+        started = time.perf_counter()
+        for _ in range(args.requests):
+            body = wsgi_app(environ, lambda status, headers: None)
+            for _ in body:
+                pass
+            if hasattr(body, 'close'):
+                body.close()
+        return (time.perf_counter() - started) / args.requests
+
+    with tempfile.TemporaryDirectory() as directory:
+        tracker = UsageTracker(path=f'{directory}/requests.db')
+        bare = run(app)
+        tracked = run(UsageMiddleware(app, tracker=tracker))
+        tracker.flush()
+
+    print(f"{'app':<12} {'us/request':>12}")
+    print(f"{'bare':<12} {bare * 1e6:>12.2f}")
+    print(f"{'tracked':<12} {tracked * 1e6:>12.2f}")
+    print(f"\nOverhead: {(tracked - bare) * 1e6:.2f} us/request")
+
+
+def bench_metrics(args):
+    """Per-request cost of the Prometheus metrics middleware and of a scrape."""
+    from superset_ext.metrics import MetricsMiddleware, MetricsRegistry
+
+    def app(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [b'ok']
+
+    def run(wsgi_app):
+        environ = {'PATH_INFO': '/api/v1/chart/data', 'REQUEST_METHOD': 'POST'}
+        started = time.perf_counter()
+        for _ in range(args.requests):
+            body = wsgi_app(environ, lambda status, headers, exc_info=None: None)
+            for _ in body:
+                pass
+            if hasattr(body, 'close'):
+                body.close()
+        return (time.perf_counter() - started) / args.requests
+
+    with tempfile.TemporaryDirectory() as directory:
+        registry = MetricsRegistry(directory=directory)
+        bare = run(app)
+        metered = run(MetricsMiddleware(app, registry=registry))
+        started = time.perf_counter()
+        registry.render()
+        scrape = time.perf_counter() - started
+
+    print(f"{'app':<12} {'us/request':>12}")
+    print(f"{'bare':<12} {bare * 1e6:>12.2f}")
+    print(f"{'metered':<12} {metered * 1e6:>12.2f}")
+    print(f"\nOverhead: {(metered - bare) * 1e6:.2f} us/request, scrape: {scrape * 1e3:.2f} ms")
+
+
+def bench_admission(args):
+    """Tail latency of a tiny instance under a burst, with and without admission control."""
+    import threading
+    import urllib.error
+    import urllib.request
+    from socketserver import ThreadingMixIn
+    from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+    from superset_ext.admission import AdmissionMiddleware
+    from superset_ext.cache import percentile
+
+    class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+        daemon_threads = True
+        request_queue_size = 1024
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    # One request at a time, like a single worker on 0.25 vCPU
+    busy = threading.Semaphore(1)
+
+    def app(environ, start_response):
+        with busy:
+            time.sleep(args.service_ms / 1000)
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [b'ok']
+
+    def burst(wsgi_app):
+        server = make_server('127.0.0.1', 0, wsgi_app, ThreadingWSGIServer, QuietHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f'http://127.0.0.1:{server.server_port}/api/v1/chart/data'
+        results = []
+        lock = threading.Lock()
+
+        def client():
+            started = time.perf_counter()
+            try:
+                status = urllib.request.urlopen(url, timeout=args.timeout).status
+            except urllib.error.HTTPError as e:
+                status = e.code
+            except OSError:
+                status = 'timeout'
+            with lock:
+                results.append((status, time.perf_counter() - started))
+
+        clients = [threading.Thread(target=client) for _ in range(args.clients)]
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        server.shutdown()
+        return results
+
+    service = args.service_ms / 1000
+    routes = {'chart_data': {
+        'rate': 1 / service,
+        'burst': 1,
+        'max_queue': args.max_queue,
+        'max_wait_seconds': args.max_wait,
+    }}
+    print(f"{'setup':<10} {'status':<8} {'count':>6} {'p50 ms':>9} {'p99 ms':>9}")
+    # Enough threads that the queue, not the waiter cap, bounds the wait
+    admission = AdmissionMiddleware(app, routes=routes, threads=args.max_queue + 1)
+    for name, wsgi_app in (('none', app), ('admission', admission)):
+        by_status = {}
+        for status, latency in burst(wsgi_app):
+            by_status.setdefault(str(status), []).append(latency)
+        for status, latencies in sorted(by_status.items()):
+            print(
+                f"{name:<10} {status:<8} {len(latencies):>6} "
+                f"{percentile(latencies, 50) * 1000:>9.1f} {percentile(latencies, 99) * 1000:>9.1f}"
+            )
+
+
+def bench_coldstart(args):
+    """Time from starting an instance to its first healthy response.
+
+    With ``--start-command`` (e.g. recreating a compose service) the clock
+    starts before the command and ``--url`` is polled; without it a single
+    request is timed, which on a Cloud Run service scaled to zero includes
+    starting an instance. ``--stop-command`` makes the next run cold again.
+    """
+    import subprocess
+    import urllib.error
+    import urllib.request
+    from superset_ext.cache import percentile
+
+    def probe():
+        try:
+            return urllib.request.urlopen(args.url, timeout=args.timeout).status
+        except urllib.error.HTTPError as e:
+            return e.code
+        except OSError:
+            return None
+
+    print(f"{'run':<5} {'first response s':>17} {'healthy s':>10}")
+    healthy_times = []
+    for run in range(args.runs):
+        if args.stop_command:
+            subprocess.run(args.stop_command, shell=True, check=True)
+        started = time.perf_counter()
+        if args.start_command:
+            subprocess.run(args.start_command, shell=True, check=True)
+
+        first_response = healthy = None
+        deadline = started + args.timeout
+        while time.perf_counter() < deadline:
+            status = probe()
+            elapsed = time.perf_counter() - started
+            if status is not None and first_response is None:
+                first_response = elapsed
+            if status == 200:
+                healthy = elapsed
+                break
+            time.sleep(args.interval)
+
+        if healthy is None:
+            print(f"{run:<5} {'-':>17} {'timeout':>10}")
+            continue
+        healthy_times.append(healthy)
+        print(f"{run:<5} {first_response:>17.2f} {healthy:>10.2f}")
+
+    if healthy_times:
+        print(
+            f"\nHealthy after p50 {percentile(healthy_times, 50):.2f}s, "
+            f"max {max(healthy_times):.2f}s over {len(healthy_times)} runs"
+        )
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description='Benchmark Superset runtime extensions')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    cache_parser = subparsers.add_parser('cache', help='L1+Redis vs. Redis read latency')
+    cache_parser.add_argument('--redis-url', default='redis://localhost:6379/0')
+    cache_parser.add_argument('--keys', type=int, default=200)
+    cache_parser.add_argument('--rows', type=int, default=200, help='Rows per cached payload')
+    cache_parser.add_argument('--iterations', type=int, default=20000)
+    cache_parser.add_argument('--l1-mb', type=int, default=32)
+    cache_parser.add_argument('--l1-timeout', type=int, default=30)
+    cache_parser.set_defaults(func=bench_cache)
+
+    sf_parser = subparsers.add_parser('singleflight', help='Duplicate queries under a miss burst')
+    sf_parser.add_argument('--workers', type=int, default=32)
+    sf_parser.add_argument('--query-seconds', type=float, default=0.5)
+    sf_parser.add_argument('--redis-url', help='Use Redis locks instead of SQLite + file locks')
+    sf_parser.set_defaults(func=bench_singleflight)
+
+    op_parser = subparsers.add_parser('opmeter', help='Operation meter overhead per statement')
+    op_parser.add_argument('--statements', type=int, default=20000)
+    op_parser.add_argument('--rounds', type=int, default=3)
+    op_parser.add_argument('--sample-rates', type=float, nargs='+', default=[1.0, 0.1])
+    op_parser.set_defaults(func=bench_opmeter)
+
+    usage_parser = subparsers.add_parser('usage', help='Usage tracking middleware overhead')
+    usage_parser.add_argument('--requests', type=int, default=100000)
+    usage_parser.set_defaults(func=bench_usage)
+
+    metrics_parser = subparsers.add_parser('metrics', help='Prometheus metrics middleware overhead')
+    metrics_parser.add_argument('--requests', type=int, default=100000)
+    metrics_parser.set_defaults(func=bench_metrics)
+
+    adm_parser = subparsers.add_parser('admission', help='Tail latency under overload with admission control')
+    adm_parser.add_argument('--clients', type=int, default=64, help='Concurrent requests in the burst')
+    adm_parser.add_argument('--service-ms', type=float, default=50, help='Time to serve one request')
+    adm_parser.add_argument('--max-queue', type=int, default=8)
+    adm_parser.add_argument('--max-wait', type=float, default=0.5)
+    adm_parser.add_argument('--timeout', type=float, default=30, help='Client timeout in seconds')
+    adm_parser.set_defaults(func=bench_admission)
+
+    cold_parser = subparsers.add_parser('coldstart', help='Seconds until a new instance answers healthy')
+    cold_parser.add_argument('--url', default='http://localhost:8088/health')
+    cold_parser.add_argument('--start-command', help='Shell command starting a cold instance')
+    cold_parser.add_argument('--stop-command', help='Shell command run before each start')
+    cold_parser.add_argument('--runs', type=int, default=3)
+    cold_parser.add_argument('--interval', type=float, default=0.5, help='Seconds between health checks')
+    cold_parser.add_argument('--timeout', type=float, default=300, help='Seconds to wait per run')
+    cold_parser.set_defaults(func=bench_coldstart)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
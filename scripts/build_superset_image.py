@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Build the prebaked Superset image of a stack of system.yaml for compose."""
+
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from pulumi.config.image import write_context
+from pulumi.config.loader import load_system_config
+
+
+def docker(*args: str, capture: bool = False) -> subprocess.CompletedProcess:
+    """Run a docker command with BuildKit enabled."""
+    env = {**os.environ, 'DOCKER_BUILDKIT': '1'}
+    return subprocess.run(['docker', *args], env=env, check=not capture, capture_output=capture, text=True)
+
+
+def main():
+    """Write the build context, build it unless already built, and pin it."""
+    root = Path(__file__).parent.parent
+    default_config = root / "system.yaml"
+    if not default_config.exists():
+        default_config = root / "system.yaml.example"
+    generated = root / "docker" / "local" / "generated"
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--stack', required=True, help='Stack name in system.yaml')
+    parser.add_argument('--config', default=str(default_config), help='Path to system.yaml')
+    parser.add_argument('--context', help='Build context directory (default: docker/local/generated/image-<stack>)')
+    parser.add_argument('--repository', help='Image repository (default: superset-<stack>)')
+    parser.add_argument('--no-build', action='store_true', help='Only write the build context')
+    parser.add_argument('--push', action='store_true', help='Push and pin the registry digest')
+    parser.add_argument('--env-file', help='Compose env file to write SUPERSET_IMAGE to '
+                                           '(default: docker/local/generated/image_<stack>.env)')
+    args = parser.parse_args()
+
+    config = load_system_config(args.config)
+    stack = config.stacks.get(args.stack)
+    if stack is None:
+        print(f"❌ Error: stack {args.stack!r} not found in {args.config}", file=sys.stderr)
+        sys.exit(1)
+
+    context = Path(args.context or generated / f'image-{args.stack}')
+    tag = write_context(stack, args.stack, context)
+    reference = f"{args.repository or f'superset-{args.stack}'}:{tag}"
+    print(f"✅ Wrote build context {context} ({reference})")
+    if args.no_build:
+        return
+
+    # The tag is a hash of the context: if it exists, so does this exact image
+    if docker('image', 'inspect', reference, capture=True).returncode == 0:
+        print(f"   {reference} is already built")
+    else:
+        docker('build', '--platform', stack.superset.image.platform, '-t', reference, str(context))
+
+    pinned = reference
+    if args.push:
+        docker('push', reference)
+        pinned = docker('image', 'inspect', '--format', '{{index .RepoDigests 0}}', reference,
+                        capture=True).stdout.strip()
+
+    env_file = Path(args.env_file or generated / f'image_{args.stack}.env')
+    env_file.parent.mkdir(parents=True, exist_ok=True)
+    env_file.write_text(f'SUPERSET_IMAGE={pinned}\n')
+    print(f"✅ Wrote {env_file}: SUPERSET_IMAGE={pinned}")
+    print(f"   docker compose --env-file {env_file} -f docker/docker-compose.yaml up")
+
+
+if __name__ == "__main__":
+    main()
@@ -54,6 +54,16 @@ else
         pulumi destroy
     else
         pulumi up
+
+        # Warm the chart data cache of the top dashboards on the new revision
+        WARMUP_JOB=$(pulumi stack output warmup_job 2>/dev/null || true)
+        if [ -n "$WARMUP_JOB" ]; then
+            echo "🔥 Warming dashboard caches..."
+            gcloud run jobs execute "$WARMUP_JOB" \
+                --region "$(pulumi stack output region)" \
+                --project "$(pulumi stack output project_id)" \
+                --wait || echo "⚠️  Cache warm-up failed, dashboards will load cold"
+        fi
     fi
     
     cd ..
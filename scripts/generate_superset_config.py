@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""Generate superset_config.py, gunicorn.conf.py and the monitoring configuration for a stack of system.yaml."""
+
+import argparse
+import sys
+from pathlib import Path
+
+import yaml
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from pulumi.config.generator import derive_sizing, render_gunicorn_config, render_superset_config
+from pulumi.config.alerting import alertmanager_config, prometheus_rules, render_rules, rule_tests
+from pulumi.config.loader import load_system_config
+from pulumi.config.monitoring import compose_prometheus_config, render_prometheus_config
+from pulumi.config.workers import compose_worker_services
+
+
+def main():
+    """Write (or print) the generated configuration of one stack."""
+    root = Path(__file__).parent.parent
+    default_config = root / "system.yaml"
+    if not default_config.exists():
+        default_config = root / "system.yaml.example"
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--stack', required=True, help='Stack name in system.yaml')
+    parser.add_argument('--config', default=str(default_config), help='Path to system.yaml')
+    parser.add_argument('--output', help='File to write (default: stdout)')
+    parser.add_argument('--gunicorn-output', help='Also write the stack\'s gunicorn.conf.py here')
+    parser.add_argument(
+        '--compose-output',
+        help='Also write a compose override with one worker service per Celery queue here',
+    )
+    parser.add_argument(
+        '--prometheus-output',
+        help='Also write the prometheus.yml of the compose monitoring profile here',
+    )
+    parser.add_argument(
+        '--rules-output',
+        help='Also write the Prometheus recording rules and latency SLO alerts here',
+    )
+    parser.add_argument(
+        '--rule-tests-output',
+        help='Also write a promtool unit test of the --rules-output alerts here',
+    )
+    parser.add_argument('--alertmanager-output', help='Also write the alertmanager.yml of the stack here')
+    args = parser.parse_args()
+
+    config = load_system_config(args.config)
+    stack = config.stacks.get(args.stack)
+    if stack is None:
+        print(f"❌ Error: stack {args.stack!r} not found in {args.config}", file=sys.stderr)
+        sys.exit(1)
+
+    source = render_superset_config(stack, args.stack)
+    if not args.output:
+        sys.stdout.write(source)
+        return
+
+    Path(args.output).write_text(source)
+    sizing = derive_sizing(stack)
+    print(f"✅ Wrote {args.output}")
+    print(f"   {sizing.workers} workers x {sizing.threads} threads, ROW_LIMIT {sizing.row_limit}")
+    if args.gunicorn_output:
+        Path(args.gunicorn_output).write_text(render_gunicorn_config(stack, args.stack))
+        print(f"✅ Wrote {args.gunicorn_output}")
+        print(f"   max_requests={sizing.max_requests} (jitter {sizing.max_requests_jitter}), keepalive={sizing.keepalive}")
+    if args.compose_output and stack.cache.type == 'redis':
+        compose_file = root / 'docker' / 'docker-compose.yaml'
+        override = compose_worker_services(stack, sizing.workers, str(compose_file), args.compose_output)
+        Path(args.compose_output).write_text(yaml.safe_dump(override, sort_keys=False))
+        print(f"✅ Wrote {args.compose_output}")
+        print(f"   workers: {', '.join(override['services'])}")
+    if args.prometheus_output:
+        prometheus = compose_prometheus_config(stack)
+        Path(args.prometheus_output).write_text(render_prometheus_config(prometheus))
+        print(f"✅ Wrote {args.prometheus_output}")
+        print(f"   jobs: {', '.join(job['job_name'] for job in prometheus['scrape_configs'])}")
+    if args.rules_output:
+        rules = prometheus_rules(stack)
+        Path(args.rules_output).write_text(render_rules(rules))
+        print(f"✅ Wrote {args.rules_output}")
+        print(f"   groups: {', '.join(group['name'] for group in rules['groups'])}")
+        slo = stack.monitoring.alerting
+        if args.rule_tests_output and slo.enabled and slo.latency_slo.enabled:
+            tests = rule_tests(stack, Path(args.rules_output).name)
+            Path(args.rule_tests_output).write_text(render_rules(tests))
+            print(f"✅ Wrote {args.rule_tests_output}")
+    if args.alertmanager_output:
+        Path(args.alertmanager_output).write_text(render_rules(alertmanager_config(stack)))
+        print(f"✅ Wrote {args.alertmanager_output}")
+
+
+if __name__ == "__main__":
+    main()
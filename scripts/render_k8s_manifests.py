@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Render the Kubernetes manifests of a stack of system.yaml as YAML.
+
+These are the manifests ``SupersetGKE`` creates, so a stack can be tried on
+a local kind cluster before deploying it to GKE::
+
+    kind create cluster --name superset
+    python scripts/render_k8s_manifests.py --stack production --image superset-production:<tag> \\
+        --output manifests.yaml
+    kind load docker-image superset-production:<tag> --name superset
+    kubectl apply -f manifests.yaml
+
+Secret values are read from ``SUPERSET_SECRET_KEY``, ``DATABASE_URL`` and
+``REDIS_URL``. The Ingress needs GKE's controller and the HPA's custom
+metrics prometheus-adapter; the rest runs on any cluster. ``--monitoring``
+adds the exporters, and the Prometheus and Grafana of ``MonitoringStack``
+(Grafana's admin password from ``GRAFANA_ADMIN_PASSWORD``)::
+
+    kubectl -n monitoring port-forward svc/grafana 3000
+"""
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+import yaml
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from pulumi.config.gke import NAMESPACE, superset_manifests
+from pulumi.config.loader import load_system_config
+from pulumi.config.monitoring import monitoring_manifests
+
+
+def main():
+    """Write the manifests of one stack."""
+    root = Path(__file__).parent.parent
+    default_config = root / "system.yaml"
+    if not default_config.exists():
+        default_config = root / "system.yaml.example"
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stack', required=True, help='Stack name in system.yaml')
+    parser.add_argument('--config', default=str(default_config), help='Path to system.yaml')
+    parser.add_argument('--image', help='Prebaked image (see build_superset_image.py); default: apache/superset')
+    parser.add_argument('--namespace', default=NAMESPACE, help='Kubernetes namespace')
+    parser.add_argument('--monitoring', action='store_true', help='Also render Prometheus, Alertmanager (with alerting) and Grafana')
+    parser.add_argument('--output', help='Output file (default: stdout)')
+    args = parser.parse_args()
+
+    config = load_system_config(args.config)
+    stack = config.stacks.get(args.stack)
+    if stack is None:
+        print(f"❌ Error: stack {args.stack!r} not found in {args.config}", file=sys.stderr)
+        sys.exit(1)
+
+    secret_values = {
+        'SUPERSET_SECRET_KEY': os.environ.get('SUPERSET_SECRET_KEY', 'CHANGE_ME_IN_PRODUCTION'),
+        'DATABASE_URL': os.environ.get('DATABASE_URL', ''),
+        'REDIS_URL': os.environ.get('REDIS_URL', f'redis://{stack.cache.host or "redis"}:{stack.cache.port}/0'),
+    }
+    if args.monitoring:
+        # The database and cache exporters come with monitoring
+        stack.monitoring.enabled = True
+    manifests = superset_manifests(stack, f'{args.stack}-superset', secret_values, args.image, args.namespace)
+    if args.monitoring:
+        grafana_password = os.environ.get('GRAFANA_ADMIN_PASSWORD') or stack.monitoring.grafana.get('admin_password')
+        manifests = monitoring_manifests(
+            stack, f'{args.stack}-monitoring', grafana_password or 'admin', superset_namespace=args.namespace
+        ) + manifests
+    content = yaml.safe_dump_all(manifests, sort_keys=False)
+
+    if args.output:
+        Path(args.output).write_text(content)
+        print(f"✅ Wrote {len(manifests)} manifests to {args.output}")
+    else:
+        sys.stdout.write(content)
+
+
+if __name__ == "__main__":
+    main()
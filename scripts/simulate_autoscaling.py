@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""Predict replica counts of a stack's autoscaling policy for a traffic trace.
+
+The trace is a CSV file with a ``time`` column (ISO 8601) and a
+``requests_per_second`` column, optionally ``service_ms`` (mean time to
+serve one request in that interval), e.g. exported from the Prometheus
+``superset_http_requests_total`` rate.
+
+Usage:
+    python scripts/simulate_autoscaling.py --stack staging --trace traffic.csv
+    python scripts/simulate_autoscaling.py --stack staging --trace traffic.csv \\
+        --target-concurrency 6 --target-latency-ms 800 --output steps.csv
+"""
+
+import argparse
+import csv
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from pulumi.config.generator import derive_sizing
+from pulumi.config.loader import load_system_config
+from pulumi.config.models import AutoscalingConfig
+from pulumi.config.scaling import TracePoint, simulate
+
+
+def read_trace(path: str):
+    """Read trace points from a CSV file."""
+    with open(path, newline='') as handle:
+        for row in csv.DictReader(handle):
+            service_ms = row.get('service_ms')
+            yield TracePoint(
+                time=datetime.fromisoformat(row['time']),
+                requests_per_second=float(row['requests_per_second']),
+                service_seconds=float(service_ms) / 1000 if service_ms else None,
+            )
+
+
+def main():
+    """Replay the trace and print the predicted replicas and latency."""
+    root = Path(__file__).parent.parent
+    default_config = root / "system.yaml"
+    if not default_config.exists():
+        default_config = root / "system.yaml.example"
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stack', required=True, help='Stack name in system.yaml')
+    parser.add_argument('--config', default=str(default_config), help='Path to system.yaml')
+    parser.add_argument('--trace', required=True, help='CSV file: time, requests_per_second[, service_ms]')
+    parser.add_argument('--target-concurrency', type=int, help='Override autoscaling.target_concurrency')
+    parser.add_argument('--target-latency-ms', type=int, help='Override autoscaling.target_latency_p95_ms')
+    parser.add_argument('--service-ms', type=float, default=200, help='Service time when the trace has none')
+    parser.add_argument('--startup-seconds', type=float, default=60, help='Time until a new replica serves')
+    parser.add_argument('--output', help='Write every step to this CSV file')
+    args = parser.parse_args()
+
+    config = load_system_config(args.config)
+    stack = config.stacks.get(args.stack)
+    if stack is None:
+        print(f"❌ Error: stack {args.stack!r} not found in {args.config}", file=sys.stderr)
+        sys.exit(1)
+
+    autoscaling = (stack.superset.autoscaling or AutoscalingConfig()).model_copy()
+    if args.target_concurrency:
+        autoscaling.target_concurrency = args.target_concurrency
+    if args.target_latency_ms:
+        autoscaling.target_latency_p95_ms = args.target_latency_ms
+    if not (autoscaling.target_concurrency or autoscaling.target_latency_p95_ms):
+        print("❌ Error: set target_concurrency or target_latency_p95_ms (or pass an override)", file=sys.stderr)
+        sys.exit(1)
+
+    sizing = derive_sizing(stack)
+    capacity = sizing.workers * sizing.threads
+    steps = simulate(
+        autoscaling,
+        read_trace(args.trace),
+        capacity=capacity,
+        service_seconds=args.service_ms / 1000,
+        startup_seconds=args.startup_seconds,
+        timeout=sizing.webserver_timeout,
+    )
+    if not steps:
+        print("❌ Error: the trace is empty", file=sys.stderr)
+        sys.exit(1)
+
+    if args.output:
+        with open(args.output, 'w', newline='') as handle:
+            writer = csv.DictWriter(handle, fieldnames=list(steps[0].model_dump()))
+            writer.writeheader()
+            for step in steps:
+                writer.writerow(step.model_dump())
+        print(f"✅ Wrote {len(steps)} steps to {args.output}")
+
+    interval_hours = [
+        (later.time - earlier.time).total_seconds() / 3600 for earlier, later in zip(steps, steps[1:])
+    ]
+    replica_hours = sum(step.ready_replicas * hours for step, hours in zip(steps, interval_hours))
+    over = [step for step in steps if autoscaling.target_latency_p95_ms
+            and step.latency_p95_seconds * 1000 > autoscaling.target_latency_p95_ms]
+    print(f"Capacity: {capacity} concurrent requests per replica, start-up {args.startup_seconds:.0f}s")
+    print(f"Replicas: min {min(s.ready_replicas for s in steps)}, max {max(s.ready_replicas for s in steps)}, "
+          f"{replica_hours:.1f} replica-hours")
+    print(f"Worst p95: {max(s.latency_p95_seconds for s in steps) * 1000:.0f} ms")
+    if autoscaling.target_latency_p95_ms:
+        print(f"Intervals over the p95 target: {len(over)} of {len(steps)}")
+
+
+if __name__ == "__main__":
+    main()
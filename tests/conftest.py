@@ -0,0 +1,39 @@
+"""Shared fixtures for the stack configuration tests."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from pulumi.config.models import GCPConfig, StackConfig
+
+
+@pytest.fixture
+def production_stack():
+    """Return a factory of production GCP stacks on Cloud SQL and Redis.
+
+    Keyword arguments are ``superset`` settings replacing the defaults (4
+    CPUs and 8Gi, 2 replicas, autoscaling up to 4); ``database`` and
+    ``monitoring`` replace those sections.
+    """
+    def factory(database=None, monitoring=None, **superset):
+        sections = {'monitoring': monitoring} if monitoring is not None else {}
+        return StackConfig(
+            type='production',
+            environment='gcp',
+            gcp=GCPConfig(project_id='test-project-123', region='us-central1'),
+            superset={
+                'version': '5.0.0',
+                'replicas': 2,
+                'resources': {'cpu': '4', 'memory': '8Gi'},
+                'autoscaling': {'enabled': True, 'min_replicas': 1, 'max_replicas': 4},
+                **superset,
+            },
+            database=database or {'type': 'cloud-sql', 'tier': 'db-n1-standard-1', 'password': 'test-password'},
+            cache={'type': 'redis', 'host': 'redis'},
+            **sections,
+        )
+    return factory
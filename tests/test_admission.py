@@ -0,0 +1,194 @@
+"""Tests for token-bucket admission control."""
+
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+# Add the mounted Superset pythonpath to the import path
+sys.path.append(str(Path(__file__).parent.parent / 'docker' / 'local'))
+
+from superset_ext.admission import (
+    DEFAULT_ROUTES,
+    AdmissionMiddleware,
+    SQLiteTokenBucket,
+    load_admission_config,
+    reserve,
+    route_class,
+)
+from superset_ext.cache import percentile
+
+
+def slow_app(service_seconds, slots=1):
+    """WSGI app serving ``slots`` requests at a time, like a tiny instance."""
+    semaphore = threading.Semaphore(slots)
+
+    def app(environ, start_response):
+        with semaphore:
+            time.sleep(service_seconds)
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [b'ok']
+    return app
+
+
+def call(app, path):
+    response = {}
+
+    def start_response(status, headers):
+        response['status'] = status
+        response['headers'] = dict(headers)
+
+    body = b''.join(app({'PATH_INFO': path, 'REQUEST_METHOD': 'GET'}, start_response))
+    return response['status'], response['headers'], body
+
+
+class TestRouteClasses:
+    """Test mapping request paths to route classes."""
+
+    def test_route_class(self):
+        """Test chart data, SQL Lab and static paths are classified."""
+        assert route_class('/api/v1/chart/data') == 'chart_data'
+        assert route_class('/api/v1/chart/42/data/') == 'chart_data'
+        assert route_class('/superset/explore_json/') == 'chart_data'
+        assert route_class('/api/v1/sqllab/execute/') == 'sql_lab'
+        assert route_class('/static/assets/app.js') == 'static'
+        assert route_class('/api/v1/chart/42') is None
+        assert route_class('/health') is None
+
+
+class TestReserve:
+    """Test the token bucket arithmetic."""
+
+    def test_burst_then_queue_then_shed(self):
+        """Test tokens are spent, then reservations queue, then requests shed."""
+        tokens, updated = 2.0, 0.0
+        outcomes = []
+        for _ in range(5):
+            tokens, admitted, wait = reserve(tokens, updated, 0.0, rate=1.0, burst=2, max_queue=2, max_wait=10)
+            outcomes.append((admitted, wait))
+
+        assert outcomes == [(True, 0.0), (True, 0.0), (True, 1.0), (True, 2.0), (False, 3.0)]
+
+    def test_deadline_shedding(self):
+        """Test requests whose wait would pass max_wait are shed."""
+        tokens, admitted, wait = reserve(0.0, 0.0, 0.0, rate=0.5, burst=1, max_queue=10, max_wait=1.0)
+        assert not admitted
+        assert wait == 2.0
+
+    def test_refill_capped_at_burst(self):
+        """Test idle time refills at most ``burst`` tokens."""
+        tokens, admitted, _ = reserve(0.0, 0.0, 1000.0, rate=1.0, burst=3, max_queue=0, max_wait=0)
+        assert admitted
+        assert tokens == 2.0
+
+
+class TestLoadAdmissionConfig:
+    """Test reading route classes from system.yaml."""
+
+    def test_missing_file_uses_defaults(self, tmp_path):
+        """Test defaults apply when system.yaml is not mounted."""
+        assert load_admission_config(str(tmp_path / 'system.yaml'), 'free') == DEFAULT_ROUTES
+
+    def test_disabled(self, tmp_path):
+        """Test a disabled admission section turns the buckets off."""
+        path = tmp_path / 'system.yaml'
+        path.write_text('stacks:\n  free:\n    superset:\n      admission:\n        enabled: false\n')
+        assert load_admission_config(str(path), 'free') == {}
+
+    def test_overrides_merge_with_defaults(self, tmp_path):
+        """Test per-class overrides keep the defaults of unset fields."""
+        path = tmp_path / 'system.yaml'
+        path.write_text(
+            'stacks:\n  free:\n    superset:\n      admission:\n        enabled: true\n'
+            '        routes:\n          chart_data:\n            rate: 5\n'
+        )
+        routes = load_admission_config(str(path), 'free')
+        assert routes['chart_data']['rate'] == 5
+        assert routes['chart_data']['burst'] == DEFAULT_ROUTES['chart_data']['burst']
+        assert routes['static'] == DEFAULT_ROUTES['static']
+
+
+class TestAdmissionMiddleware:
+    """Test admitting, queueing and shedding requests."""
+
+    def test_rejects_with_retry_after(self):
+        """Test requests beyond burst and queue get 503 with Retry-After."""
+        routes = {'chart_data': {'rate': 0.1, 'burst': 1, 'max_queue': 0, 'max_wait_seconds': 0}}
+        app = AdmissionMiddleware(slow_app(0), routes=routes)
+
+        assert call(app, '/api/v1/chart/data')[0] == '200 OK'
+        status, headers, _ = call(app, '/api/v1/chart/data')
+        assert status == '503 Service Unavailable'
+        assert headers['Retry-After'] == '10'
+        # Unclassified routes are never limited
+        assert call(app, '/health')[0] == '200 OK'
+        assert app.counters['chart_data'] == {'admitted': 1, 'queued': 0, 'shed': 1}
+
+    def test_waiters_leave_one_thread_free(self):
+        """Test waiters beyond all but one worker thread are shed."""
+        routes = {'chart_data': {'rate': 5, 'burst': 1, 'max_queue': 10, 'max_wait_seconds': 5}}
+        app = AdmissionMiddleware(slow_app(0), routes=routes, threads=2)
+        results = []
+        lock = threading.Lock()
+
+        def client():
+            response = call(app, '/api/v1/chart/data')
+            with lock:
+                results.append(response)
+
+        # The first request takes the token, the second sleeps for the next one
+        call(app, '/api/v1/chart/data')
+        waiter = threading.Thread(target=client)
+        waiter.start()
+        time.sleep(0.05)
+        shed = [call(app, '/api/v1/chart/data') for _ in range(3)]
+        waiter.join()
+
+        assert results[0][0] == '200 OK'
+        assert all(status == '503 Service Unavailable' and 'Retry-After' in headers
+                   for status, headers, _ in shed)
+        assert app.counters['chart_data'] == {'admitted': 1, 'queued': 1, 'shed': 3}
+        # Shed requests gave their tokens back: the next one waits one interval
+        assert app.buckets['chart_data'].reserve() == (True, pytest.approx(0.2, abs=0.1))
+
+    def test_buckets_shared_between_workers(self, tmp_path):
+        """Test processes sharing the SQLite file draw from one bucket."""
+        path = str(tmp_path / 'admission.db')
+        settings = {'rate': 0.01, 'burst': 2, 'max_queue': 0, 'max_wait_seconds': 0}
+        first = SQLiteTokenBucket('chart_data', path, **settings)
+        second = SQLiteTokenBucket('chart_data', path, **settings)
+
+        assert first.reserve()[0]
+        assert second.reserve()[0]
+        assert not first.reserve()[0]
+        assert not second.reserve()[0]
+
+    def test_tail_latency_under_overload(self):
+        """Test an overload burst sheds fast and bounds admitted latency."""
+        service = 0.02
+        routes = {'chart_data': {'rate': 1 / service, 'burst': 1, 'max_queue': 5, 'max_wait_seconds': 0.2}}
+        app = AdmissionMiddleware(slow_app(service), routes=routes)
+        results = []
+        lock = threading.Lock()
+
+        def client():
+            started = time.perf_counter()
+            status = call(app, '/api/v1/chart/data')[0]
+            with lock:
+                results.append((status, time.perf_counter() - started))
+
+        threads = [threading.Thread(target=client) for _ in range(40)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        admitted = [latency for status, latency in results if status == '200 OK']
+        shed = [latency for status, latency in results if status.startswith('503')]
+        assert admitted and shed
+        assert len(admitted) < len(shed)
+        assert max(shed) < 0.1
+        # Queue wait is capped at max_wait; service adds at most queue * service
+        assert percentile(admitted, 99) < 0.2 + 6 * service + 0.1
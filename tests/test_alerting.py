@@ -0,0 +1,149 @@
+"""Tests for the Prometheus rules, latency SLO alerts and Alertmanager routing."""
+
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+import yaml
+from pydantic import ValidationError
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+sys.path.append(str(Path(__file__).parent.parent / 'docker' / 'local'))
+
+from pulumi.config.alerting import (
+    LATENCY_ALERT,
+    alertmanager_config,
+    burn_rate_alerts,
+    prometheus_rules,
+    render_rules,
+    rule_tests,
+)
+from pulumi.config.loader import expand_config_env_vars
+from pulumi.config.models import LATENCY_BUCKETS, AlertChannelConfig, AlertingConfig, LatencySLOConfig, StackConfig
+from superset_ext.metrics import REQUEST_BUCKETS
+
+
+def local_stack(**alerting):
+    return StackConfig(type='minimal', environment='local', monitoring={'alerting': alerting})
+
+
+def rules_by_name(stack):
+    return {group['name']: group['rules'] for group in prometheus_rules(stack)['groups']}
+
+
+class TestModels:
+    """Test the alerting configuration."""
+
+    def test_threshold_is_a_histogram_bucket(self):
+        """Test the latency threshold must be a bucket of the request histogram."""
+        assert LATENCY_BUCKETS == REQUEST_BUCKETS
+        assert LatencySLOConfig(threshold_seconds=1).threshold_seconds == 1
+        with pytest.raises(ValidationError):
+            LatencySLOConfig(threshold_seconds=2)
+
+    def test_channel_destinations(self):
+        """Test each channel type requires its destination, and email an SMTP relay."""
+        with pytest.raises(ValidationError):
+            AlertChannelConfig(type='slack')
+        with pytest.raises(ValidationError):
+            AlertChannelConfig(type='pagerduty', severities=[])
+        with pytest.raises(ValidationError):
+            AlertingConfig(channels=[{'type': 'email', 'addresses': ['ops@example.com']}])
+
+    def test_example_smtp_relay_has_a_default(self, monkeypatch):
+        """Test the example's email channel validates without SMTP_SMARTHOST."""
+        monkeypatch.delenv('SMTP_SMARTHOST', raising=False)
+        example = yaml.safe_load((Path(__file__).parent.parent / 'system.yaml.example').read_text())
+        alerting = example['stacks']['production']['monitoring']['alerting']
+        assert expand_config_env_vars(alerting['smtp_smarthost'], strict=True) == 'localhost:25'
+        assert AlertingConfig(**expand_config_env_vars(alerting)).smtp_smarthost == 'localhost:25'
+
+    def test_earlier_keys(self):
+        """Test the Slack ``webhook`` key is still read and removed alerting keys are rejected."""
+        channel = AlertChannelConfig(type='slack', webhook='https://hooks.slack.com/x')
+        assert channel.webhook_url == 'https://hooks.slack.com/x'
+        with pytest.raises(ValidationError, match='alerting.rules is no longer supported'):
+            AlertingConfig(enabled=True, rules=[{'name': 'high_cpu', 'threshold': 80}])
+        with pytest.raises(ValidationError, match='alerting.slack'):
+            AlertingConfig(slack=True)
+
+
+class TestRules:
+    """Test the recording rules and burn-rate alerts."""
+
+    def test_recording_rules_always_present(self):
+        """Test recording rules are loaded without alerting, SLO rules only with it."""
+        assert list(rules_by_name(local_stack())) == ['superset-recording']
+        records = [rule['record'] for rule in rules_by_name(local_stack())['superset-recording']]
+        assert 'endpoint:superset_http_request_duration_seconds:p99' in records
+        assert 'queue:celery_backlog_drain_seconds:estimate' in records
+        assert list(rules_by_name(local_stack(enabled=True))) == ['superset-recording', 'superset-slo']
+        assert list(rules_by_name(local_stack(enabled=True, latency_slo={'enabled': False}))) == ['superset-recording']
+
+    def test_burn_rates(self):
+        """Test the burn rates of a 30 day SLO and that longer windows than the SLO are left out."""
+        assert [(long, rate, severity) for long, _, rate, severity in burn_rate_alerts(local_stack())] == [
+            ('1h', pytest.approx(14.4), 'critical'),
+            ('6h', pytest.approx(6), 'critical'),
+            ('1d', pytest.approx(3), 'warning'),
+            ('3d', pytest.approx(1), 'warning'),
+        ]
+        short = local_stack(latency_slo={'window_days': 1})
+        assert [long for long, *_ in burn_rate_alerts(short)] == ['1h', '6h', '1d']
+
+    def test_alert_expressions(self):
+        """Test the slow request ratio uses the threshold bucket and excluded endpoints."""
+        stack = local_stack(enabled=True, latency_slo={'threshold_seconds': 1, 'objective': 0.999})
+        rules = rules_by_name(stack)['superset-slo']
+        ratio = next(rule for rule in rules if rule.get('record') == 'slo:superset_http_latency:error_ratio_rate1h')
+        assert 'le="1",endpoint!~"(/static/|/metrics|/health).*"' in ratio['expr']
+
+        alerts = [rule for rule in rules if rule.get('alert') == LATENCY_ALERT]
+        assert alerts[0]['expr'] == (
+            'slo:superset_http_latency:error_ratio_rate1h > 0.0144'
+            ' and slo:superset_http_latency:error_ratio_rate5m > 0.0144'
+        )
+        assert (alerts[0]['for'], alerts[-1]['labels']['severity']) == ('2m', 'warning')
+
+    @pytest.mark.skipif(shutil.which('promtool') is None, reason='promtool is not installed')
+    def test_promtool(self, tmp_path):
+        """Test the generated rules pass their generated promtool unit test."""
+        stack = local_stack(enabled=True)
+        (tmp_path / 'rules.yml').write_text(render_rules(prometheus_rules(stack)))
+        (tmp_path / 'rules.test.yml').write_text(render_rules(rule_tests(stack)))
+        result = subprocess.run(
+            ['promtool', 'test', 'rules', 'rules.test.yml'], cwd=tmp_path, capture_output=True, text=True,
+        )
+        assert result.returncode == 0, result.stdout + result.stderr
+
+
+class TestAlertmanager:
+    """Test alerts are routed to the channels of their severity."""
+
+    def test_routing(self):
+        """Test each severity's receiver is made of the channels listing it."""
+        stack = local_stack(enabled=True, smtp_smarthost='smtp:25', channels=[
+            {'type': 'email', 'addresses': ['ops@example.com', 'dba@example.com']},
+            {'type': 'slack', 'webhook_url': 'https://hooks.slack.com/x', 'severities': ['warning']},
+            {'type': 'pagerduty', 'integration_key': 'key', 'severities': ['critical']},
+        ])
+        config = alertmanager_config(stack)
+        assert config['global']['smtp_smarthost'] == 'smtp:25'
+        assert config['route']['routes'][0] == {
+            'matchers': ['severity="critical"'], 'receiver': 'critical', 'repeat_interval': '1h',
+        }
+
+        critical, warning = config['receivers']
+        assert set(critical) == {'name', 'email_configs', 'pagerduty_configs'}
+        assert critical['email_configs'][0]['to'] == 'ops@example.com, dba@example.com'
+        assert critical['pagerduty_configs'] == [{'routing_key': 'key'}]
+        assert set(warning) == {'name', 'email_configs', 'slack_configs'}
+
+    def test_without_channels(self):
+        """Test a stack without channels still gets a valid configuration that drops alerts."""
+        config = alertmanager_config(local_stack())
+        assert 'global' not in config
+        assert config['receivers'] == [{'name': 'critical'}, {'name': 'warning'}]
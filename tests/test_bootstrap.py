@@ -0,0 +1,194 @@
+"""Tests for the idempotent container bootstrap."""
+
+import multiprocessing
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+# Add the mounted Superset pythonpath to the import path
+sys.path.append(str(Path(__file__).parent.parent / 'docker' / 'local'))
+
+sqlalchemy = pytest.importorskip('sqlalchemy')
+from sqlalchemy import text
+
+from superset_ext.bootstrap import Bootstrap
+
+ADMIN = {'username': 'admin', 'password': 'secret', 'email': 'admin@example.com'}
+
+
+class FakeSuperset:
+    """Stands in for the superset CLI, applying its effects to the database."""
+
+    def __init__(self, uri, head='abc123'):
+        self.engine = sqlalchemy.create_engine(uri)
+        self.head = head
+        self.commands = []
+
+    def __call__(self, command):
+        self.commands.append(' '.join(command[:3]))
+        with self.engine.begin() as conn:
+            if command[1:3] == ['db', 'upgrade']:
+                conn.execute(text('CREATE TABLE IF NOT EXISTS alembic_version (version_num VARCHAR(32))'))
+                conn.execute(text('CREATE TABLE IF NOT EXISTS ab_user (username VARCHAR(64))'))
+                conn.execute(text('DELETE FROM alembic_version'))
+                conn.execute(text('INSERT INTO alembic_version VALUES (:head)').bindparams(head=self.head))
+            elif command[1:3] == ['fab', 'create-admin']:
+                conn.execute(text('INSERT INTO ab_user VALUES (:name)').bindparams(name=command[4]))
+
+
+def bootstrap(uri, superset, **kwargs):
+    kwargs.setdefault('version', '5.0.0')
+    return Bootstrap(uri, heads={superset.head}, admin=ADMIN, run=superset, **kwargs)
+
+
+def _hold_lock(uri, held, release):
+    instance = Bootstrap(uri, heads=set(), version='5.0.0', run=lambda command: None)
+    with instance.lock():
+        held.set()
+        release.wait(10)
+
+
+class FakeResult:
+    def __init__(self, value):
+        self.value = value
+
+    def scalar(self):
+        return self.value
+
+
+class FakeEngine:
+    """Engine of a server database, recording statements; connections have no ``commit``."""
+
+    def __init__(self, backend, results):
+        self.url = sqlalchemy.engine.make_url(f'{backend}://superset@db/superset')
+        self.results = list(results)
+        self.options = {}
+        self.statements = []
+        self.closed = False
+
+    def execution_options(self, **options):
+        self.options.update(options)
+        return self
+
+    def connect(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.closed = True
+
+    def execute(self, statement):
+        self.statements.append(str(statement))
+        return FakeResult(self.results.pop(0) if self.results else 1)
+
+
+class TestBootstrap:
+    """Test phases are skipped once the database is current."""
+
+    def test_new_database_runs_every_phase(self, tmp_path):
+        """Test an empty database is migrated, gets its admin and is initialized."""
+        uri = f'sqlite:///{tmp_path}/superset.db'
+        superset = FakeSuperset(uri)
+        instance = bootstrap(uri, superset)
+        timings = instance.run_all()
+
+        assert superset.commands == ['superset db upgrade', 'superset fab create-admin', 'superset init']
+        assert instance.actions == ['migrate', 'admin', 'init']
+        assert set(timings) == {'lock', 'migrate', 'admin', 'init', 'total'}
+
+    def test_restart_does_nothing(self, tmp_path):
+        """Test a second start with the same version skips every command."""
+        uri = f'sqlite:///{tmp_path}/superset.db'
+        superset = FakeSuperset(uri)
+        bootstrap(uri, superset).run_all()
+        superset.commands.clear()
+
+        instance = bootstrap(uri, superset)
+        instance.run_all()
+        assert superset.commands == []
+        assert instance.actions == []
+
+    def test_new_migration_upgrades_and_inits(self, tmp_path):
+        """Test a newer image migrates and re-syncs roles but keeps the admin."""
+        uri = f'sqlite:///{tmp_path}/superset.db'
+        bootstrap(uri, FakeSuperset(uri, head='abc123')).run_all()
+
+        superset = FakeSuperset(uri, head='def456')
+        bootstrap(uri, superset).run_all()
+        assert superset.commands == ['superset db upgrade', 'superset init']
+
+    def test_version_change_reruns_init_only(self, tmp_path):
+        """Test a Superset upgrade without migrations still syncs permissions."""
+        uri = f'sqlite:///{tmp_path}/superset.db'
+        superset = FakeSuperset(uri)
+        bootstrap(uri, superset).run_all()
+        superset.commands.clear()
+
+        bootstrap(uri, superset, version='5.0.1').run_all()
+        assert superset.commands == ['superset init']
+
+    def test_failed_command_is_not_recorded(self, tmp_path):
+        """Test init runs again on the next start if it failed."""
+        uri = f'sqlite:///{tmp_path}/superset.db'
+        superset = FakeSuperset(uri)
+
+        def failing(command):
+            superset(command)
+            if command[1] == 'init':
+                raise RuntimeError('init failed')
+
+        with pytest.raises(RuntimeError):
+            Bootstrap(uri, heads={superset.head}, version='5.0.0', admin=ADMIN, run=failing).run_all()
+        superset.commands.clear()
+        bootstrap(uri, superset).run_all()
+        assert superset.commands == ['superset init']
+
+
+class TestLock:
+    """Test concurrent bootstraps serialize."""
+
+    def test_waits_for_other_replica(self, tmp_path):
+        """Test the lock is exclusive and times out."""
+        uri = f'sqlite:///{tmp_path}/superset.db'
+        context = multiprocessing.get_context('fork')
+        held, release = context.Event(), context.Event()
+        other = context.Process(target=_hold_lock, args=(uri, held, release))
+        other.start()
+        try:
+            assert held.wait(10)
+            instance = Bootstrap(uri, heads=set(), version='5.0.0', run=lambda command: None, lock_timeout=0.6)
+            started = time.monotonic()
+            with pytest.raises(TimeoutError):
+                with instance.lock():
+                    pass
+            assert time.monotonic() - started >= 0.5
+        finally:
+            release.set()
+            other.join(10)
+
+        with instance.lock():
+            pass
+
+    @pytest.mark.parametrize('backend, acquire, release', [
+        ('postgresql', 'pg_try_advisory_lock', 'pg_advisory_unlock'),
+        ('mysql', 'GET_LOCK', 'RELEASE_LOCK'),
+    ])
+    def test_session_lock_autocommits(self, tmp_path, backend, acquire, release):
+        """Test PostgreSQL and MySQL retry a session lock on an autocommit connection."""
+        engine = FakeEngine(backend, results=[0, 1])
+        instance = Bootstrap(
+            f'sqlite:///{tmp_path}/superset.db', heads=set(), version='5.0.0', run=lambda command: None,
+        )
+        instance.engine = engine
+
+        with instance.lock():
+            assert not engine.closed
+        assert engine.options == {'isolation_level': 'AUTOCOMMIT'}
+        assert [statement.split('(')[0] for statement in engine.statements] == [
+            f'SELECT {acquire}', f'SELECT {acquire}', f'SELECT {release}',
+        ]
+        assert engine.closed
@@ -0,0 +1,156 @@
+"""Tests for the pool of warm screenshot browsers."""
+
+import ast
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+# Add the mounted Superset pythonpath to the import path
+sys.path.append(str(Path(__file__).parent.parent / 'docker' / 'local'))
+
+from superset_ext.browser_pool import BrowserPool, BrowserPoolTimeout
+from superset_ext.metrics import MetricsRegistry
+
+
+class FakeDriver:
+    """A Selenium WebDriver recording what the pool does with it."""
+
+    def __init__(self, broken=False):
+        self.broken = broken
+        self.cookies_cleared = 0
+        self.url = None
+        self.quit_called = False
+
+    def delete_all_cookies(self):
+        if self.broken:
+            raise RuntimeError('browser crashed')
+        self.cookies_cleared += 1
+
+    def get(self, url):
+        self.url = url
+
+    def quit(self):
+        self.quit_called = True
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_pool(tmp_path, **kwargs):
+    drivers = []
+
+    def create():
+        drivers.append(FakeDriver())
+        return drivers[-1]
+
+    kwargs.setdefault('registry', MetricsRegistry(directory=str(tmp_path)))
+    return BrowserPool(create, **kwargs), drivers
+
+
+class TestBrowserPool:
+    """Test reuse, recycling and the render limit."""
+
+    def test_browsers_are_reused_and_reset(self, tmp_path):
+        """Test a returned browser is cleaned and lent again instead of a new one."""
+        pool, drivers = make_pool(tmp_path, size=2)
+        with pool.render() as first:
+            pass
+        with pool.render() as second:
+            pass
+        assert first is second and len(drivers) == 1
+        assert first.cookies_cleared == 2 and first.url == 'about:blank'
+
+    def test_warm(self, tmp_path):
+        """Test warming starts the browsers up front, only once."""
+        pool, drivers = make_pool(tmp_path, size=3)
+        assert pool.warm() == 3
+        assert pool.warm() == 0
+        with pool.render():
+            pass
+        assert len(drivers) == 3
+
+    def test_recycled_after_max_renders(self, tmp_path):
+        """Test a browser is quit after max_renders and replaced on the next render."""
+        registry = MetricsRegistry(directory=str(tmp_path))
+        pool, drivers = make_pool(tmp_path, size=1, max_renders=2, registry=registry)
+        for _ in range(3):
+            with pool.render():
+                pass
+        assert len(drivers) == 2
+        assert drivers[0].quit_called and not drivers[1].quit_called
+        recycles = registry.collect()['superset_browser_recycles_total']
+        assert recycles[(('reason', 'max_renders'),)] == 1
+
+    def test_failed_renders_replace_the_browser(self, tmp_path):
+        """Test an exception or a failed reset discards the browser."""
+        pool, drivers = make_pool(tmp_path, size=1)
+        with pytest.raises(ValueError):
+            with pool.render():
+                raise ValueError('render failed')
+        assert drivers[0].quit_called
+
+        driver = pool.acquire()
+        driver.broken = True
+        pool.release(driver)
+        assert driver.quit_called
+        with pool.render() as driver:
+            assert driver is drivers[2]
+
+    def test_concurrency_limit(self, tmp_path):
+        """Test renders beyond size wait for a browser and give up after the timeout."""
+        pool, drivers = make_pool(tmp_path, size=1, acquire_timeout=0.05)
+        driver = pool.acquire()
+        with pytest.raises(BrowserPoolTimeout):
+            pool.acquire()
+
+        threading.Timer(0.02, pool.release, args=(driver,)).start()
+        pool.acquire_timeout = 5
+        assert pool.acquire() is driver
+        assert len(drivers) == 1
+
+    def test_render_metrics(self, tmp_path):
+        """Test render time is observed by outcome and in-flight renders are counted."""
+        registry = MetricsRegistry(directory=str(tmp_path))
+        clock = FakeClock()
+        pool, _ = make_pool(tmp_path, registry=registry, clock=clock)
+        with pool.render():
+            clock.now += 3
+            assert registry.collect()['superset_browser_renders_in_flight'][()] == 1
+
+        metrics = registry.collect()
+        render = metrics['superset_browser_render_seconds'][(('outcome', 'ok'),)]
+        assert render[-1] == 3 and sum(render[:-1]) == 1
+        assert metrics['superset_browser_renders_in_flight'][()] == 0
+        assert (('reason', 'cold'),) in metrics['superset_browser_launch_seconds']
+
+    def test_close_quits_idle_browsers(self, tmp_path):
+        """Test closing the pool quits the browsers it holds."""
+        pool, drivers = make_pool(tmp_path, size=2)
+        pool.warm()
+        pool.close()
+        assert all(driver.quit_called for driver in drivers)
+
+
+
+class TestMountedConfigs:
+    """Test the hand-written configs enable the pool."""
+
+    def test_screenshot_configs_pool_browsers(self):
+        """Test every config taking Chrome screenshots loads and sizes the pool."""
+        for path in (Path(__file__).parent.parent / 'docker' / 'local').glob('superset_config*.py'):
+            source = path.read_text()
+            settings = {
+                node.targets[0].id: node.value
+                for node in ast.parse(source).body
+                if isinstance(node, ast.Assign) and isinstance(node.targets[0], ast.Name)
+            }
+            if 'WEBDRIVER_TYPE' in settings:
+                assert ast.literal_eval(settings['BROWSER_POOL'])['size'] >= 1, path.name
+                assert "'superset_ext.tasks'" in source, path.name
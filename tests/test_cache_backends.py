@@ -0,0 +1,436 @@
+"""Tests for the Superset cache backends in docker/local/superset_ext."""
+
+import os
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+# Add the mounted Superset pythonpath to the import path
+sys.path.append(str(Path(__file__).parent.parent / 'docker' / 'local'))
+
+from superset_ext.lru import BoundedLRU
+from superset_ext.cache import LayeredRedisCache, SQLiteCache, percentile
+from superset_ext.results import DiskResultsBackend
+from superset_ext.singleflight import Entry, FileLock, SingleFlightCache
+
+
+class TestBoundedLRU:
+    """Test the byte-accounted in-process LRU."""
+
+    def test_evicts_least_recently_used_by_bytes(self):
+        """Test eviction keeps total size under the byte budget."""
+        lru = BoundedLRU(max_bytes=30, max_item_bytes=10)
+        lru.set('a', b'x' * 10, ttl=0)
+        lru.set('b', b'x' * 10, ttl=0)
+        lru.set('c', b'x' * 10, ttl=0)
+
+        # Touch 'a' so 'b' becomes the eviction candidate
+        assert lru.get('a') is not None
+        lru.set('d', b'x' * 10, ttl=0)
+
+        assert lru.get('b') is None
+        assert lru.get('a') is not None
+        assert lru.current_bytes == 30
+        assert lru.stats()['evictions'] == 1
+
+    def test_rejects_oversized_items(self):
+        """Test values above max_item_bytes are not stored."""
+        lru = BoundedLRU(max_bytes=100, max_item_bytes=10)
+        assert lru.set('big', b'x' * 11, ttl=0) is False
+        assert lru.get('big') is None
+        assert lru.current_bytes == 0
+
+    def test_ttl_expiry(self):
+        """Test entries are not served after their TTL."""
+        lru = BoundedLRU(max_bytes=100)
+        lru.set('k', b'v', ttl=0.01)
+        time.sleep(0.02)
+        assert lru.get('k') is None
+        assert lru.current_bytes == 0
+
+    def test_overwrite_updates_accounting(self):
+        """Test replacing a key does not double count its size."""
+        lru = BoundedLRU(max_bytes=100)
+        lru.set('k', b'x' * 5, ttl=0)
+        lru.set('k', b'x' * 7, ttl=0)
+        assert lru.current_bytes == 7
+        assert len(lru) == 1
+
+
+class FakeRedis:
+    """The Redis commands LayeredRedisCache sends, on a dict with TTLs in milliseconds."""
+
+    def __init__(self):
+        self.values = {}
+        self.pttls = {}
+        self.published = []
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def publish(self, channel, message):
+        self.published.append(message)
+        return 0
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.commands.append((name, args))
+
+    def execute(self):
+        results = []
+        for name, args in self.commands:
+            if name == 'get':
+                results.append(self.redis.values.get(args[0]))
+            elif name == 'pttl':
+                results.append(self.redis.pttls.get(args[0], -1) if args[0] in self.redis.values else -2)
+            elif name in ('set', 'setex'):
+                key, value = args[0], args[-1]
+                self.redis.values[key] = value
+                self.redis.pttls[key] = args[1] * 1000 if name == 'setex' else -1
+                results.append(True)
+            else:
+                results.append(self.redis.publish(*args))
+        return results
+
+
+class TestLayeredRedisCache:
+    """Test L1 behaviour of the layered Redis cache (no Redis server needed)."""
+
+    def make_cache(self, **kwargs):
+        cache = LayeredRedisCache(host='localhost', key_prefix='t_', **kwargs)
+        cache._read_client = cache._write_client = FakeRedis()
+        # No invalidation listener thread
+        cache._listener_pid = os.getpid()
+        return cache
+
+    def test_get_and_set_through_both_layers(self):
+        """Test a set fills L1 and Redis, and a Redis hit refills an empty L1."""
+        cache = self.make_cache(l1_timeout=30)
+        assert cache.set('chart', {'rows': 3}, timeout=60)
+        assert cache._write_client.values['t_chart'] == cache.l1.get('t_chart')
+        assert cache.get('chart') == {'rows': 3}
+        assert (cache.l1_hits, cache.l2_hits) == (1, 0)
+
+        cache.l1.clear()
+        assert cache.get('chart') == {'rows': 3}
+        assert cache.l2_hits == 1 and cache.l1.get('t_chart') is not None
+        assert cache.get('missing') is None and cache.misses == 1
+
+    def test_expiring_key_not_kept_in_l1(self):
+        """Test a key Redis is about to expire is served but not stored in L1 forever."""
+        cache = self.make_cache(l1_timeout=30)
+        cache.set('chart', 'stale', timeout=60)
+        cache.l1.clear()
+        cache._read_client.pttls['t_chart'] = 0
+        assert cache.get('chart') == 'stale'
+        assert cache.l1.get('t_chart') is None
+
+        # Once Redis drops it, so does every read
+        del cache._read_client.values['t_chart']
+        assert cache.get('chart') is None
+
+    def test_l1_disabled_by_zero_timeout(self):
+        """Test l1_timeout 0 keeps everything in Redis only."""
+        cache = self.make_cache(l1_timeout=0)
+        cache.set('chart', 'v', timeout=60)
+        assert cache.l1.get('t_chart') is None
+        assert cache.get('chart') == 'v' and cache.l2_hits == 1
+
+    def test_l1_ttl_capped_by_redis_ttl(self):
+        """Test L1 entries never outlive the Redis TTL."""
+        cache = self.make_cache(l1_timeout=30)
+        assert cache._l1_ttl(5000) == 5.0
+        assert cache._l1_ttl(60000) == 30.0
+        assert cache._l1_ttl(-1) == 30.0
+
+    def test_invalidation_messages(self):
+        """Test peer invalidations evict L1 but our own messages do not."""
+        cache = self.make_cache()
+        cache._origin = 'me'
+        cache.l1.set('t_a', b'1', ttl=0)
+        cache.l1.set('t_b', b'2', ttl=0)
+
+        channel = cache.invalidation_channel.encode()
+        cache._handle_message({'channel': channel, 'data': b'me|t_a'})
+        assert cache.l1.get('t_a') is not None
+
+        cache._handle_message({'channel': channel, 'data': b'peer|t_a'})
+        assert cache.l1.get('t_a') is None
+
+        cache._handle_message({'channel': b'__keyevent@0__:expired', 'data': b't_b'})
+        assert cache.l1.get('t_b') is None
+
+    def test_stats_hit_ratios(self):
+        """Test hit ratio reporting."""
+        cache = self.make_cache()
+        cache.l1_hits, cache.l2_hits, cache.misses = 6, 3, 1
+        stats = cache.stats()
+        assert stats['l1_hit_ratio'] == 0.6
+        assert stats['l2_hit_ratio'] == 0.3
+
+    def test_percentile(self):
+        """Test percentile helper."""
+        assert percentile([], 99) == 0.0
+        assert percentile(list(range(101)), 99) == 99
+
+
+class TestSQLiteCache:
+    """Test the shared SQLite-backed cache."""
+
+    def test_entries_shared_between_instances(self, tmp_path):
+        """Test two workers on the same file see each other's writes."""
+        path = str(tmp_path / 'cache.db')
+        worker_a = SQLiteCache(path=path, key_prefix='data_')
+        worker_b = SQLiteCache(path=path, key_prefix='data_')
+
+        assert worker_a.set('chart', {'rows': [1, 2, 3]})
+        assert worker_b.get('chart') == {'rows': [1, 2, 3]}
+        assert worker_b.has('chart')
+
+        assert worker_b.delete('chart')
+        assert worker_a.get('chart') is None
+
+    def test_factory_accepts_flask_caching_options(self, tmp_path):
+        """Test the factory works with the options Flask-Caching passes."""
+        config = {
+            'CACHE_SQLITE_PATH': str(tmp_path / 'cache.db'),
+            'CACHE_MAX_BYTES': 1024,
+            'CACHE_KEY_PREFIX': 'superset_',
+        }
+        kwargs = {'default_timeout': 60, 'ignore_delete_many_errors': False}
+        cache = SQLiteCache.factory(None, config, [], kwargs)
+
+        assert cache.max_bytes == 1024
+        assert cache.key_prefix == 'superset_'
+        assert cache.default_timeout == 60
+
+    def test_lru_eviction_under_byte_budget(self, tmp_path):
+        """Test least recently used entries are evicted past max_bytes."""
+        cache = SQLiteCache(path=str(tmp_path / 'cache.db'), max_bytes=2500)
+        cache.TOUCH_INTERVAL = 0
+        for i in range(3):
+            cache.set(f'k{i}', b'x' * 700)
+            time.sleep(0.01)
+        # Refresh k0 so k1 is the least recently used entry
+        assert cache.get('k0') is not None
+        time.sleep(0.01)
+        cache.set('k3', b'x' * 700)
+
+        assert cache.get('k1') is None
+        assert cache.get('k0') is not None
+        assert cache.stats()['bytes'] <= 2500
+
+    def test_expiry_and_sweep(self, tmp_path):
+        """Test expired entries are hidden and swept."""
+        cache = SQLiteCache(path=str(tmp_path / 'cache.db'))
+        cache.set('short', 'v', timeout=1)
+        cache.set('forever', 'v', timeout=0)
+        time.sleep(1.1)
+
+        assert cache.get('short') is None
+        assert cache.sweep() == 1
+        assert cache.get('forever') == 'v'
+        assert cache.stats()['items'] == 1
+
+    def test_add_only_when_missing(self, tmp_path):
+        """Test add() does not overwrite live entries."""
+        cache = SQLiteCache(path=str(tmp_path / 'cache.db'))
+        assert cache.add('k', 1)
+        assert not cache.add('k', 2)
+        assert cache.get('k') == 1
+
+    def test_clear_respects_prefix(self, tmp_path):
+        """Test clear() only removes keys of its own cache role."""
+        path = str(tmp_path / 'cache.db')
+        data = SQLiteCache(path=path, key_prefix='superset_data_')
+        meta = SQLiteCache(path=path, key_prefix='superset_')
+        data.set('a', 1)
+        meta.set('b', 2)
+
+        data.clear()
+        assert data.get('a') is None
+        assert meta.get('b') == 2
+
+
+class TestDiskResultsBackend:
+    """Test the disk-backed results backend."""
+
+    def test_roundtrip_payload_types(self, tmp_path):
+        """Test bytes, pre-compressed bytes and objects survive storage."""
+        import zlib
+        backend = DiskResultsBackend(path=str(tmp_path / 'results'))
+        compressed = zlib.compress(b'{"data": []}' * 100)
+        backend.set('raw', b'plain bytes')
+        backend.set('zlib', compressed)
+        backend.set('object', {'rows': [1, 2, 3]})
+
+        assert backend.get('raw') == b'plain bytes'
+        assert backend.get('zlib') == compressed
+        assert backend.get('object') == {'rows': [1, 2, 3]}
+        assert backend.get('missing') is None
+
+    def test_precompressed_payload_not_compressed_again(self, tmp_path):
+        """Test Superset's zlib payloads are stored as-is."""
+        import zlib
+        backend = DiskResultsBackend(path=str(tmp_path / 'results'))
+        compressed = zlib.compress(b'x' * 100000)
+        backend.set('zlib', compressed)
+
+        files = list((tmp_path / 'results').glob('*.result'))
+        assert len(files) == 1
+        assert files[0].stat().st_size == len(compressed) + 1
+
+    def test_eviction_removes_files(self, tmp_path):
+        """Test least recently used results are deleted over the byte budget."""
+        import os
+        directory = tmp_path / 'results'
+        backend = DiskResultsBackend(path=str(directory), max_bytes=3 * 1024)
+        for i in range(5):
+            backend.set(f'result_{i}', os.urandom(1024))
+            time.sleep(0.01)
+
+        assert backend.get('result_0') is None
+        assert backend.get('result_4') is not None
+        total = sum(f.stat().st_size for f in directory.glob('*.result'))
+        assert total <= 3 * 1024
+
+    def test_delete_removes_file(self, tmp_path):
+        """Test deleting a result also deletes its file."""
+        directory = tmp_path / 'results'
+        backend = DiskResultsBackend(path=str(directory))
+        backend.set('result', b'payload')
+        assert backend.delete('result')
+
+        assert backend.get('result') is None
+        assert list(directory.glob('*.result')) == []
+
+    def test_stream_chunks(self, tmp_path):
+        """Test results can be read back without joining them in memory."""
+        backend = DiskResultsBackend(path=str(tmp_path / 'results'))
+        backend.set('result', b'abc' * 1000)
+
+        chunks = list(backend.stream('result'))
+        assert chunks[0] == b'Z'
+        assert b''.join(chunks[1:]) == b'abc' * 1000
+
+    def test_get_size_cap(self, tmp_path):
+        """Test get() treats results over max_read_bytes as missing and keeps them streamable."""
+        backend = DiskResultsBackend(path=str(tmp_path / 'results'), max_read_bytes=2000)
+        backend.set('small', b'abc' * 500)
+        backend.set('large', b'abc' * 1000)
+
+        assert backend.get('small') == b'abc' * 500
+        assert backend.get('large') is None
+        assert b''.join(list(backend.stream('large'))[1:]) == b'abc' * 1000
+
+
+class TestSingleFlightCache:
+    """Test the single-flight cache wrapper."""
+
+    def make_cache(self, tmp_path, **kwargs):
+        backend = SQLiteCache(path=str(tmp_path / 'data.db'))
+        kwargs.setdefault('poll_interval', 0.01)
+        return SingleFlightCache(backend, **kwargs)
+
+    def test_burst_runs_one_query(self, tmp_path):
+        """Test concurrent misses on one key compute it only once."""
+        import threading
+        cache = self.make_cache(tmp_path)
+        computed = []
+        results = []
+
+        def request():
+            value = cache.get('chart')
+            if value is None:
+                computed.append(1)
+                time.sleep(0.2)
+                value = {'rows': 42}
+                cache.set('chart', value, timeout=60)
+            results.append(value)
+
+        threads = [threading.Thread(target=request) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(computed) == 1
+        assert results == [{'rows': 42}] * 20
+        assert cache.stats()['coalesced'] == 19
+
+    def test_waiter_takes_over_abandoned_lock(self, tmp_path):
+        """Test a waiter recomputes when the leader gives up without a value."""
+        cache = self.make_cache(tmp_path, wait_timeout=1)
+        assert cache.get('chart') is None
+        cache.delete('chart')  # releases the lock without storing anything
+
+        assert cache.get('chart') is None
+        assert cache.stats()['leaders'] == 2
+
+    def test_failed_leader_releases_lock(self, tmp_path):
+        """Test a leader whose query raises frees the key when its app context ends."""
+        flask = pytest.importorskip('flask')
+        app = flask.Flask(__name__)
+        config = {'CACHE_BACKEND': 'superset_ext.cache.SQLiteCache', 'CACHE_SQLITE_PATH': str(tmp_path / 'data.db')}
+        cache = SingleFlightCache.factory(app, config, [], {})
+        assert cache.wait_timeout == 5
+
+        with pytest.raises(RuntimeError):
+            with app.app_context():
+                assert cache.get('chart') is None
+                raise RuntimeError('query failed')
+
+        waiter = self.make_cache(tmp_path, wait_timeout=30)
+        started = time.monotonic()
+        assert waiter.get('chart') is None
+        assert time.monotonic() - started < 1
+        assert waiter.stats() == {'leaders': 1, 'coalesced': 0, 'wait_timeouts': 0, 'early_refreshes': 0}
+
+    def test_wait_timeout(self, tmp_path):
+        """Test waiters fall back to computing after wait_timeout."""
+        cache = self.make_cache(tmp_path, wait_timeout=0.1)
+        other = self.make_cache(tmp_path, wait_timeout=0.1)
+        assert cache.get('chart') is None  # leader never finishes
+
+        assert other.get('chart') is None
+        assert other.stats()['wait_timeouts'] == 1
+
+    def test_early_expiration(self, tmp_path):
+        """Test entries close to expiry are refreshed by a single caller."""
+        cache = self.make_cache(tmp_path, beta=1.0)
+        expires_at = time.time() + 1
+        # Took far longer to compute than the remaining TTL: always refresh early
+        cache.backend.set('chart', Entry('stale', 3600.0, expires_at), timeout=60)
+
+        assert cache.get('chart') is None
+        assert cache.stats()['early_refreshes'] == 1
+        # Everyone else keeps the cached value while the refresh runs
+        assert self.make_cache(tmp_path, beta=1.0).get('chart') == 'stale'
+
+    def test_early_expiration_disabled(self, tmp_path):
+        """Test beta=0 never refreshes before expiry."""
+        cache = self.make_cache(tmp_path, beta=0)
+        cache.backend.set('chart', Entry('value', 3600.0, time.time() + 1), timeout=60)
+
+        assert cache.get('chart') == 'value'
+
+    def test_file_lock_steals_stale_lock(self, tmp_path):
+        """Test a lock file older than its timeout can be taken over."""
+        import os
+        path = str(tmp_path / 'key.lock')
+        first = FileLock(path, timeout=10)
+        assert first.acquire()
+        assert not FileLock(path, timeout=10).acquire()
+
+        os.utime(path, (time.time() - 60, time.time() - 60))
+        second = FileLock(path, timeout=10)
+        assert second.acquire()
+        first.release()  # not the owner any more
+        assert second.locked()
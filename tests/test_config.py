@@ -171,7 +171,19 @@ class TestPydanticModels:
         
         errors = exc_info.value.errors()
         assert any('memory' in str(error['loc']) for error in errors)
-    
+
+    def test_warmup_schedule_validation(self):
+        """Test cache warm-up defaults and cron schedule validation."""
+        config = SupersetConfig()
+        assert config.warmup.enabled
+        assert config.warmup.top_dashboards == 10
+
+        with pytest.raises(ValidationError) as exc_info:
+            SupersetConfig(warmup={'schedule': 'every 30 minutes'})
+
+        errors = exc_info.value.errors()
+        assert any('schedule' in str(error['loc']) for error in errors)
+
     def test_gcp_project_id_validation(self):
         """Test GCP project ID validation."""
         # Valid project ID
@@ -335,6 +347,19 @@ class TestValidators:
         warnings = validate_cloud_sql_tier_for_environment('db-n1-standard-1', False, 'production')
         assert len(warnings) == 0
     
+    def test_validate_warmup_configuration(self):
+        """Test cache warm-up without the prebaked image is flagged on Cloud stacks."""
+        from pulumi.config.validators import validate_warmup_configuration
+        
+        warnings = validate_warmup_configuration({'warmup': {'enabled': True}}, 'standard')
+        assert len(warnings) == 1
+        assert 'prebaked image' in warnings[0]
+        
+        # Warm-up disabled, image built, or Celery beat runs it locally
+        assert validate_warmup_configuration({'warmup': {'enabled': False}}, 'production') == []
+        assert validate_warmup_configuration({'image': {'enabled': True}}, 'production') == []
+        assert validate_warmup_configuration({}, 'minimal') == []
+    
     def test_check_version_compatibility(self):
         """Test version compatibility checking."""
         from pulumi.config.validators import check_version_compatibility
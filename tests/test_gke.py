@@ -0,0 +1,193 @@
+"""Tests for the Kubernetes manifests of GKE stacks."""
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+from pydantic import ValidationError
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from pulumi.config.gke import (
+    config_files,
+    container_resources,
+    kubeconfig,
+    prometheus_adapter_values,
+    superset_manifests,
+)
+from pulumi.config.models import ResourceConfig
+from pulumi.config.scaling import LATENCY_P95_METRIC
+
+SECRETS = {'SUPERSET_SECRET_KEY': 'key', 'DATABASE_URL': 'postgresql://db', 'REDIS_URL': 'redis://redis'}
+
+
+def manifests(stack, image=None):
+    return {
+        (manifest['kind'], manifest['metadata']['name']): manifest
+        for manifest in superset_manifests(stack, 'prod-superset', SECRETS, image)
+    }
+
+
+class TestResources:
+    """Test container resources derived from superset.resources."""
+
+    def test_requests_and_limits(self):
+        """Test the allocation is the limit and requests default to it."""
+        assert container_resources(ResourceConfig(cpu='4', memory='8Gi', requests={'cpu': '2', 'memory': '4Gi'})) == {
+            'requests': {'cpu': '2', 'memory': '4Gi'},
+            'limits': {'cpu': '4', 'memory': '8Gi'},
+        }
+        guaranteed = container_resources(ResourceConfig(cpu='1', memory='2Gi'))
+        assert guaranteed['requests'] == guaranteed['limits']
+
+    @pytest.mark.parametrize('requests', [{'cpu': '8', 'memory': '4Gi'}, {'cpu': '2', 'memory': '9000Mi'}])
+    def test_requests_within_limits(self, requests):
+        """Test requests above the allocation are rejected."""
+        with pytest.raises(ValidationError):
+            ResourceConfig(cpu='4', memory='8Gi', requests=requests)
+
+
+class TestManifests:
+    """Test the web, worker and beat workloads."""
+
+    def test_kinds(self, production_stack):
+        """Test every workload is created, the namespace first."""
+        kinds = [manifest['kind'] for manifest in superset_manifests(production_stack(), 'prod-superset', SECRETS)]
+        assert kinds[0] == 'Namespace'
+        assert kinds.count('Deployment') == 3
+        assert {'ConfigMap', 'Secret', 'Service', 'Ingress', 'HorizontalPodAutoscaler', 'PodDisruptionBudget'} <= set(kinds)
+
+    def test_selectors_match_pods(self, production_stack):
+        """Test Deployments, the Service and the budgets select the right pods."""
+        resources = manifests(production_stack())
+        for component in ('web', 'worker', 'beat'):
+            deployment = resources[('Deployment', f'prod-superset-{component}')]
+            labels = deployment['spec']['template']['metadata']['labels']
+            assert deployment['spec']['selector']['matchLabels'].items() <= labels.items()
+
+        web_labels = resources[('Deployment', 'prod-superset-web')]['spec']['template']['metadata']['labels']
+        assert resources[('Service', 'prod-superset-web')]['spec']['selector'].items() <= web_labels.items()
+        budget = resources[('PodDisruptionBudget', 'prod-superset-web')]
+        assert budget['spec']['selector']['matchLabels'].items() <= web_labels.items()
+
+    def test_hpa_owns_web_replicas(self, production_stack):
+        """Test the HPA uses the scaling policies and the Deployment leaves replicas to it."""
+        stack = production_stack(autoscaling={
+            'enabled': True, 'min_replicas': 3, 'max_replicas': 10, 'target_latency_p95_ms': 1500,
+        })
+        resources = manifests(stack)
+        hpa = resources[('HorizontalPodAutoscaler', 'prod-superset-web')]
+        assert (hpa['spec']['minReplicas'], hpa['spec']['maxReplicas']) == (3, 10)
+        assert hpa['spec']['metrics'][-1]['pods']['metric']['name'] == LATENCY_P95_METRIC
+        assert 'replicas' not in resources[('Deployment', 'prod-superset-web')]['spec']
+
+        fixed = manifests(production_stack(autoscaling=None))
+        assert ('HorizontalPodAutoscaler', 'prod-superset-web') not in fixed
+        assert fixed[('Deployment', 'prod-superset-web')]['spec']['replicas'] == 2
+
+    def test_worker_autoscaling(self, production_stack):
+        """Test queue-driven workers get an HPA, the redis exporter and no fixed replicas."""
+        resources = manifests(production_stack(celery={'autoscaling': {
+            'enabled': True, 'min_workers': 0, 'max_workers': 6, 'queues': ['celery', 'reports'],
+        }}))
+        hpa = resources[('HorizontalPodAutoscaler', 'prod-superset-worker')]
+        assert (hpa['spec']['minReplicas'], hpa['spec']['maxReplicas']) == (1, 6)
+        assert 'replicas' not in resources[('Deployment', 'prod-superset-worker')]['spec']
+
+        exporter = resources[('Deployment', 'prod-superset-redis-exporter')]['spec']['template']['spec']
+        assert exporter['containers'][0]['args'] == ['--check-single-keys=db0=celery,db0=reports']
+
+        assert ('HorizontalPodAutoscaler', 'prod-superset-worker') not in manifests(production_stack())
+
+    def test_queue_pools(self, production_stack):
+        """Test each dedicated queue gets its Deployment, budget and, when scaled, HPA."""
+        resources = manifests(production_stack(celery={
+            'autoscaling': {'enabled': True, 'queues': ['celery', 'sql_lab']},
+            'queues': {'sql_lab': {'concurrency': 6}, 'thumbnails': {'replicas': 2}},
+        }))
+        sql_lab = resources[('Deployment', 'prod-superset-worker-sql-lab')]
+        container = sql_lab['spec']['template']['spec']['containers'][0]
+        assert {'--queues=sql_lab', '--concurrency=6'} <= set(container['command'])
+        assert 'sql_lab@$HOSTNAME' in container['livenessProbe']['exec']['command'][-1]
+        assert 'replicas' not in sql_lab['spec']
+
+        hpa = resources[('HorizontalPodAutoscaler', 'prod-superset-worker-sql-lab')]
+        selector = hpa['spec']['metrics'][0]['external']['metric']['selector']
+        assert selector['matchExpressions'][0]['values'] == ['sql_lab']
+
+        assert resources[('Deployment', 'prod-superset-worker-thumbnails')]['spec']['replicas'] == 2
+        assert ('HorizontalPodAutoscaler', 'prod-superset-worker-thumbnails') not in resources
+        assert ('PodDisruptionBudget', 'prod-superset-worker-thumbnails') in resources
+
+    def test_beat_is_a_singleton(self, production_stack):
+        """Test beat never runs twice, even during a rollout."""
+        beat = manifests(production_stack())[('Deployment', 'prod-superset-beat')]
+        assert beat['spec']['replicas'] == 1
+        assert beat['spec']['strategy'] == {'type': 'Recreate'}
+
+    def test_web_probes(self, production_stack):
+        """Test the start-up probe covers cold_start.startup_timeout_seconds."""
+        stack = production_stack(resources={'cpu': '4', 'memory': '8Gi', 'requests': {'cpu': '2', 'memory': '4Gi'}})
+        web = manifests(stack)[('Deployment', 'prod-superset-web')]
+        container = web['spec']['template']['spec']['containers'][0]
+        probe = container['startupProbe']
+        assert probe['periodSeconds'] * probe['failureThreshold'] >= 240
+        assert container['resources']['requests'] == {'cpu': '2', 'memory': '4Gi'}
+
+
+class TestConfiguration:
+    """Test how the generated configuration reaches the pods."""
+
+    def test_stock_image_mounts_config_map(self, production_stack):
+        """Test every config file is a ConfigMap key mounted back at its path."""
+        resources = manifests(production_stack())
+        data = resources[('ConfigMap', 'prod-superset-config')]['data']
+        assert set(config_files(production_stack(), 'prod-superset')) == {
+            key.replace('-', '/') for key in data
+        }
+        assert 'superset_ext-bootstrap.py' in data
+
+        pod = resources[('Deployment', 'prod-superset-web')]['spec']['template']
+        container = pod['spec']['containers'][0]
+        assert container['image'] == 'apache/superset:5.0.0'
+        volume = next(v for v in pod['spec']['volumes'] if v['name'] == 'config')
+        assert {'key': 'superset_ext-metrics.py', 'path': 'superset_ext/metrics.py'} in volume['configMap']['items']
+        assert 'checksum/config' in pod['metadata']['annotations']
+
+    def test_prebaked_image_ships_config(self, production_stack):
+        """Test a prebaked image runs without the ConfigMap mounted."""
+        pod = manifests(production_stack(), image='registry/superset@sha256:abc')[('Deployment', 'prod-superset-worker')]['spec']['template']
+        assert pod['spec']['containers'][0]['image'] == 'registry/superset@sha256:abc'
+        assert [volume['name'] for volume in pod['spec']['volumes']] == ['metrics']
+
+    def test_pods_run_as_superset_user(self, production_stack):
+        """Test every pod runs as the image's non-root superset user."""
+        resources = manifests(production_stack())
+        for component in ('web', 'worker', 'beat'):
+            context = resources[('Deployment', f'prod-superset-{component}')]['spec']['template']['spec']['securityContext']
+            assert context == {'runAsNonRoot': True, 'runAsUser': 1000, 'runAsGroup': 1000, 'fsGroup': 1000}
+
+    def test_secret_and_env(self, production_stack):
+        """Test credentials come from the Secret."""
+        resources = manifests(production_stack())
+        assert resources[('Secret', 'prod-superset-env')]['stringData'] == SECRETS
+        container = resources[('Deployment', 'prod-superset-worker')]['spec']['template']['spec']['containers'][0]
+        assert container['envFrom'] == [{'secretRef': {'name': 'prod-superset-env'}}]
+
+
+class TestCluster:
+    """Test cluster access and the metrics adapter."""
+
+    def test_kubeconfig(self):
+        """Test the kubeconfig points at the endpoint and authenticates with the GKE plugin."""
+        config = json.loads(kubeconfig('prod-gke', '10.0.0.1', 'Q0E='))
+        assert config['clusters'][0]['cluster']['server'] == 'https://10.0.0.1'
+        assert config['users'][0]['user']['exec']['command'] == 'gke-gcloud-auth-plugin'
+
+    def test_adapter_values(self):
+        """Test the adapter serves only the custom rules."""
+        values = prometheus_adapter_values('http://prometheus.monitoring.svc')
+        assert values['rules']['default'] is False
+        assert values['rules']['custom'][1]['name']['as'] == LATENCY_P95_METRIC
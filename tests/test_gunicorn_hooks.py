@@ -0,0 +1,105 @@
+"""Tests for the gunicorn server hooks."""
+
+import multiprocessing
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+# Add the mounted Superset pythonpath to the import path
+sys.path.append(str(Path(__file__).parent.parent / 'docker' / 'local'))
+
+from superset_ext import gunicorn_hooks
+from superset_ext.metrics import MetricsRegistry
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    registry = MetricsRegistry(directory=str(tmp_path))
+    monkeypatch.setattr(gunicorn_hooks, 'REGISTRY', registry)
+    return registry
+
+
+def server(preload_app=True):
+    return SimpleNamespace(cfg=SimpleNamespace(preload_app=preload_app))
+
+
+def _checkout_in_child(engine, parent_connection, results):
+    raw = engine.raw_connection()
+    results.put(raw.dbapi_connection is parent_connection)
+    raw.close()
+
+
+class TestHooks:
+    """Test boot time and latency recording."""
+
+    def test_worker_boot_time(self, registry):
+        """Test the time from post_fork to post_worker_init is observed."""
+        worker = SimpleNamespace(pid=123)
+        gunicorn_hooks.post_fork(server(), worker)
+        gunicorn_hooks.post_worker_init(worker)
+        boot = registry.collect()['superset_gunicorn_worker_boot_seconds'][()]
+        assert sum(boot[:-1]) == 1
+
+    def test_request_latency(self, registry, caplog, monkeypatch):
+        """Test requests are observed by method and status and slow ones logged."""
+        monkeypatch.setattr(gunicorn_hooks, 'SLOW_REQUEST_SECONDS', 0)
+        worker = SimpleNamespace(pid=123)
+        req = SimpleNamespace(method='POST', path='/api/v1/chart/data')
+        gunicorn_hooks.pre_request(worker, req)
+        with caplog.at_level('WARNING', logger='superset_ext.gunicorn_hooks'):
+            gunicorn_hooks.post_request(worker, req, {}, SimpleNamespace(status='504 GATEWAY TIMEOUT'))
+
+        latency = registry.collect()['superset_gunicorn_request_duration_seconds']
+        assert sum(latency[(('method', 'POST'), ('status', '504'))][:-1]) == 1
+        assert 'Slow request: POST /api/v1/chart/data 504' in caplog.text
+
+    def test_master_ready_and_worker_exits(self, registry):
+        """Test readiness is a gauge and exits and timeouts are counted."""
+        gunicorn_hooks.when_ready(server())
+        gunicorn_hooks.child_exit(server(), SimpleNamespace(pid=1))
+        gunicorn_hooks.worker_abort(SimpleNamespace(pid=1))
+
+        metrics = registry.collect()
+        assert metrics['superset_gunicorn_master_ready_seconds'][()] > 0
+        assert metrics['superset_gunicorn_worker_exits_total'][()] == 1
+        assert metrics['superset_gunicorn_worker_timeouts_total'][()] == 1
+
+    def test_pre_fork_freezes_once_when_preloading(self, monkeypatch):
+        """Test the collector is frozen before the first fork of a preloaded app only."""
+        calls = []
+        monkeypatch.setattr(gunicorn_hooks, '_frozen', False)
+        monkeypatch.setattr(gunicorn_hooks.gc, 'freeze', lambda: calls.append('freeze'))
+        gunicorn_hooks.pre_fork(server(preload_app=False), None)
+        assert calls == []
+        gunicorn_hooks.pre_fork(server(), None)
+        gunicorn_hooks.pre_fork(server(), None)
+        assert calls == ['freeze']
+
+
+class TestPidGuard:
+    """Test preloaded database connections are not shared with workers."""
+
+    def test_forked_worker_gets_its_own_connection(self, tmp_path):
+        """Test a pooled connection opened before fork is not checked out after it."""
+        sqlalchemy = pytest.importorskip('sqlalchemy')
+        from sqlalchemy.pool import QueuePool
+
+        gunicorn_hooks.install_pid_guard()
+        engine = sqlalchemy.create_engine(f'sqlite:///{tmp_path}/meta.db', poolclass=QueuePool, pool_size=1)
+        raw = engine.raw_connection()
+        parent_connection = raw.dbapi_connection
+        raw.close()
+
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        child = context.Process(target=_checkout_in_child, args=(engine, parent_connection, results))
+        child.start()
+        child.join(10)
+        assert results.get(timeout=5) is False
+
+        # The parent keeps using its own connection
+        raw = engine.raw_connection()
+        assert raw.dbapi_connection is parent_connection
+        raw.close()
@@ -0,0 +1,319 @@
+"""Tests for the multi-worker Prometheus exporter."""
+
+import ast
+import multiprocessing
+import sys
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+import pytest
+
+# Add the mounted Superset pythonpath to the import path
+sys.path.append(str(Path(__file__).parent.parent / 'docker' / 'local'))
+
+from superset_ext.metrics import (
+    ENDPOINT_ENVIRON_KEY,
+    PUBLISHED_HEADER,
+    MetricsMiddleware,
+    MetricsRegistry,
+    PrometheusStatsLogger,
+    instrument_app,
+    instrument_cache,
+    instrumented_pool,
+    normalize_path,
+    observe_queue_wait,
+    serve_metrics,
+    stamp_published,
+)
+
+
+def make_app(status='200 OK', endpoint=None):
+    def app(environ, start_response):
+        if endpoint:
+            environ[ENDPOINT_ENVIRON_KEY] = endpoint
+        start_response(status, [('Content-Type', 'text/plain')])
+        return [b'ok']
+    return app
+
+
+def call(app, path, method='GET'):
+    environ = {'PATH_INFO': path, 'REQUEST_METHOD': method}
+    body = app(environ, lambda status, headers, exc_info=None: None)
+    data = b''.join(body)
+    if hasattr(body, 'close'):
+        body.close()
+    return data
+
+
+def _worker_requests(directory, count, hold=None, release=None):
+    registry = MetricsRegistry(directory=str(directory), flush_interval=3600)
+    app = MetricsMiddleware(make_app(endpoint='/api/v1/chart/data'), registry=registry)
+    for _ in range(count):
+        call(app, '/api/v1/chart/data', 'POST')
+    if hold is not None:
+        registry.inc('superset_http_requests_in_flight', (('route_class', 'sql_lab'),))
+    registry.flush()
+    if hold is not None:
+        hold.set()
+        release.wait(10)
+
+
+class TestMetricsRegistry:
+    """Test metric aggregation and the text format."""
+
+    def test_histogram_buckets_are_cumulative(self, tmp_path):
+        """Test observations land in le buckets and render cumulatively."""
+        registry = MetricsRegistry(directory=str(tmp_path))
+        labels = (('endpoint', '/x'), ('method', 'GET'))
+        for value in (0.004, 0.1, 0.3, 500):
+            registry.observe('superset_http_request_duration_seconds', labels, value)
+
+        text = registry.render()
+        assert '# TYPE superset_http_request_duration_seconds histogram' in text
+        prefix = 'superset_http_request_duration_seconds_bucket{endpoint="/x",method="GET",'
+        assert f'{prefix}le="0.005"}} 1' in text
+        assert f'{prefix}le="0.1"}} 2' in text
+        assert f'{prefix}le="0.5"}} 3' in text
+        assert f'{prefix}le="300"}} 3' in text
+        assert f'{prefix}le="+Inf"}} 4' in text
+        assert 'superset_http_request_duration_seconds_count{endpoint="/x",method="GET"} 4' in text
+        assert 'superset_http_request_duration_seconds_sum{endpoint="/x",method="GET"} 500.404' in text
+
+    def test_label_values_are_escaped(self, tmp_path):
+        """Test quotes and backslashes in label values keep the format valid."""
+        registry = MetricsRegistry(directory=str(tmp_path))
+        registry.inc('superset_cache_requests_total', (('cache', 'a"b\\c'), ('result', 'hit')))
+        assert 'superset_cache_requests_total{cache="a\\"b\\\\c",result="hit"} 1' in registry.render()
+
+    def test_workers_are_summed(self, tmp_path):
+        """Test values written by other worker processes are added to our own."""
+        context = multiprocessing.get_context('fork')
+        hold, release = context.Event(), context.Event()
+        worker = context.Process(target=_worker_requests, args=(tmp_path, 3, hold, release))
+        worker.start()
+        try:
+            assert hold.wait(10)
+            registry = MetricsRegistry(directory=str(tmp_path))
+            app = MetricsMiddleware(make_app(endpoint='/api/v1/chart/data'), registry=registry)
+            call(app, '/api/v1/chart/data', 'POST')
+
+            metrics = registry.collect()
+            key = (('endpoint', '/api/v1/chart/data'), ('method', 'POST'), ('status', '200'))
+            assert metrics['superset_http_requests_total'][key] == 4
+            assert metrics['superset_http_requests_in_flight'][(('route_class', 'sql_lab'),)] == 1
+        finally:
+            release.set()
+            worker.join(10)
+
+    def test_exited_workers_are_archived(self, tmp_path):
+        """Test counters of exited workers survive and their gauges are dropped."""
+        context = multiprocessing.get_context('fork')
+        for _ in range(2):
+            worker = context.Process(target=_worker_requests, args=(tmp_path, 2))
+            worker.start()
+            worker.join(10)
+
+        registry = MetricsRegistry(directory=str(tmp_path))
+        registry.inc('superset_http_requests_in_flight', (('route_class', 'other'),))
+        metrics = registry.collect()
+        key = (('endpoint', '/api/v1/chart/data'), ('method', 'POST'), ('status', '200'))
+        assert metrics['superset_http_requests_total'][key] == 4
+        histogram = metrics['superset_http_request_duration_seconds'][(('endpoint', '/api/v1/chart/data'), ('method', 'POST'))]
+        assert sum(histogram[:-1]) == 4
+        assert sorted(p.name for p in tmp_path.glob('*.json')) == ['archive.json']
+        # Scraping again must not count the archive twice
+        assert registry.collect()['superset_http_requests_total'][key] == 4
+
+
+class TestMetricsMiddleware:
+    """Test request instrumentation."""
+
+    def test_records_endpoint_status_and_in_flight(self, tmp_path):
+        """Test requests are labelled by URL rule and status and leave no in-flight request."""
+        registry = MetricsRegistry(directory=str(tmp_path))
+        app = MetricsMiddleware(make_app('404 NOT FOUND', endpoint='/api/v1/chart/<int:pk>'), registry=registry)
+        call(app, '/api/v1/chart/42')
+
+        metrics = registry.collect()
+        key = (('endpoint', '/api/v1/chart/<int:pk>'), ('method', 'GET'), ('status', '404'))
+        assert metrics['superset_http_requests_total'][key] == 1
+        assert metrics['superset_http_requests_in_flight'][(('route_class', 'other'),)] == 0
+
+    def test_serves_metrics_path(self, tmp_path):
+        """Test the metrics path returns the text format and is not counted."""
+        registry = MetricsRegistry(directory=str(tmp_path))
+        app = MetricsMiddleware(make_app(), registry=registry, path='/metrics')
+        text = call(app, '/metrics').decode()
+        assert '# TYPE superset_http_requests_total counter' in text
+        assert registry.collect()['superset_http_requests_total'] == {}
+
+    def test_standalone_server(self, tmp_path):
+        """Test processes without a web server (Celery workers) can serve the registry."""
+        registry = MetricsRegistry(directory=str(tmp_path))
+        registry.inc('superset_browser_recycles_total', (('reason', 'max_renders'),))
+        server = serve_metrics(0, registry, host='127.0.0.1')
+        try:
+            url = f'http://127.0.0.1:{server.server_address[1]}'
+            text = urllib.request.urlopen(f'{url}/metrics').read().decode()
+            assert 'superset_browser_recycles_total{reason="max_renders"} 1' in text
+            with pytest.raises(urllib.error.HTTPError):
+                urllib.request.urlopen(f'{url}/other')
+        finally:
+            server.shutdown()
+
+    def test_unmatched_paths_are_bounded(self, tmp_path, monkeypatch):
+        """Test ids are normalized and new endpoints fold into other past the cap."""
+        monkeypatch.setattr('superset_ext.metrics.MAX_ENDPOINTS', 2)
+        registry = MetricsRegistry(directory=str(tmp_path))
+        app = MetricsMiddleware(make_app(), registry=registry)
+        for path in ('/dashboard/1/', '/dashboard/2/', '/a', '/b', '/c'):
+            call(app, path)
+
+        endpoints = {
+            dict(labels)['endpoint']: value
+            for labels, value in registry.collect()['superset_http_requests_total'].items()
+        }
+        assert endpoints == {'/dashboard/<id>/': 2, '/a': 1, 'other': 2}
+
+    def test_normalize_path(self):
+        """Test numeric, UUID and static segments are collapsed."""
+        assert normalize_path('/api/v1/chart/12/data/') == '/api/v1/chart/<id>/data/'
+        assert normalize_path('/superset/dashboard/0f8fad5b-d9cb-469f-a165-70867728950e/') == (
+            '/superset/dashboard/<id>/'
+        )
+        assert normalize_path('/static/assets/app.1234.js') == '/static/'
+        assert normalize_path('/login/') == '/login/'
+
+
+class TestInstrumentation:
+    """Test pool, cache and Flask instrumentation."""
+
+    def test_pool_checkout_wait_and_timeouts(self, tmp_path):
+        """Test checkouts are timed and pool timeouts counted."""
+        sqlalchemy = pytest.importorskip('sqlalchemy')
+        from sqlalchemy.pool import QueuePool
+
+        registry = MetricsRegistry(directory=str(tmp_path))
+        engine = sqlalchemy.create_engine(
+            f'sqlite:///{tmp_path}/meta.db',
+            poolclass=instrumented_pool(QueuePool, registry),
+            pool_size=1,
+            max_overflow=0,
+            pool_timeout=0.05,
+        )
+        with engine.connect():
+            with pytest.raises(sqlalchemy.exc.TimeoutError):
+                engine.connect()
+
+        metrics = registry.collect()
+        assert sum(metrics['superset_db_pool_checkout_seconds'][()][:-1]) == 2
+        assert metrics['superset_db_pool_checkout_seconds'][()][-1] >= 0.05
+        assert metrics['superset_db_pool_checkout_timeouts_total'][()] == 1
+
+    def test_cache_hits_and_misses(self, tmp_path):
+        """Test cache lookups are counted once per cache even if instrumented twice."""
+        from flask_caching.backends import SimpleCache
+
+        registry = MetricsRegistry(directory=str(tmp_path))
+        cache = SimpleCache()
+        instrument_cache(cache, 'data', registry)
+        instrument_cache(cache, 'data', registry)
+        cache.set('k', 'v')
+        assert cache.get('k') == 'v'
+        assert cache.get('missing') is None
+
+        counts = registry.collect()['superset_cache_requests_total']
+        assert counts[(('cache', 'data'), ('result', 'hit'))] == 1
+        assert counts[(('cache', 'data'), ('result', 'miss'))] == 1
+
+    def test_instrument_app_labels_url_rule(self, tmp_path):
+        """Test the Flask URL rule becomes the endpoint label."""
+        flask = pytest.importorskip('flask')
+        registry = MetricsRegistry(directory=str(tmp_path))
+        app = flask.Flask(__name__)
+
+        @app.route('/api/v1/chart/<int:pk>')
+        def chart(pk):
+            return 'ok'
+
+        instrument_app(app, registry)
+        app.wsgi_app = MetricsMiddleware(app.wsgi_app, registry=registry)
+        response = app.test_client().get('/api/v1/chart/7')
+        assert response.status_code == 200
+        response.close()
+
+        key = (('endpoint', '/api/v1/chart/<int:pk>'), ('method', 'GET'), ('status', '200'))
+        assert registry.collect()['superset_http_requests_total'][key] == 1
+
+    def test_celery_queue_wait(self, tmp_path):
+        """Test the wait from publish to start is observed by queue, except for scheduled tasks."""
+        registry = MetricsRegistry(directory=str(tmp_path))
+        headers = {}
+        stamp_published(headers=headers, clock=lambda: 100.0, body=(), exchange='', routing_key='reports')
+        assert headers == {PUBLISHED_HEADER: 100.0}
+
+        class Request:
+            eta = None
+            delivery_info = {'routing_key': 'reports'}
+
+        class Task:
+            request = Request()
+
+        setattr(Task.request, PUBLISHED_HEADER, headers[PUBLISHED_HEADER])
+        observe_queue_wait(task=Task(), registry=registry, clock=lambda: 107.0, task_id='1', args=(), kwargs={})
+        Task.request.eta = '2026-01-01T00:00:00'
+        observe_queue_wait(task=Task(), registry=registry, clock=lambda: 900.0)
+
+        wait = registry.collect()['superset_celery_queue_wait_seconds'][(('queue', 'reports'),)]
+        assert sum(wait[:-1]) == 1 and wait[-1] == 7
+
+
+class TestPrometheusStatsLogger:
+    """Test the STATS_LOGGER backend."""
+
+    def test_calls_become_metrics(self, tmp_path):
+        """Test incr, decr, timing and gauge land in the registry, timings in seconds."""
+        registry = MetricsRegistry(directory=str(tmp_path))
+        stats = PrometheusStatsLogger(registry=registry)
+        stats.incr('loaded_from_cache')
+        stats.incr('loaded_from_cache')
+        stats.decr('reports.running')
+        stats.timing('DashboardRestApi.get.time', 250)
+        stats.gauge('celery.queue_length', 3)
+        stats.gauge('celery.queue_length', 5)
+
+        metrics = registry.collect()
+        assert metrics['superset_stats_events_total'][(('key', 'loaded_from_cache'),)] == 2
+        assert metrics['superset_stats_decrements_total'][(('key', 'reports.running'),)] == 1
+        timing = metrics['superset_stats_timing_seconds'][(('key', 'DashboardRestApi.get.time'),)]
+        assert timing[-1] == pytest.approx(0.25)
+        assert metrics['superset_stats_gauge'][(('key', 'celery.queue_length'),)] == 5
+        assert stats.key('log') == 'superset.log'
+
+    @pytest.mark.parametrize('config', sorted(
+        path.name for path in (Path(__file__).parent.parent / 'docker' / 'local').glob('superset_config*.py')
+    ))
+    def test_every_config_sets_stats_logger(self, config):
+        """Test each mounted config sets STATS_LOGGER unconditionally."""
+        source = (Path(__file__).parent.parent / 'docker' / 'local' / config).read_text()
+        assigned = {
+            target.id
+            for node in ast.parse(source).body if isinstance(node, ast.Assign)
+            for target in node.targets if isinstance(target, ast.Name)
+        }
+        assert 'STATS_LOGGER' in assigned
+
+    def test_key_cardinality_is_bounded(self, tmp_path, monkeypatch):
+        """Test id segments are collapsed and new keys fold into other past the cap."""
+        monkeypatch.setattr('superset_ext.metrics.MAX_STATS_KEYS', 2)
+        registry = MetricsRegistry(directory=str(tmp_path))
+        stats = PrometheusStatsLogger(registry=registry)
+        for key in ('dashboard.12.load', 'dashboard.13.load', 'a', 'b', 'c'):
+            stats.incr(key)
+
+        keys = {
+            dict(labels)['key']: value
+            for labels, value in registry.collect()['superset_stats_events_total'].items()
+        }
+        assert keys == {'dashboard.<id>.load': 2, 'a': 1, 'other': 2}
@@ -0,0 +1,163 @@
+"""Tests for the exporters, scrape configs and monitoring manifests."""
+
+import json
+import re
+import sys
+from pathlib import Path
+
+import yaml
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from pulumi.config.gke import PROMETHEUS_URL, prometheus_adapter_values, superset_manifests
+from pulumi.config.models import StackConfig
+from pulumi.config.monitoring import (
+    CADVISOR_METRICS,
+    GRAFANA_DIR,
+    compose_prometheus_config,
+    gke_prometheus_config,
+    monitoring_manifests,
+)
+
+SECRETS = {'SUPERSET_SECRET_KEY': 'key', 'DATABASE_URL': 'postgresql://db', 'REDIS_URL': 'redis://redis'}
+
+MONITORING = {
+    'enabled': True,
+    'prometheus': {'retention_days': 30, 'storage_size': 100, 'high_availability': True},
+    'grafana': {'admin_password': 'secret', 'plugins': ['grafana-piechart-panel']},
+}
+
+
+def by_name(manifests):
+    return {(manifest['kind'], manifest['metadata']['name']): manifest for manifest in manifests}
+
+
+def jobs(config):
+    return {job['job_name']: job for job in config['scrape_configs']}
+
+
+class TestExporters:
+    """Test the exporters deployed next to Superset."""
+
+    def test_exporters_with_monitoring(self, production_stack):
+        """Test the database and cache exporters read their addresses from the Secret."""
+        resources = by_name(superset_manifests(production_stack(monitoring=MONITORING, celery={'queues': {'reports': {}}}), 'prod-superset', SECRETS))
+        postgres = resources[('Deployment', 'prod-superset-postgres-exporter')]['spec']['template']
+        assert postgres['metadata']['annotations']['prometheus.io/port'] == '9187'
+        assert postgres['spec']['containers'][0]['env'][0]['valueFrom']['secretKeyRef'] == {
+            'name': 'prod-superset-env', 'key': 'DATABASE_URL',
+        }
+        redis = resources[('Deployment', 'prod-superset-redis-exporter')]['spec']['template']['spec']
+        assert redis['containers'][0]['args'] == ['--check-single-keys=db0=celery,db0=reports']
+
+    def test_no_exporters_without_monitoring(self, production_stack):
+        """Test nothing is added when monitoring and worker autoscaling are off."""
+        kinds = by_name(superset_manifests(production_stack(monitoring={}), 'prod-superset', SECRETS))
+        assert not [name for _, name in kinds if name.endswith('-exporter')]
+
+
+class TestScrapeConfigs:
+    """Test the generated prometheus.yml of compose and GKE."""
+
+    def test_compose_targets(self, production_stack):
+        """Test compose services are scraped, every worker service through its DNS name."""
+        config = compose_prometheus_config(production_stack(monitoring=MONITORING))
+        assert config['global']['scrape_interval'] == '15s'
+        assert list(jobs(config)) == ['web', 'worker', 'redis-exporter', 'postgres-exporter', 'cadvisor', 'prometheus']
+        assert jobs(config)['web']['static_configs'][0]['targets'] == ['superset:8088']
+
+        pooled = jobs(compose_prometheus_config(production_stack(monitoring=MONITORING, celery={'queues': {'thumbnails': {}}})))
+        assert pooled['worker-thumbnails']['dns_sd_configs'][0] == {
+            'names': ['superset-worker-thumbnails'], 'type': 'A', 'port': 9808,
+        }
+
+    def test_compose_without_postgres(self):
+        """Test a SQLite stack has no database exporter to scrape."""
+        stack = StackConfig(type='minimal', environment='local')
+        assert list(jobs(compose_prometheus_config(stack))) == ['web', 'cadvisor', 'prometheus']
+
+    def test_cadvisor_container_label(self, production_stack):
+        """Test compose cAdvisor series are labelled with the compose service, like on GKE."""
+        relabel = jobs(compose_prometheus_config(production_stack(monitoring=MONITORING)))['cadvisor']['metric_relabel_configs']
+        assert relabel[1] == {
+            'source_labels': ['container_label_com_docker_compose_service'], 'target_label': 'container',
+        }
+
+    def test_gke_discovery(self, production_stack):
+        """Test annotated pods of the Superset namespace and the kubelets' cAdvisor are scraped."""
+        config = gke_prometheus_config(production_stack(monitoring=MONITORING), 'superset')
+        pods = jobs(config)['pods']
+        assert pods['kubernetes_sd_configs'] == [{'role': 'pod', 'namespaces': {'names': ['superset']}}]
+        assert {
+            'source_labels': ['__meta_kubernetes_pod_label_app_kubernetes_io_component'], 'target_label': 'job',
+        } in pods['relabel_configs']
+
+        cadvisor = jobs(config)['cadvisor']
+        assert cadvisor['relabel_configs'][1]['replacement'] == '/api/v1/nodes/$1/proxy/metrics/cadvisor'
+
+    def test_shipped_dashboard_metrics_are_kept(self):
+        """Test the container series of the dashboard survive the cAdvisor metric filter."""
+        dashboard = json.loads((GRAFANA_DIR / 'dashboards' / 'superset-dashboard.json').read_text())
+        exprs = ' '.join(target['expr'] for panel in dashboard['panels'] for target in panel['targets'])
+        names = set(re.findall(r'\bcontainer_[a-z_]+', exprs))
+        assert names and all(re.fullmatch(CADVISOR_METRICS, name) for name in names)
+
+
+class TestManifests:
+    """Test Prometheus and Grafana in the monitoring namespace."""
+
+    def test_prometheus(self, production_stack):
+        """Test retention, storage and replicas follow monitoring.prometheus."""
+        resources = by_name(monitoring_manifests(production_stack(monitoring=MONITORING), 'prod-monitoring', 'secret'))
+        statefulset = resources[('StatefulSet', 'prometheus')]['spec']
+        assert statefulset['replicas'] == 2
+        args = statefulset['template']['spec']['containers'][0]['args']
+        assert {'--storage.tsdb.retention.time=30d', '--storage.tsdb.retention.size=90GB'} <= set(args)
+        claim = statefulset['volumeClaimTemplates'][0]['spec']['resources']['requests']
+        assert claim == {'storage': '100Gi'}
+
+        data = resources[('ConfigMap', 'prometheus-config')]['data']
+        config = yaml.safe_load(data['prometheus.yml'])
+        assert list(jobs(config)) == ['pods', 'cadvisor', 'prometheus']
+        assert config['rule_files'] == ['/etc/prometheus/rules.yml']
+        assert 'groups' in yaml.safe_load(data['rules.yml'])
+        assert 'alerting' not in config and ('Deployment', 'alertmanager') not in resources
+
+    def test_alertmanager(self, production_stack):
+        """Test alerting adds Alertmanager, configured from a Secret, as Prometheus' alert target."""
+        monitoring = {'enabled': True, 'grafana': {'admin_password': 'secret'}, 'alerting': {
+            'enabled': True, 'channels': [{'type': 'pagerduty', 'integration_key': 'key'}],
+        }}
+        resources = by_name(monitoring_manifests(production_stack(monitoring=monitoring), 'prod-monitoring', 'secret'))
+        secret = resources[('Secret', 'alertmanager-config')]['stringData']['alertmanager.yml']
+        assert yaml.safe_load(secret)['receivers'][0]['pagerduty_configs'] == [{'routing_key': 'key'}]
+        assert resources[('Service', 'alertmanager')]['spec']['ports'][0]['port'] == 9093
+
+        config = yaml.safe_load(resources[('ConfigMap', 'prometheus-config')]['data']['prometheus.yml'])
+        assert config['alerting']['alertmanagers'][0]['static_configs'] == [{'targets': ['alertmanager:9093']}]
+        rules = yaml.safe_load(resources[('ConfigMap', 'prometheus-config')]['data']['rules.yml'])
+        assert [group['name'] for group in rules['groups']] == ['superset-recording', 'superset-slo']
+
+    def test_prometheus_service_matches_adapter(self, production_stack):
+        """Test prometheus-adapter's URL and port reach the Prometheus Service."""
+        resources = by_name(monitoring_manifests(production_stack(monitoring=MONITORING), 'prod-monitoring', 'secret'))
+        service = resources[('Service', 'prometheus')]
+        adapter = prometheus_adapter_values(PROMETHEUS_URL)['prometheus']
+        assert adapter['url'] == f"http://{service['metadata']['name']}.{service['metadata']['namespace']}.svc"
+        assert service['spec']['ports'][0]['port'] == adapter['port']
+
+    def test_grafana(self, production_stack):
+        """Test Grafana is provisioned with the repository's datasource and dashboards."""
+        resources = by_name(monitoring_manifests(production_stack(monitoring=MONITORING), 'prod-monitoring', 'secret'))
+        assert resources[('Secret', 'grafana-admin')]['stringData'] == {'admin-password': 'secret'}
+        assert set(resources[('ConfigMap', 'grafana-dashboards')]['data']) == {
+            'superset-dashboard.json', 'superset-dashboard-load.json',
+        }
+
+        spec = resources[('Deployment', 'grafana')]['spec']['template']['spec']
+        provisioning = spec['volumes'][0]['configMap']['items']
+        assert {'key': 'datasources-prometheus.yml', 'path': 'datasources/prometheus.yml'} in provisioning
+        env = {var['name']: var.get('value') for var in spec['containers'][0]['env']}
+        assert env['GF_INSTALL_PLUGINS'] == 'grafana-piechart-panel'
+        assert env['GF_AUTH_ANONYMOUS_ENABLED'] == 'false'
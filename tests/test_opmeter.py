@@ -0,0 +1,114 @@
+"""Tests for the metadata database operation meter."""
+
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+# Add the mounted Superset pythonpath to the import path
+sys.path.append(str(Path(__file__).parent.parent / 'docker' / 'local'))
+
+from superset_ext.opmeter import OperationMeter, classify
+
+
+class TestClassify:
+    """Test statement classification."""
+
+    def test_statement_kinds(self):
+        """Test the first keyword decides the operation kind."""
+        assert classify('SELECT 1') == 'reads'
+        assert classify('  \n  select * from dashboards') == 'reads'
+        assert classify('WITH x AS (SELECT 1) SELECT * FROM x') == 'reads'
+        assert classify('(SELECT 1) UNION (SELECT 2)') == 'reads'
+        assert classify('INSERT INTO logs VALUES (?)') == 'writes'
+        assert classify('UPDATE slices SET cache_timeout = 0') == 'writes'
+        assert classify('DELETE FROM logs') == 'deletes'
+        assert classify('PRAGMA journal_mode=WAL') is None
+        assert classify('BEGIN') is None
+
+
+class TestOperationMeter:
+    """Test counting, aggregation and rollover."""
+
+    def test_workers_share_totals(self, tmp_path):
+        """Test counts from separate meters (workers) add up in the database."""
+        path = str(tmp_path / 'operations.db')
+        first = OperationMeter(path=path, flush_interval=3600)
+        second = OperationMeter(path=path, flush_interval=3600)
+        for _ in range(3):
+            first.record('reads')
+        second.record('reads')
+        second.record('writes', 2)
+        first.flush()
+        second.flush()
+
+        assert OperationMeter(path=path).totals() == {'reads': 4, 'writes': 2, 'deletes': 0}
+
+    def test_totals_include_unflushed_counts(self, tmp_path):
+        """Test a worker sees its own buffered counts before flushing."""
+        meter = OperationMeter(path=str(tmp_path / 'operations.db'), flush_interval=3600)
+        meter.record('deletes')
+
+        assert meter.totals()['deletes'] == 1
+
+    def test_daily_rollover(self, tmp_path):
+        """Test counts are kept per UTC day and old days are pruned."""
+        meter = OperationMeter(path=str(tmp_path / 'operations.db'), flush_interval=0, retain_days=7)
+        today = datetime(2024, 5, 10, 23, 59, tzinfo=timezone.utc)
+        meter._now = lambda: today
+        meter._day_checked = float('-inf')
+        meter.record('reads', 5)
+
+        meter._now = lambda: today + timedelta(minutes=2)
+        meter._day_checked = float('-inf')
+        meter.record('reads')
+        assert meter.totals() == {'reads': 1, 'writes': 0, 'deletes': 0}
+        assert meter.totals('2024-05-10')['reads'] == 5
+
+        meter._now = lambda: today + timedelta(days=10)
+        meter._day_checked = float('-inf')
+        meter.record('writes')
+        assert meter.totals('2024-05-10')['reads'] == 0
+
+    def test_sampling_scales_counts(self, tmp_path):
+        """Test sampled statements count 1 / sample_rate each."""
+        import random
+        random.seed(1)
+        meter = OperationMeter(path=str(tmp_path / 'operations.db'), sample_rate=0.1, flush_interval=3600)
+        for _ in range(10000):
+            meter._before_cursor_execute(None, None, 'SELECT 1', (), None, False)
+
+        assert 9000 <= meter.totals()['reads'] <= 11000
+
+    def test_invalid_sample_rate(self, tmp_path):
+        """Test sample rates outside (0, 1] are rejected."""
+        with pytest.raises(ValueError):
+            OperationMeter(path=str(tmp_path / 'operations.db'), sample_rate=0)
+
+    def test_limit_warnings(self, tmp_path, caplog):
+        """Test warnings are logged once at 80% and once at 100% of a limit."""
+        meter = OperationMeter(path=str(tmp_path / 'operations.db'), flush_interval=0, limits={'writes': 10})
+        with caplog.at_level('WARNING', logger='superset_ext.opmeter'):
+            for _ in range(12):
+                meter.record('writes')
+
+        messages = [record.getMessage() for record in caplog.records]
+        assert messages == [
+            'Daily writes at 80% of limit: 8/10',
+            'Daily writes exceeded limit: 10/10',
+        ]
+
+    def test_counts_engine_statements(self, tmp_path):
+        """Test statements executed through SQLAlchemy are counted."""
+        from sqlalchemy import create_engine, text
+        engine = create_engine('sqlite://')
+        meter = OperationMeter(path=str(tmp_path / 'operations.db'), flush_interval=3600)
+        meter.install(engine)
+        with engine.begin() as conn:
+            conn.execute(text('CREATE TABLE t (x INTEGER)'))
+            conn.execute(text('INSERT INTO t VALUES (:x)'), [{'x': 1}, {'x': 2}, {'x': 3}])
+            conn.execute(text('SELECT * FROM t')).fetchall()
+            conn.execute(text('DELETE FROM t WHERE x = 1'))
+
+        assert meter.totals() == {'reads': 1, 'writes': 3, 'deletes': 1}
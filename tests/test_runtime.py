@@ -0,0 +1,107 @@
+"""Tests for cgroup-based runtime tuning."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add the mounted Superset pythonpath to the import path
+sys.path.append(str(Path(__file__).parent.parent / 'docker' / 'local'))
+
+from superset_ext.runtime import (
+    MiB,
+    RuntimeTuning,
+    main,
+    read_cpu_limit,
+    read_memory_limit,
+    tune,
+)
+
+
+def cgroup(tmp_path, cpu='max 100000', memory='max'):
+    (tmp_path / 'cpu.max').write_text(cpu + '\n')
+    (tmp_path / 'memory.max').write_text(memory + '\n')
+    return str(tmp_path)
+
+
+@pytest.fixture(autouse=True)
+def no_overrides(monkeypatch):
+    for name in ('GUNICORN_WORKERS', 'GUNICORN_THREADS', 'GUNICORN_TIMEOUT',
+                 'DATABASE_MAX_CONNECTIONS', 'SUPERSET_REPLICAS'):
+        monkeypatch.delenv(name, raising=False)
+
+
+class TestLimits:
+    """Test reading cgroup v2 limits."""
+
+    def test_quota_and_memory(self, tmp_path):
+        """Test cpu.max quota/period and memory.max bytes are parsed."""
+        root = cgroup(tmp_path, '25000 100000', str(1024 * MiB))
+        assert read_cpu_limit(root) == (0.25, 'cgroup cpu.max')
+        assert read_memory_limit(root) == (1024 * MiB, 'cgroup memory.max')
+
+    def test_unlimited_falls_back_to_host(self, tmp_path):
+        """Test max means the host's CPUs and memory are used."""
+        root = cgroup(tmp_path)
+        cpu, cpu_source = read_cpu_limit(root)
+        memory, memory_source = read_memory_limit(root)
+        assert cpu >= 1 and cpu_source != 'cgroup cpu.max'
+        assert memory > 0 and memory_source == 'physical memory'
+
+    def test_missing_files(self, tmp_path):
+        """Test hosts without cgroup v2 files still get limits."""
+        assert read_cpu_limit(str(tmp_path / 'missing'))[0] >= 1
+        assert read_memory_limit(str(tmp_path / 'missing'))[0] > 0
+
+
+class TestRuntimeTuning:
+    """Test settings derived from limits."""
+
+    def test_e2_micro(self):
+        """Test a quarter CPU with 1GB runs one worker with two threads."""
+        tuning = RuntimeTuning(0.25, 1024 * MiB)
+        assert (tuning.workers, tuning.threads, tuning.timeout) == (1, 2, 300)
+        assert (tuning.pool_size, tuning.max_overflow) == (2, 2)
+        assert tuning.data_cache_l1_bytes == 38 * MiB
+        assert tuning.gunicorn_args() == ['--workers=1', '--worker-class=gthread', '--threads=2', '--timeout=300']
+
+    def test_n2_standard_4(self):
+        """Test four CPUs with 16GB run nine workers with four threads."""
+        tuning = RuntimeTuning(4, 16 * 1024 * MiB)
+        assert (tuning.workers, tuning.threads, tuning.timeout) == (9, 4, 120)
+        assert tuning.cache_l1_bytes == tuning.data_cache_l1_bytes // 4
+
+    def test_memory_caps_workers(self):
+        """Test workers are limited by memory when CPUs are plenty."""
+        assert RuntimeTuning(8, 1024 * MiB).workers == 2
+
+    def test_pool_fits_connections(self):
+        """Test the pool shrinks so every worker of every replica fits."""
+        tuning = RuntimeTuning(4, 16 * 1024 * MiB, max_connections=90, replicas=2)
+        assert tuning.pool_size + tuning.max_overflow == 5
+        assert 2 * tuning.workers * (tuning.pool_size + tuning.max_overflow) <= 90
+
+
+class TestTune:
+    """Test the entry points."""
+
+    def test_environment_overrides(self, tmp_path, monkeypatch):
+        """Test GUNICORN_* variables replace derived values."""
+        monkeypatch.setenv('GUNICORN_WORKERS', '3')
+        monkeypatch.setenv('GUNICORN_TIMEOUT', '60')
+        tuning = tune(cgroup(tmp_path, '25000 100000', str(1024 * MiB)))
+        assert (tuning.workers, tuning.threads, tuning.timeout) == (3, 2, 60)
+
+    def test_logs_choice(self, tmp_path, caplog):
+        """Test the chosen values and their sources are logged."""
+        with caplog.at_level('INFO', logger='superset_ext.runtime'):
+            tune(cgroup(tmp_path, '200000 100000', str(4096 * MiB)))
+        assert 'cgroup cpu.max and cgroup memory.max' in caplog.text
+        assert 'workers=5, threads=4' in caplog.text
+
+    def test_gunicorn_args_cli(self, tmp_path, capsys):
+        """Test the command line prints gunicorn options for the compose command."""
+        main(['--root', cgroup(tmp_path, '100000 100000', str(2048 * MiB)), '--gunicorn-args'])
+        assert capsys.readouterr().out.strip() == (
+            '--workers=3 --worker-class=gthread --threads=4 --timeout=120'
+        )
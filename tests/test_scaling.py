@@ -0,0 +1,221 @@
+"""Tests for autoscaling windows, metric policies and the simulator."""
+
+import json
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+from pydantic import ValidationError
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from pulumi.config.models import AutoscalingConfig, WorkerAutoscalingConfig
+from pulumi.config.scaling import (
+    CELERY_QUEUE_METRIC,
+    LATENCY_P95_METRIC,
+    TracePoint,
+    cloud_run_scaling_request,
+    erlang_c,
+    hpa_metrics,
+    hpa_patch_cronjob,
+    latency_p95,
+    prometheus_adapter_rules,
+    replica_bounds,
+    simulate,
+    window_in_effect,
+    worker_hpa_behavior,
+    worker_hpa_metrics,
+)
+from pulumi.config.validators import cron_matches, parse_cron_expression, validate_cron_expression
+
+
+def autoscaling(**kwargs):
+    kwargs.setdefault('windows', [
+        {'name': 'morning', 'schedule': '45 7 * * 1-5', 'min_replicas': 3, 'max_replicas': 6},
+        {'name': 'evening', 'schedule': '0 19 * * 1-5', 'min_replicas': 0, 'max_replicas': 3},
+    ])
+    return AutoscalingConfig(enabled=True, min_replicas=1, max_replicas=5, **kwargs)
+
+
+class TestCron:
+    """Test the cron parser shared by validation and scheduling."""
+
+    def test_fields(self):
+        """Test steps, ranges and lists expand to the matching values."""
+        minutes, hours, _, _, weekdays = parse_cron_expression('*/20 8-10 * * 1,3')
+        assert minutes == {0, 20, 40}
+        assert hours == {8, 9, 10}
+        assert weekdays == {1, 3}
+        assert parse_cron_expression('5/30 * * * *')[0] == {5, 35}
+
+    @pytest.mark.parametrize('expression', ['0 24 * * *', '*/0 * * * *', '1-2-3 * * * *', '0 8 * *'])
+    def test_invalid(self, expression):
+        """Test out-of-range values, zero steps and wrong field counts are rejected."""
+        valid, error = validate_cron_expression(expression)
+        assert not valid and error
+
+    def test_matches(self):
+        """Test matching by minute, weekday and the day-of-month/day-of-week OR rule."""
+        monday = datetime(2026, 10, 19, 7, 45)
+        assert cron_matches('45 7 * * 1-5', monday)
+        assert not cron_matches('45 7 * * 0,6', monday)
+        assert not cron_matches('46 7 * * *', monday)
+        assert cron_matches('0 0 1 * 1', datetime(2026, 10, 19, 0, 0))
+
+
+class TestWindows:
+    """Test which window is in effect."""
+
+    def test_window_follows_last_firing(self):
+        """Test a window lasts from its schedule until the next window fires."""
+        config = autoscaling()
+        assert window_in_effect(config, datetime(2026, 10, 19, 7, 44)).name == 'evening'
+        assert window_in_effect(config, datetime(2026, 10, 19, 7, 45)).name == 'morning'
+        assert window_in_effect(config, datetime(2026, 10, 19, 18, 59)).name == 'morning'
+        # The Friday evening window lasts over the weekend
+        assert window_in_effect(config, datetime(2026, 10, 25, 12, 0)).name == 'evening'
+
+    def test_bounds_default_without_windows(self):
+        """Test the base bounds apply when there are no windows."""
+        assert replica_bounds(autoscaling(windows=[]), datetime(2026, 10, 19, 8, 0)) == (1, 5)
+        assert replica_bounds(autoscaling(), datetime(2026, 10, 19, 8, 0)) == (3, 6)
+
+    def test_aware_times_use_window_time_zone(self):
+        """Test schedules are read in the configured time zone."""
+        config = autoscaling(timezone='Europe/Madrid')
+        # 05:45 UTC is 07:45 in Madrid (CEST)
+        assert window_in_effect(config, datetime(2026, 10, 19, 5, 45, tzinfo=timezone.utc)).name == 'morning'
+
+    def test_validation(self):
+        """Test schedules, bounds, names and time zones are validated."""
+        window = {'name': 'peak', 'schedule': '0 8 * * *', 'min_replicas': 2, 'max_replicas': 4}
+        for invalid in (
+            {'windows': [{**window, 'schedule': '0 25 * * *'}]},
+            {'windows': [{**window, 'min_replicas': 5}]},
+            {'windows': [{**window, 'name': 'Peak Hours'}]},
+            {'windows': [window, window]},
+            {'timezone': 'Mars/Olympus'},
+        ):
+            with pytest.raises(ValidationError):
+                autoscaling(**invalid)
+
+
+class TestSchedulers:
+    """Test the Cloud Scheduler request and the GKE CronJob."""
+
+    def test_cloud_run_request(self):
+        """Test the window is applied through the service-level scaling fields."""
+        window = autoscaling().windows[0]
+        request = cloud_run_scaling_request('project', 'us-central1', 'staging-superset', window)
+        assert request['http_method'] == 'PATCH'
+        assert request['uri'].startswith(
+            'https://run.googleapis.com/v2/projects/project/locations/us-central1/services/staging-superset?'
+        )
+        assert json.loads(request['body']) == {'scaling': {'minInstanceCount': 3, 'maxInstanceCount': 6}}
+
+    def test_cronjob(self):
+        """Test the CronJob patches the HPA on the window schedule and keeps one replica."""
+        window = autoscaling().windows[1]
+        manifest = hpa_patch_cronjob('prod-scaling', 'superset', 'superset-web', window, 'Europe/Madrid', 'sa')
+        assert manifest['metadata']['name'] == 'prod-scaling-evening'
+        assert (manifest['spec']['schedule'], manifest['spec']['timeZone']) == ('0 19 * * 1-5', 'Europe/Madrid')
+
+        args = manifest['spec']['jobTemplate']['spec']['template']['spec']['containers'][0]['args']
+        assert args[:3] == ['patch', 'hpa', 'superset-web']
+        assert json.loads(args[-1]) == {'spec': {'minReplicas': 1, 'maxReplicas': 3}}
+
+
+class TestWorkerPolicies:
+    """Test the Celery worker HPA on the queue backlog."""
+
+    def test_external_metric(self):
+        """Test the backlog of the configured queues is averaged over the workers."""
+        autoscaling = WorkerAutoscalingConfig(enabled=True, queues=['celery', 'reports'], target_queue_length=20)
+        metric = worker_hpa_metrics(autoscaling)[0]['external']
+        assert metric['metric']['name'] == CELERY_QUEUE_METRIC
+        assert metric['metric']['selector']['matchExpressions'][0]['values'] == ['celery', 'reports']
+        assert metric['target'] == {'type': 'AverageValue', 'averageValue': '20'}
+
+        rule = prometheus_adapter_rules()['externalRules'][0]
+        assert rule['name']['as'] == CELERY_QUEUE_METRIC
+
+    def test_cooldown(self):
+        """Test workers are removed only after the cooldown."""
+        behavior = worker_hpa_behavior(WorkerAutoscalingConfig(enabled=True, cooldown_seconds=120))
+        assert behavior['scaleDown']['stabilizationWindowSeconds'] == 120
+        assert behavior['scaleUp']['stabilizationWindowSeconds'] == 0
+
+    def test_validation(self):
+        """Test bounds and queues are validated."""
+        for invalid in ({'min_workers': 5, 'max_workers': 2}, {'queues': []}):
+            with pytest.raises(ValidationError):
+                WorkerAutoscalingConfig(**invalid)
+
+
+def ramp(start, rates, seconds=60):
+    return [
+        TracePoint(time=start + timedelta(seconds=seconds * i), requests_per_second=rate)
+        for i, rate in enumerate(rates)
+    ]
+
+
+class TestMetricPolicies:
+    """Test concurrency and latency targets for the HPA."""
+
+    def test_metrics(self):
+        """Test CPU is kept and custom metrics are added per configured target."""
+        assert [m['type'] for m in hpa_metrics(autoscaling(windows=[]))] == ['Resource']
+
+        metrics = hpa_metrics(autoscaling(windows=[], target_concurrency=6, target_latency_p95_ms=800))
+        assert metrics[1]['pods']['target'] == {'type': 'AverageValue', 'averageValue': '6'}
+        assert metrics[2]['pods']['metric']['name'] == LATENCY_P95_METRIC
+        assert metrics[2]['pods']['target']['averageValue'] == '800m'
+
+    def test_adapter_rules(self):
+        """Test the adapter exposes the p95 under the name the HPA asks for."""
+        rules = prometheus_adapter_rules()['rules']
+        assert rules[1]['name']['as'] == LATENCY_P95_METRIC
+        assert 'histogram_quantile(0.95' in rules[1]['metricsQuery']
+
+
+class TestSimulator:
+    """Test replaying a trace through the policies."""
+
+    def test_queueing_model(self):
+        """Test waiting grows with load and saturation answers at the timeout."""
+        assert erlang_c(4, 0) == 0
+        assert erlang_c(4, 1) < erlang_c(4, 3) < 1
+        assert latency_p95(1, 0.2, 4) == pytest.approx(0.6)
+        assert latency_p95(10, 0.2, 4) > latency_p95(15, 0.2, 4) / 10
+        assert latency_p95(30, 0.2, 4, timeout=60) == 60
+
+    def test_scales_with_concurrency(self):
+        """Test replicas follow load after the start-up delay and shrink after stabilization."""
+        config = autoscaling(windows=[], target_concurrency=4, scale_down_stabilization_seconds=300)
+        trace = ramp(datetime(2026, 10, 19, 8, 0), [5] * 3 + [60] * 10 + [5] * 10)
+        steps = simulate(config, trace, capacity=8, service_seconds=0.2, startup_seconds=60)
+
+        assert steps[0].ready_replicas == 1
+        # 60 req/s x 0.2s = 12 in flight: 3 replicas at 4 each, ready a minute later
+        assert steps[3].ready_replicas == 1 and steps[3].desired_replicas == 3
+        assert steps[5].ready_replicas == 3
+        # Load dropped at step 13; the 5 minute window keeps the replicas
+        assert steps[15].ready_replicas == 3
+        assert steps[-1].ready_replicas == 1
+
+    def test_latency_target_and_bounds(self):
+        """Test a latency target adds replicas within max_replicas."""
+        config = autoscaling(windows=[], target_latency_p95_ms=700)
+        steps = simulate(config, ramp(datetime(2026, 10, 19, 8, 0), [100] * 10), capacity=8, startup_seconds=0)
+        assert max(step.ready_replicas for step in steps) == config.max_replicas
+
+    def test_windows_prescale(self):
+        """Test the morning window raises replicas before the traffic arrives."""
+        config = autoscaling(target_concurrency=4)
+        trace = ramp(datetime(2026, 10, 19, 7, 40), [2] * 10)
+        steps = simulate(config, trace, capacity=8, startup_seconds=60)
+        assert steps[0].ready_replicas == 0
+        assert steps[5].desired_replicas == 3
+        assert steps[7].ready_replicas == 3
@@ -0,0 +1,109 @@
+"""Tests for the slow metadata query log."""
+
+import json
+import logging
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add the mounted Superset pythonpath to the import path
+sys.path.append(str(Path(__file__).parent.parent / 'docker' / 'local'))
+
+from superset_ext.slowlog import OTHER, SlowQueryLog, fingerprint, main, normalize, top
+
+
+class TestFingerprint:
+    """Test SQL normalization."""
+
+    def test_literals_and_parameters(self):
+        """Test literals and every paramstyle normalize to the same statement."""
+        expected = 'SELECT * FROM slices WHERE id = ? AND name = ?'
+        assert normalize("SELECT *  FROM slices\n WHERE id = 42 AND name = 'it''s'") == expected
+        assert normalize('SELECT * FROM slices WHERE id = %(id_1)s AND name = %s') == expected
+        assert normalize('SELECT * FROM slices WHERE id = :id AND name = $2') == expected
+        assert normalize('SELECT * FROM slices WHERE id = ? AND name = ?') == expected
+
+    def test_lists_comments_and_casts(self):
+        """Test IN/VALUES lists collapse, comments go and casts survive."""
+        assert normalize('SELECT a FROM t WHERE id IN (1, 2, 3) -- note') == 'SELECT a FROM t WHERE id IN (?)'
+        assert normalize('INSERT INTO t VALUES (?, ?), (?, ?) /* bulk */') == 'INSERT INTO t VALUES (?)'
+        assert normalize('SELECT x::text FROM t1') == 'SELECT x::text FROM t1'
+        assert fingerprint('SELECT a FROM t WHERE id IN (1, 2)') == fingerprint('SELECT a FROM t WHERE id IN (7)')
+
+
+class TestSlowQueryLog:
+    """Test timing, sampling and the top-N dump."""
+
+    def test_statistics_per_fingerprint(self, tmp_path):
+        """Test executions of one statement shape accumulate under one fingerprint."""
+        log = SlowQueryLog(path=str(tmp_path), threshold_seconds=10, flush_interval=3600)
+        log.record('SELECT * FROM dashboards WHERE id = 1', 0.002)
+        log.record('SELECT * FROM dashboards WHERE id = 2', 0.2)
+
+        stats = log.stats()[fingerprint('SELECT * FROM dashboards WHERE id = 1')]
+        assert stats['count'] == 2
+        assert stats['total'] == pytest.approx(0.202)
+        assert stats['max'] == pytest.approx(0.2)
+        assert stats['sql'] == 'SELECT * FROM dashboards WHERE id = ?'
+        assert sum(stats['buckets']) == 2
+
+    def test_fingerprints_are_bounded(self, tmp_path):
+        """Test statements past max_fingerprints are counted under other."""
+        log = SlowQueryLog(path=str(tmp_path), threshold_seconds=10, max_fingerprints=2, flush_interval=3600)
+        for table in ('a', 'b', 'c', 'd'):
+            log.record(f'SELECT * FROM {table}', 0.01)
+        stats = log.stats()
+        assert len(stats) == 3
+        assert stats[OTHER]['count'] == 2
+
+    def test_slow_statements_are_logged_with_sampling(self, tmp_path, caplog, monkeypatch):
+        """Test only statements over the threshold are logged, sampled, without parameters."""
+        log = SlowQueryLog(path=str(tmp_path), threshold_seconds=0.1, sample_rate=0.5, flush_interval=3600)
+        draws = iter([0.9, 0.1])
+        monkeypatch.setattr('superset_ext.slowlog.random.random', lambda: next(draws))
+        with caplog.at_level(logging.WARNING, logger='superset_ext.slowlog'):
+            log.record("SELECT * FROM ab_user WHERE password = 'secret'", 0.01)
+            log.record("SELECT * FROM ab_user WHERE password = 'secret'", 0.5)
+            log.record("SELECT * FROM ab_user WHERE password = 'secret'", 0.5)
+        assert len(caplog.records) == 1
+        assert 'secret' not in caplog.text
+        assert '500.0ms' in caplog.text
+
+    def test_top_merges_workers(self, tmp_path, capsys):
+        """Test the dump sums worker files and ranks by total time."""
+        first = SlowQueryLog(path=str(tmp_path), threshold_seconds=10, flush_interval=3600)
+        first.record('SELECT * FROM slices', 0.05)
+        first.record('SELECT * FROM tables', 0.4)
+        first.flush()
+        # A second worker's file, as written by another process
+        second = SlowQueryLog(path=str(tmp_path), threshold_seconds=10, flush_interval=3600)
+        second.record('SELECT * FROM slices', 0.5)
+        (tmp_path / '1.json').write_text(json.dumps(second.stats()))
+
+        rows = top(str(tmp_path), limit=2)
+        assert [row['sql'] for row in rows] == ['SELECT * FROM slices', 'SELECT * FROM tables']
+        assert rows[0]['count'] == 2
+        assert rows[0]['total'] == pytest.approx(0.55)
+        assert rows[0]['p95'] == 0.5
+        assert top(str(tmp_path), limit=1, by='count')[0]['sql'] == 'SELECT * FROM slices'
+
+        assert main(['--path', str(tmp_path), '--top', '1']) == 0
+        assert 'SELECT * FROM slices' in capsys.readouterr().out
+
+    def test_install_times_metadata_engine_only(self, tmp_path):
+        """Test cursor events are timed for the metadata engine and not for others."""
+        sqlalchemy = pytest.importorskip('sqlalchemy')
+        metadata = sqlalchemy.create_engine(f'sqlite:///{tmp_path}/meta.db')
+        analytics = sqlalchemy.create_engine(f'sqlite:///{tmp_path}/analytics.db')
+        log = SlowQueryLog(path=str(tmp_path / 'slowlog'), threshold_seconds=10, flush_interval=3600)
+        for engine in (metadata, analytics):
+            log.install(engine, url=f'sqlite:///{tmp_path}/meta.db')
+
+        with metadata.connect() as conn:
+            conn.execute(sqlalchemy.text('SELECT 1'))
+        with analytics.connect() as conn:
+            conn.execute(sqlalchemy.text('SELECT 2'))
+
+        assert [stats['sql'] for stats in log.stats().values()] == ['SELECT ?']
+        assert sum(stats['count'] for stats in log.stats().values()) == 1
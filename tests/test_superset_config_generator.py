@@ -0,0 +1,267 @@
+"""Tests for the generated superset_config.py."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from pulumi.config.generator import (
+    RESERVED_CONNECTIONS,
+    ConfigFragment,
+    Raw,
+    base_layer,
+    build_settings,
+    cloud_run_settings,
+    derive_sizing,
+    gunicorn_command_args,
+    gunicorn_settings,
+    parse_memory,
+    profile_layers,
+    render_gunicorn_config,
+    render_superset_config,
+    sizing_layer,
+)
+from pulumi.config.models import CeleryQueueConfig, StackConfig
+
+
+def minimal_stack(**superset):
+    return StackConfig(type='minimal', environment='local', superset=superset or {})
+
+
+class TestSizing:
+    """Test values derived from resources and backends."""
+
+    def test_parse_memory(self):
+        """Test Mi and Gi are converted to bytes."""
+        assert parse_memory('512Mi') == 512 * 1024 * 1024
+        assert parse_memory('1.5Gi') == 1536 * 1024 * 1024
+        with pytest.raises(ValueError):
+            parse_memory('2GB')
+
+    def test_small_instance(self):
+        """Test a quarter CPU with 1GB gets few workers, long timeouts and TTLs."""
+        sizing = derive_sizing(minimal_stack(resources={'cpu': '0.25', 'memory': '1Gi'}))
+        assert sizing.workers == 1
+        assert sizing.threads == 2
+        assert sizing.webserver_timeout == 300
+        assert sizing.pool_size is None
+        assert sizing.data_cache_timeout == 16 * 3600
+
+    def test_large_instance(self, production_stack):
+        """Test more CPU and memory give more workers and larger row limits."""
+        small = derive_sizing(production_stack(resources={'cpu': '1', 'memory': '2Gi'}))
+        large = derive_sizing(production_stack(resources={'cpu': '4', 'memory': '8Gi'}))
+        assert (small.workers, large.workers) == (3, 9)
+        assert large.sql_max_row > small.sql_max_row
+        assert large.row_limit >= small.row_limit
+        assert large.data_cache_timeout < small.data_cache_timeout
+
+    def test_workers_are_bounded_by_memory(self, production_stack):
+        """Test CPU-rich, memory-poor instances do not start more workers than fit."""
+        assert derive_sizing(production_stack(resources={'cpu': '4', 'memory': '1Gi'})).workers == 2
+
+    def test_pools_fit_database_connections(self, production_stack):
+        """Test every worker of every replica fits in the database's max_connections."""
+        for tier, limit in (('db-f1-micro', 25), ('db-n1-standard-2', 200)):
+            stack = production_stack(
+                resources={'cpu': '2', 'memory': '4Gi'},
+                autoscaling={'enabled': True, 'min_replicas': 1, 'max_replicas': 3},
+                database={'type': 'cloud-sql', 'tier': tier, 'password': 'test-password'},
+            )
+            sizing = derive_sizing(stack)
+            total = 3 * sizing.workers * (sizing.pool_size + sizing.max_overflow)
+            assert sizing.pool_size >= 1
+            assert total <= max(limit - RESERVED_CONNECTIONS, 3 * sizing.workers * 2)
+        large_tier = {'type': 'cloud-sql', 'tier': 'db-n1-standard-4', 'password': 'test-password'}
+        assert derive_sizing(production_stack(database=large_tier)).pool_size == 4
+
+
+class TestLayers:
+    """Test profile layers and their merge order."""
+
+    def test_layers_follow_backends(self, production_stack):
+        """Test Redis stacks get Celery and free tier stacks get admission control."""
+        redis = [layer.__name__ for layer in profile_layers(production_stack())]
+        assert 'celery_layer' in redis and 'sqlite_cache_layer' not in redis
+
+        free = [layer.__name__ for layer in profile_layers(minimal_stack(admission={'enabled': True}))]
+        assert 'sqlite_cache_layer' in free and 'admission_layer' in free
+        assert free[-1] == 'observability_layer'
+
+    def test_later_layers_override(self):
+        """Test a setting from a later layer replaces the earlier value."""
+        def override(stack, sizing):
+            return ConfigFragment(title='OVERRIDE', settings={'ROW_LIMIT': 42})
+
+        settings = build_settings(minimal_stack(), [base_layer, sizing_layer, override])
+        assert settings['ROW_LIMIT'] == 42
+        assert settings['SECRET_KEY'] == Raw("os.environ.get('SUPERSET_SECRET_KEY', 'CHANGE_ME_IN_PRODUCTION')")
+
+    def test_settings_use_sizing(self, production_stack):
+        """Test pool, L1 and cache settings come from the derived sizing."""
+        stack = production_stack()
+        sizing = derive_sizing(stack)
+        settings = build_settings(stack)
+        assert settings['SQLALCHEMY_ENGINE_OPTIONS']['pool_size'] == sizing.pool_size
+        assert settings['SQL_MAX_ROW'] == sizing.sql_max_row
+        assert settings['DATA_CACHE_CONFIG']['CACHE_L1_MAX_BYTES'] == sizing.l1_max_bytes
+        assert settings['DATA_CACHE_CONFIG']['CACHE_DEFAULT_TIMEOUT'] == sizing.data_cache_timeout
+
+
+class TestRender:
+    """Test the rendered module."""
+
+    @pytest.mark.parametrize('stack', [
+        minimal_stack(),
+        minimal_stack(resources={'cpu': '0.25', 'memory': '1Gi'}, admission={'enabled': True}),
+        pytest.param(None, id='production'),
+    ])
+    def test_renders_valid_python(self, stack, production_stack):
+        """Test every profile renders to a module that compiles."""
+        source = render_superset_config(stack or production_stack(), 'test')
+        compile(source, 'superset_config.py', 'exec')
+        assert 'do not edit' in source
+        assert source.count('\nSQLALCHEMY_DATABASE_URI = ') == 1
+        # Middleware is appended after the list is created
+        assert source.index('ADDITIONAL_MIDDLEWARE = []') < source.index('ADDITIONAL_MIDDLEWARE.append(')
+
+    def test_admission_waiters_follow_threads(self):
+        """Test admission control is told the worker's thread count."""
+        stack = minimal_stack(resources={'cpu': '0.25', 'memory': '1Gi'}, admission={'enabled': True})
+        source = render_superset_config(stack, 'test')
+        assert f'threads={derive_sizing(stack).threads})' in source
+
+    def test_prefetch_follows_worker_autoscaling(self, production_stack):
+        """Test queue-driven worker autoscaling keeps waiting tasks in the broker."""
+        assert 'worker_prefetch_multiplier = 10' in render_superset_config(production_stack(), 'test')
+        stack = production_stack()
+        stack.superset.celery.autoscaling.enabled = True
+        assert 'worker_prefetch_multiplier = 1\n' in render_superset_config(stack, 'test')
+
+    def test_task_routes(self, production_stack):
+        """Test dedicated queues are routed and the rest stays on the default queue."""
+        assert 'task_routes' not in render_superset_config(production_stack(), 'test')
+        stack = production_stack()
+        stack.superset.celery.queues = {'sql_lab': CeleryQueueConfig(), 'thumbnails': CeleryQueueConfig()}
+        source = render_superset_config(stack, 'test')
+        compile(source, 'superset_config.py', 'exec')
+        assert "'sql_lab.get_sql_results': {\n            'queue': 'sql_lab',\n" in source
+        assert "'cache_dashboard_thumbnail': {\n            'queue': 'thumbnails',\n" in source
+        assert "'reports.execute'" not in source
+
+    def test_browser_pool(self, production_stack):
+        """Test the browser pool settings reach the config."""
+        stack = production_stack()
+        assert 'BROWSER_POOL' not in render_superset_config(stack, 'test')
+        stack.superset.celery.browser_pool.enabled = True
+        source = render_superset_config(stack, 'test')
+        compile(source, 'superset_config.py', 'exec')
+        assert "\nWEBDRIVER_TYPE = 'chrome'\n" in source
+        assert "    'max_renders': 50,\n" in source
+
+    def test_celery_metrics(self, production_stack):
+        """Test workers serve metrics and Celery queue waits are timed."""
+        source = render_superset_config(production_stack(), 'test')
+        assert '\nWORKER_METRICS_PORT = 9808\n' in source
+        assert '\ninstrument_celery()\n' in source
+
+    def test_warmup_schedule(self, production_stack):
+        """Test every field of the warm-up cron expression reaches Celery beat."""
+        stack = production_stack()
+        stack.superset.warmup.schedule = '0 6 * * 1-5'
+        source = render_superset_config(stack, 'test')
+        assert (
+            "crontab(minute='0', hour='6', day_of_month='*', month_of_year='*', day_of_week='1-5')"
+        ) in source
+
+    def test_header_records_sizing(self, production_stack):
+        """Test the docstring states the sizing the values were derived from."""
+        stack = production_stack()
+        sizing = derive_sizing(stack)
+        source = render_superset_config(stack, 'production')
+        assert f'{sizing.workers} gunicorn workers x {sizing.threads} threads' in source
+        assert f"\nSUPERSET_WEBSERVER_WORKERS = {sizing.workers}\n" in source
+
+
+class TestGunicorn:
+    """Test the generated gunicorn settings."""
+
+    def test_profiles_use_gthread(self, production_stack):
+        """Test every profile gets preloaded gthread workers, production a long keep-alive."""
+        production = derive_sizing(production_stack())
+        assert gunicorn_settings(production)['worker_class'] == 'gthread'
+        assert production.preload_app
+        assert production.keepalive > 600
+
+        small = derive_sizing(minimal_stack(resources={'cpu': '0.25', 'memory': '1Gi'}))
+        assert gunicorn_settings(small)['threads'] == small.threads
+        assert (small.max_requests, small.max_requests_jitter) == (1000, 100)
+
+    def test_command_args(self):
+        """Test GUNICORN_CMD_ARGS carries the same settings as the config file."""
+        sizing = derive_sizing(minimal_stack(resources={'cpu': '1', 'memory': '2Gi'}))
+        args = gunicorn_command_args(sizing).split()
+        assert '--workers=3' in args and '--threads=4' in args
+        assert '--preload' in args and '--keep-alive=5' in args
+        assert '--max-requests=1000' in args and '--max-requests-jitter=100' in args
+
+    @pytest.mark.parametrize('stack', [minimal_stack(), pytest.param(None, id='production')])
+    def test_renders_valid_python(self, stack, production_stack):
+        """Test the config file compiles and imports and exports every hook gunicorn looks up."""
+        stack = stack or production_stack()
+        source = render_gunicorn_config(stack, 'test')
+        compile(source, 'gunicorn.conf.py', 'exec')
+        for hook in ('when_ready', 'post_fork', 'post_worker_init', 'pre_request', 'post_request'):
+            assert f'    {hook},\n' in source
+            assert f"    '{hook}',\n" in source
+        assert ('install_pid_guard()' in source) == derive_sizing(stack).preload_app
+
+
+class TestCloudRun:
+    """Test Cloud Run cold-start settings."""
+
+    def test_concurrency_follows_gunicorn(self, production_stack):
+        """Test an instance is sent as many requests as its workers and threads serve."""
+        stack = production_stack(resources={'cpu': '1', 'memory': '2Gi'})
+        stack.type = 'standard'
+        sizing = derive_sizing(stack)
+        settings = cloud_run_settings(stack, 'staging-superset')
+        assert settings.container_concurrency == sizing.workers * sizing.threads
+        assert settings.max_instances == 4
+
+    def test_probes_and_annotations(self, production_stack):
+        """Test the start-up probe covers the timeout and CPU follows Celery."""
+        settings = cloud_run_settings(production_stack(), 'prod-superset')
+        assert settings.startup_probe['http_get']['path'] == '/health'
+        assert settings.startup_probe['period_seconds'] * settings.startup_probe['failure_threshold'] >= 240
+        assert 'initial_delay_seconds' not in settings.liveness_probe
+
+        annotations = settings.annotations()
+        assert annotations['run.googleapis.com/startup-cpu-boost'] == 'true'
+        assert annotations['run.googleapis.com/cpu-throttling'] == 'true'
+        assert annotations['autoscaling.knative.dev/minScale'] == '1'
+
+        redisless = cloud_run_settings(minimal_stack(), 'x-dev')
+        assert redisless.annotations()['run.googleapis.com/cpu-throttling'] == 'false'
+        assert redisless.min_instances == 0
+
+    def test_overrides(self):
+        """Test explicit cold_start values win over derived ones."""
+        stack = minimal_stack(cold_start={
+            'min_instances': 2, 'container_concurrency': 5, 'cpu_always_allocated': False,
+            'startup_probe_path': '/healthcheck',
+        })
+        settings = cloud_run_settings(stack, 'x-dev')
+        assert (settings.min_instances, settings.container_concurrency) == (2, 5)
+        assert settings.cpu_always_allocated is False
+        assert settings.startup_probe['http_get']['path'] == '/healthcheck'
+
+    def test_target_concurrency(self, production_stack):
+        """Test a concurrency target lowers containerConcurrency to the utilization target."""
+        stack = production_stack(resources={'cpu': '1', 'memory': '2Gi'})
+        stack.type = 'standard'
+        stack.superset.autoscaling.target_concurrency = 3
+        assert cloud_run_settings(stack, 'staging-superset').container_concurrency == 5
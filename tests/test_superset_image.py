@@ -0,0 +1,89 @@
+"""Tests for the prebaked Superset image build context."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from pulumi.config.image import (
+    base_image,
+    content_tag,
+    context_files,
+    plugin_requirements,
+    render_dockerfile,
+    write_context,
+)
+from pulumi.config.models import StackConfig
+
+DIGEST = 'sha256:' + 'a' * 64
+
+
+def stack(**superset):
+    superset.setdefault('version', '5.0.0')
+    return StackConfig(type='minimal', environment='local', superset=superset)
+
+
+class TestDockerfile:
+    """Test the rendered Dockerfile."""
+
+    def test_base_image_pinned_by_digest(self):
+        """Test the base image carries the configured digest."""
+        assert base_image(stack()) == 'apache/superset:5.0.0'
+        assert base_image(stack(image={'base_digest': DIGEST})) == f'apache/superset:5.0.0@{DIGEST}'
+        with pytest.raises(ValueError):
+            stack(image={'base_digest': 'latest'})
+
+    def test_layers_go_from_stable_to_volatile(self):
+        """Test plugins are installed before the configuration is copied."""
+        dockerfile = render_dockerfile(stack(plugins=['psycopg2-binary']), 'test')
+        order = [
+            dockerfile.index('COPY requirements-plugins.txt'),
+            dockerfile.index('--invalidation-mode unchecked-hash'),
+            dockerfile.index('COPY superset_ext'),
+            dockerfile.index('COPY superset_config.py'),
+            dockerfile.index('--invalidation-mode checked-hash'),
+        ]
+        assert order == sorted(order)
+        assert dockerfile.rstrip().endswith('exec gunicorn --config /app/gunicorn.conf.py"]')
+
+    def test_bytecode_can_be_disabled(self):
+        """Test compile_bytecode false leaves compileall out."""
+        assert 'compileall' not in render_dockerfile(stack(image={'compile_bytecode': False}), 'test')
+
+    def test_plugins_are_sorted(self):
+        """Test the requirements file does not depend on the plugin order."""
+        assert plugin_requirements(stack(plugins=['b', 'a', 'a'])) == 'a\nb\n'
+        assert plugin_requirements(stack()) == ''
+
+
+class TestContext:
+    """Test content-addressed build contexts."""
+
+    def test_context_contents(self):
+        """Test the context ships the generated config and superset_ext."""
+        files = context_files(stack(), 'test')
+        assert {'Dockerfile', 'superset_config.py', 'gunicorn.conf.py'} <= set(files)
+        assert 'superset_ext/bootstrap.py' in files
+
+    def test_tag_follows_content(self):
+        """Test equal stacks share a tag and any change gives a new one."""
+        tag = content_tag(context_files(stack(plugins=['a', 'b']), 'test'))
+        assert tag == content_tag(context_files(stack(plugins=['b', 'a']), 'test'))
+        assert tag != content_tag(context_files(stack(plugins=['a']), 'test'))
+        assert tag != content_tag(context_files(stack(version='4.0.2', plugins=['a', 'b']), 'test'))
+
+    def test_write_context_removes_stale_files(self, tmp_path):
+        """Test the written directory matches the returned tag."""
+        (tmp_path / 'superset_ext').mkdir()
+        (tmp_path / 'superset_ext' / 'removed.py').write_text('')
+        tag = write_context(stack(), 'test', tmp_path)
+
+        files = {
+            path.relative_to(tmp_path).as_posix(): path.read_bytes()
+            for path in tmp_path.rglob('*') if path.is_file()
+        }
+        assert 'superset_ext/removed.py' not in files
+        assert content_tag(files) == tag
@@ -0,0 +1,156 @@
+"""Tests for cross-worker usage tracking."""
+
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+# Add the mounted Superset pythonpath to the import path
+sys.path.append(str(Path(__file__).parent.parent / 'docker' / 'local'))
+
+from superset_ext.usage import UsageMiddleware, UsageTracker
+
+
+def make_app(body=b'ok'):
+    def app(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [body]
+    return app
+
+
+class TestUsageTracker:
+    """Test usage aggregation and sliding windows."""
+
+    def test_workers_share_usage(self, tmp_path):
+        """Test usage recorded by separate trackers (workers) is summed."""
+        path = str(tmp_path / 'requests.db')
+        first = UsageTracker(path=path, memory_gb=2.0, flush_interval=3600)
+        second = UsageTracker(path=path, memory_gb=2.0, flush_interval=3600)
+        first.record(0.5, 0.1)
+        second.record(1.5, 0.3)
+        first.flush()
+        second.flush()
+
+        day = UsageTracker(path=path).usage()['day']
+        assert day['requests'] == 2
+        assert day['gb_seconds'] == pytest.approx(4.0)
+        assert day['vcpu_seconds'] == pytest.approx(0.4)
+
+    def test_sliding_windows(self, tmp_path):
+        """Test requests fall out of shorter windows as time passes."""
+        tracker = UsageTracker(path=str(tmp_path / 'requests.db'), flush_interval=0)
+        now = time.time()
+        tracker.record(1.0, 0.0, now=now - 2 * 3600)
+        tracker.record(1.0, 0.0, now=now - 2 * 86400)
+        tracker.record(1.0, 0.0, now=now)
+
+        usage = tracker.usage(now=now)
+        assert usage['hour']['requests'] == 1
+        assert usage['day']['requests'] == 2
+        assert usage['month']['requests'] == 3
+
+    def test_limit_ratios_and_warnings(self, tmp_path, caplog):
+        """Test used ratios are reported and warnings logged once per threshold."""
+        tracker = UsageTracker(
+            path=str(tmp_path / 'requests.db'),
+            flush_interval=0,
+            limits={'requests_day': 10},
+        )
+        with caplog.at_level('WARNING', logger='superset_ext.usage'):
+            for _ in range(11):
+                tracker.record(0.01, 0.0)
+
+        assert tracker.check_limits() == {'requests_day': pytest.approx(1.1)}
+        messages = [record.getMessage() for record in caplog.records]
+        assert messages == [
+            'Free tier requests_day approaching: 8/10',
+            'Free tier requests_day exceeded: 10/10',
+        ]
+
+    def test_unknown_limit_rejected(self, tmp_path):
+        """Test misspelled limits fail fast."""
+        with pytest.raises(ValueError):
+            UsageTracker(path=str(tmp_path / 'requests.db'), limits={'requests_per_day': 1})
+
+    def test_record_is_cheap(self, tmp_path):
+        """Test recording a request costs microseconds, not milliseconds."""
+        tracker = UsageTracker(path=str(tmp_path / 'requests.db'), flush_interval=3600)
+        started = time.perf_counter()
+        for _ in range(10000):
+            tracker.record(0.01, 0.001)
+        assert (time.perf_counter() - started) / 10000 < 50e-6
+
+
+class TestUsageMiddleware:
+    """Test the WSGI middleware."""
+
+    def call(self, app, path='/', **environ):
+        status = []
+        environ = {'PATH_INFO': path, 'REQUEST_METHOD': 'GET', 'REMOTE_ADDR': '127.0.0.1', **environ}
+        body = app(environ, lambda s, h: status.append(s))
+        data = b''.join(body)
+        if hasattr(body, 'close'):
+            body.close()
+        return status[0], data
+
+    def test_records_requests_after_body(self, tmp_path):
+        """Test each request is recorded once its body has been sent."""
+        tracker = UsageTracker(path=str(tmp_path / 'requests.db'), flush_interval=3600)
+        app = UsageMiddleware(make_app(), tracker=tracker)
+        for _ in range(3):
+            assert self.call(app) == ('200 OK', b'ok')
+
+        assert tracker.usage()['hour']['requests'] == 3
+
+    def test_metrics_endpoint(self, tmp_path):
+        """Test usage is exposed in the Prometheus text format and not counted."""
+        tracker = UsageTracker(
+            path=str(tmp_path / 'requests.db'),
+            flush_interval=3600,
+            limits={'requests_day': 100},
+        )
+        app = UsageMiddleware(make_app(), tracker=tracker)
+        self.call(app)
+        status, body = self.call(app, '/usage/metrics')
+
+        assert status == '200 OK'
+        text = body.decode()
+        assert 'superset_free_tier_usage{metric="requests",window="day"} 1' in text
+        assert 'superset_free_tier_limit_ratio{limit="requests_day"} 0.01' in text
+        assert tracker.usage()['day']['requests'] == 1
+
+    def test_metrics_endpoint_is_internal(self, tmp_path):
+        """Test the metrics need a private client address, or the token when one is set."""
+        tracker = UsageTracker(path=str(tmp_path / 'requests.db'), flush_interval=3600)
+        app = UsageMiddleware(make_app(), tracker=tracker)
+        assert self.call(app, '/usage/metrics', REMOTE_ADDR='10.1.2.3')[0] == '200 OK'
+        assert self.call(app, '/usage/metrics', REMOTE_ADDR='203.0.113.7')[0] == '403 Forbidden'
+        assert self.call(app, '/usage/metrics', REMOTE_ADDR='')[0] == '403 Forbidden'
+
+        app = UsageMiddleware(make_app(), tracker=tracker, metrics_token='secret')
+        assert self.call(app, '/usage/metrics')[0] == '403 Forbidden'
+        assert self.call(
+            app, '/usage/metrics', REMOTE_ADDR='203.0.113.7', HTTP_AUTHORIZATION='Bearer secret'
+        )[0] == '200 OK'
+
+    def test_file_wrapper_passed_through(self, tmp_path):
+        """Test file wrapper responses reach the server unwrapped and are still recorded."""
+        class FileWrapper:
+            def __init__(self, filelike, block_size=8192):
+                self.filelike = filelike
+
+            def __iter__(self):
+                return iter([self.filelike])
+
+        def app(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'application/octet-stream')])
+            return environ['wsgi.file_wrapper'](b'file')
+
+        tracker = UsageTracker(path=str(tmp_path / 'requests.db'), flush_interval=3600)
+        response = UsageMiddleware(app, tracker=tracker)(
+            {'PATH_INFO': '/static/x', 'wsgi.file_wrapper': FileWrapper}, lambda s, h: None
+        )
+
+        assert isinstance(response, FileWrapper)
+        assert tracker.usage()['hour']['requests'] == 1
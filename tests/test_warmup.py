@@ -0,0 +1,143 @@
+"""Tests for the dashboard cache warm-up."""
+
+import json
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+# Add the mounted Superset pythonpath to the import path
+sys.path.append(str(Path(__file__).parent.parent / 'docker' / 'local'))
+
+from superset_ext.warmup import CacheWarmer, top_dashboards
+
+
+class FakeSuperset(BaseHTTPRequestHandler):
+    """Minimal Superset API: login, dashboard charts and chart warm-up."""
+
+    charts = {1: [10, 11], 2: [20]}
+    warmed = []
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        return json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+
+    def do_POST(self):
+        self._body()
+        self._reply({'access_token': 'token'})
+
+    def do_GET(self):
+        dashboard_id = int(self.path.split('/')[4])
+        self._reply({'result': [{'id': chart_id} for chart_id in self.charts[dashboard_id]]})
+
+    def do_PUT(self):
+        assert self.headers['Authorization'] == 'Bearer token'
+        body = self._body()
+        cls = type(self)
+        with cls.lock:
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        time.sleep(0.05)
+        with cls.lock:
+            cls.in_flight -= 1
+            cls.warmed.append((body['chart_id'], body['dashboard_id']))
+        error = 'boom' if body['chart_id'] == 20 else None
+        self._reply({'result': [{'chart_id': body['chart_id'], 'viz_error': error, 'viz_status': 'success'}]})
+
+
+@pytest.fixture
+def superset():
+    FakeSuperset.warmed = []
+    FakeSuperset.max_in_flight = 0
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeSuperset)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+
+
+def now(days=0):
+    return datetime.utcnow() - timedelta(days=days)
+
+
+def logs_engine(tmp_path, rows):
+    from sqlalchemy import create_engine, text
+    engine = create_engine(f"sqlite:///{tmp_path / 'superset.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            'CREATE TABLE logs (id INTEGER PRIMARY KEY, action VARCHAR(512), dashboard_id INTEGER, dttm DATETIME)'
+        ))
+        for dashboard_id, action, dttm in rows:
+            conn.execute(
+                text('INSERT INTO logs (dashboard_id, action, dttm) VALUES (:d, :a, :t)'),
+                {'d': dashboard_id, 'a': action, 't': dttm},
+            )
+    return engine
+
+
+class TestTopDashboards:
+    """Test ranking dashboards from the logs table."""
+
+    def test_ranks_recent_views(self, tmp_path):
+        """Test dashboards are ordered by recent views and old views ignored."""
+        engine = logs_engine(tmp_path, (
+            [(1, 'dashboard', now())] * 3 + [(2, 'DashboardRestApi.get', now())] * 5
+            + [(3, 'dashboard', now(days=30))] * 10 + [(None, 'welcome', now())] * 20
+        ))
+
+        assert top_dashboards(engine, limit=10, lookback_days=7) == [2, 1]
+        assert top_dashboards(engine, limit=1, lookback_days=60) == [3]
+
+    def test_only_views_count(self, tmp_path):
+        """Test chart data calls and frontend events of a dashboard are not views."""
+        engine = logs_engine(tmp_path, (
+            [(1, 'Superset.dashboard', now())] * 4
+            + [(2, 'Superset.dashboard', now())] * 2
+            + [(2, 'ChartRestApi.data', now())] * 30 + [(2, 'log', now())] * 30
+        ))
+
+        assert top_dashboards(engine, limit=10, lookback_days=7) == [1, 2]
+
+
+class TestCacheWarmer:
+    """Test replaying chart data requests."""
+
+    def test_warms_every_chart_and_reports(self, superset):
+        """Test each chart is warmed in its dashboard and failures counted."""
+        warmer = CacheWarmer(superset, 'admin', 'admin', concurrency=2)
+        report = warmer.run([1, 2])
+
+        assert sorted(FakeSuperset.warmed) == [(10, 1), (11, 1), (20, 2)]
+        assert report['dashboards'] == 2
+        assert report['charts'] == 3
+        assert report['warmed'] == 2
+        assert report['failed'] == 1
+        assert report['seconds'] > 0
+
+    def test_concurrency_is_bounded(self, superset):
+        """Test no more than ``concurrency`` chart requests run at once."""
+        FakeSuperset.charts = {1: list(range(100, 112))}
+        try:
+            CacheWarmer(superset, 'admin', 'admin', concurrency=3).run([1])
+        finally:
+            FakeSuperset.charts = {1: [10, 11], 2: [20]}
+
+        assert len(FakeSuperset.warmed) == 12
+        assert 1 < FakeSuperset.max_in_flight <= 3
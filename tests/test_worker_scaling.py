@@ -0,0 +1,118 @@
+"""Tests for queue-driven Celery worker autoscaling."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add the mounted Superset pythonpath to the import path
+sys.path.append(str(Path(__file__).parent.parent / 'docker' / 'local'))
+
+from superset_ext.worker_scaling import QueueScaler, queue_keys, queue_lengths, run
+
+
+class FakeRedis:
+    """Lists of a Redis database, answering pipelined LLEN."""
+
+    def __init__(self, lists):
+        self.lists = lists
+        self.round_trips = 0
+
+    def pipeline(self, transaction=True):
+        client = self
+
+        class Pipeline:
+            def __init__(self):
+                self.keys = []
+
+            def llen(self, key):
+                self.keys.append(key)
+
+            def execute(self):
+                client.round_trips += 1
+                return [client.lists.get(key, 0) for key in self.keys]
+
+        return Pipeline()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeWorkers:
+    def __init__(self, replicas=1):
+        self.replicas = replicas
+        self.changes = []
+
+    def current(self):
+        return self.replicas
+
+    def scale(self, replicas):
+        self.changes.append(replicas)
+        self.replicas = replicas
+
+
+class TestQueueLengths:
+    """Test reading the backlog from the broker."""
+
+    def test_priority_lists_are_counted(self):
+        """Test a queue's priority sub-lists add to its length, in one round trip."""
+        client = FakeRedis({'celery': 5, queue_keys('celery')[2]: 3, 'reports': 4, 'celery-task-meta-1': 1})
+        assert queue_lengths(client, ['celery', 'reports']) == {'celery': 8, 'reports': 4}
+        assert client.round_trips == 1
+
+
+class TestQueueScaler:
+    """Test replica decisions."""
+
+    def test_desired_within_bounds(self):
+        """Test one worker per target_queue_length waiting tasks, clamped to min/max."""
+        scaler = QueueScaler(min_workers=1, max_workers=4, target_queue_length=10)
+        assert [scaler.desired(backlog) for backlog in (0, 10, 11, 35, 500)] == [1, 1, 2, 4, 4]
+
+    def test_scale_up_at_once_and_down_after_cooldown(self):
+        """Test a burst adds workers immediately and they stay for the cooldown."""
+        clock = FakeClock()
+        scaler = QueueScaler(min_workers=0, max_workers=5, target_queue_length=10, cooldown_seconds=300, clock=clock)
+        assert scaler.recommend(45, current=0) == 5
+
+        clock.now = 120
+        assert scaler.recommend(0, current=5) == 5
+        clock.now = 301
+        assert scaler.recommend(0, current=5) == 0
+
+    def test_scale_down_to_recent_peak(self):
+        """Test scaling down stops at the highest need within the cooldown."""
+        clock = FakeClock()
+        scaler = QueueScaler(min_workers=1, max_workers=8, target_queue_length=10, cooldown_seconds=60, clock=clock)
+        scaler.recommend(80, current=1)
+        clock.now = 70
+        scaler.recommend(30, current=8)
+        clock.now = 100
+        assert scaler.recommend(0, current=8) == 3
+
+    def test_invalid_bounds(self):
+        """Test min_workers above max_workers is rejected."""
+        with pytest.raises(ValueError):
+            QueueScaler(min_workers=5, max_workers=2)
+
+
+class TestRun:
+    """Test the polling loop."""
+
+    def test_scales_only_on_change(self):
+        """Test workers are scaled when the recommendation differs from what runs."""
+        workers = FakeWorkers(replicas=1)
+        backlogs = iter([{'celery': 25}, {'celery': 28}])
+        run(QueueScaler(1, 4, 10, 300), lambda: next(backlogs), workers, interval=0, iterations=2)
+        assert workers.changes == [3]
+
+    def test_dry_run(self):
+        """Test --dry-run leaves the workers alone."""
+        workers = FakeWorkers(replicas=1)
+        run(QueueScaler(1, 4, 10, 300), lambda: {'celery': 40}, workers, iterations=1, dry_run=True)
+        assert workers.changes == []
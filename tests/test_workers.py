@@ -0,0 +1,112 @@
+"""Tests for Celery queue routing and worker pools."""
+
+import ast
+import sys
+from pathlib import Path
+
+import pytest
+from pydantic import ValidationError
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from pulumi.config.models import CeleryConfig
+from pulumi.config.workers import QUEUE_TASKS, compose_worker_services, task_routes, worker_command, worker_pools
+
+
+class TestRoutes:
+    """Test which tasks leave the default queue."""
+
+    def test_only_listed_queues(self, production_stack):
+        """Test tasks are routed only for the configured queues."""
+        assert task_routes(production_stack()) == {}
+        routes = task_routes(production_stack(celery={'queues': {'reports': {}}}))
+        assert routes['reports.execute'] == {'queue': 'reports'}
+        assert set(route['queue'] for route in routes.values()) == {'reports'}
+
+    @pytest.mark.parametrize('config', ['superset_config.py', 'superset_config_standard.py'])
+    def test_compose_configs_route_every_queue(self, config):
+        """Test the Redis compose configs route like a stack listing every queue."""
+        source = (Path(__file__).parent.parent / 'docker' / 'local' / config).read_text()
+        celery = next(
+            node for node in ast.parse(source).body if isinstance(node, ast.ClassDef) and node.name == 'CeleryConfig'
+        )
+        settings = {
+            node.targets[0].id: ast.literal_eval(node.value)
+            for node in celery.body
+            if isinstance(node, ast.Assign) and node.targets[0].id in ('task_routes', 'worker_prefetch_multiplier')
+        }
+        assert settings['task_routes'] == {
+            task: {'queue': queue} for queue, tasks in QUEUE_TASKS.items() for task in tasks
+        }
+        assert settings['worker_prefetch_multiplier'] == 1
+
+    def test_unknown_queue(self):
+        """Test only the known task classes can get a queue."""
+        with pytest.raises(ValidationError):
+            CeleryConfig(queues={'exports': {}})
+
+
+class TestPools:
+    """Test the worker pools and their commands."""
+
+    def test_default_pool(self, production_stack):
+        """Test the default pool keeps one process per gunicorn worker and prefetch 10."""
+        [pool] = worker_pools(production_stack(), processes=5)
+        assert (pool.queue, pool.component, pool.concurrency, pool.prefetch_multiplier) == ('celery', 'worker', 5, 10)
+        assert pool.replicas == 2 and not pool.autoscaled_queues
+
+    def test_dedicated_pools(self, production_stack):
+        """Test per-queue settings, defaults and resources."""
+        stack = production_stack(celery={'queues': {
+            'sql_lab': {'concurrency': 8, 'pool': 'threads'},
+            'thumbnails': {'max_tasks_per_child': 20, 'resources': {'cpu': '2', 'memory': '4Gi'}},
+        }})
+        pools = {pool.queue: pool for pool in worker_pools(stack, processes=5)}
+        assert list(pools) == ['celery', 'sql_lab', 'thumbnails']
+        assert pools['thumbnails'].component == 'worker-thumbnails'
+        assert pools['thumbnails'].concurrency == 2
+        assert pools['thumbnails'].resources.memory == '4Gi'
+        assert pools['sql_lab'].resources.memory == '8Gi'
+
+        command = worker_command(pools['sql_lab'])
+        assert '--queues=sql_lab' in command and '--hostname=sql_lab@%h' in command
+        assert {'--pool=threads', '--concurrency=8', '--prefetch-multiplier=1'} <= set(command)
+        assert '--max-tasks-per-child=20' in worker_command(pools['thumbnails'])
+
+    def test_autoscaled_queues(self, production_stack):
+        """Test each pool scales on the autoscaled queues it consumes."""
+        stack = production_stack(celery={
+            'autoscaling': {'enabled': True, 'queues': ['celery', 'reports', 'thumbnails']},
+            'queues': {'thumbnails': {}},
+        })
+        default, thumbnails = worker_pools(stack, processes=5)
+        assert default.autoscaled_queues == ['celery', 'reports']
+        assert default.prefetch_multiplier == 1
+        assert thumbnails.autoscaled_queues == ['thumbnails']
+
+    def test_browser_queues_use_threads(self, production_stack):
+        """Test screenshot queues default to one thread per pooled browser."""
+        stack = production_stack(celery={
+            'browser_pool': {'enabled': True, 'size': 3},
+            'queues': {'thumbnails': {}, 'reports': {'pool': 'prefork'}, 'warmup': {}},
+        })
+        pools = {pool.queue: pool for pool in worker_pools(stack, processes=5)}
+        assert (pools['thumbnails'].pool, pools['thumbnails'].concurrency) == ('threads', 3)
+        assert (pools['reports'].pool, pools['reports'].concurrency) == ('prefork', 2)
+        assert pools['warmup'].pool == 'prefork'
+
+    def test_compose_override(self, tmp_path, production_stack):
+        """Test one compose service per pool, extending the base worker service."""
+        output = tmp_path / 'generated' / 'compose_workers.yaml'
+        compose_file = tmp_path / 'docker-compose.yaml'
+        override = compose_worker_services(
+            production_stack(celery={'queues': {'warmup': {}}}), 5, str(compose_file), str(output)
+        )
+        services = override['services']
+        assert list(services) == ['superset-worker', 'superset-worker-warmup']
+        assert 'extends' not in services['superset-worker']
+        assert services['superset-worker-warmup']['extends'] == {
+            'file': '../docker-compose.yaml', 'service': 'superset-worker',
+        }
+        assert '--queues=warmup' in services['superset-worker-warmup']['command']